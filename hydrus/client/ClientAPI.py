@@ -1,3 +1,4 @@
+import collections
 import collections.abc
 import threading
 
@@ -62,6 +63,9 @@ basic_permission_to_str_lookup = {
 
 SEARCH_RESULTS_CACHE_TIMEOUT = 4 * 3600
 
+# total file ids held in paginated search results for each access key. past this, the oldest searches get dropped
+MAX_NUM_SEARCH_CURSOR_HASH_IDS = 1000000
+
 SESSION_EXPIRY = 86400
 
 api_request_dialog_open = False
@@ -286,6 +290,8 @@ class APIPermissions( HydrusSerialisable.SerialisableBaseNamed ):
         self._last_search_results = None
         self._search_results_timeout = 0
         
+        self._search_cursor_keys_to_results = collections.OrderedDict()
+        
         self._lock = threading.Lock()
         
     
@@ -381,6 +387,28 @@ class APIPermissions( HydrusSerialisable.SerialisableBaseNamed ):
             
         
     
+    def AddSearchCursor( self, hash_ids: list[ int ], page_size: int ) -> bytes:
+        
+        with self._lock:
+            
+            cursor_key = HydrusData.GenerateKey()
+            
+            self._search_cursor_keys_to_results[ cursor_key ] = ( hash_ids, page_size, HydrusTime.GetNow() + SEARCH_RESULTS_CACHE_TIMEOUT )
+            
+            num_hash_ids = sum( ( len( cursor_hash_ids ) for ( cursor_hash_ids, cursor_page_size, timeout ) in self._search_cursor_keys_to_results.values() ) )
+            
+            # we always keep the newest, even if it is huge on its own
+            while num_hash_ids > MAX_NUM_SEARCH_CURSOR_HASH_IDS and len( self._search_cursor_keys_to_results ) > 1:
+                
+                ( dropped_cursor_key, ( dropped_hash_ids, dropped_page_size, dropped_timeout ) ) = self._search_cursor_keys_to_results.popitem( last = False )
+                
+                num_hash_ids -= len( dropped_hash_ids )
+                
+            
+            return cursor_key
+            
+        
+    
     def CheckCanSeeAllFiles( self ):
         
         with self._lock:
@@ -505,6 +533,45 @@ class APIPermissions( HydrusSerialisable.SerialisableBaseNamed ):
             
         
     
+    def GetSearchCursorPage( self, cursor_key: bytes, offset: int, page_size: int | None = None ) -> tuple[ list[ int ], int, int ]:
+        
+        with self._lock:
+            
+            if cursor_key not in self._search_cursor_keys_to_results:
+                
+                raise HydrusExceptions.BadRequestException( 'It looks like that search cursor is no longer available--please run the search again!' )
+                
+            
+            ( hash_ids, cursor_page_size, timeout ) = self._search_cursor_keys_to_results[ cursor_key ]
+            
+            self._search_cursor_keys_to_results[ cursor_key ] = ( hash_ids, cursor_page_size, HydrusTime.GetNow() + SEARCH_RESULTS_CACHE_TIMEOUT )
+            
+            self._search_cursor_keys_to_results.move_to_end( cursor_key )
+            
+            if page_size is None:
+                
+                page_size = cursor_page_size
+                
+            
+            page_hash_ids = hash_ids[ offset : offset + page_size ]
+            
+            # another search may have happened since this cursor was made, so the files we serve here need to be seeable
+            if not self._search_tag_filter.AllowsEverything():
+                
+                if self._last_search_results is None:
+                    
+                    self._last_search_results = set()
+                    
+                
+                self._last_search_results.update( page_hash_ids )
+                
+                self._search_results_timeout = HydrusTime.GetNow() + SEARCH_RESULTS_CACHE_TIMEOUT
+                
+            
+            return ( page_hash_ids, len( hash_ids ), page_size )
+            
+        
+    
     def GetSearchTagFilter( self ):
         
         with self._lock:
@@ -530,6 +597,14 @@ class APIPermissions( HydrusSerialisable.SerialisableBaseNamed ):
                 self._last_search_results = None
                 
             
+            for ( cursor_key, ( hash_ids, page_size, timeout ) ) in list( self._search_cursor_keys_to_results.items() ):
+                
+                if HydrusTime.TimeHasPassed( timeout ):
+                    
+                    del self._search_cursor_keys_to_results[ cursor_key ]
+                    
+                
+            
         
     
     def PermitsEverything( self ):
@@ -35,6 +35,7 @@ from hydrus.client.gui import ClientGUIDialogsMessage
 from hydrus.client.gui import ClientGUIFunctions
 from hydrus.client.gui import ClientGUISplash
 from hydrus.client.gui import QtPorting as QP
+from hydrus.client.media import ClientMediaResultCache
 
 if not HG.twisted_is_broke:
     
@@ -269,6 +270,11 @@ class Controller( HydrusController.HydrusController ):
             
         
     
+    def _GetMediaResultSnapshotPath( self ):
+        
+        return os.path.join( self.db_dir, 'client_media_result_snapshot.bin' )
+        
+    
     def _GetPubsubValidCallable( self ):
         
         return QP.isValid
@@ -981,6 +987,12 @@ class Controller( HydrusController.HydrusController ):
                 
                 if self.gui is not None and QP.isValid( self.gui ):
                     
+                    if self._is_booted and self.new_options.GetBoolean( 'save_media_result_snapshot_on_exit' ):
+                        
+                        # grab these while the pages still hold them. we write them out after the db is done
+                        ClientMediaResultCache.MediaResultCache.instance().PrepareSnapshot()
+                        
+                    
                     self.frame_splash_status.SetTitleText( 'saving and hiding gui' + HC.UNICODE_ELLIPSIS )
                     
                     self.gui.SaveAndHide()
@@ -1275,6 +1287,10 @@ class Controller( HydrusController.HydrusController ):
         
         HydrusPaths.DO_NOT_DO_CHMOD_MODE = self.new_options.GetBoolean( 'do_not_do_chmod_mode' )
         
+        from hydrus.client.db import ClientDBMappingsStorage
+        
+        ClientDBMappingsStorage.TAG_POSTINGS_CACHE.SetMaxSize( self.new_options.GetInteger( 'tag_postings_cache_size' ) )
+        
         with self._thread_slot_lock:
             
             self._UpdateThreadSlotLockLimits()
@@ -1319,6 +1335,7 @@ class Controller( HydrusController.HydrusController ):
         # TODO: When you move this guy to being the only thumb cache, and when you clean up the thumbs rendering pipeline...
         # if this guy still has a mainloop, move him to being a DAEMON and formalise it all as a manager. atm he calls his own loop start argh
         self.thumbnails_cache_graphics_view_test = ClientCaches.ThumbnailCacheGraphicsViewTest( self )
+        self.client_api_render_cache = ClientCaches.ClientAPIRenderCache( self )
         
         self.frame_splash_status.SetText( 'initialising managers' )
         
@@ -1549,6 +1566,21 @@ class Controller( HydrusController.HydrusController ):
         
         self._managers[ 'undo' ] = ClientManagers.UndoManager( self )
         
+        #
+        
+        media_result_snapshot_path = self._GetMediaResultSnapshotPath()
+        
+        if self.new_options.GetBoolean( 'save_media_result_snapshot_on_exit' ):
+            
+            self.frame_splash_status.SetSubtext( 'media result snapshot' )
+            
+            ClientMediaResultCache.MediaResultCache.instance().LoadSnapshot( media_result_snapshot_path )
+            
+        elif os.path.exists( media_result_snapshot_path ):
+            
+            os.remove( media_result_snapshot_path )
+            
+        
         self.sub( self, 'ToClipboard', 'clipboard' )
         
     
@@ -1869,6 +1901,10 @@ class Controller( HydrusController.HydrusController ):
     
     def ReportFirstSessionInitialised( self ):
         
+        job = self.CallRepeating( 30.0, 5.0, self.RevalidateMediaResultSnapshot )
+        job.ShouldDelayOnWakeup( True )
+        self._daemon_jobs[ 'revalidate_media_result_snapshot' ] = job
+        
         job = self.CallRepeating( 5.0, 3600.0, self.SynchroniseAccounts )
         job.ShouldDelayOnWakeup( True )
         job.WakeOnPubSub( 'notify_account_sync_due' )
@@ -1912,6 +1948,10 @@ class Controller( HydrusController.HydrusController ):
         job.WakeOnPubSub( 'notify_new_physical_file_deletes' )
         self._daemon_jobs[ 'deferred_physical_deletes' ] = job
         
+        job = self.CallRepeating( 120.0, 3600.0, self.client_files_manager.MaintainThumbnailPacks )
+        job.ShouldDelayOnWakeup( True )
+        self._daemon_jobs[ 'maintain_thumbnail_packs' ] = job
+        
         job = self.CallRepeating( 30.0, 600.0, self.MaintainHashedSerialisables )
         job.WakeOnPubSub( 'maintain_hashed_serialisables' )
         job.ShouldDelayOnWakeup( True )
@@ -1975,6 +2015,34 @@ class Controller( HydrusController.HydrusController ):
             
         
     
+    def RevalidateMediaResultSnapshot( self ):
+        
+        # the snapshot is only checked in idle time, a chunk at a time, so it never competes with the user for the db
+        
+        media_result_cache = ClientMediaResultCache.MediaResultCache.instance()
+        
+        time_to_stop = HydrusTime.GetNowFloat() + 1.0
+        
+        work_done = False
+        
+        while self.GoodTimeToStartBackgroundWork() and not HydrusTime.TimeHasPassedFloat( time_to_stop ):
+            
+            if not media_result_cache.RevalidateSnapshotChunk():
+                
+                self._daemon_jobs[ 'revalidate_media_result_snapshot' ].Cancel()
+                
+                break
+                
+            
+            work_done = True
+            
+        
+        if work_done:
+            
+            self.pub( 'refresh_all_tag_presentation_gui' )
+            
+        
+    
     def Run( self ):
         
         from hydrus.client.gui import QtInit
@@ -2379,6 +2447,15 @@ class Controller( HydrusController.HydrusController ):
         
         HydrusController.HydrusController.ShutdownModel( self )
         
+        if self._is_booted and not self._doing_fast_exit:
+            
+            self.frame_splash_status.SetSubtext( 'media result snapshot' )
+            
+            ClientMediaResultCache.MediaResultCache.instance().SaveSnapshot( self._GetMediaResultSnapshotPath() )
+            
+            self.frame_splash_status.SetSubtext( '' )
+            
+        
     
     def ShutdownView( self ):
         
@@ -217,6 +217,7 @@ class ClientOptions( HydrusSerialisable.SerialisableBase ):
             'show_new_on_file_seed_short_summary' : False,
             'show_deleted_on_file_seed_short_summary' : False,
             'only_save_last_session_during_idle' : False,
+            'save_media_result_snapshot_on_exit' : False,
             'do_human_sort_on_hdd_file_import_paths' : True,
             'highlight_new_watcher' : True,
             'highlight_new_query' : True,
@@ -226,6 +227,7 @@ class ClientOptions( HydrusSerialisable.SerialisableBase ):
             'file_viewing_statistics_active_on_dupe_filter' : False,
             'prefix_hash_when_copying' : False,
             'file_system_waits_on_wakeup' : False,
+            'use_packed_thumbnail_storage' : False,
             'show_system_everything' : True,
             'watch_clipboard_for_watcher_urls' : False,
             'watch_clipboard_for_other_recognised_urls' : False,
@@ -243,6 +245,7 @@ class ClientOptions( HydrusSerialisable.SerialisableBase ):
             'start_client_in_system_tray' : False,
             'use_qt_file_dialogs' : False,
             'notify_client_api_cookies' : False,
+            'client_api_render_cache_warm_up' : False,
             'expand_parents_on_storage_taglists' : True,
             'expand_parents_on_storage_autocomplete_taglists' : True,
             'show_parent_decorators_on_storage_taglists' : True,
@@ -530,7 +533,10 @@ class ClientOptions( HydrusSerialisable.SerialisableBase ):
             'thumbnail_cache_size' : 1024 * 1024 * 32,
             'image_cache_size' : 1024 * 1024 * 1024,
             'image_tile_cache_size' : 1024 * 1024 * 256,
+            'client_api_render_cache_size' : 1024 * 1024 * 256,
+            'tag_postings_cache_size' : 0,
             'thumbnail_cache_timeout' : 86400,
+            'thumbnail_decode_num_workers' : 4,
             'image_cache_timeout' : 600,
             'image_tile_cache_timeout' : 300,
             'image_cache_storage_limit_percentage' : 25,
@@ -546,6 +552,7 @@ class ClientOptions( HydrusSerialisable.SerialisableBase ):
             'file_maintenance_idle_throttle_time_delta' : 2,
             'file_maintenance_active_throttle_files' : 1,
             'file_maintenance_active_throttle_time_delta' : 20,
+            'file_maintenance_num_workers' : 1,
             'subscription_network_error_delay' : 12 * 3600,
             'subscription_other_error_delay' : 36 * 3600,
             'downloader_network_error_delay' : 90 * 60,
@@ -641,6 +648,7 @@ class ClientOptions( HydrusSerialisable.SerialisableBase ):
         
         self._dictionary[ 'noneable_integers' ] = {
             'forced_search_limit' : None,
+            'json_dump_compression_codec' : None,
             'num_recent_tags' : 20,
             'num_recent_tags_in_quick_dialog' : 10,
             'duplicate_background_switch_intensity_a' : 0,
@@ -662,6 +670,7 @@ class ClientOptions( HydrusSerialisable.SerialisableBase ):
             'slideshow_short_duration_cutoff_percentage' : 75,
             'slideshow_long_duration_overspill_percentage' : 50,
             'num_to_show_in_ac_dropdown_children_tab' : 40,
+            'autocomplete_max_results' : None,
             'number_of_unselected_medias_to_present_tags_for' : 4096,
             'export_path_character_limit' : None,
             'export_dirname_character_limit' : None,
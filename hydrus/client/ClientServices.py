@@ -1,4 +1,6 @@
+import collections
 import collections.abc
+import concurrent.futures
 import hashlib
 from io import BytesIO
 import json
@@ -31,6 +33,8 @@ from hydrus.client.networking import ClientNetworkingJobs
 SHORT_DELAY_PERIOD = 50000
 ACCOUNT_SYNC_PERIOD = 250000
 
+NUM_UPDATES_TO_DECODE_AHEAD = 2
+
 def ConvertNumericalRatingToPrettyString( lower, upper, rating, rounded_result = False, out_of = True ):
     
     rating_converted = ( rating * ( upper - lower ) ) + lower
@@ -1189,6 +1193,82 @@ class ServiceRestricted( ServiceRemote ):
         CG.client_controller.pub( 'notify_account_sync_due' )
         
     
+    def _GenerateNetworkJob( self, method, command, request_args, temp_path = None, file_body_path = None ) -> ClientNetworkingJobs.NetworkJobHydrus:
+        
+        query = ''
+        body = ''
+        
+        if method == HC.GET:
+            
+            query = HydrusNetworkVariableHandling.DumpToGETQuery( request_args )
+            
+            body = ''
+            
+            content_type = None
+            
+        elif method == HC.POST:
+            
+            query = ''
+            
+            if command == 'file':
+                
+                content_type = HC.APPLICATION_OCTET_STREAM
+                
+            else:
+                
+                content_type = HC.APPLICATION_JSON
+                
+                body = HydrusNetworkVariableHandling.DumpHydrusArgsToNetworkBytes( request_args )
+                
+            
+        
+        if query != '':
+            
+            command_and_query = command + '?' + query
+            
+        else:
+            
+            command_and_query = command
+            
+        
+        url = self.GetBaseURL() + command_and_query
+        
+        if method == HC.GET:
+            
+            method = 'GET'
+            
+        elif method == HC.POST:
+            
+            method = 'POST'
+            
+        
+        network_job = ClientNetworkingJobs.NetworkJobHydrus( self._service_key, method, url, body = body, temp_path = temp_path, file_body_path = file_body_path )
+        
+        if command not in ( 'update', 'metadata', 'file', 'thumbnail' ):
+            
+            network_job.OverrideBandwidth()
+            network_job.OnlyTryConnectionOnce()
+            
+        
+        if command in ( '', 'access_key', 'access_key_verification' ):
+            
+            # don't try to establish a session key for these requests
+            network_job.SetForLogin( True )
+            
+            if command == 'access_key_verification':
+                
+                network_job.AddAdditionalHeader( 'Hydrus-Key', self._credentials.GetAccessKey().hex() )
+                
+            
+        
+        if content_type is not None:
+            
+            network_job.AddAdditionalHeader( 'Content-Type', HC.mime_mimetype_string_lookup[ content_type ] )
+            
+        
+        return network_job
+        
+    
     def _GetSerialisableDictionary( self ):
         
         dictionary = ServiceRemote._GetSerialisableDictionary( self )
@@ -1240,6 +1320,74 @@ class ServiceRestricted( ServiceRemote ):
         self._service_options.update( service_options )
         
     
+    def _WaitForResponse( self, network_job: ClientNetworkingJobs.NetworkJobHydrus, command ):
+        
+        try:
+            
+            network_job.WaitUntilDone()
+            
+            network_bytes = network_job.GetContentBytes()
+            
+            content_type = network_job.GetContentType()
+            
+            if content_type is not None and content_type.startswith( 'application/json' ):
+                
+                parsed_args = HydrusNetworkVariableHandling.ParseNetworkBytesToParsedHydrusArgs( network_bytes )
+                
+                if command == 'account' and 'account' in parsed_args:
+                    
+                    data_used = network_job.GetTotalDataUsed()
+                    
+                    account = parsed_args[ 'account' ]
+                    
+                    # because the account was one behind when it was serialised! mostly do this just to sync up nicely with the service bandwidth tracker
+                    account.ReportDataUsed( data_used )
+                    account.ReportRequestUsed()
+                    
+                
+                response = parsed_args
+                
+            else:
+                
+                response = network_bytes
+                
+            
+            return response
+            
+        except Exception as e:
+            
+            with self._lock:
+                
+                if isinstance( e, HydrusExceptions.ServerBusyException ):
+                    
+                    self._DelayFutureRequests( 'server was busy', duration_s = 5 * 60 )
+                    
+                elif isinstance( e, HydrusExceptions.SessionException ):
+                    
+                    CG.client_controller.network_engine.session_manager.ClearSession( self.network_context )
+                    
+                elif isinstance( e, ( HydrusExceptions.MissingCredentialsException, HydrusExceptions.InsufficientCredentialsException, HydrusExceptions.ConflictException ) ):
+                    
+                    self._DealWithAccountError()
+                    
+                elif isinstance( e, HydrusExceptions.NetworkVersionException ):
+                    
+                    self._DealWithFundamentalNetworkError()
+                    
+                elif isinstance( e, HydrusExceptions.BandwidthException ):
+                    
+                    self._DelayFutureRequests( 'service has exceeded bandwidth', duration_s = ACCOUNT_SYNC_PERIOD )
+                    
+                elif isinstance( e, HydrusExceptions.ServerException ):
+                    
+                    self._DelayFutureRequests( str( e ) )
+                    
+                
+            
+            raise
+            
+        
+    
     def CheckFunctional( self, including_external_communication = True, including_bandwidth = True, including_account = True ):
         
         with self._lock:
@@ -1358,143 +1506,11 @@ class ServiceRestricted( ServiceRemote ):
         if request_headers is None: request_headers = {}
         if report_hooks is None: report_hooks = []
         
-        try:
-            
-            query = ''
-            body = ''
-            
-            if method == HC.GET:
-                
-                query = HydrusNetworkVariableHandling.DumpToGETQuery( request_args )
-                
-                body = ''
-                
-                content_type = None
-                
-            elif method == HC.POST:
-                
-                query = ''
-                
-                if command == 'file':
-                    
-                    content_type = HC.APPLICATION_OCTET_STREAM
-                    
-                else:
-                    
-                    content_type = HC.APPLICATION_JSON
-                    
-                    body = HydrusNetworkVariableHandling.DumpHydrusArgsToNetworkBytes( request_args )
-                    
-                
-            
-            if query != '':
-                
-                command_and_query = command + '?' + query
-                
-            else:
-                
-                command_and_query = command
-                
-            
-            url = self.GetBaseURL() + command_and_query
-            
-            if method == HC.GET:
-                
-                method = 'GET'
-                
-            elif method == HC.POST:
-                
-                method = 'POST'
-                
-            
-            network_job = ClientNetworkingJobs.NetworkJobHydrus( self._service_key, method, url, body = body, temp_path = temp_path, file_body_path = file_body_path )
-            
-            if command not in ( 'update', 'metadata', 'file', 'thumbnail' ):
-                
-                network_job.OverrideBandwidth()
-                network_job.OnlyTryConnectionOnce()
-                
-            
-            if command in ( '', 'access_key', 'access_key_verification' ):
-                
-                # don't try to establish a session key for these requests
-                network_job.SetForLogin( True )
-                
-                if command == 'access_key_verification':
-                    
-                    network_job.AddAdditionalHeader( 'Hydrus-Key', self._credentials.GetAccessKey().hex() )
-                    
-                
-            
-            if content_type is not None:
-                
-                network_job.AddAdditionalHeader( 'Content-Type', HC.mime_mimetype_string_lookup[ content_type ] )
-                
-            
-            CG.client_controller.network_engine.AddJob( network_job )
-            
-            network_job.WaitUntilDone()
-            
-            network_bytes = network_job.GetContentBytes()
-            
-            content_type = network_job.GetContentType()
-            
-            if content_type is not None and content_type.startswith( 'application/json' ):
-                
-                parsed_args = HydrusNetworkVariableHandling.ParseNetworkBytesToParsedHydrusArgs( network_bytes )
-                
-                if command == 'account' and 'account' in parsed_args:
-                    
-                    data_used = network_job.GetTotalDataUsed()
-                    
-                    account = parsed_args[ 'account' ]
-                    
-                    # because the account was one behind when it was serialised! mostly do this just to sync up nicely with the service bandwidth tracker
-                    account.ReportDataUsed( data_used )
-                    account.ReportRequestUsed()
-                    
-                
-                response = parsed_args
-                
-            else:
-                
-                response = network_bytes
-                
-            
-            return response
-            
-        except Exception as e:
-            
-            with self._lock:
-                
-                if isinstance( e, HydrusExceptions.ServerBusyException ):
-                    
-                    self._DelayFutureRequests( 'server was busy', duration_s = 5 * 60 )
-                    
-                elif isinstance( e, HydrusExceptions.SessionException ):
-                    
-                    CG.client_controller.network_engine.session_manager.ClearSession( self.network_context )
-                    
-                elif isinstance( e, ( HydrusExceptions.MissingCredentialsException, HydrusExceptions.InsufficientCredentialsException, HydrusExceptions.ConflictException ) ):
-                    
-                    self._DealWithAccountError()
-                    
-                elif isinstance( e, HydrusExceptions.NetworkVersionException ):
-                    
-                    self._DealWithFundamentalNetworkError()
-                    
-                elif isinstance( e, HydrusExceptions.BandwidthException ):
-                    
-                    self._DelayFutureRequests( 'service has exceeded bandwidth', duration_s = ACCOUNT_SYNC_PERIOD )
-                    
-                elif isinstance( e, HydrusExceptions.ServerException ):
-                    
-                    self._DelayFutureRequests( str( e ) )
-                    
-                
-            
-            raise
-            
+        network_job = self._GenerateNetworkJob( method, command, request_args, temp_path = temp_path, file_body_path = file_body_path )
+        
+        CG.client_controller.network_engine.AddJob( network_job )
+        
+        return self._WaitForResponse( network_job, command )
         
     
     def SetAccountRefreshDueNow( self ):
@@ -1773,6 +1789,38 @@ class ServiceRepository( ServiceRestricted ):
         return dictionary
         
     
+    def _IterateUpdatesWithDecodeAhead( self, executor: concurrent.futures.ThreadPoolExecutor, update_hashes_and_content_types, mime ):
+        
+        # the next few update files are read and parsed on worker threads while the db is busy with the current one
+        
+        update_hashes_content_types_and_futures = collections.deque()
+        
+        try:
+            
+            for ( update_hash, content_types ) in update_hashes_and_content_types:
+                
+                update_hashes_content_types_and_futures.append( ( update_hash, content_types, executor.submit( self._LoadUpdate, update_hash, mime ) ) )
+                
+                if len( update_hashes_content_types_and_futures ) > NUM_UPDATES_TO_DECODE_AHEAD:
+                    
+                    yield update_hashes_content_types_and_futures.popleft()
+                    
+                
+            
+            while len( update_hashes_content_types_and_futures ) > 0:
+                
+                yield update_hashes_content_types_and_futures.popleft()
+                
+            
+        finally:
+            
+            for ( update_hash, content_types, future ) in update_hashes_content_types_and_futures:
+                
+                future.cancel()
+                
+            
+        
+    
     def _LoadFromDictionary( self, dictionary ):
         
         ServiceRestricted._LoadFromDictionary( self, dictionary )
@@ -1819,6 +1867,25 @@ class ServiceRepository( ServiceRestricted ):
         self._update_processing_content_types_paused = dict( dictionary[ 'update_processing_content_types_paused' ] )
         
     
+    def _LoadUpdate( self, update_hash, mime ):
+        
+        update_path = CG.client_controller.client_files_manager.GetFilePath( update_hash, mime )
+        
+        with open( update_path, 'rb' ) as f:
+            
+            update_network_bytes = f.read()
+            
+        
+        try:
+            
+            return HydrusSerialisable.CreateFromNetworkBytes( update_network_bytes )
+            
+        except Exception as e:
+            
+            raise HydrusExceptions.SerialisationException( str( e ) )
+            
+        
+    
     def _LogFinalRowSpeed( self, precise_timestamp, total_rows, row_name ):
         
         if total_rows == 0:
@@ -1945,6 +2012,13 @@ class ServiceRepository( ServiceRestricted ):
             
             job_status = ClientThreading.JobStatus( cancellable = True, stop_time = stop_time )
             
+            # a fresh sync is mostly round-trip latency, so we keep a few downloads in flight while we verify and import the oldest
+            # the network engine still applies the service's bandwidth rules and the per-domain job limit to each one
+            max_num_in_flight = max( 1, CG.client_controller.new_options.GetInteger( 'max_network_jobs_per_domain' ) )
+            
+            update_hashes_to_start = collections.deque( update_hashes )
+            update_hashes_and_network_jobs_in_flight = collections.deque()
+            
             try:
                 
                 job_status.SetStatusTitle( name + ' sync: downloading updates' )
@@ -1979,9 +2053,22 @@ class ServiceRepository( ServiceRestricted ):
                         return
                         
                     
+                    while len( update_hashes_to_start ) > 0 and len( update_hashes_and_network_jobs_in_flight ) < max_num_in_flight:
+                        
+                        update_hash_to_start = update_hashes_to_start.popleft()
+                        
+                        network_job = self._GenerateNetworkJob( HC.GET, 'update', { 'update_hash' : update_hash_to_start } )
+                        
+                        CG.client_controller.network_engine.AddJob( network_job )
+                        
+                        update_hashes_and_network_jobs_in_flight.append( ( update_hash_to_start, network_job ) )
+                        
+                    
+                    ( update_hash, network_job ) = update_hashes_and_network_jobs_in_flight.popleft()
+                    
                     try:
                         
-                        update_network_string = self.Request( HC.GET, 'update', { 'update_hash' : update_hash } )
+                        update_network_string = self._WaitForResponse( network_job, 'update' )
                         
                     except HydrusExceptions.CancelledException as e:
                         
@@ -2087,6 +2174,12 @@ class ServiceRepository( ServiceRestricted ):
                 
             finally:
                 
+                # if we bailed out early, don't leave downloads running that nothing will import
+                for ( update_hash, network_job ) in update_hashes_and_network_jobs_in_flight:
+                    
+                    network_job.Cancel()
+                    
+                
                 job_status.FinishAndDismiss( 5 )
                 
             
@@ -2109,6 +2202,8 @@ class ServiceRepository( ServiceRestricted ):
         
         work_done = False
         
+        executor = concurrent.futures.ThreadPoolExecutor( max_workers = NUM_UPDATES_TO_DECODE_AHEAD, thread_name_prefix = 'repository update decoder' )
+        
         try:
             
             job_status = ClientThreading.JobStatus( cancellable = True, maintenance_mode = maintenance_mode, stop_time = stop_time )
@@ -2149,7 +2244,7 @@ class ServiceRepository( ServiceRestricted ):
             
             try:
                 
-                for ( definition_hash, content_types ) in definition_hashes_and_content_types:
+                for ( definition_hash, content_types, future ) in self._IterateUpdatesWithDecodeAhead( executor, definition_hashes_and_content_types, HC.APPLICATION_HYDRUS_UPDATE_DEFINITIONS ):
                     
                     progress_string = HydrusNumbers.ValueRangeToPrettyString( num_updates_done, num_updates_to_do )
                     
@@ -2164,7 +2259,7 @@ class ServiceRepository( ServiceRestricted ):
                     
                     try:
                         
-                        update_path = CG.client_controller.client_files_manager.GetFilePath( definition_hash, HC.APPLICATION_HYDRUS_UPDATE_DEFINITIONS )
+                        definition_update = future.result()
                         
                     except HydrusExceptions.FileMissingException:
                         
@@ -2173,16 +2268,7 @@ class ServiceRepository( ServiceRestricted ):
                         raise Exception( 'An unusual error has occured during repository processing: a definition update file ({}) was missing. Your repository should be paused, and all update files have been scheduled for a presence check. I recommend you run _database->maintenance->clear/fix orphan file records_ too. Please then permit file maintenance under _database->file maintenance->manage scheduled jobs_ to finish its new work, which should fix this, before unpausing your repository.'.format( definition_hash.hex() ) )
                         
                     
-                    with open( update_path, 'rb' ) as f:
-                        
-                        update_network_bytes = f.read()
-                        
-                    
-                    try:
-                        
-                        definition_update = HydrusSerialisable.CreateFromNetworkBytes( update_network_bytes )
-                        
-                    except Exception as e:
+                    except HydrusExceptions.SerialisationException:
                         
                         CG.client_controller.WriteSynchronous( 'schedule_repository_update_file_maintenance', self._service_key, ClientFilesMaintenance.REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA_REMOVE_RECORD )
                         
@@ -2278,7 +2364,7 @@ class ServiceRepository( ServiceRestricted ):
             
             try:
                 
-                for ( content_hash, content_types ) in content_hashes_and_content_types:
+                for ( content_hash, content_types, future ) in self._IterateUpdatesWithDecodeAhead( executor, content_hashes_and_content_types, HC.APPLICATION_HYDRUS_UPDATE_CONTENT ):
                     
                     progress_string = HydrusNumbers.ValueRangeToPrettyString( num_updates_done, num_updates_to_do )
                     
@@ -2293,7 +2379,7 @@ class ServiceRepository( ServiceRestricted ):
                     
                     try:
                         
-                        update_path = CG.client_controller.client_files_manager.GetFilePath( content_hash, HC.APPLICATION_HYDRUS_UPDATE_CONTENT )
+                        content_update = future.result()
                         
                     except HydrusExceptions.FileMissingException:
                         
@@ -2302,16 +2388,7 @@ class ServiceRepository( ServiceRestricted ):
                         raise Exception( 'An unusual error has occured during repository processing: a content update file ({}) was missing. Your repository should be paused, and all update files have been scheduled for a presence check. I recommend you run _database->maintenance->clear/fix orphan file records_ too. Please then permit file maintenance under _database->file maintenance->manage scheduled jobs_ to finish its new work, which should fix this, before unpausing your repository.'.format( content_hash.hex() ) )
                         
                     
-                    with open( update_path, 'rb' ) as f:
-                        
-                        update_network_bytes = f.read()
-                        
-                    
-                    try:
-                        
-                        content_update = HydrusSerialisable.CreateFromNetworkBytes( update_network_bytes )
-                        
-                    except Exception as e:
+                    except HydrusExceptions.SerialisationException:
                         
                         CG.client_controller.WriteSynchronous( 'schedule_repository_update_file_maintenance', self._service_key, ClientFilesMaintenance.REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA_REMOVE_RECORD )
                         
@@ -2445,6 +2522,8 @@ class ServiceRepository( ServiceRestricted ):
             
         finally:
             
+            executor.shutdown( wait = False, cancel_futures = True )
+            
             if work_done:
                 
                 with self._lock:
@@ -2607,6 +2686,23 @@ class ServiceRepository( ServiceRestricted ):
             
         
     
+    def GetUpdateFormat( self ) -> int:
+        
+        with self._lock:
+            
+            # older servers do not report this, and they only do json
+            
+            update_format = self._service_options.get( 'update_format', HydrusNetwork.UPDATE_FORMAT_JSON )
+            
+            if update_format not in HydrusNetwork.update_format_string_lookup:
+                
+                raise HydrusExceptions.DataMissing( 'This service has a bad update format! Try refreshing your account!' )
+                
+            
+            return update_format
+            
+        
+    
     def GetUpdateHashes( self ):
         
         with self._lock:
@@ -1,6 +1,8 @@
 import collections
 import collections.abc
+import concurrent.futures
 import json
+import os
 import threading
 import time
 import typing
@@ -9,6 +11,7 @@ from hydrus.core import HydrusConstants as HC
 from hydrus.core import HydrusExceptions
 from hydrus.core import HydrusData
 from hydrus.core import HydrusGlobals as HG
+from hydrus.core import HydrusPaths
 from hydrus.core import HydrusStaticDir
 from hydrus.core import HydrusTime
 from hydrus.core.files import HydrusFileHandling
@@ -25,6 +28,25 @@ from hydrus.client.files import ClientFilesMaintenance
 from hydrus.client.parsing import ClientParsing
 from hydrus.client.media import ClientMediaResult
 
+MAX_RENDER_CACHE_NUM_PROFILES = 16
+MAX_RENDER_CACHE_WARM_UP_QUEUE_SIZE = 256
+
+def GenerateRenderCacheFilename( hash: bytes, target_resolution, format: int, quality: int ) -> str:
+    
+    if target_resolution is None:
+        
+        resolution_string = 'full'
+        
+    else:
+        
+        ( width, height ) = target_resolution
+        
+        resolution_string = f'{width}x{height}'
+        
+    
+    return f'{hash.hex()}_{resolution_string}_{format}_{quality}'
+    
+
 class ParsingCache( object ):
     
     def __init__( self ):
@@ -356,6 +378,420 @@ class ImageTileCache( object ):
         
     
 
+class ClientAPIRenderCache( object ):
+    
+    def __init__( self, controller: "CG.ClientController.Controller", cache_dir = None ):
+        
+        self._controller = controller
+        
+        if cache_dir is None:
+            
+            cache_dir = os.path.join( self._controller.db_dir, 'client_api_render_cache' )
+            
+        
+        self._cache_dir = cache_dir
+        
+        self._size_limit = self._controller.new_options.GetInteger( 'client_api_render_cache_size' )
+        
+        # filename -> num_bytes, least recently used first
+        self._filenames_to_num_bytes = collections.OrderedDict()
+        self._total_size = 0
+        
+        self._initialised = False
+        
+        self._render_profiles_counter = collections.Counter()
+        
+        self._warm_up_queue = collections.deque( maxlen = MAX_RENDER_CACHE_WARM_UP_QUEUE_SIZE )
+        self._warm_up_working = False
+        
+        self._lock = threading.Lock()
+        
+        self._controller.sub( self, 'NotifyNewOptions', 'notify_new_options' )
+        self._controller.sub( self, 'ClearSpecificFiles', 'notify_files_need_cache_clear' )
+        
+    
+    def _DeletePaths( self, paths ):
+        
+        # disk work, so never call this holding the lock
+        
+        for path in paths:
+            
+            try:
+                
+                os.remove( path )
+                
+            except FileNotFoundError:
+                
+                pass
+                
+            
+        
+    
+    def _ForgetFilename( self, filename ):
+        
+        num_bytes = self._filenames_to_num_bytes.pop( filename, 0 )
+        
+        self._total_size -= num_bytes
+        
+        return self._GetPath( filename )
+        
+    
+    def _GetPath( self, filename ):
+        
+        return os.path.join( self._cache_dir, filename[:2], filename )
+        
+    
+    def _GetRenderBytes( self, media_result: ClientMediaResult.MediaResult, target_resolution, format: int, quality: int, abort_call = None ) -> bytes | None:
+        
+        hash = media_result.GetHash()
+        
+        if self._size_limit > 0:
+            
+            data = self.GetData( hash, target_resolution, format, quality )
+            
+            if data is not None:
+                
+                return data
+                
+            
+        
+        renderer = self._controller.images_cache.GetImageRenderer( media_result )
+        
+        while not renderer.IsReady():
+            
+            if abort_call is not None and abort_call():
+                
+                return None
+                
+            
+            time.sleep( 0.01 )
+            
+        
+        numpy_image = renderer.GetNumPyImage()
+        
+        if target_resolution is not None:
+            
+            numpy_image = HydrusImageHandling.ResizeNumPyImage( numpy_image, target_resolution )
+            
+        
+        data = HydrusImageHandling.GenerateFileBytesForRenderAPI( numpy_image, format, quality )
+        
+        if self._size_limit > 0:
+            
+            self.AddData( hash, target_resolution, format, quality, data )
+            
+        
+        return data
+        
+    
+    def _InitialiseIfNeeded( self ):
+        
+        with self._lock:
+            
+            if self._initialised:
+                
+                return
+                
+            
+        
+        # mtime is bumped on every access, so it is our persistent LRU order
+        
+        rows = []
+        
+        if os.path.exists( self._cache_dir ):
+            
+            for subdir_entry in os.scandir( self._cache_dir ):
+                
+                if not subdir_entry.is_dir():
+                    
+                    continue
+                    
+                
+                for file_entry in os.scandir( subdir_entry.path ):
+                    
+                    if file_entry.name.endswith( '.tmp' ):
+                        
+                        HydrusPaths.DeletePath( file_entry.path )
+                        
+                        continue
+                        
+                    
+                    stat_result = file_entry.stat()
+                    
+                    rows.append( ( stat_result.st_mtime, file_entry.name, stat_result.st_size ) )
+                    
+                
+            
+        
+        rows.sort()
+        
+        with self._lock:
+            
+            if self._initialised:
+                
+                # another thread beat us to it
+                return
+                
+            
+            self._initialised = True
+            
+            for ( mtime, filename, num_bytes ) in rows:
+                
+                self._filenames_to_num_bytes[ filename ] = num_bytes
+                self._total_size += num_bytes
+                
+            
+            paths_to_delete = self._MaintainSize()
+            
+        
+        self._DeletePaths( paths_to_delete )
+        
+    
+    def _MaintainSize( self ):
+        
+        paths_to_delete = []
+        
+        while self._total_size > self._size_limit and len( self._filenames_to_num_bytes ) > 0:
+            
+            ( filename, num_bytes ) = next( iter( self._filenames_to_num_bytes.items() ) )
+            
+            paths_to_delete.append( self._ForgetFilename( filename ) )
+            
+        
+        return paths_to_delete
+        
+    
+    def AddData( self, hash: bytes, target_resolution, format: int, quality: int, data: bytes ):
+        
+        filename = GenerateRenderCacheFilename( hash, target_resolution, format, quality )
+        
+        self._InitialiseIfNeeded()
+        
+        with self._lock:
+            
+            # don't let one giant render flush the whole cache
+            if len( data ) > self._size_limit / 4:
+                
+                return
+                
+            
+        
+        path = self._GetPath( filename )
+        
+        HydrusPaths.MakeSureDirectoryExists( os.path.dirname( path ) )
+        
+        # two threads may be rendering the same thing, so they each get their own temp file
+        temp_path = '{}.{}.tmp'.format( path, os.urandom( 4 ).hex() )
+        
+        with open( temp_path, 'wb' ) as f:
+            
+            f.write( data )
+            
+        
+        os.replace( temp_path, path )
+        
+        with self._lock:
+            
+            if filename in self._filenames_to_num_bytes:
+                
+                self._total_size -= self._filenames_to_num_bytes[ filename ]
+                
+            
+            self._filenames_to_num_bytes[ filename ] = len( data )
+            self._filenames_to_num_bytes.move_to_end( filename )
+            self._total_size += len( data )
+            
+            paths_to_delete = self._MaintainSize()
+            
+        
+        self._DeletePaths( paths_to_delete )
+        
+    
+    def Clear( self ):
+        
+        self._InitialiseIfNeeded()
+        
+        with self._lock:
+            
+            paths_to_delete = [ self._ForgetFilename( filename ) for filename in list( self._filenames_to_num_bytes.keys() ) ]
+            
+        
+        self._DeletePaths( paths_to_delete )
+        
+    
+    def ClearSpecificFiles( self, hashes ):
+        
+        self._InitialiseIfNeeded()
+        
+        prefixes = tuple( hash.hex() for hash in hashes )
+        
+        with self._lock:
+            
+            paths_to_delete = [ self._ForgetFilename( filename ) for filename in [ filename for filename in self._filenames_to_num_bytes.keys() if filename.startswith( prefixes ) ] ]
+            
+        
+        self._DeletePaths( paths_to_delete )
+        
+    
+    def GetData( self, hash: bytes, target_resolution, format: int, quality: int ) -> bytes | None:
+        
+        filename = GenerateRenderCacheFilename( hash, target_resolution, format, quality )
+        
+        self._InitialiseIfNeeded()
+        
+        with self._lock:
+            
+            if filename not in self._filenames_to_num_bytes:
+                
+                return None
+                
+            
+            self._filenames_to_num_bytes.move_to_end( filename )
+            
+        
+        path = self._GetPath( filename )
+        
+        try:
+            
+            with open( path, 'rb' ) as f:
+                
+                data = f.read()
+                
+            
+            os.utime( path )
+            
+        except OSError:
+            
+            # someone cleaned the dir, or evicted this, under us
+            
+            with self._lock:
+                
+                self._ForgetFilename( filename )
+                
+            
+            return None
+            
+        
+        return data
+        
+    
+    def GetRenderBytes( self, media_result: ClientMediaResult.MediaResult, target_resolution, format: int, quality: int, abort_call = None ) -> bytes | None:
+        
+        # this is the api request entry point, so it is what counts towards the warm-up profile
+        
+        with self._lock:
+            
+            render_profile = ( target_resolution, format, quality )
+            
+            self._render_profiles_counter[ render_profile ] += 1
+            
+            if len( self._render_profiles_counter ) > 2 * MAX_RENDER_CACHE_NUM_PROFILES:
+                
+                self._render_profiles_counter = collections.Counter( dict( self._render_profiles_counter.most_common( MAX_RENDER_CACHE_NUM_PROFILES ) ) )
+                
+            
+        
+        return self._GetRenderBytes( media_result, target_resolution, format, quality, abort_call = abort_call )
+        
+    
+    def HasData( self, hash: bytes, target_resolution, format: int, quality: int ) -> bool:
+        
+        filename = GenerateRenderCacheFilename( hash, target_resolution, format, quality )
+        
+        self._InitialiseIfNeeded()
+        
+        with self._lock:
+            
+            return filename in self._filenames_to_num_bytes
+            
+        
+    
+    def NotifyFileAccessed( self, media_result: ClientMediaResult.MediaResult ):
+        
+        # an api client looking at a thumb is likely to ask for a render next, so we prep the one it usually wants
+        
+        if self._size_limit == 0 or not self._controller.new_options.GetBoolean( 'client_api_render_cache_warm_up' ):
+            
+            return
+            
+        
+        if not media_result.IsStaticImage():
+            
+            return
+            
+        
+        with self._lock:
+            
+            if len( self._render_profiles_counter ) == 0:
+                
+                return
+                
+            
+            [ ( render_profile, count ) ] = self._render_profiles_counter.most_common( 1 )
+            
+            self._warm_up_queue.append( ( media_result, render_profile ) )
+            
+            if not self._warm_up_working:
+                
+                self._warm_up_working = True
+                
+                self._controller.CallToThread( self.THREADWarmUp )
+                
+            
+        
+    
+    def NotifyNewOptions( self ):
+        
+        paths_to_delete = []
+        
+        with self._lock:
+            
+            self._size_limit = self._controller.new_options.GetInteger( 'client_api_render_cache_size' )
+            
+            if self._initialised:
+                
+                paths_to_delete = self._MaintainSize()
+                
+            
+        
+        self._DeletePaths( paths_to_delete )
+        
+    
+    def THREADWarmUp( self ):
+        
+        while True:
+            
+            with self._lock:
+                
+                if len( self._warm_up_queue ) == 0 or HydrusThreading.IsThreadShuttingDown():
+                    
+                    self._warm_up_working = False
+                    
+                    return
+                    
+                
+                ( media_result, ( target_resolution, format, quality ) ) = self._warm_up_queue.popleft()
+                
+            
+            if self.HasData( media_result.GetHash(), target_resolution, format, quality ):
+                
+                continue
+                
+            
+            try:
+                
+                # not GetRenderBytes, which would count this towards the profile it came from
+                self._GetRenderBytes( media_result, target_resolution, format, quality, abort_call = HydrusThreading.IsThreadShuttingDown )
+                
+            except Exception as e:
+                
+                HydrusData.Print( f'Problem warming up the Client API render cache for {media_result.GetHash().hex()}:' )
+                HydrusData.PrintException( e, do_wait = False )
+                
+            
+        
+    
+
 class ThumbnailCache( object ):
     
     def __init__( self, controller: "CG.ClientController.Controller" ):
@@ -378,6 +814,12 @@ class ThumbnailCache( object ):
         self._waterfall_queue_quick = set()
         self._waterfall_queue = []
         
+        # popped off the queue and handed to a decode worker, but not yet delivered
+        self._waterfall_in_flight = set()
+        
+        self._decode_executor = None
+        self._decode_executor_num_workers = 1
+        
         self._shutdown = False
         self._loop_finished = False
         
@@ -401,6 +843,83 @@ class ThumbnailCache( object ):
         self._controller.sub( self, 'NotifyNewOptions', 'notify_new_options' )
         
     
+    def _DoParallelWaterfall( self, executor: concurrent.futures.ThreadPoolExecutor, num_workers: int ):
+        
+        # a sliding window of decode jobs, topped up from the end of the queue so the _RecalcQueues order still holds
+        # finished thumbs are delivered in a batch about once a frame
+        
+        items_to_futures = {}
+        
+        page_keys_to_rendered_medias = collections.defaultdict( list )
+        
+        stop_time = HydrusTime.GetNowPrecise() + 0.005
+        
+        while not ( HydrusThreading.IsThreadShuttingDown() or self._shutdown ):
+            
+            with self._lock:
+                
+                while len( items_to_futures ) < num_workers * 2 and len( self._waterfall_queue ) > 0:
+                    
+                    item = self._waterfall_queue.pop()
+                    
+                    self._waterfall_queue_quick.discard( item )
+                    
+                    self._waterfall_in_flight.add( item )
+                    
+                    items_to_futures[ item ] = executor.submit( self._RenderWaterfallItem, item )
+                    
+                
+            
+            if len( items_to_futures ) == 0:
+                
+                break
+                
+            
+            timeout = max( stop_time - HydrusTime.GetNowPrecise(), 0.0 )
+            
+            ( done_futures, not_done_futures ) = concurrent.futures.wait( list( items_to_futures.values() ), timeout = timeout, return_when = concurrent.futures.FIRST_COMPLETED )
+            
+            with self._lock:
+                
+                for ( item, future ) in list( items_to_futures.items() ):
+                    
+                    if future in done_futures:
+                        
+                        del items_to_futures[ item ]
+                        
+                        rendered = future.result()
+                        
+                        # if it was cancelled while the worker had it, we drop it here
+                        if rendered and item in self._waterfall_in_flight:
+                            
+                            ( page_key, media ) = item
+                            
+                            page_keys_to_rendered_medias[ page_key ].append( media )
+                            
+                        
+                        self._waterfall_in_flight.discard( item )
+                        
+                    
+                
+                if len( self._waterfall_queue ) == 0 and len( self._waterfall_in_flight ) == 0:
+                    
+                    self._waterfall_queue_empty_event.set()
+                    
+                
+            
+            if HydrusTime.TimeHasPassedPrecise( stop_time ):
+                
+                self._PubRenderedMedias( page_keys_to_rendered_medias )
+                
+                page_keys_to_rendered_medias = collections.defaultdict( list )
+                
+                stop_time = HydrusTime.GetNowPrecise() + 0.005
+                
+            
+        
+        self._PubRenderedMedias( page_keys_to_rendered_medias )
+        
+    
     def _GetBestRecoveryThumbnailHydrusBitmap( self, media_result: ClientMediaResult.MediaResult ):
         
         if self._allow_blurhash_fallback:
@@ -448,7 +967,7 @@ class ThumbnailCache( object ):
         
         try:
             
-            thumbnail_path = self._controller.client_files_manager.GetThumbnailPath( media_result )
+            thumbnail_bytes = self._controller.client_files_manager.GetThumbnailBytes( media_result )
             
         except HydrusExceptions.FileMissingException as e:
             
@@ -466,9 +985,9 @@ class ThumbnailCache( object ):
         
         try:
             
-            thumbnail_mime = HydrusFileHandling.GetThumbnailMime( thumbnail_path )
+            thumbnail_mime = HydrusFileHandling.GetThumbnailMimeFromBytes( thumbnail_bytes )
             
-            numpy_image = HydrusImageHandling.GenerateNumPyImage( thumbnail_path, thumbnail_mime )
+            numpy_image = HydrusImageHandling.GenerateNumPyImageFromBytes( thumbnail_bytes, thumbnail_mime )
             
         except Exception as e:
             
@@ -488,7 +1007,11 @@ class ThumbnailCache( object ):
             
             try:
                 
-                numpy_image = HydrusImageHandling.GenerateNumPyImage( thumbnail_path, thumbnail_mime )
+                thumbnail_bytes = self._controller.client_files_manager.GetThumbnailBytes( media_result )
+                
+                thumbnail_mime = HydrusFileHandling.GetThumbnailMimeFromBytes( thumbnail_bytes )
+                
+                numpy_image = HydrusImageHandling.GenerateNumPyImageFromBytes( thumbnail_bytes, thumbnail_mime )
                 
             except Exception as e:
                 
@@ -555,6 +1078,30 @@ class ThumbnailCache( object ):
         return hydrus_bitmap
         
     
+    def _GetDecodeExecutor( self ):
+        
+        num_workers = self._controller.new_options.GetInteger( 'thumbnail_decode_num_workers' )
+        
+        if num_workers != self._decode_executor_num_workers:
+            
+            if self._decode_executor is not None:
+                
+                self._decode_executor.shutdown( wait = False )
+                
+                self._decode_executor = None
+                
+            
+            self._decode_executor_num_workers = num_workers
+            
+            if num_workers > 1:
+                
+                self._decode_executor = concurrent.futures.ThreadPoolExecutor( max_workers = num_workers, thread_name_prefix = 'thumbnail decode worker' )
+                
+            
+        
+        return self._decode_executor
+        
+    
     def _HandleThumbnailException( self, hash, e, summary ):
         
         if self._thumbnail_error_occurred:
@@ -652,7 +1199,7 @@ class ThumbnailCache( object ):
         # we pop off the end, so reverse
         self._waterfall_queue.sort( key = sort_waterfall, reverse = True )
         
-        if len( self._waterfall_queue ) == 0:
+        if len( self._waterfall_queue ) == 0 and len( self._waterfall_in_flight ) == 0:
             
             self._waterfall_queue_empty_event.set()
             
@@ -679,6 +1226,39 @@ class ThumbnailCache( object ):
         self._delayed_regeneration_queue.sort( key = sort_regen, reverse = True )
         
     
+    def _PubRenderedMedias( self, page_keys_to_rendered_medias ):
+        
+        for ( page_key, rendered_medias ) in page_keys_to_rendered_medias.items():
+            
+            self._controller.pub( 'waterfall_thumbnails', page_key, rendered_medias )
+            
+        
+    
+    def _RenderWaterfallItem( self, item ) -> bool:
+        
+        with self._lock:
+            
+            if item not in self._waterfall_in_flight:
+                
+                # cancelled before we got to it
+                return False
+                
+            
+        
+        ( page_key, media ) = item
+        
+        display_media_result = media.GetDisplayMediaResult()
+        
+        if display_media_result is None:
+            
+            return False
+            
+        
+        self.GetThumbnail( display_media_result )
+        
+        return True
+        
+    
     def _ShouldBeAbleToProvideThumb( self, media_result: ClientMediaResult.MediaResult ):
         
         locations_manager = media_result.GetLocationsManager()
@@ -699,7 +1279,10 @@ class ThumbnailCache( object ):
                 return
                 
             
-            self._waterfall_queue_quick.difference_update( ( ( page_key, media ) for media in medias ) )
+            cancelled_items = { ( page_key, media ) for media in medias }
+            
+            self._waterfall_queue_quick.difference_update( cancelled_items )
+            self._waterfall_in_flight.difference_update( cancelled_items )
             
             cancelled_media_results = { media.GetDisplayMediaResult() for media in medias }
             
@@ -774,6 +1357,7 @@ class ThumbnailCache( object ):
             self._controller.pub( 'notify_complete_thumbnail_reset' )
             
             self._waterfall_queue_quick = set()
+            self._waterfall_in_flight = set()
             self._delayed_regeneration_queue_quick = set()
             
             self._RecalcQueues()
@@ -953,6 +1537,13 @@ class ThumbnailCache( object ):
                 self._waterfall_event.clear()
                 
             
+            executor = self._GetDecodeExecutor()
+            
+            if executor is not None:
+                
+                self._DoParallelWaterfall( executor, self._decode_executor_num_workers )
+                
+            
             start_time = HydrusTime.GetNowPrecise()
             stop_time = start_time + 0.005 # a bit of a typical frame
             
@@ -996,10 +1587,7 @@ class ThumbnailCache( object ):
             
             if len( page_keys_to_rendered_medias ) > 0:
                 
-                for ( page_key, rendered_medias ) in page_keys_to_rendered_medias.items():
-                    
-                    self._controller.pub( 'waterfall_thumbnails', page_key, rendered_medias )
-                    
+                self._PubRenderedMedias( page_keys_to_rendered_medias )
                 
                 time.sleep( 0.00001 )
                 
@@ -1044,6 +1632,13 @@ class ThumbnailCache( object ):
                 
             
         
+        if self._decode_executor is not None:
+            
+            self._decode_executor.shutdown( wait = False, cancel_futures = True )
+            
+            self._decode_executor = None
+            
+        
         self._loop_finished = True
         
         self.Clear()
@@ -1224,7 +1819,7 @@ class ThumbnailCacheGraphicsViewTest( object ):
         
         try:
             
-            thumbnail_path = self._controller.client_files_manager.GetThumbnailPath( media_result )
+            thumbnail_bytes = self._controller.client_files_manager.GetThumbnailBytes( media_result )
             
         except HydrusExceptions.FileMissingException as e:
             
@@ -1242,9 +1837,9 @@ class ThumbnailCacheGraphicsViewTest( object ):
         
         try:
             
-            thumbnail_mime = HydrusFileHandling.GetThumbnailMime( thumbnail_path )
+            thumbnail_mime = HydrusFileHandling.GetThumbnailMimeFromBytes( thumbnail_bytes )
             
-            numpy_image = HydrusImageHandling.GenerateNumPyImage( thumbnail_path, thumbnail_mime )
+            numpy_image = HydrusImageHandling.GenerateNumPyImageFromBytes( thumbnail_bytes, thumbnail_mime )
             
         except Exception as e:
             
@@ -1264,7 +1859,11 @@ class ThumbnailCacheGraphicsViewTest( object ):
             
             try:
                 
-                numpy_image = HydrusImageHandling.GenerateNumPyImage( thumbnail_path, thumbnail_mime )
+                thumbnail_bytes = self._controller.client_files_manager.GetThumbnailBytes( media_result )
+                
+                thumbnail_mime = HydrusFileHandling.GetThumbnailMimeFromBytes( thumbnail_bytes )
+                
+                numpy_image = HydrusImageHandling.GenerateNumPyImageFromBytes( thumbnail_bytes, thumbnail_mime )
                 
             except Exception as e:
                 
@@ -3,6 +3,7 @@ import collections.abc
 import threading
 import time
 import typing
+import weakref
 
 from hydrus.core import HydrusData
 from hydrus.core import HydrusGlobals as HG
@@ -28,7 +29,8 @@ class DataCacheEntry( object ):
         
         self.data = data
         self.size_estimate = data.GetEstimatedMemoryFootprint()
-        self.last_access_time = time.monotonic()
+        self.added_time = time.monotonic()
+        self.last_access_time = self.added_time
         
     
     def touch( self ):
@@ -37,6 +39,12 @@ class DataCacheEntry( object ):
         
     
 
+# segmented lru. new items go into a probationary segment, and only an access in a later tick promotes them to the protected segment
+# eviction takes from probation first, so a run of one-off items (a big render, a fast scroll past a thousand thumbs) only churns probation and can't flush the hot stuff
+# a paint or a prefetch will often ask for the same thing several times in a row, so repeat hits inside the same tick don't count
+PROTECTED_SEGMENT_PERCENTAGE = 80
+PROMOTION_TICK_DURATION = 0.5
+
 class DataCache( object ):
     
     def __init__( self, controller: "CG.ClientController.Controller", name, cache_size, timeout = 1200 ):
@@ -46,26 +54,40 @@ class DataCache( object ):
         self._cache_size = cache_size
         self._timeout = timeout
         
-        self._keys_to_data: collections.OrderedDict[ typing.Any, DataCacheEntry ] = collections.OrderedDict()
+        self._probationary_keys_to_data: collections.OrderedDict[ typing.Any, DataCacheEntry ] = collections.OrderedDict()
+        self._protected_keys_to_data: collections.OrderedDict[ typing.Any, DataCacheEntry ] = collections.OrderedDict()
         
         self._total_estimated_memory_footprint = 0
+        self._protected_estimated_memory_footprint = 0
+        
+        self._num_hits = 0
+        self._num_misses = 0
+        self._num_evictions = 0
         
         self._lock = threading.Lock()
         
         self._controller.sub( self, 'MaintainCache', 'memory_maintenance_pulse' )
         
+        data_caches.add( self )
+        
     
     def _Delete( self, key ):
         
-        if key not in self._keys_to_data:
+        if key in self._probationary_keys_to_data:
+            
+            entry = self._probationary_keys_to_data.pop( key )
+            
+        elif key in self._protected_keys_to_data:
+            
+            entry = self._protected_keys_to_data.pop( key )
+            
+            self._protected_estimated_memory_footprint -= entry.size_estimate
+            
+        else:
             
             return
             
         
-        entry = self._keys_to_data[ key ]
-        
-        del self._keys_to_data[ key ]
-        
         self._total_estimated_memory_footprint -= entry.size_estimate
         
         if HG.cache_report_mode:
@@ -87,7 +109,7 @@ class DataCache( object ):
         
         expected_free_space = self._cache_size - self._total_estimated_memory_footprint
         
-        for ( key, entry ) in self._keys_to_data.items():
+        for ( key, entry ) in self._IterateEntriesInEvictionOrder():
             
             if not entry.data.IsFinishedLoading():
                 
@@ -110,6 +132,8 @@ class DataCache( object ):
                 
                 self._Delete( key )
                 
+                self._num_evictions += 1
+                
             
             return True
             
@@ -122,10 +146,21 @@ class DataCache( object ):
     
     def _DeleteOldestItem( self ):
         
-        ( key, entry ) = self._keys_to_data.popitem( last = False )
+        if len( self._probationary_keys_to_data ) > 0:
+            
+            ( key, entry ) = self._probationary_keys_to_data.popitem( last = False )
+            
+        else:
+            
+            ( key, entry ) = self._protected_keys_to_data.popitem( last = False )
+            
+            self._protected_estimated_memory_footprint -= entry.size_estimate
+            
         
         self._total_estimated_memory_footprint -= entry.size_estimate
         
+        self._num_evictions += 1
+        
         if HG.cache_report_mode:
             
             HydrusData.ShowText( 'Cache "{}" removing oldest item "{}", size "{}". Current size {}.'.format( self._name, key, HydrusData.ToHumanBytes( entry.size_estimate ), HydrusData.ConvertValueRangeToBytes( self._total_estimated_memory_footprint, self._cache_size ) ) )
@@ -134,14 +169,14 @@ class DataCache( object ):
     
     def _GetData( self, key ) -> CacheableObject:
         
-        if key not in self._keys_to_data:
+        entry = self._GetEntry( key )
+        
+        if entry is None:
             
             raise Exception( f'Cache error! Looking for "{key}", but it was missing.' )
             
         
         self._TouchKey( key )
-
-        entry = self._keys_to_data[ key ]
         
         data = entry.data
         size_estimate = entry.size_estimate
@@ -152,25 +187,115 @@ class DataCache( object ):
             
             self._total_estimated_memory_footprint += new_estimate - size_estimate
             
+            if key in self._protected_keys_to_data:
+                
+                self._protected_estimated_memory_footprint += new_estimate - size_estimate
+                
+            
             entry.size_estimate = new_estimate
             
         
         return data
         
     
+    def _GetEntry( self, key ) -> DataCacheEntry | None:
+        
+        if key in self._probationary_keys_to_data:
+            
+            return self._probationary_keys_to_data[ key ]
+            
+        elif key in self._protected_keys_to_data:
+            
+            return self._protected_keys_to_data[ key ]
+            
+        else:
+            
+            return None
+            
+        
+    
+    def _HasItems( self ):
+        
+        return len( self._probationary_keys_to_data ) > 0 or len( self._protected_keys_to_data ) > 0
+        
+    
+    def _HasKey( self, key ):
+        
+        return key in self._probationary_keys_to_data or key in self._protected_keys_to_data
+        
+    
+    def _IterateEntriesInEvictionOrder( self ):
+        
+        # we copy since callers may delete as they go
+        
+        yield from list( self._probationary_keys_to_data.items() )
+        yield from list( self._protected_keys_to_data.items() )
+        
+    
     def _TouchKey( self, key ):
         
-        self._keys_to_data[ key ].touch()
-        self._keys_to_data.move_to_end( key )
+        if key in self._probationary_keys_to_data:
+            
+            entry = self._probationary_keys_to_data[ key ]
+            
+            entry.touch()
+            
+            if entry.last_access_time - entry.added_time < PROMOTION_TICK_DURATION:
+                
+                # same tick as when he came in, so this is probably the same paint asking again. not a real second access
+                self._probationary_keys_to_data.move_to_end( key )
+                
+                return
+                
+            
+            protected_size_limit = self._cache_size * ( PROTECTED_SEGMENT_PERCENTAGE / 100 )
+            
+            if entry.size_estimate > protected_size_limit / 2:
+                
+                # a second access, but this guy is so big he would push out half the hot set. he can stay in probation
+                self._probationary_keys_to_data.move_to_end( key )
+                
+                return
+                
+            
+            # second access in a later tick, so it has earned its place
+            
+            del self._probationary_keys_to_data[ key ]
+            
+            self._protected_keys_to_data[ key ] = entry
+            
+            self._protected_estimated_memory_footprint += entry.size_estimate
+            
+            while self._protected_estimated_memory_footprint > protected_size_limit and len( self._protected_keys_to_data ) > 1:
+                
+                # protected is full, so its least recent guy gets one more chance back in probation
+                
+                ( demotee_key, demotee_entry ) = self._protected_keys_to_data.popitem( last = False )
+                
+                self._protected_estimated_memory_footprint -= demotee_entry.size_estimate
+                
+                # he goes to the fresh end of probation, so re-stamp him or the timeout sweep will stop early on his old time
+                demotee_entry.touch()
+                
+                self._probationary_keys_to_data[ demotee_key ] = demotee_entry
+                
+            
+        elif key in self._protected_keys_to_data:
+            
+            self._protected_keys_to_data[ key ].touch()
+            self._protected_keys_to_data.move_to_end( key )
+            
         
     
     def Clear( self ):
         
         with self._lock:
             
-            self._keys_to_data.clear()
+            self._probationary_keys_to_data.clear()
+            self._protected_keys_to_data.clear()
             
             self._total_estimated_memory_footprint = 0
+            self._protected_estimated_memory_footprint = 0
             
         
     
@@ -178,7 +303,7 @@ class DataCache( object ):
         
         with self._lock:
             
-            if key not in self._keys_to_data:
+            if not self._HasKey( key ):
                 
                 while self._total_estimated_memory_footprint > self._cache_size:
                     
@@ -189,7 +314,7 @@ class DataCache( object ):
                 
                 entry = DataCacheEntry( data )
                 
-                self._keys_to_data[ key ] = entry
+                self._probationary_keys_to_data[ key ] = entry
                 
                 self._total_estimated_memory_footprint += entry.size_estimate
                 
@@ -220,7 +345,7 @@ class DataCache( object ):
         
         with self._lock:
             
-            return list( self._keys_to_data.keys() )
+            return list( self._probationary_keys_to_data.keys() ) + list( self._protected_keys_to_data.keys() )
             
         
     
@@ -228,7 +353,11 @@ class DataCache( object ):
         
         with self._lock:
             
-            return self._GetData( key )
+            data = self._GetData( key )
+            
+            self._num_hits += 1
+            
+            return data
             
         
     
@@ -236,17 +365,26 @@ class DataCache( object ):
         
         with self._lock:
             
-            if key in self._keys_to_data:
+            if self._HasKey( key ):
+                
+                self._num_hits += 1
                 
                 return self._GetData( key )
                 
             else:
                 
+                self._num_misses += 1
+                
                 return None
                 
             
         
     
+    def GetName( self ) -> str:
+        
+        return self._name
+        
+    
     def GetSizeLimit( self ) -> int:
         
         with self._lock:
@@ -255,11 +393,27 @@ class DataCache( object ):
             
         
     
+    def GetStatistics( self ) -> dict:
+        
+        with self._lock:
+            
+            return {
+                'num_items' : len( self._probationary_keys_to_data ) + len( self._protected_keys_to_data ),
+                'num_protected_items' : len( self._protected_keys_to_data ),
+                'estimated_memory_footprint' : self._total_estimated_memory_footprint,
+                'size_limit' : self._cache_size,
+                'num_hits' : self._num_hits,
+                'num_misses' : self._num_misses,
+                'num_evictions' : self._num_evictions
+            }
+            
+        
+    
     def HasData( self, key ) -> bool:
         
         with self._lock:
             
-            return key in self._keys_to_data
+            return self._HasKey( key )
             
         
     
@@ -267,22 +421,23 @@ class DataCache( object ):
         
         with self._lock:
             
-            while self._total_estimated_memory_footprint > self._cache_size and len( self._keys_to_data ) > 0: # little sanity check haha
+            while self._total_estimated_memory_footprint > self._cache_size and self._HasItems(): # little sanity check haha
                 
                 self._DeleteOldestItem()
                 
             
-            if len( self._keys_to_data ) > 0:
-                
-                older_than_this_has_timed_out = time.monotonic() - self._timeout
+            older_than_this_has_timed_out = time.monotonic() - self._timeout
+            
+            # each segment is in rough access order, so we can stop at the first fresh guy
+            for keys_to_data in ( self._probationary_keys_to_data, self._protected_keys_to_data ):
                 
-                num_to_remove = 0
+                timed_out_keys = []
                 
-                for entry in self._keys_to_data.values():
+                for ( key, entry ) in keys_to_data.items():
                     
                     if entry.last_access_time < older_than_this_has_timed_out:
                         
-                        num_to_remove += 1
+                        timed_out_keys.append( key )
                         
                     else:
                         
@@ -290,12 +445,11 @@ class DataCache( object ):
                         
                     
                 
-                if num_to_remove > 0:
+                for key in timed_out_keys:
                     
-                    for i in range( num_to_remove ):
-                        
-                        self._DeleteOldestItem()
-                        
+                    self._Delete( key )
+                    
+                    self._num_evictions += 1
                     
                 
             
@@ -316,7 +470,7 @@ class DataCache( object ):
         
         with self._lock:
             
-            if key not in self._keys_to_data:
+            if not self._HasKey( key ):
                 
                 return
                 
@@ -339,3 +493,10 @@ class DataCache( object ):
             
         
     
+
+data_caches: "weakref.WeakSet[ DataCache ]" = weakref.WeakSet()
+
+def GetDataCacheStatistics() -> list[ tuple[ str, dict ] ]:
+    
+    return sorted( ( ( data_cache.GetName(), data_cache.GetStatistics() ) for data_cache in list( data_caches ) ), key = lambda n_s: n_s[0] )
+    
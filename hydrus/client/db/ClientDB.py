@@ -222,6 +222,12 @@ class DB( HydrusDB.HydrusDB ):
     
     READ_WRITE_ACTIONS = [ 'service_info', 'system_predicates', 'missing_thumbnail_hashes' ]
     
+    # reads that never write, are happy with the last committed snapshot, and only touch the hash and tag id caches, which a pool connection gets its own copy of, and the locked service lookups and media result cache
+    # any other module state is blocked on the pool copies, so adding an action here that needs more will fail loudly in test_read_pool_copies
+    # file searches (file_query_ids), autocomplete and related tags stay on the main connection. GetTagId creates missing tag definitions, and they fill the shared sibling and parent lookups
+    # media results stay on the main connection too. they go into the media result cache, and a result read from an older snapshot would sit there missing a content update the main connection already applied
+    READ_POOL_ACTIONS = [ 'file_hashes', 'file_info_managers_from_ids', 'file_metadata_columns', 'filter_hashes', 'hash_status', 'url_statuses' ]
+    
     def __init__( self, controller: "CG.ClientController.Controller", db_dir, db_name ):
         
         self._initial_messages = []
@@ -931,6 +937,9 @@ class DB( HydrusDB.HydrusDB ):
         self._regen_tags_managers_hash_ids.clear()
         self._regen_tags_managers_tag_ids.clear()
         
+        # no-op if the job saved
+        self.modules_similar_files.DiscardUncommittedPerceptualHashIndexChanges()
+        
         HydrusDB.HydrusDB._CleanAfterJobWork( self )
         
     
@@ -1525,6 +1534,8 @@ class DB( HydrusDB.HydrusDB ):
     
     def _DoAfterJobWork( self ):
         
+        self.modules_similar_files.CommitPerceptualHashIndexChanges()
+        
         for content_update_package in self._after_job_content_update_packages:
             
             self.modules_media_results.ProcessContentUpdatePackage( content_update_package )
@@ -3889,6 +3900,7 @@ class DB( HydrusDB.HydrusDB ):
                 'file_info_managers_from_ids' : self.modules_media_results.GetFileInfoManagers,
                 'file_maintenance_get_job_counts' : self.modules_files_maintenance_queue.GetJobCounts,
                 'file_maintenance_get_jobs' : self.modules_files_maintenance_queue.GetJobs,
+                'file_metadata_columns' : self.modules_media_results.GetFileMetadataColumns,
                 'file_query_ids' : self.modules_files_query.GetHashIdsFromQuery,
                 'file_relationships_for_api' : self.modules_files_duplicates_storage.GetFileRelationshipsForAPI,
                 'filter_existing_tags' : self.modules_mappings_counts_update.FilterExistingTags,
@@ -3920,6 +3932,7 @@ class DB( HydrusDB.HydrusDB ):
                 'recent_tags' : self.modules_recent_tags.GetRecentTags,
                 'repository_progress' : self.modules_repositories.GetRepositoryProgress,
                 'repository_update_hashes_to_process' : self.modules_repositories.GetRepositoryUpdateHashesICanProcess,
+                'revalidate_media_results' : self.modules_media_results.RevalidateMediaResults,
                 'serialisable' : self.modules_serialisable.GetJSONDump,
                 'serialisable_simple' : self.modules_serialisable.GetJSONSimple,
                 'serialisable_named' : self.modules_serialisable.GetJSONDumpNamed,
@@ -4472,6 +4485,14 @@ class DB( HydrusDB.HydrusDB ):
             HydrusData.ShowText( 'A database exception looked like it could be a very serious \'database image is malformed\' error! Unless you know otherwise, please shut down the client immediately and check the \'Recovery->Help my db is broke\' document in the help.' )
             
         
+        # we are about to rollback, so any postings or sibling chains we fetched inside this transaction may be wrong
+        ClientDBMappingsStorage.TAG_POSTINGS_CACHE.Clear()
+        
+        if hasattr( self, 'modules_tag_siblings' ):
+            
+            self.modules_tag_siblings.ClearChainsLookups()
+            
+        
         if job.IsSynchronous():
             
             db_traceback = 'Database ' + tb
@@ -4933,7 +4954,7 @@ class DB( HydrusDB.HydrusDB ):
         num_done = 0
         still_work_to_do = True
         
-        group_of_hash_ids = self.modules_similar_files.GetSomeHashIdsToSimilarSearch( search_distance, 10 )
+        group_of_hash_ids = self.modules_similar_files.GetSomeHashIdsToSimilarSearch( search_distance, 256 )
         
         while len( group_of_hash_ids ) > 0:
             
@@ -4955,7 +4976,7 @@ class DB( HydrusDB.HydrusDB ):
                     
                 
             
-            group_of_hash_ids = self.modules_similar_files.GetSomeHashIdsToSimilarSearch( search_distance, 10 )
+            group_of_hash_ids = self.modules_similar_files.GetSomeHashIdsToSimilarSearch( search_distance, 256 )
             
         
         still_work_to_do = False
@@ -6796,6 +6817,8 @@ class DB( HydrusDB.HydrusDB ):
                 
                 self._Execute( 'DELETE FROM {};'.format( cache_ideal_tag_siblings_lookup_table_name ) )
                 
+                self.modules_tag_siblings.ClearChainsLookups( tag_service_id = service_id, display_type = ClientTags.TAG_DISPLAY_DISPLAY_IDEAL )
+                
             
             #
             
@@ -8207,6 +8230,22 @@ class DB( HydrusDB.HydrusDB ):
                 
             
         
+        if version == 682:
+            
+            if not self._TableExists( 'main.json_dumps_hashed_file_seed_chunks' ):
+                
+                self._Execute( 'CREATE TABLE IF NOT EXISTS main.json_dumps_hashed_file_seed_chunks ( hash BLOB_BYTES, file_seed_chunk_hash BLOB_BYTES, PRIMARY KEY ( hash, file_seed_chunk_hash ) );' )
+                
+            
+            if not self._TableExists( 'main.file_seed_chunks' ):
+                
+                self._Execute( 'CREATE TABLE IF NOT EXISTS main.file_seed_chunks ( file_seed_chunk_hash BLOB_BYTES PRIMARY KEY, dump BLOB_BYTES );' )
+                
+            
+            # similar files search no longer uses the old VP-tree, so its table and parent_id index can go
+            self._Execute( 'DROP TABLE IF EXISTS main.shape_vptree;' )
+            
+        
         if False: # on version where we are happy with human-readable file metadata. do not want to pull the trigger on this big job until we are content
             # actually yeah now we want to do it for 'has xmp', 'has iptc', and 'has software/source', and we MUST make it optional through a yes/no dialog
             
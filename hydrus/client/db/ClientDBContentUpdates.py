@@ -1331,6 +1331,8 @@ class ClientDBContentUpdates( ClientDBModule.ClientDBModule ):
     
     def UpdateMappings( self, tag_service_id, mappings_ids = None, deleted_mappings_ids = None, pending_mappings_ids = None, pending_rescinded_mappings_ids = None, petitioned_mappings_ids = None, petitioned_rescinded_mappings_ids = None ):
         
+        ClientDBMappingsStorage.TAG_POSTINGS_CACHE.NotifyTagServiceChanged( tag_service_id )
+        
         ( current_mappings_table_name, deleted_mappings_table_name, pending_mappings_table_name, petitioned_mappings_table_name ) = ClientDBMappingsStorage.GenerateMappingsTableNames( tag_service_id )
         
         if mappings_ids is None: mappings_ids = []
@@ -1,7 +1,9 @@
 import collections.abc
+import numpy
 import random
 import sqlite3
 
+from hydrus.core import HydrusBitmaps
 from hydrus.core import HydrusConstants as HC
 from hydrus.core import HydrusData
 from hydrus.core import HydrusExceptions
@@ -97,6 +99,30 @@ class SearchState( object ):
         
     
 
+def GetNumPySortOrder( sort_columns: list[ numpy.ndarray ], reverse: bool ) -> numpy.ndarray:
+    
+    # sort_columns go most significant first. lexsort is stable and wants them the other way around
+    # negating for reverse keeps ties in their original order, just like sorted( reverse = True )
+    
+    if reverse:
+        
+        sort_columns = [ -sort_column for sort_column in sort_columns ]
+        
+    
+    if len( sort_columns ) == 1:
+        
+        return numpy.argsort( sort_columns[0], kind = 'stable' )
+        
+    
+    return numpy.lexsort( sort_columns[ : : -1 ] )
+    
+
+def GetNumPySortColumn( rows: list[ tuple ], column_index: int ) -> numpy.ndarray:
+    
+    # None comes through as nan
+    return numpy.array( [ row[ column_index ] for row in rows ], dtype = numpy.float64 )
+    
+
 def GetFilesInfoPredicates( system_predicates: ClientSearchFileSearchContext.FileSystemPredicates ):
     
     simple_preds = system_predicates.GetSimpleInfo()
@@ -290,6 +316,37 @@ class ClientDBFilesSearchTags( ClientDBModule.ClientDBModule ):
         super().__init__( 'client file search using tags', cursor )
         
     
+    def _GetHashIdsBitmapFromTagId( self, tag_service_id: int, table_name: str, tag_id: int, job_status = None ) -> HydrusBitmaps.CompressedBitmap:
+        
+        tag_postings_cache = ClientDBMappingsStorage.TAG_POSTINGS_CACHE
+        
+        bitmap = tag_postings_cache.GetBitmap( tag_service_id, table_name, tag_id )
+        
+        if bitmap is None:
+            
+            generation = tag_postings_cache.GetGeneration( tag_service_id )
+            
+            cancelled_hook = None
+            
+            if job_status is not None:
+                
+                cancelled_hook = job_status.IsCancelled
+                
+            
+            hash_ids = self._STL( self._ExecuteCancellable( 'SELECT hash_id FROM {} WHERE tag_id = ?;'.format( table_name ), ( tag_id, ), cancelled_hook ) )
+            
+            bitmap = HydrusBitmaps.CompressedBitmap.FromIntegers( hash_ids )
+            
+            # only the main connection fills the cache. the writer bumps the generation when it starts a write, so a pool snapshot could be older than that generation
+            if ( job_status is None or not job_status.IsCancelled() ) and not self._OnReadPoolConnection():
+                
+                tag_postings_cache.AddBitmap( tag_service_id, table_name, tag_id, bitmap, generation )
+                
+            
+        
+        return bitmap
+        
+    
     def GetHashIdsAndNonZeroTagCounts( self, tag_display_type: int, location_context: ClientLocation.LocationContext, tag_context: ClientSearchTagContext.TagContext, hash_ids, namespace_wildcard = '*', job_status = None ):
         
         if namespace_wildcard == '*':
@@ -365,6 +422,52 @@ class ClientDBFilesSearchTags( ClientDBModule.ClientDBModule ):
             
         
     
+    def GetHashIdsBitmapFromTag( self, tag_display_type: int, location_context: ClientLocation.LocationContext, tag_context: ClientSearchTagContext.TagContext, tag, job_status = None ) -> HydrusBitmaps.CompressedBitmap:
+        
+        # this does not filter to the location context, so if it is not cross-referenced, the caller has to do that
+        
+        ( file_service_keys, file_location_is_cross_referenced ) = location_context.GetCoveringCurrentFileServiceKeys()
+        
+        result = HydrusBitmaps.CompressedBitmap()
+        
+        if not self.modules_tags.TagExists( tag ):
+            
+            return result
+            
+        
+        if tag_context.service_key == CC.COMBINED_TAG_SERVICE_KEY:
+            
+            search_tag_service_ids = self.modules_services.GetServiceIds( HC.REAL_TAG_SERVICES )
+            
+        else:
+            
+            search_tag_service_ids = ( self.modules_services.GetServiceId( tag_context.service_key ), )
+            
+        
+        service_ids_to_service_keys = self.modules_services.GetServiceIdsToServiceKeys()
+        
+        tag_id = self.modules_tags.GetTagId( tag )
+        
+        for search_tag_service_id in search_tag_service_ids:
+            
+            search_tag_service_key = service_ids_to_service_keys[ search_tag_service_id ]
+            
+            search_tag_context = ClientSearchTagContext.TagContext( service_key = search_tag_service_key, include_current_tags = tag_context.include_current_tags, include_pending_tags = tag_context.include_pending_tags, display_service_key = search_tag_service_key )
+            
+            ideal_tag_id = self.modules_tag_siblings.GetIdealTagId( tag_display_type, search_tag_service_id, tag_id )
+            
+            for file_service_key in file_service_keys:
+                
+                for table_name in self.modules_tag_search.GetMappingTables( tag_display_type, file_service_key, search_tag_context ):
+                    
+                    result = result.Union( self._GetHashIdsBitmapFromTagId( search_tag_service_id, table_name, ideal_tag_id, job_status = job_status ) )
+                    
+                
+            
+        
+        return result
+        
+    
     def GetHashIdsFromNamespaceIdsSubtagIds( self, tag_display_type: int, file_service_key, tag_context: ClientSearchTagContext.TagContext, namespace_ids, subtag_ids, hash_ids = None, hash_ids_table_name = None, job_status = None ):
         
         file_service_id = self.modules_services.GetServiceId( file_service_key )
@@ -649,7 +752,22 @@ class ClientDBFilesSearchTags( ClientDBModule.ClientDBModule ):
             cancelled_hook = job_status.IsCancelled
             
         
-        if len( tag_ids ) == 1:
+        if len( tag_ids ) == 1 and not do_hash_table_join and tag_context.service_key != CC.COMBINED_TAG_SERVICE_KEY and self.TagPostingsCacheIsActive():
+            
+            ( tag_id, ) = tag_ids
+            
+            tag_service_id = self.modules_services.GetServiceId( tag_context.service_key )
+            
+            bitmap = HydrusBitmaps.CompressedBitmap()
+            
+            for table_name in table_names:
+                
+                bitmap = bitmap.Union( self._GetHashIdsBitmapFromTagId( tag_service_id, table_name, tag_id, job_status = job_status ) )
+                
+            
+            result_hash_ids = bitmap.ToSet()
+            
+        elif len( tag_ids ) == 1:
             
             ( tag_id, ) = tag_ids
             
@@ -1055,7 +1173,11 @@ class ClientDBFilesSearchTags( ClientDBModule.ClientDBModule ):
         return tables_and_columns
         
     
-
+    def TagPostingsCacheIsActive( self ) -> bool:
+        
+        return ClientDBMappingsStorage.TAG_POSTINGS_CACHE.IsActive()
+        
+    
 
 class ClientDBFilesQuery( ClientDBModule.ClientDBModule ):
     
@@ -1328,6 +1450,45 @@ class ClientDBFilesQuery( ClientDBModule.ClientDBModule ):
             
             tags_to_include.sort( key = sort_longest_tag_first_key )
             
+            if query_hash_ids is None and len( tags_to_include ) > 0 and self.modules_files_search_tags.TagPostingsCacheIsActive():
+                
+                # we can do the whole AND in compressed bitmaps and only make a big python set at the end
+                
+                tag_bitmaps = [ self.modules_files_search_tags.GetHashIdsBitmapFromTag( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, location_context, tag_context, tag, job_status = job_status ) for tag in tags_to_include ]
+                
+                tag_bitmaps.sort( key = len )
+                
+                tags_bitmap = tag_bitmaps[0]
+                
+                for tag_bitmap in tag_bitmaps[1:]:
+                    
+                    if len( tags_bitmap ) == 0:
+                        
+                        break
+                        
+                    
+                    tags_bitmap = tags_bitmap.Intersection( tag_bitmap )
+                    
+                
+                query_hash_ids = tags_bitmap.ToSet()
+                
+                ( file_service_keys, file_location_is_cross_referenced ) = location_context.GetCoveringCurrentFileServiceKeys()
+                
+                if not file_location_is_cross_referenced:
+                    
+                    query_hash_ids = self.modules_files_storage.FilterHashIds( location_context, query_hash_ids )
+                    
+                
+                search_state.have_cross_referenced_file_locations = True
+                
+                if len( query_hash_ids ) == 0:
+                    
+                    return set()
+                    
+                
+                tags_to_include = []
+                
+            
             for tag in tags_to_include:
                 
                 if query_hash_ids is None:
@@ -1845,6 +2006,25 @@ class ClientDBFilesQuery( ClientDBModule.ClientDBModule ):
         
         wildcards_to_exclude = file_search_context.GetWildcardsToExclude()
         
+        if len( tags_to_exclude ) > 0 and self.modules_files_search_tags.TagPostingsCacheIsActive():
+            
+            query_bitmap = HydrusBitmaps.CompressedBitmap.FromIntegers( query_hash_ids )
+            
+            for tag in tags_to_exclude:
+                
+                query_bitmap = query_bitmap.Difference( self.modules_files_search_tags.GetHashIdsBitmapFromTag( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, location_context, tag_context, tag, job_status = job_status ) )
+                
+                if len( query_bitmap ) == 0:
+                    
+                    return set()
+                    
+                
+            
+            query_hash_ids = query_bitmap.ToSet()
+            
+            tags_to_exclude = []
+            
+        
         if len( tags_to_exclude ) + len( namespaces_to_exclude ) + len( wildcards_to_exclude ) > 0:
             
             with self._MakeTemporaryIntegerTable( query_hash_ids, 'hash_id' ) as temp_table_name:
@@ -3049,7 +3229,7 @@ class ClientDBFilesQuery( ClientDBModule.ClientDBModule ):
         
         if sort_by is not None and sort_by.CanSortAtDBLevel( location_context ):
             
-            ( did_sort, query_hash_ids ) = self.TryToSortHashIds( location_context, query_hash_ids, sort_by )
+            ( did_sort, query_hash_ids ) = self.TryToSortHashIds( location_context, query_hash_ids, sort_by, limit = system_limit if we_are_applying_limit else None )
             
         
         #
@@ -3087,7 +3267,7 @@ class ClientDBFilesQuery( ClientDBModule.ClientDBModule ):
         return query_hash_ids
         
     
-    def TryToSortHashIds( self, location_context: ClientLocation.LocationContext, hash_ids, sort_by: ClientMediaSort.MediaSort ):
+    def TryToSortHashIds( self, location_context: ClientLocation.LocationContext, hash_ids, sort_by: ClientMediaSort.MediaSort, limit = None ):
         
         did_sort = False
         
@@ -3101,6 +3281,8 @@ class ClientDBFilesQuery( ClientDBModule.ClientDBModule ):
         
         query = None
         key = lambda x: 1
+        get_sort_columns = None
+        limit_order_by_columns = None
         reverse = False
         
         if sort_metadata == 'system':
@@ -3142,38 +3324,56 @@ class ClientDBFilesQuery( ClientDBModule.ClientDBModule ):
                     
                     query = 'SELECT hash_id, timestamp_ms FROM {temp_table} CROSS JOIN {current_files_table} USING ( hash_id );'.format( temp_table = '{temp_table}', current_files_table = current_files_table_name )
                     
+                    limit_order_by_columns = [ 'IFNULL( timestamp_ms, -1 )', 'hash_id' ]
+                    
                 elif sort_data == CC.SORT_FILES_BY_FILESIZE:
                     
                     query = 'SELECT hash_id, size FROM {temp_table} CROSS JOIN files_info USING ( hash_id );'
                     
+                    limit_order_by_columns = [ 'IFNULL( size, -1 )' ]
+                    
                 elif sort_data == CC.SORT_FILES_BY_DURATION:
                     
                     query = 'SELECT hash_id, duration FROM {temp_table} CROSS JOIN files_info USING ( hash_id );'
                     
+                    limit_order_by_columns = [ 'IFNULL( duration, -1 )' ]
+                    
                 elif sort_data == CC.SORT_FILES_BY_FRAMERATE:
                     
                     query = 'SELECT hash_id, num_frames, duration FROM {temp_table} CROSS JOIN files_info USING ( hash_id );'
                     
+                    limit_order_by_columns = [ 'CASE WHEN num_frames IS NULL OR duration IS NULL OR num_frames <= 0 OR duration <= 0 THEN -1 ELSE CAST( num_frames AS REAL ) / duration END' ]
+                    
                 elif sort_data == CC.SORT_FILES_BY_NUM_FRAMES:
                     
                     query = 'SELECT hash_id, num_frames FROM {temp_table} CROSS JOIN files_info USING ( hash_id );'
                     
+                    limit_order_by_columns = [ 'IFNULL( num_frames, -1 )' ]
+                    
                 elif sort_data == CC.SORT_FILES_BY_WIDTH:
                     
                     query = 'SELECT hash_id, width FROM {temp_table} CROSS JOIN files_info USING ( hash_id );'
                     
+                    limit_order_by_columns = [ 'IFNULL( width, -1 )' ]
+                    
                 elif sort_data == CC.SORT_FILES_BY_HEIGHT:
                     
                     query = 'SELECT hash_id, height FROM {temp_table} CROSS JOIN files_info USING ( hash_id );'
                     
+                    limit_order_by_columns = [ 'IFNULL( height, -1 )' ]
+                    
                 elif sort_data == CC.SORT_FILES_BY_RATIO:
                     
                     query = 'SELECT hash_id, width, height FROM {temp_table} CROSS JOIN files_info USING ( hash_id );'
-                        
+                    
+                    limit_order_by_columns = [ 'CASE WHEN width IS NULL OR height IS NULL OR width = 0 OR height = 0 THEN -1 ELSE CAST( width AS REAL ) / height END' ]
+                    
                 elif sort_data == CC.SORT_FILES_BY_NUM_PIXELS:
                     
                     query = 'SELECT hash_id, width, height FROM {temp_table} CROSS JOIN files_info USING ( hash_id );'
                     
+                    limit_order_by_columns = [ 'CASE WHEN width IS NULL OR height IS NULL OR width = 0 OR height = 0 THEN -1 ELSE width * height END' ]
+                    
                 elif sort_data in ( CC.SORT_FILES_BY_MEDIA_VIEWS, CC.SORT_FILES_BY_MEDIA_VIEWTIME ):
                     
                     desired_canvas_types = CG.client_controller.new_options.GetIntegerList( 'file_viewing_stats_interesting_canvas_types' )
@@ -3204,78 +3404,66 @@ class ClientDBFilesQuery( ClientDBModule.ClientDBModule ):
                     
                     query = 'SELECT hash_id, last_viewed_timestamp_ms FROM {temp_table} CROSS JOIN file_viewing_stats USING ( hash_id ) WHERE canvas_type = {canvas_type};'.format( temp_table = '{temp_table}', canvas_type = CC.CANVAS_MEDIA_VIEWER )
                     
+                    limit_order_by_columns = [ 'IFNULL( last_viewed_timestamp_ms, -1 )' ]
+                    
                 elif sort_data == CC.SORT_FILES_BY_ARCHIVED_TIMESTAMP:
                     
                     query = 'SELECT hash_id, archived_timestamp_ms FROM {temp_table} CROSS JOIN archive_timestamps USING ( hash_id );'
                     
+                    limit_order_by_columns = [ 'IFNULL( archived_timestamp_ms, -1 )' ]
+                    
+                
+                # these get sorted as numpy columns, where None comes in as nan
                 
                 if sort_data == CC.SORT_FILES_BY_IMPORT_TIME:
                     
-                    def deal_with_none( x ):
-                        
-                        if x is None: return -1
-                        else: return x
-                        
-                    
-                    def key( row ):
+                    def get_sort_columns( rows ):
                         
-                        hash_id = row[0]
-                        timestamp = row[1]
+                        timestamps = numpy.nan_to_num( GetNumPySortColumn( rows, 1 ), nan = -1 )
+                        hash_ids = numpy.fromiter( ( row[0] for row in rows ), dtype = numpy.int64, count = len( rows ) )
                         
                         # hash_id to differentiate files imported in the same second
                         
-                        return ( deal_with_none( timestamp ), hash_id )
+                        return [ timestamps, hash_ids ]
                         
                     
-                elif sort_data == CC.SORT_FILES_BY_RATIO:
+                elif sort_data in ( CC.SORT_FILES_BY_RATIO, CC.SORT_FILES_BY_NUM_PIXELS ):
                     
-                    def key( row ):
+                    def get_sort_columns( rows ):
+                        
+                        widths = GetNumPySortColumn( rows, 1 )
+                        heights = GetNumPySortColumn( rows, 2 )
+                        
+                        valid = ~numpy.isnan( widths ) & ~numpy.isnan( heights ) & ( widths != 0 ) & ( heights != 0 )
                         
-                        width = row[1]
-                        height = row[2]
+                        result = numpy.full( len( widths ), -1, dtype = numpy.float64 )
                         
-                        if width is None or height is None or width == 0 or height == 0:
+                        if sort_data == CC.SORT_FILES_BY_RATIO:
                             
-                            return -1
+                            numpy.divide( widths, heights, out = result, where = valid )
                             
                         else:
                             
-                            return width / height
+                            numpy.multiply( widths, heights, out = result, where = valid )
                             
                         
+                        return [ result ]
+                        
                     
                 elif sort_data == CC.SORT_FILES_BY_FRAMERATE:
                     
-                    def key( row ):
+                    def get_sort_columns( rows ):
                         
-                        num_frames = row[1]
-                        duration_ms = row[2]
+                        nums_frames = GetNumPySortColumn( rows, 1 )
+                        durations_ms = GetNumPySortColumn( rows, 2 )
                         
-                        if num_frames is None or duration_ms is None or num_frames <= 0 or duration_ms <= 0:
-                            
-                            return -1
-                            
-                        else:
-                            
-                            return num_frames / duration_ms
-                            
+                        valid = ( nums_frames > 0 ) & ( durations_ms > 0 )
                         
-                    
-                elif sort_data == CC.SORT_FILES_BY_NUM_PIXELS:
-                    
-                    def key( row ):
+                        result = numpy.full( len( nums_frames ), -1, dtype = numpy.float64 )
                         
-                        width = row[1]
-                        height = row[2]
+                        numpy.divide( nums_frames, durations_ms, out = result, where = valid )
                         
-                        if width is None or height is None or width == 0 or height == 0:
-                            
-                            return -1
-                            
-                        else:
-                            
-                            return width * height
-                            
+                        return [ result ]
                         
                     
                 elif sort_data == CC.SORT_FILES_BY_APPROX_BITRATE:
@@ -3345,7 +3533,7 @@ class ClientDBFilesQuery( ClientDBModule.ClientDBModule ):
                     
                 else:
                     
-                    key = lambda row: -1 if row[1] is None else row[1]
+                    get_sort_columns = lambda rows: [ numpy.nan_to_num( GetNumPySortColumn( rows, 1 ), nan = -1 ) ]
                     
                 
                 reverse = sort_order == CC.SORT_DESC
@@ -3431,19 +3619,52 @@ class ClientDBFilesQuery( ClientDBModule.ClientDBModule ):
         
         if query is not None:
             
+            # if we only want the top n and there is one row per file, sqlite can do the cut for us
+            limit_pushed_down = limit is not None and limit_order_by_columns is not None and limit < len( hash_ids )
+            
+            if limit_pushed_down:
+                
+                direction = 'DESC' if reverse else 'ASC'
+                
+                order_by = ', '.join( ( '{} {}'.format( column, direction ) for column in limit_order_by_columns ) )
+                
+                query = '{} ORDER BY {} LIMIT {};'.format( query[:-1], order_by, limit )
+                
+            
             with self._MakeTemporaryIntegerTable( hash_ids, 'hash_id' ) as temp_hash_ids_table_name:
                 
-                hash_ids_and_other_data = sorted( self._Execute( query.format( temp_table = temp_hash_ids_table_name ) ), key = key, reverse = reverse )
+                hash_ids_and_other_data = self._Execute( query.format( temp_table = temp_hash_ids_table_name ) ).fetchall()
                 
             
             original_hash_ids = set( hash_ids )
             
-            hash_ids = [ row[0] for row in hash_ids_and_other_data ]
+            if get_sort_columns is None:
+                
+                hash_ids_and_other_data.sort( key = key, reverse = reverse )
+                
+                hash_ids = [ row[0] for row in hash_ids_and_other_data ]
+                
+            elif len( hash_ids_and_other_data ) == 0:
+                
+                hash_ids = []
+                
+            else:
+                
+                sort_order_indices = GetNumPySortOrder( get_sort_columns( hash_ids_and_other_data ), reverse )
+                
+                unsorted_hash_ids = numpy.fromiter( ( row[0] for row in hash_ids_and_other_data ), dtype = numpy.int64, count = len( hash_ids_and_other_data ) )
+                
+                hash_ids = unsorted_hash_ids[ sort_order_indices ].tolist()
+                
             
             # some stuff like media views won't have rows
-            missing_hash_ids = original_hash_ids.difference( hash_ids )
-            
-            hash_ids.extend( missing_hash_ids )
+            # if sqlite gave us a full top n, anything missing was going to be cut anyway
+            if not ( limit_pushed_down and len( hash_ids ) == limit ):
+                
+                missing_hash_ids = original_hash_ids.difference( hash_ids )
+                
+                hash_ids.extend( missing_hash_ids )
+                
             
             did_sort = True
             
@@ -140,6 +140,8 @@ class ClientDBMappingsCacheSpecificDisplay( ClientDBModule.ClientDBModule ):
     
     def AddFiles( self, file_service_id, tag_service_id, hash_ids, hash_ids_table_name ):
         
+        ClientDBMappingsStorage.TAG_POSTINGS_CACHE.NotifyTagServiceChanged( tag_service_id )
+        
         ( cache_display_current_mappings_table_name, cache_display_pending_mappings_table_name ) = ClientDBMappingsStorage.GenerateSpecificDisplayMappingsCacheTableNames( file_service_id, tag_service_id )
         
         ( cache_current_mappings_table_name, cache_deleted_mappings_table_name, cache_pending_mappings_table_name ) = ClientDBMappingsStorage.GenerateSpecificMappingsCacheTableNames( file_service_id, tag_service_id )
@@ -224,6 +226,8 @@ class ClientDBMappingsCacheSpecificDisplay( ClientDBModule.ClientDBModule ):
     
     def AddImplications( self, file_service_id, tag_service_id, implication_tag_ids, tag_id, status_hook = None ):
         
+        ClientDBMappingsStorage.TAG_POSTINGS_CACHE.NotifyTagServiceChanged( tag_service_id )
+        
         if len( implication_tag_ids ) == 0:
             
             return
@@ -284,6 +288,8 @@ class ClientDBMappingsCacheSpecificDisplay( ClientDBModule.ClientDBModule ):
     
     def AddMappings( self, file_service_id, tag_service_id, tag_id, hash_ids ):
         
+        ClientDBMappingsStorage.TAG_POSTINGS_CACHE.NotifyTagServiceChanged( tag_service_id )
+        
         # this guy doesn't do rescind pend because of storage calculation issues that need that to occur before deletes to storage tables
         
         ( cache_display_current_mappings_table_name, cache_display_pending_mappings_table_name ) = ClientDBMappingsStorage.GenerateSpecificDisplayMappingsCacheTableNames( file_service_id, tag_service_id )
@@ -314,6 +320,8 @@ class ClientDBMappingsCacheSpecificDisplay( ClientDBModule.ClientDBModule ):
     
     def Clear( self, file_service_id, tag_service_id, keep_pending = False ):
         
+        ClientDBMappingsStorage.TAG_POSTINGS_CACHE.NotifyTagServiceChanged( tag_service_id )
+        
         ( cache_display_current_mappings_table_name, cache_display_pending_mappings_table_name ) = ClientDBMappingsStorage.GenerateSpecificDisplayMappingsCacheTableNames( file_service_id, tag_service_id )
         
         self._Execute( 'DELETE FROM {};'.format( cache_display_current_mappings_table_name ) )
@@ -328,6 +336,8 @@ class ClientDBMappingsCacheSpecificDisplay( ClientDBModule.ClientDBModule ):
     
     def Drop( self, file_service_id, tag_service_id ):
         
+        ClientDBMappingsStorage.TAG_POSTINGS_CACHE.NotifyTagServiceChanged( tag_service_id )
+        
         ( cache_display_current_mappings_table_name, cache_display_pending_mappings_table_name ) = ClientDBMappingsStorage.GenerateSpecificDisplayMappingsCacheTableNames( file_service_id, tag_service_id )
         
         self.modules_db_maintenance.DeferredDropTable( cache_display_current_mappings_table_name )
@@ -338,6 +348,8 @@ class ClientDBMappingsCacheSpecificDisplay( ClientDBModule.ClientDBModule ):
     
     def DeleteFiles( self, file_service_id, tag_service_id, hash_ids, hash_id_table_name ):
         
+        ClientDBMappingsStorage.TAG_POSTINGS_CACHE.NotifyTagServiceChanged( tag_service_id )
+        
         ( cache_display_current_mappings_table_name, cache_display_pending_mappings_table_name ) = ClientDBMappingsStorage.GenerateSpecificDisplayMappingsCacheTableNames( file_service_id, tag_service_id )
         
         # temp hashes to mappings
@@ -381,6 +393,8 @@ class ClientDBMappingsCacheSpecificDisplay( ClientDBModule.ClientDBModule ):
     
     def DeleteImplications( self, file_service_id, tag_service_id, implication_tag_ids, tag_id, status_hook = None ):
         
+        ClientDBMappingsStorage.TAG_POSTINGS_CACHE.NotifyTagServiceChanged( tag_service_id )
+        
         if len( implication_tag_ids ) == 0:
             
             return
@@ -495,6 +509,8 @@ class ClientDBMappingsCacheSpecificDisplay( ClientDBModule.ClientDBModule ):
     
     def DeleteMappings( self, file_service_id, tag_service_id, storage_tag_id, hash_ids ):
         
+        ClientDBMappingsStorage.TAG_POSTINGS_CACHE.NotifyTagServiceChanged( tag_service_id )
+        
         ( cache_display_current_mappings_table_name, cache_display_pending_mappings_table_name ) = ClientDBMappingsStorage.GenerateSpecificDisplayMappingsCacheTableNames( file_service_id, tag_service_id )
         
         implies_tag_ids = self.modules_tag_display.GetImplies( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, tag_service_id, storage_tag_id )
@@ -551,6 +567,8 @@ class ClientDBMappingsCacheSpecificDisplay( ClientDBModule.ClientDBModule ):
     
     def Generate( self, file_service_id, tag_service_id, populate_from_storage = True, status_hook = None ):
         
+        ClientDBMappingsStorage.TAG_POSTINGS_CACHE.NotifyTagServiceChanged( tag_service_id )
+        
         table_generation_dict = self._GetServiceTableGenerationDictSingle( file_service_id, tag_service_id )
         
         for ( table_name, ( create_query_without_name, version_added ) ) in table_generation_dict.items():
@@ -620,6 +638,8 @@ class ClientDBMappingsCacheSpecificDisplay( ClientDBModule.ClientDBModule ):
     
     def PendMappings( self, file_service_id, tag_service_id, tag_id, hash_ids ):
         
+        ClientDBMappingsStorage.TAG_POSTINGS_CACHE.NotifyTagServiceChanged( tag_service_id )
+        
         ( cache_display_current_mappings_table_name, cache_display_pending_mappings_table_name ) = ClientDBMappingsStorage.GenerateSpecificDisplayMappingsCacheTableNames( file_service_id, tag_service_id )
         
         ac_counts = collections.Counter()
@@ -648,6 +668,8 @@ class ClientDBMappingsCacheSpecificDisplay( ClientDBModule.ClientDBModule ):
     
     def RegeneratePending( self, file_service_id, tag_service_id, status_hook = None ):
         
+        ClientDBMappingsStorage.TAG_POSTINGS_CACHE.NotifyTagServiceChanged( tag_service_id )
+        
         ( cache_current_mappings_table_name, cache_deleted_mappings_table_name, cache_pending_mappings_table_name ) = ClientDBMappingsStorage.GenerateSpecificMappingsCacheTableNames( file_service_id, tag_service_id )
         ( cache_display_current_mappings_table_name, cache_display_pending_mappings_table_name ) = ClientDBMappingsStorage.GenerateSpecificDisplayMappingsCacheTableNames( file_service_id, tag_service_id )
         
@@ -713,6 +735,8 @@ class ClientDBMappingsCacheSpecificDisplay( ClientDBModule.ClientDBModule ):
     
     def RegenerateTags( self, tag_service_id, tag_ids ):
         
+        ClientDBMappingsStorage.TAG_POSTINGS_CACHE.NotifyTagServiceChanged( tag_service_id )
+        
         file_service_ids = self.modules_services.GetServiceIds( HC.FILE_SERVICES_WITH_SPECIFIC_MAPPING_CACHES )
         
         for file_service_id in file_service_ids:
@@ -745,6 +769,8 @@ class ClientDBMappingsCacheSpecificDisplay( ClientDBModule.ClientDBModule ):
     
     def RescindPendingMappings( self, file_service_id, tag_service_id, storage_tag_id, hash_ids ):
         
+        ClientDBMappingsStorage.TAG_POSTINGS_CACHE.NotifyTagServiceChanged( tag_service_id )
+        
         # other things imply this tag on display, so we need to check storage to see what else has it
         statuses_to_table_names = self.modules_mappings_storage.GetFastestStorageMappingTableNames( file_service_id, tag_service_id )
         
@@ -217,6 +217,8 @@ class ClientDBMappingsCacheSpecificStorage( ClientDBModule.ClientDBModule ):
     
     def AddFiles( self, file_service_id, tag_service_id, hash_ids, hash_ids_table_name ):
         
+        ClientDBMappingsStorage.TAG_POSTINGS_CACHE.NotifyTagServiceChanged( tag_service_id )
+        
         ( cache_current_mappings_table_name, cache_deleted_mappings_table_name, cache_pending_mappings_table_name ) = ClientDBMappingsStorage.GenerateSpecificMappingsCacheTableNames( file_service_id, tag_service_id )
         
         ( current_mappings_table_name, deleted_mappings_table_name, pending_mappings_table_name, petitioned_mappings_table_name ) = ClientDBMappingsStorage.GenerateMappingsTableNames( tag_service_id )
@@ -281,6 +283,8 @@ class ClientDBMappingsCacheSpecificStorage( ClientDBModule.ClientDBModule ):
     
     def AddMappings( self, tag_service_id, tag_id, hash_ids, filtered_hashes_generator: FilteredHashesGenerator ):
         
+        ClientDBMappingsStorage.TAG_POSTINGS_CACHE.NotifyTagServiceChanged( tag_service_id )
+        
         is_local = self.modules_services.GetServiceType( tag_service_id ) == HC.LOCAL_TAG
         
         for ( file_service_id, filtered_hash_ids ) in filtered_hashes_generator.IterateHashes( hash_ids ):
@@ -331,6 +335,8 @@ class ClientDBMappingsCacheSpecificStorage( ClientDBModule.ClientDBModule ):
     
     def Clear( self, file_service_id, tag_service_id, keep_pending = False ):
         
+        ClientDBMappingsStorage.TAG_POSTINGS_CACHE.NotifyTagServiceChanged( tag_service_id )
+        
         ( cache_current_mappings_table_name, cache_deleted_mappings_table_name, cache_pending_mappings_table_name ) = ClientDBMappingsStorage.GenerateSpecificMappingsCacheTableNames( file_service_id, tag_service_id )
         
         self._Execute( 'DELETE FROM {};'.format( cache_current_mappings_table_name ) )
@@ -360,6 +366,8 @@ class ClientDBMappingsCacheSpecificStorage( ClientDBModule.ClientDBModule ):
     
     def Drop( self, file_service_id, tag_service_id ):
         
+        ClientDBMappingsStorage.TAG_POSTINGS_CACHE.NotifyTagServiceChanged( tag_service_id )
+        
         ( cache_current_mappings_table_name, cache_deleted_mappings_table_name, cache_pending_mappings_table_name ) = ClientDBMappingsStorage.GenerateSpecificMappingsCacheTableNames( file_service_id, tag_service_id )
         
         self.modules_db_maintenance.DeferredDropTable( cache_current_mappings_table_name )
@@ -373,6 +381,8 @@ class ClientDBMappingsCacheSpecificStorage( ClientDBModule.ClientDBModule ):
     
     def DeleteFiles( self, file_service_id, tag_service_id, hash_ids, hash_id_table_name ):
         
+        ClientDBMappingsStorage.TAG_POSTINGS_CACHE.NotifyTagServiceChanged( tag_service_id )
+        
         self.modules_mappings_cache_specific_display.DeleteFiles( file_service_id, tag_service_id, hash_ids, hash_id_table_name )
         
         ( cache_current_mappings_table_name, cache_deleted_mappings_table_name, cache_pending_mappings_table_name ) = ClientDBMappingsStorage.GenerateSpecificMappingsCacheTableNames( file_service_id, tag_service_id )
@@ -426,6 +436,8 @@ class ClientDBMappingsCacheSpecificStorage( ClientDBModule.ClientDBModule ):
     
     def DeleteMappings( self, tag_service_id, tag_id, hash_ids, filtered_hashes_generator: FilteredHashesGenerator ):
         
+        ClientDBMappingsStorage.TAG_POSTINGS_CACHE.NotifyTagServiceChanged( tag_service_id )
+        
         for ( file_service_id, filtered_hash_ids ) in filtered_hashes_generator.IterateHashes( hash_ids ):
             
             ( cache_current_mappings_table_name, cache_deleted_mappings_table_name, cache_pending_mappings_table_name ) = ClientDBMappingsStorage.GenerateSpecificMappingsCacheTableNames( file_service_id, tag_service_id )
@@ -451,6 +463,8 @@ class ClientDBMappingsCacheSpecificStorage( ClientDBModule.ClientDBModule ):
     
     def Generate( self, file_service_id, tag_service_id ):
         
+        ClientDBMappingsStorage.TAG_POSTINGS_CACHE.NotifyTagServiceChanged( tag_service_id )
+        
         self.CreateTables( file_service_id, tag_service_id )
         
         #
@@ -552,6 +566,8 @@ class ClientDBMappingsCacheSpecificStorage( ClientDBModule.ClientDBModule ):
     
     def PendMappings( self, tag_service_id, tag_id, hash_ids, filtered_hashes_generator: FilteredHashesGenerator ):
         
+        ClientDBMappingsStorage.TAG_POSTINGS_CACHE.NotifyTagServiceChanged( tag_service_id )
+        
         for ( file_service_id, filtered_hash_ids ) in filtered_hashes_generator.IterateHashes( hash_ids ):
             
             ( cache_current_mappings_table_name, cache_deleted_mappings_table_name, cache_pending_mappings_table_name ) = ClientDBMappingsStorage.GenerateSpecificMappingsCacheTableNames( file_service_id, tag_service_id )
@@ -573,6 +589,8 @@ class ClientDBMappingsCacheSpecificStorage( ClientDBModule.ClientDBModule ):
     
     def RegenerateTags( self, tag_service_id, tag_ids ):
         
+        ClientDBMappingsStorage.TAG_POSTINGS_CACHE.NotifyTagServiceChanged( tag_service_id )
+        
         file_service_ids = self.modules_services.GetServiceIds( HC.FILE_SERVICES_WITH_SPECIFIC_MAPPING_CACHES )
         
         for file_service_id in file_service_ids:
@@ -619,6 +637,8 @@ class ClientDBMappingsCacheSpecificStorage( ClientDBModule.ClientDBModule ):
     
     def RegeneratePending( self, file_service_id, tag_service_id, status_hook = None ):
         
+        ClientDBMappingsStorage.TAG_POSTINGS_CACHE.NotifyTagServiceChanged( tag_service_id )
+        
         ( current_mappings_table_name, deleted_mappings_table_name, pending_mappings_table_name, petitioned_mappings_table_name ) = ClientDBMappingsStorage.GenerateMappingsTableNames( tag_service_id )
         ( cache_current_mappings_table_name, cache_deleted_mappings_table_name, cache_pending_mappings_table_name ) = ClientDBMappingsStorage.GenerateSpecificMappingsCacheTableNames( file_service_id, tag_service_id )
         
@@ -664,6 +684,8 @@ class ClientDBMappingsCacheSpecificStorage( ClientDBModule.ClientDBModule ):
     
     def RescindPendingMappings( self, tag_service_id, tag_id, hash_ids, filtered_hashes_generator: FilteredHashesGenerator ):
         
+        ClientDBMappingsStorage.TAG_POSTINGS_CACHE.NotifyTagServiceChanged( tag_service_id )
+        
         for ( file_service_id, filtered_hash_ids ) in filtered_hashes_generator.IterateHashes( hash_ids ):
             
             ( cache_current_mappings_table_name, cache_deleted_mappings_table_name, cache_pending_mappings_table_name ) = ClientDBMappingsStorage.GenerateSpecificMappingsCacheTableNames( file_service_id, tag_service_id )
@@ -309,7 +309,7 @@ class ClientDBMappingsCounts( ClientDBModule.ClientDBModule ):
         return ( current_count, pending_count )
         
     
-    def GetCounts( self, tag_display_type, tag_service_id, file_service_id, tag_ids, include_current, include_pending, domain_is_cross_referenced = True, zero_count_ok = False, job_status = None, tag_ids_table_name = None ):
+    def GetCounts( self, tag_display_type, tag_service_id, file_service_id, tag_ids, include_current, include_pending, domain_is_cross_referenced = True, zero_count_ok = False, job_status = None, tag_ids_table_name = None, max_results = None ):
         
         if len( tag_ids ) == 0:
             
@@ -334,6 +334,29 @@ class ClientDBMappingsCounts( ClientDBModule.ClientDBModule ):
         
         cache_results = []
         
+        if len( search_tag_service_ids ) > 1:
+            
+            # a per-service top-k would drop the count of a tag that just misses one service's cut, so we only limit in sqlite when there is nothing to merge
+            max_results = None
+            
+        
+        if max_results is None:
+            
+            count_order_phrase = None
+            
+        elif include_current and include_pending:
+            
+            count_order_phrase = 'current_count + pending_count'
+            
+        elif include_pending:
+            
+            count_order_phrase = 'pending_count'
+            
+        else:
+            
+            count_order_phrase = 'current_count'
+            
+        
         if len( tag_ids ) > 1:
             
             if tag_ids_table_name is None:
@@ -347,7 +370,7 @@ class ClientDBMappingsCounts( ClientDBModule.ClientDBModule ):
                             return {}
                             
                         
-                        cache_results.extend( self.GetCountsForTags( tag_display_type, file_service_id, search_tag_service_id, temp_tag_id_table_name ) )
+                        cache_results.extend( self.GetCountsForTags( tag_display_type, file_service_id, search_tag_service_id, temp_tag_id_table_name, count_order_phrase = count_order_phrase, max_results = max_results ) )
                         
                     
                 
@@ -360,7 +383,7 @@ class ClientDBMappingsCounts( ClientDBModule.ClientDBModule ):
                         return {}
                         
                     
-                    cache_results.extend( self.GetCountsForTags( tag_display_type, file_service_id, search_tag_service_id, tag_ids_table_name ) )
+                    cache_results.extend( self.GetCountsForTags( tag_display_type, file_service_id, search_tag_service_id, tag_ids_table_name, count_order_phrase = count_order_phrase, max_results = max_results ) )
                     
                 
             
@@ -428,6 +451,11 @@ class ClientDBMappingsCounts( ClientDBModule.ClientDBModule ):
             
             for tag_id in tag_ids:
                 
+                if max_results is not None and len( ids_to_count ) >= max_results:
+                    
+                    break
+                    
+                
                 if tag_id not in ids_to_count:
                     
                     ids_to_count[ tag_id ] = ( 0, 0, 0, 0 )
@@ -507,12 +535,21 @@ class ClientDBMappingsCounts( ClientDBModule.ClientDBModule ):
         return self._Execute( 'SELECT tag_id, current_count, pending_count FROM {} WHERE tag_id = ?;'.format( counts_cache_table_name ), ( tag_id, ) ).fetchall()
         
     
-    def GetCountsForTags( self, tag_display_type, file_service_id, tag_service_id, temp_tag_id_table_name ):
+    def GetCountsForTags( self, tag_display_type, file_service_id, tag_service_id, temp_tag_id_table_name, count_order_phrase = None, max_results = None ):
         
         counts_cache_table_name = self.GetCountsCacheTableName( tag_display_type, file_service_id, tag_service_id )
         
-        # temp tags to counts
-        return self._Execute( 'SELECT tag_id, current_count, pending_count FROM {} CROSS JOIN {} USING ( tag_id );'.format( temp_tag_id_table_name, counts_cache_table_name ) ).fetchall()
+        if max_results is None:
+            
+            # temp tags to counts
+            return self._Execute( 'SELECT tag_id, current_count, pending_count FROM {} CROSS JOIN {} USING ( tag_id );'.format( temp_tag_id_table_name, counts_cache_table_name ) ).fetchall()
+            
+        else:
+            
+            # sqlite does ORDER BY + LIMIT as a top-k sort, so we never pull the whole match into python
+            return self._Execute( 'SELECT tag_id, current_count, pending_count FROM {} CROSS JOIN {} USING ( tag_id ) ORDER BY {} DESC LIMIT ?;'.format( temp_tag_id_table_name, counts_cache_table_name, count_order_phrase ), ( max_results, ) ).fetchall()
+            
+        
         
     
     def GetCurrentPendingPositiveCountsAndWeights( self, tag_display_type, file_service_id, tag_service_id, tag_ids, tag_ids_table_name = None ):
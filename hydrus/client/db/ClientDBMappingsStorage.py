@@ -1,5 +1,8 @@
+import collections
 import sqlite3
+import threading
 
+from hydrus.core import HydrusBitmaps
 from hydrus.core import HydrusConstants as HC
 
 from hydrus.client import ClientLocation
@@ -75,6 +78,163 @@ def GenerateSpecificMappingsCacheTableNames( file_service_id, tag_service_id ):
     return ( cache_current_mappings_table_name, cache_deleted_mappings_table_name, cache_pending_mappings_table_name )
     
 
+class TagPostingsCache( object ):
+    
+    # an optional in-memory sidecar of ( tag_service_id, mappings_table_name, tag_id ) -> compressed bitmap of hash_ids
+    # it is shared by all db connections. anything that writes to a searchable mappings table has to tell us about it
+    
+    def __init__( self ):
+        
+        self._lock = threading.Lock()
+        
+        self._max_size = 0
+        self._current_size = 0
+        
+        self._keys_to_bitmaps = collections.OrderedDict()
+        self._tag_service_ids_to_keys = collections.defaultdict( set )
+        self._tag_service_ids_to_generations = collections.Counter()
+        
+    
+    def _Delete( self, key ):
+        
+        bitmap = self._keys_to_bitmaps.pop( key )
+        
+        self._current_size -= bitmap.GetSizeInBytes()
+        
+        ( tag_service_id, table_name, tag_id ) = key
+        
+        self._tag_service_ids_to_keys[ tag_service_id ].discard( key )
+        
+    
+    def _MaintainSize( self ):
+        
+        while self._current_size > self._max_size and len( self._keys_to_bitmaps ) > 0:
+            
+            oldest_key = next( iter( self._keys_to_bitmaps ) )
+            
+            self._Delete( oldest_key )
+            
+        
+    
+    def AddBitmap( self, tag_service_id: int, table_name: str, tag_id: int, bitmap: HydrusBitmaps.CompressedBitmap, generation: int ):
+        
+        with self._lock:
+            
+            # a write happened while this was being fetched, so it may be stale
+            if generation != self._tag_service_ids_to_generations[ tag_service_id ]:
+                
+                return
+                
+            
+            if bitmap.GetSizeInBytes() > self._max_size / 4:
+                
+                return
+                
+            
+            key = ( tag_service_id, table_name, tag_id )
+            
+            if key in self._keys_to_bitmaps:
+                
+                self._Delete( key )
+                
+            
+            self._keys_to_bitmaps[ key ] = bitmap
+            self._tag_service_ids_to_keys[ tag_service_id ].add( key )
+            
+            self._current_size += bitmap.GetSizeInBytes()
+            
+            self._MaintainSize()
+            
+        
+    
+    def Clear( self ):
+        
+        with self._lock:
+            
+            self._keys_to_bitmaps = collections.OrderedDict()
+            self._tag_service_ids_to_keys = collections.defaultdict( set )
+            
+            for tag_service_id in list( self._tag_service_ids_to_generations.keys() ):
+                
+                self._tag_service_ids_to_generations[ tag_service_id ] += 1
+                
+            
+            self._current_size = 0
+            
+        
+    
+    def GetBitmap( self, tag_service_id: int, table_name: str, tag_id: int ) -> HydrusBitmaps.CompressedBitmap | None:
+        
+        key = ( tag_service_id, table_name, tag_id )
+        
+        with self._lock:
+            
+            if key not in self._keys_to_bitmaps:
+                
+                return None
+                
+            
+            self._keys_to_bitmaps.move_to_end( key )
+            
+            return self._keys_to_bitmaps[ key ]
+            
+        
+    
+    def GetGeneration( self, tag_service_id: int ) -> int:
+        
+        with self._lock:
+            
+            return self._tag_service_ids_to_generations[ tag_service_id ]
+            
+        
+    
+    def GetSizeInBytes( self ) -> int:
+        
+        with self._lock:
+            
+            return self._current_size
+            
+        
+    
+    def IsActive( self ) -> bool:
+        
+        with self._lock:
+            
+            return self._max_size > 0
+            
+        
+    
+    def NotifyTagServiceChanged( self, tag_service_id: int ):
+        
+        with self._lock:
+            
+            self._tag_service_ids_to_generations[ tag_service_id ] += 1
+            
+            for key in list( self._tag_service_ids_to_keys[ tag_service_id ] ):
+                
+                self._Delete( key )
+                
+            
+        
+    
+    def SetMaxSize( self, max_size: int ):
+        
+        with self._lock:
+            
+            if max_size == self._max_size:
+                
+                return
+                
+            
+            self._max_size = max_size
+            
+            self._MaintainSize()
+            
+        
+    
+
+TAG_POSTINGS_CACHE = TagPostingsCache()
+
 class ClientDBMappingsStorage( ClientDBModule.ClientDBModule ):
     
     def __init__( self, cursor: sqlite3.Cursor, modules_db_maintenance: ClientDBMaintenance.ClientDBMaintenance, modules_services: ClientDBServices.ClientDBMasterServices ):
@@ -146,6 +306,8 @@ class ClientDBMappingsStorage( ClientDBModule.ClientDBModule ):
         self._Execute( 'DELETE FROM {};'.format( pending_mappings_table_name ) )
         self._Execute( 'DELETE FROM {};'.format( petitioned_mappings_table_name ) )
         
+        TAG_POSTINGS_CACHE.NotifyTagServiceChanged( service_id )
+        
     
     def DropMappingsTables( self, service_id: int ):
         
@@ -156,6 +318,8 @@ class ClientDBMappingsStorage( ClientDBModule.ClientDBModule ):
         self.modules_db_maintenance.DeferredDropTable( pending_mappings_table_name )
         self.modules_db_maintenance.DeferredDropTable( petitioned_mappings_table_name )
         
+        TAG_POSTINGS_CACHE.NotifyTagServiceChanged( service_id )
+        
     
     def FilterExistingUpdateMappings( self, tag_service_id, mappings_ids, action ):
         
@@ -30,6 +30,8 @@ from hydrus.client.media import ClientMediaResultCache
 from hydrus.client.metadata import ClientContentUpdates
 from hydrus.client.metadata import ClientTags
 
+FILES_INFO_METADATA_COLUMNS = ( 'size', 'mime', 'width', 'height', 'duration', 'num_frames', 'has_audio', 'num_words' )
+
 class ClientDBMediaResults( ClientDBModule.ClientDBModule ):
     
     def __init__(
@@ -73,6 +75,13 @@ class ClientDBMediaResults( ClientDBModule.ClientDBModule ):
         super().__init__( 'client media results', cursor )
         
     
+    def _GetReadPoolSharedAttributeNames( self ) -> collections.abc.Collection[ str ]:
+        
+        # the media result cache does its own locking
+        
+        return ( '_weakref_media_result_cache', )
+        
+    
     def ClearMediaResultCache( self ):
         
         self._weakref_media_result_cache.Clear()
@@ -203,6 +212,146 @@ class ClientDBMediaResults( ClientDBModule.ClientDBModule ):
         return file_info_managers
         
     
+    def GenerateMediaResults( self, hash_ids: collections.abc.Collection[ int ] ) -> list[ ClientMediaResult.MediaResult ]:
+        
+        # get first detailed results
+        
+        with self._MakeTemporaryIntegerTable( hash_ids, 'hash_id' ) as temp_table_name:
+            
+            # everything here is temp hashes to metadata
+            
+            file_info_managers = self.GenerateFileInfoManagers( hash_ids, temp_table_name )
+            
+            hash_ids_to_file_info_managers = { file_info_manager.hash_id : file_info_manager for file_info_manager in file_info_managers }
+            
+            (
+                hash_ids_to_current_file_service_ids_to_timestamps_ms,
+                hash_ids_to_deleted_file_service_ids_to_timestamps_ms,
+                hash_ids_to_deleted_file_service_ids_to_previously_imported_timestamps_ms,
+                hash_ids_to_pending_file_service_ids,
+                hash_ids_to_petitioned_file_service_ids
+            ) = self.modules_files_storage.GetHashIdsToServiceInfoDicts( temp_table_name )
+            
+            hash_ids_to_current_file_service_ids = { hash_id : list( file_service_ids_to_timestamps_ms.keys() ) for ( hash_id, file_service_ids_to_timestamps_ms ) in hash_ids_to_current_file_service_ids_to_timestamps_ms.items() }
+            
+            hash_ids_to_tags_managers = self.GetForceRefreshTagsManagersWithTableHashIds( hash_ids, temp_table_name, hash_ids_to_current_file_service_ids = hash_ids_to_current_file_service_ids )
+            
+            # TODO: it is a little tricky, but it would be nice to have 'gettimestampmanagers' and 'getlocationsmanagers' here
+            # don't forget that timestamp is held by both the media result and the locations manager, so either give it to location manager entirely for KISS or have another think
+            
+            hash_ids_to_half_initialised_timestamp_managers = self.modules_files_timestamps.GetHashIdsToHalfInitialisedTimesManagers( hash_ids, temp_table_name )
+            
+            hash_ids_to_urls = self.modules_url_map.GetHashIdsToURLs( hash_ids_table_name = temp_table_name )
+            
+            hash_ids_to_service_ids_and_filenames = self.modules_service_paths.GetHashIdsToServiceIdsAndFilenames( temp_table_name )
+            
+            hash_ids_to_local_file_deletion_reasons = self.modules_files_storage.GetHashIdsToFileDeletionReasons( temp_table_name )
+            
+            hash_ids_to_file_viewing_stats = self.modules_files_viewing_stats.GetHashIdsToFileViewingStatsRows( temp_table_name )
+            
+            hash_ids_to_local_ratings = self.modules_ratings.GetHashIdsToRatings( temp_table_name )
+            
+            hash_ids_to_names_and_notes = self.modules_notes_map.GetHashIdsToNamesAndNotes( temp_table_name )
+            
+        
+        # build it
+        
+        service_ids_to_service_keys = self.modules_services.GetServiceIdsToServiceKeys()
+        
+        media_results = []
+        
+        for hash_id in hash_ids:
+            
+            file_info_manager = hash_ids_to_file_info_managers[ hash_id ]
+            tags_manager = hash_ids_to_tags_managers[ hash_id ]
+            
+            #
+            
+            current_file_service_keys_to_timestamps_ms = { service_ids_to_service_keys[ service_id ] : timestamp_ms for ( service_id, timestamp_ms ) in hash_ids_to_current_file_service_ids_to_timestamps_ms[ hash_id ].items() }
+            
+            deleted_file_service_keys_to_timestamps_ms = { service_ids_to_service_keys[ service_id ] : timestamp_ms for ( service_id, timestamp_ms ) in hash_ids_to_deleted_file_service_ids_to_timestamps_ms[ hash_id ].items() }
+            
+            deleted_file_service_keys_to_previously_imported_timestamps_ms = { service_ids_to_service_keys[ service_id ] : timestamp_ms for ( service_id, timestamp_ms ) in hash_ids_to_deleted_file_service_ids_to_previously_imported_timestamps_ms[ hash_id ].items() }
+            
+            pending_file_service_keys = { service_ids_to_service_keys[ service_id ] for service_id in hash_ids_to_pending_file_service_ids[ hash_id ] }
+            
+            petitioned_file_service_keys = { service_ids_to_service_keys[ service_id ] for service_id in hash_ids_to_petitioned_file_service_ids[ hash_id ] }
+            
+            inbox = hash_id in self.modules_files_inbox.inbox_hash_ids
+            
+            urls = hash_ids_to_urls[ hash_id ]
+            
+            service_ids_to_filenames = dict( hash_ids_to_service_ids_and_filenames[ hash_id ] )
+            
+            service_keys_to_filenames = { service_ids_to_service_keys[ service_id ] : filename for ( service_id, filename ) in service_ids_to_filenames.items() }
+            
+            if hash_id in hash_ids_to_half_initialised_timestamp_managers:
+                
+                times_manager = hash_ids_to_half_initialised_timestamp_managers[ hash_id ]
+                
+            else:
+                
+                times_manager = ClientMediaManagers.TimesManager()
+                
+            
+            times_manager.SetImportedTimestampsMS( current_file_service_keys_to_timestamps_ms )
+            times_manager.SetDeletedTimestampsMS( deleted_file_service_keys_to_timestamps_ms )
+            times_manager.SetPreviouslyImportedTimestampsMS( deleted_file_service_keys_to_previously_imported_timestamps_ms )
+            
+            local_file_deletion_reason = hash_ids_to_local_file_deletion_reasons.get( hash_id, None )
+            
+            locations_manager = ClientMediaManagers.LocationsManager(
+                set( current_file_service_keys_to_timestamps_ms.keys() ),
+                set( deleted_file_service_keys_to_timestamps_ms.keys() ),
+                pending_file_service_keys,
+                petitioned_file_service_keys,
+                times_manager,
+                inbox = inbox,
+                urls = urls,
+                service_keys_to_filenames = service_keys_to_filenames,
+                local_file_deletion_reason = local_file_deletion_reason
+            )
+            
+            #
+            
+            service_keys_to_ratings = { service_ids_to_service_keys[ service_id ] : rating for ( service_id, rating ) in hash_ids_to_local_ratings[ hash_id ] }
+            
+            ratings_manager = ClientMediaManagers.RatingsManager( service_keys_to_ratings )
+            
+            #
+            
+            if hash_id in hash_ids_to_names_and_notes:
+                
+                names_to_notes = dict( hash_ids_to_names_and_notes[ hash_id ] )
+                
+            else:
+                
+                names_to_notes = dict()
+                
+            
+            notes_manager = ClientMediaManagers.NotesManager( names_to_notes )
+            
+            #
+            
+            if hash_id in hash_ids_to_file_viewing_stats:
+                
+                file_viewing_stats = hash_ids_to_file_viewing_stats[ hash_id ]
+                
+                file_viewing_stats_manager = ClientMediaManagers.FileViewingStatsManager( times_manager, file_viewing_stats )
+                
+            else:
+                
+                file_viewing_stats_manager = ClientMediaManagers.FileViewingStatsManager.STATICGenerateEmptyManager( times_manager )
+                
+            
+            #
+            
+            media_results.append( ClientMediaResult.MediaResult( file_info_manager, tags_manager, times_manager, locations_manager, ratings_manager, notes_manager, file_viewing_stats_manager ) )
+            
+        
+        return media_results
+        
+    
     def GetFileInfoManagers( self, hash_ids: collections.abc.Collection[ int ], sorted = False ) -> list[ ClientMediaManagers.FileInfoManager ]:
         
         ( cached_media_results, missing_hash_ids ) = self._weakref_media_result_cache.GetMediaResultsAndMissing( hash_ids )
@@ -255,6 +404,82 @@ class ClientDBMediaResults( ClientDBModule.ClientDBModule ):
         return file_info_managers
         
     
+    def GetFileMetadataColumns( self, hash_ids: list[ int ], column_names: collections.abc.Collection[ str ], tag_service_keys: collections.abc.Collection[ bytes ] ) -> dict:
+        
+        # a lean alternative to media results for bulk api sync jobs. we only hit the tables asked for and hand back lists aligned to hash_ids
+        
+        columns = {}
+        
+        with self._MakeTemporaryIntegerTable( hash_ids, 'hash_id' ) as temp_table_name:
+            
+            self._AnalyzeTempTable( temp_table_name )
+            
+            files_info_column_names = [ column_name for column_name in FILES_INFO_METADATA_COLUMNS if column_name in column_names ]
+            
+            if len( files_info_column_names ) > 0:
+                
+                select_phrase = ', '.join( files_info_column_names )
+                
+                hash_ids_to_rows = { hash_id : row for ( hash_id, *row ) in self._Execute( 'SELECT hash_id, {} FROM {} CROSS JOIN files_info USING ( hash_id );'.format( select_phrase, temp_table_name ) ) }
+                
+                if 'mime' in files_info_column_names:
+                    
+                    hash_ids_to_forced_filetypes = self.modules_files_metadata_basic.GetHashIdsToForcedFiletypes( temp_table_name )
+                    
+                    mime_index = files_info_column_names.index( 'mime' )
+                    
+                    for ( hash_id, forced_mime ) in hash_ids_to_forced_filetypes.items():
+                        
+                        if hash_id in hash_ids_to_rows:
+                            
+                            hash_ids_to_rows[ hash_id ][ mime_index ] = forced_mime
+                            
+                        
+                    
+                
+                null_row = [ None ] * len( files_info_column_names )
+                
+                rows = [ hash_ids_to_rows.get( hash_id, null_row ) for hash_id in hash_ids ]
+                
+                for ( i, column_name ) in enumerate( files_info_column_names ):
+                    
+                    column = [ row[ i ] for row in rows ]
+                    
+                    if column_name == 'has_audio':
+                        
+                        column = [ None if value is None else bool( value ) for value in column ]
+                        
+                    
+                    columns[ column_name ] = column
+                    
+                
+            
+            if len( tag_service_keys ) > 0:
+                
+                service_keys_to_tag_columns = {}
+                
+                for tag_service_key in tag_service_keys:
+                    
+                    tag_service_id = self.modules_services.GetServiceId( tag_service_key )
+                    
+                    statuses_to_table_names = self.modules_mappings_storage.GetFastestStorageMappingTableNames( self.modules_services.combined_file_service_id, tag_service_id )
+                    
+                    current_mappings_table_name = statuses_to_table_names[ HC.CONTENT_STATUS_CURRENT ]
+                    
+                    hash_ids_to_tag_ids = HydrusData.BuildKeyToListDict( self._Execute( 'SELECT hash_id, tag_id FROM {} CROSS JOIN {} USING ( hash_id );'.format( temp_table_name, current_mappings_table_name ) ) )
+                    
+                    tag_ids_to_tags = self.modules_tags_local_cache.GetTagIdsToTags( tag_ids = set( itertools.chain.from_iterable( hash_ids_to_tag_ids.values() ) ) )
+                    
+                    service_keys_to_tag_columns[ tag_service_key ] = [ sorted( ( tag_ids_to_tags[ tag_id ] for tag_id in hash_ids_to_tag_ids[ hash_id ] ) ) if hash_id in hash_ids_to_tag_ids else [] for hash_id in hash_ids ]
+                    
+                
+                columns[ 'tags' ] = service_keys_to_tag_columns
+                
+            
+        
+        return columns
+        
+    
     def GetForceRefreshTagsManagers( self, hash_ids, hash_ids_to_current_file_service_ids = None ):
         
         with self._MakeTemporaryIntegerTable( hash_ids, 'hash_id' ) as temp_table_name:
@@ -401,140 +626,7 @@ class ClientDBMediaResults( ClientDBModule.ClientDBModule ):
         
         if len( missing_hash_ids ) > 0:
             
-            # get first detailed results
-            
-            with self._MakeTemporaryIntegerTable( missing_hash_ids, 'hash_id' ) as temp_table_name:
-                
-                # everything here is temp hashes to metadata
-                
-                file_info_managers = self.GenerateFileInfoManagers( missing_hash_ids, temp_table_name )
-                
-                hash_ids_to_file_info_managers = { file_info_manager.hash_id : file_info_manager for file_info_manager in file_info_managers }
-                
-                (
-                    hash_ids_to_current_file_service_ids_to_timestamps_ms,
-                    hash_ids_to_deleted_file_service_ids_to_timestamps_ms,
-                    hash_ids_to_deleted_file_service_ids_to_previously_imported_timestamps_ms,
-                    hash_ids_to_pending_file_service_ids,
-                    hash_ids_to_petitioned_file_service_ids
-                ) = self.modules_files_storage.GetHashIdsToServiceInfoDicts( temp_table_name )
-                
-                hash_ids_to_current_file_service_ids = { hash_id : list( file_service_ids_to_timestamps_ms.keys() ) for ( hash_id, file_service_ids_to_timestamps_ms ) in hash_ids_to_current_file_service_ids_to_timestamps_ms.items() }
-                
-                hash_ids_to_tags_managers = self.GetForceRefreshTagsManagersWithTableHashIds( missing_hash_ids, temp_table_name, hash_ids_to_current_file_service_ids = hash_ids_to_current_file_service_ids )
-                
-                # TODO: it is a little tricky, but it would be nice to have 'gettimestampmanagers' and 'getlocationsmanagers' here
-                # don't forget that timestamp is held by both the media result and the locations manager, so either give it to location manager entirely for KISS or have another think
-                
-                hash_ids_to_half_initialised_timestamp_managers = self.modules_files_timestamps.GetHashIdsToHalfInitialisedTimesManagers( missing_hash_ids, temp_table_name )
-                
-                hash_ids_to_urls = self.modules_url_map.GetHashIdsToURLs( hash_ids_table_name = temp_table_name )
-                
-                hash_ids_to_service_ids_and_filenames = self.modules_service_paths.GetHashIdsToServiceIdsAndFilenames( temp_table_name )
-                
-                hash_ids_to_local_file_deletion_reasons = self.modules_files_storage.GetHashIdsToFileDeletionReasons( temp_table_name )
-                
-                hash_ids_to_file_viewing_stats = self.modules_files_viewing_stats.GetHashIdsToFileViewingStatsRows( temp_table_name )
-                
-                hash_ids_to_local_ratings = self.modules_ratings.GetHashIdsToRatings( temp_table_name )
-                
-                hash_ids_to_names_and_notes = self.modules_notes_map.GetHashIdsToNamesAndNotes( temp_table_name )
-                
-            
-            # build it
-            
-            service_ids_to_service_keys = self.modules_services.GetServiceIdsToServiceKeys()
-            
-            missing_media_results = []
-            
-            for hash_id in missing_hash_ids:
-                
-                file_info_manager = hash_ids_to_file_info_managers[ hash_id ]
-                tags_manager = hash_ids_to_tags_managers[ hash_id ]
-                
-                #
-                
-                current_file_service_keys_to_timestamps_ms = { service_ids_to_service_keys[ service_id ] : timestamp_ms for ( service_id, timestamp_ms ) in hash_ids_to_current_file_service_ids_to_timestamps_ms[ hash_id ].items() }
-                
-                deleted_file_service_keys_to_timestamps_ms = { service_ids_to_service_keys[ service_id ] : timestamp_ms for ( service_id, timestamp_ms ) in hash_ids_to_deleted_file_service_ids_to_timestamps_ms[ hash_id ].items() }
-                
-                deleted_file_service_keys_to_previously_imported_timestamps_ms = { service_ids_to_service_keys[ service_id ] : timestamp_ms for ( service_id, timestamp_ms ) in hash_ids_to_deleted_file_service_ids_to_previously_imported_timestamps_ms[ hash_id ].items() }
-                
-                pending_file_service_keys = { service_ids_to_service_keys[ service_id ] for service_id in hash_ids_to_pending_file_service_ids[ hash_id ] }
-                
-                petitioned_file_service_keys = { service_ids_to_service_keys[ service_id ] for service_id in hash_ids_to_petitioned_file_service_ids[ hash_id ] }
-                
-                inbox = hash_id in self.modules_files_inbox.inbox_hash_ids
-                
-                urls = hash_ids_to_urls[ hash_id ]
-                
-                service_ids_to_filenames = dict( hash_ids_to_service_ids_and_filenames[ hash_id ] )
-                
-                service_keys_to_filenames = { service_ids_to_service_keys[ service_id ] : filename for ( service_id, filename ) in service_ids_to_filenames.items() }
-                
-                if hash_id in hash_ids_to_half_initialised_timestamp_managers:
-                    
-                    times_manager = hash_ids_to_half_initialised_timestamp_managers[ hash_id ]
-                    
-                else:
-                    
-                    times_manager = ClientMediaManagers.TimesManager()
-                    
-                
-                times_manager.SetImportedTimestampsMS( current_file_service_keys_to_timestamps_ms )
-                times_manager.SetDeletedTimestampsMS( deleted_file_service_keys_to_timestamps_ms )
-                times_manager.SetPreviouslyImportedTimestampsMS( deleted_file_service_keys_to_previously_imported_timestamps_ms )
-                
-                local_file_deletion_reason = hash_ids_to_local_file_deletion_reasons.get( hash_id, None )
-                
-                locations_manager = ClientMediaManagers.LocationsManager(
-                    set( current_file_service_keys_to_timestamps_ms.keys() ),
-                    set( deleted_file_service_keys_to_timestamps_ms.keys() ),
-                    pending_file_service_keys,
-                    petitioned_file_service_keys,
-                    times_manager,
-                    inbox = inbox,
-                    urls = urls,
-                    service_keys_to_filenames = service_keys_to_filenames,
-                    local_file_deletion_reason = local_file_deletion_reason
-                )
-                
-                #
-                
-                service_keys_to_ratings = { service_ids_to_service_keys[ service_id ] : rating for ( service_id, rating ) in hash_ids_to_local_ratings[ hash_id ] }
-                
-                ratings_manager = ClientMediaManagers.RatingsManager( service_keys_to_ratings )
-                
-                #
-                
-                if hash_id in hash_ids_to_names_and_notes:
-                    
-                    names_to_notes = dict( hash_ids_to_names_and_notes[ hash_id ] )
-                    
-                else:
-                    
-                    names_to_notes = dict()
-                    
-                
-                notes_manager = ClientMediaManagers.NotesManager( names_to_notes )
-                
-                #
-                
-                if hash_id in hash_ids_to_file_viewing_stats:
-                    
-                    file_viewing_stats = hash_ids_to_file_viewing_stats[ hash_id ]
-                    
-                    file_viewing_stats_manager = ClientMediaManagers.FileViewingStatsManager( times_manager, file_viewing_stats )
-                    
-                else:
-                    
-                    file_viewing_stats_manager = ClientMediaManagers.FileViewingStatsManager.STATICGenerateEmptyManager( times_manager )
-                    
-                
-                #
-                
-                missing_media_results.append( ClientMediaResult.MediaResult( file_info_manager, tags_manager, times_manager, locations_manager, ratings_manager, notes_manager, file_viewing_stats_manager ) )
-                
+            missing_media_results = self.GenerateMediaResults( missing_hash_ids )
             
             self._weakref_media_result_cache.AddMediaResults( missing_media_results )
             
@@ -642,3 +734,24 @@ class ClientDBMediaResults( ClientDBModule.ClientDBModule ):
         return work_done
         
     
+    def RevalidateMediaResults( self, hash_ids: collections.abc.Collection[ int ] ):
+        
+        # we read and swap in this one job, so no content update can get between them and be lost
+        
+        hash_ids_to_do = self._weakref_media_result_cache.FilterFiles( hash_ids )
+        
+        if len( hash_ids_to_do ) > 0:
+            
+            fresh_media_results = self.GenerateMediaResults( hash_ids_to_do )
+            
+            updated_hashes = self._weakref_media_result_cache.SilentlyTakeFreshMediaResults( fresh_media_results )
+            
+            if len( updated_hashes ) > 0:
+                
+                # same as the file info and tag refreshes, so anything already showing these files redraws. the file bytes have not changed, so no cache clear
+                CG.client_controller.pub( 'notify_files_need_redraw', updated_hashes )
+                CG.client_controller.pub( 'refresh_all_tag_presentation_gui' )
+                
+            
+        
+    
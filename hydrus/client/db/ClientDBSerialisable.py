@@ -5,9 +5,11 @@ import sqlite3
 import time
 import typing
 
+from hydrus.core import HydrusCompression
 from hydrus.core import HydrusData
 from hydrus.core import HydrusDBBase
 from hydrus.core import HydrusExceptions
+from hydrus.core import HydrusNumbers
 from hydrus.core import HydrusSerialisable
 from hydrus.core import HydrusTime
 
@@ -15,6 +17,9 @@ from hydrus.client import ClientGlobals as CG
 from hydrus.client.db import ClientDBModule
 from hydrus.client.db import ClientDBServices
 
+# small dumps are not worth the cpu
+MIN_COMPRESSED_DUMP_SIZE = 1024
+
 YAML_DUMP_ID_SINGLE = 0
 YAML_DUMP_ID_REMOTE_BOORU = 1
 YAML_DUMP_ID_FAVOURITE_CUSTOM_FILTER_ACTIONS = 2
@@ -76,7 +81,21 @@ def DealWithBrokenJSONDump( db_dir, dump, dump_object_descriptor, dump_descripto
     
     raise HydrusExceptions.SerialisationException( message )
     
-def GenerateBigSQLiteDumpBuffer( dump ):
+def ConvertDumpToString( dump ) -> str:
+    
+    if isinstance( dump, bytes ):
+        
+        if HydrusCompression.IsFramed( dump ):
+            
+            return HydrusCompression.DecompressBytesToString( dump )
+            
+        
+        dump = str( dump, 'utf-8' )
+        
+    
+    return dump
+    
+def GenerateBigSQLiteDumpBuffer( dump, codec = None ):
     
     try:
         
@@ -89,6 +108,11 @@ def GenerateBigSQLiteDumpBuffer( dump ):
         raise Exception( 'While trying to save data to the database, it could not be decoded from UTF-8 to bytes! This could indicate an encoding error, such as Shift JIS sneaking into a downloader page! Please let hydrus dev know about this! Full error was written to the log!' )
         
     
+    if codec is not None and len( dump_bytes ) >= MIN_COMPRESSED_DUMP_SIZE:
+        
+        dump_bytes = HydrusCompression.CompressBytesToBytes( dump_bytes, codec = codec )
+        
+    
     if len( dump_bytes ) >= 1000000000: # 1 billion, not 1GB https://sqlite.org/limits.html
         
         raise Exception( 'A data object could not save to the database because it was bigger than a buffer limit of 1,000,000,000 bytes! If your session has a page with >500k files/URLs, reduce its size NOW or you will lose it from your session on next load! On a download page, try clicking the arrow on the file log and clearing out successful imports. Otherwise, please report this to hydrus dev!' )
@@ -163,13 +187,33 @@ class ClientDBSerialisable( ClientDBModule.ClientDBModule ):
         }
         
     
+    def _GetDumpCodec( self, dump_type ):
+        
+        # the options stay plain, so a client that has lost its zstd library can still boot and turn this off
+        if dump_type == HydrusSerialisable.SERIALISABLE_TYPE_CLIENT_OPTIONS:
+            
+            return None
+            
+        
+        codec = CG.client_controller.new_options.GetNoneableInteger( 'json_dump_compression_codec' )
+        
+        if codec is not None and not HydrusCompression.CodecIsAvailable( codec ):
+            
+            codec = HydrusCompression.CODEC_ZLIB
+            
+        
+        return codec
+        
+    
     def _GetInitialTableGenerationDict( self ) -> dict:
         
         return {
             'main.json_dict' : ( 'CREATE TABLE IF NOT EXISTS {} ( name TEXT PRIMARY KEY, dump BLOB_BYTES );', 400 ),
             'main.json_dumps' : ( 'CREATE TABLE IF NOT EXISTS {} ( dump_type INTEGER PRIMARY KEY, version INTEGER, dump BLOB_BYTES );', 400 ),
             'main.json_dumps_named' : ( 'CREATE TABLE IF NOT EXISTS {} ( dump_type INTEGER, dump_name TEXT, version INTEGER, timestamp_ms INTEGER, dump BLOB_BYTES, PRIMARY KEY ( dump_type, dump_name, timestamp_ms ) );', 400 ),
-            'main.json_dumps_hashed' : ( 'CREATE TABLE IF NOT EXISTS {} ( hash BLOB_BYTES PRIMARY KEY, dump_type INTEGER, version INTEGER, dump BLOB_BYTES );', 442 )
+            'main.json_dumps_hashed' : ( 'CREATE TABLE IF NOT EXISTS {} ( hash BLOB_BYTES PRIMARY KEY, dump_type INTEGER, version INTEGER, dump BLOB_BYTES );', 442 ),
+            'main.json_dumps_hashed_file_seed_chunks' : ( 'CREATE TABLE IF NOT EXISTS {} ( hash BLOB_BYTES, file_seed_chunk_hash BLOB_BYTES, PRIMARY KEY ( hash, file_seed_chunk_hash ) );', 683 ),
+            'main.file_seed_chunks' : ( 'CREATE TABLE IF NOT EXISTS {} ( file_seed_chunk_hash BLOB_BYTES PRIMARY KEY, dump BLOB_BYTES );', 683 )
         }
         
     
@@ -194,6 +238,78 @@ class ClientDBSerialisable( ClientDBModule.ClientDBModule ):
             
         
     
+    def _GetFileSeedChunks( self, file_seed_chunk_hashes: collections.abc.Collection[ bytes ] ):
+        
+        hashes_to_serialisable_file_seed_chunks = {}
+        
+        for file_seed_chunk_hash in file_seed_chunk_hashes:
+            
+            result = self._Execute( 'SELECT dump FROM file_seed_chunks WHERE file_seed_chunk_hash = ?;', ( sqlite3.Binary( file_seed_chunk_hash ), ) ).fetchone()
+            
+            if result is None:
+                
+                HydrusData.Print( 'Was asked to fetch file log chunk "{}", but it was missing!'.format( file_seed_chunk_hash.hex() ) )
+                
+                continue
+                
+            
+            ( dump, ) = result
+            
+            try:
+                
+                dump = ConvertDumpToString( dump )
+                
+                serialisable_file_seed_chunk = json.loads( dump )
+                
+            except HydrusExceptions.UnsupportedCodecException:
+                
+                raise
+                
+            except Exception as e:
+                
+                HydrusData.Print( 'Was asked to fetch file log chunk "{}", but it was malformed!'.format( file_seed_chunk_hash.hex() ) )
+                
+                continue
+                
+            
+            hashes_to_serialisable_file_seed_chunks[ file_seed_chunk_hash ] = serialisable_file_seed_chunk
+            
+        
+        num_missing = len( file_seed_chunk_hashes ) - len( hashes_to_serialisable_file_seed_chunks )
+        
+        if num_missing > 0:
+            
+            HydrusData.ShowText( 'A session page was missing {} chunks of its file log! Those import items will not be in the page. If you have had any other database or hard drive issues recently, please check the \'Recovery->Help my db is broke\' document in the help.'.format( HydrusNumbers.ToHumanInt( num_missing ) ) )
+            
+        
+        return hashes_to_serialisable_file_seed_chunks
+        
+    
+    def _SetFileSeedChunks( self, hash: bytes, hashes_to_serialisable_file_seed_chunks ):
+        
+        # each chunk is stored once, so a page with a big file log only writes the chunks that changed since its last save
+        
+        for ( file_seed_chunk_hash, serialisable_file_seed_chunk ) in hashes_to_serialisable_file_seed_chunks.items():
+            
+            if self._Execute( 'SELECT 1 FROM file_seed_chunks WHERE file_seed_chunk_hash = ?;', ( sqlite3.Binary( file_seed_chunk_hash ), ) ).fetchone() is not None:
+                
+                continue
+                
+            
+            dump = json.dumps( serialisable_file_seed_chunk )
+            
+            maintenance_tracker = MaintenanceTracker.instance()
+            
+            maintenance_tracker.RegisterNewHashedSerialisable( len( dump ) )
+            
+            dump_buffer = GenerateBigSQLiteDumpBuffer( dump, codec = self._GetDumpCodec( HydrusSerialisable.SERIALISABLE_TYPE_FILE_SEED_CACHE ) )
+            
+            self._Execute( 'INSERT INTO file_seed_chunks ( file_seed_chunk_hash, dump ) VALUES ( ?, ? );', ( sqlite3.Binary( file_seed_chunk_hash ), dump_buffer ) )
+            
+        
+        self._ExecuteMany( 'INSERT OR IGNORE INTO json_dumps_hashed_file_seed_chunks ( hash, file_seed_chunk_hash ) VALUES ( ?, ? );', ( ( sqlite3.Binary( hash ), sqlite3.Binary( file_seed_chunk_hash ) ) for file_seed_chunk_hash in hashes_to_serialisable_file_seed_chunks.keys() ) )
+        
+    
     def GetAllExpectedHashedJSONHashes( self ) -> collections.abc.Collection[ bytes ]:
         
         all_expected_hashes = set()
@@ -248,13 +364,15 @@ class ClientDBSerialisable( ClientDBModule.ClientDBModule ):
             
             try:
                 
-                if isinstance( dump, bytes ):
-                    
-                    dump = str( dump, 'utf-8' )
-                    
+                dump = ConvertDumpToString( dump )
                 
                 serialisable_info = json.loads( dump )
                 
+            except HydrusExceptions.UnsupportedCodecException:
+                
+                # not a broken dump, so don't delete it!
+                raise
+                
             except Exception as e:
                 
                 self._Execute( 'DELETE FROM json_dumps_hashed WHERE hash = ?;', ( sqlite3.Binary( hash ), ) )
@@ -283,6 +401,15 @@ class ClientDBSerialisable( ClientDBModule.ClientDBModule ):
             
             obj = HydrusSerialisable.CreateFromSerialisableTuple( ( dump_type, version, serialisable_info ) )
             
+            if dump_type == HydrusSerialisable.SERIALISABLE_TYPE_GUI_SESSION_PAGE_DATA:
+                
+                # noinspection PyUnresolvedReferences
+                hashes_to_serialisable_file_seed_chunks = self._GetFileSeedChunks( obj.GetFileSeedChunkHashes() )
+                
+                # noinspection PyUnresolvedReferences
+                obj.SetFileSeedChunks( hashes_to_serialisable_file_seed_chunks )
+                
+            
             hashes_to_objs[ hash ] = obj
             
         
@@ -321,13 +448,15 @@ class ClientDBSerialisable( ClientDBModule.ClientDBModule ):
             
             try:
                 
-                if isinstance( dump, bytes ):
-                    
-                    dump = str( dump, 'utf-8' )
-                    
+                dump = ConvertDumpToString( dump )
                 
                 serialisable_info = json.loads( dump )
                 
+            except HydrusExceptions.UnsupportedCodecException:
+                
+                # not a broken dump, so don't delete it!
+                raise
+                
             except Exception as e:
                 
                 self._Execute( 'DELETE FROM json_dumps WHERE dump_type = ?;', ( dump_type, ) )
@@ -368,15 +497,17 @@ class ClientDBSerialisable( ClientDBModule.ClientDBModule ):
                 
                 try:
                     
-                    if isinstance( dump, bytes ):
-                        
-                        dump = str( dump, 'utf-8' )
-                        
+                    dump = ConvertDumpToString( dump )
                     
                     serialisable_info = json.loads( dump )
                     
                     objs.append( HydrusSerialisable.CreateFromSerialisableTuple( ( dump_type, dump_name, version, serialisable_info ) ) )
                     
+                except HydrusExceptions.UnsupportedCodecException:
+                    
+                    # not a broken dump, so don't delete it!
+                    raise
+                    
                 except Exception as e:
                     
                     self._Execute( 'DELETE FROM json_dumps_named WHERE dump_type = ? AND dump_name = ? AND timestamp_ms = ?;', ( dump_type, dump_name, object_timestamp_ms ) )
@@ -409,13 +540,15 @@ class ClientDBSerialisable( ClientDBModule.ClientDBModule ):
             
             try:
                 
-                if isinstance( dump, bytes ):
-                    
-                    dump = str( dump, 'utf-8' )
-                    
+                dump = ConvertDumpToString( dump )
                 
                 serialisable_info = json.loads( dump )
                 
+            except HydrusExceptions.UnsupportedCodecException:
+                
+                # not a broken dump, so don't delete it!
+                raise
+                
             except Exception as e:
                 
                 self._Execute( 'DELETE FROM json_dumps_named WHERE dump_type = ? AND dump_name = ? AND timestamp_ms = ?;', ( dump_type, dump_name, object_timestamp_ms ) )
@@ -464,10 +597,7 @@ class ClientDBSerialisable( ClientDBModule.ClientDBModule ):
         
         ( dump, ) = result
         
-        if isinstance( dump, bytes ):
-            
-            dump = str( dump, 'utf-8' )
-            
+        dump = ConvertDumpToString( dump )
         
         value = json.loads( dump )
         
@@ -522,6 +652,9 @@ class ClientDBSerialisable( ClientDBModule.ClientDBModule ):
             self._ExecuteMany( 'DELETE FROM json_dumps_hashed WHERE hash = ?;', ( ( sqlite3.Binary( hash ), ) for hash in all_deletee_hashes ) )
             
         
+        self._Execute( 'DELETE FROM json_dumps_hashed_file_seed_chunks WHERE hash NOT IN ( SELECT hash FROM json_dumps_hashed );' )
+        self._Execute( 'DELETE FROM file_seed_chunks WHERE file_seed_chunk_hash NOT IN ( SELECT file_seed_chunk_hash FROM json_dumps_hashed_file_seed_chunks );' )
+        
         maintenance_tracker.NotifyHashedSerialisableMaintenanceDone()
         
         return len( all_deletee_hashes )
@@ -551,6 +684,12 @@ class ClientDBSerialisable( ClientDBModule.ClientDBModule ):
             
             ( dump_type, version, serialisable_info ) = obj.GetSerialisableTuple()
             
+            if dump_type == HydrusSerialisable.SERIALISABLE_TYPE_GUI_SESSION_PAGE_DATA:
+                
+                # noinspection PyUnresolvedReferences
+                self._SetFileSeedChunks( hash, obj.GetFileSeedChunks() )
+                
+            
             try:
                 
                 dump = json.dumps( serialisable_info )
@@ -568,7 +707,7 @@ class ClientDBSerialisable( ClientDBModule.ClientDBModule ):
             
             maintenance_tracker.RegisterNewHashedSerialisable( len( dump ) )
             
-            dump_buffer = GenerateBigSQLiteDumpBuffer( dump )
+            dump_buffer = GenerateBigSQLiteDumpBuffer( dump, codec = self._GetDumpCodec( dump_type ) )
             
             try:
                 
@@ -671,7 +810,7 @@ class ClientDBSerialisable( ClientDBModule.ClientDBModule ):
                 object_timestamp_ms = force_timestamp_ms
                 
             
-            dump_buffer = GenerateBigSQLiteDumpBuffer( dump )
+            dump_buffer = GenerateBigSQLiteDumpBuffer( dump, codec = self._GetDumpCodec( dump_type ) )
             
             try:
                 
@@ -766,7 +905,7 @@ class ClientDBSerialisable( ClientDBModule.ClientDBModule ):
             
             self._Execute( 'DELETE FROM json_dumps WHERE dump_type = ?;', ( dump_type, ) )
             
-            dump_buffer = GenerateBigSQLiteDumpBuffer( dump )
+            dump_buffer = GenerateBigSQLiteDumpBuffer( dump, codec = self._GetDumpCodec( dump_type ) )
             
             try:
                 
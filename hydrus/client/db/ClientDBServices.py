@@ -1,6 +1,7 @@
 import collections.abc
 import itertools
 import sqlite3
+import threading
 import typing
 
 from hydrus.core import HydrusConstants as HC
@@ -70,6 +71,9 @@ class ClientDBMasterServices( ClientDBModule.ClientDBModule ):
         
         super().__init__( 'client services master', cursor )
         
+        # read-only pool copies of us share these with the main thread, so anything that iterates or changes them holds the lock
+        self._services_lock = threading.Lock()
+        
         self._service_ids_to_services = {}
         self._service_keys_to_service_ids = {}
         
@@ -99,6 +103,11 @@ class ClientDBMasterServices( ClientDBModule.ClientDBModule ):
         }
         
     
+    def _GetReadPoolSharedAttributeNames( self ) -> collections.abc.Collection[ str ]:
+        
+        return ( '_services_lock', '_service_ids_to_services', '_service_keys_to_service_ids' )
+        
+    
     def _InitCaches( self ):
         
         if self._Execute( 'SELECT 1 FROM sqlite_master WHERE name = ?;', ( 'services', ) ).fetchone() is not None:
@@ -111,9 +120,12 @@ class ClientDBMasterServices( ClientDBModule.ClientDBModule ):
                 
                 service = ClientServices.GenerateService( service_key, service_type, name, dictionary )
                 
-                self._service_ids_to_services[ service_id ] = service
-                
-                self._service_keys_to_service_ids[ service_key ] = service_id
+                with self._services_lock:
+                    
+                    self._service_ids_to_services[ service_id ] = service
+                    
+                    self._service_keys_to_service_ids[ service_key ] = service_id
+                    
                 
             
             self.local_update_service_id = self.GetServiceId( CC.LOCAL_UPDATE_SERVICE_KEY )
@@ -147,8 +159,11 @@ class ClientDBMasterServices( ClientDBModule.ClientDBModule ):
         
         service = ClientServices.GenerateService( service_key, service_type, name, dictionary )
         
-        self._service_ids_to_services[ service_id ] = service
-        self._service_keys_to_service_ids[ service_key ] = service_id
+        with self._services_lock:
+            
+            self._service_ids_to_services[ service_id ] = service
+            self._service_keys_to_service_ids[ service_key ] = service_id
+            
         
         if service_key == CC.LOCAL_UPDATE_SERVICE_KEY:
             
@@ -184,15 +199,18 @@ class ClientDBMasterServices( ClientDBModule.ClientDBModule ):
     
     def DeleteService( self, service_id ):
         
-        if service_id in self._service_ids_to_services:
-            
-            service_key = self._service_ids_to_services[ service_id ].GetServiceKey()
-            
-            del self._service_ids_to_services[ service_id ]
+        with self._services_lock:
             
-            if service_key in self._service_keys_to_service_ids:
+            if service_id in self._service_ids_to_services:
                 
-                del self._service_keys_to_service_ids[ service_key ]
+                service_key = self._service_ids_to_services[ service_id ].GetServiceKey()
+                
+                del self._service_ids_to_services[ service_id ]
+                
+                if service_key in self._service_keys_to_service_ids:
+                    
+                    del self._service_keys_to_service_ids[ service_key ]
+                    
                 
             
         
@@ -254,16 +272,22 @@ class ClientDBMasterServices( ClientDBModule.ClientDBModule ):
     
     def GetNonDupeName( self, name ) -> str:
         
-        existing_names = { service.GetName() for service in self._service_ids_to_services.values() }
+        with self._services_lock:
+            
+            existing_names = { service.GetName() for service in self._service_ids_to_services.values() }
+            
+        
         
         return HydrusData.GetNonDupeName( name, existing_names, do_casefold = True )
         
     
     def GetService( self, service_id ) -> typing.Any:
         
-        if service_id in self._service_ids_to_services:
+        service = self._service_ids_to_services.get( service_id, None )
+        
+        if service is not None:
             
-            return self._service_ids_to_services[ service_id ]
+            return service
             
         
         raise HydrusExceptions.DataMissing( 'Service id error in database: id "{}" does not exist!'.format( service_id ) )
@@ -271,14 +295,20 @@ class ClientDBMasterServices( ClientDBModule.ClientDBModule ):
     
     def GetServices( self, limited_types = HC.ALL_SERVICES ):
         
-        return [ service for service in self._service_ids_to_services.values() if service.GetServiceType() in limited_types ]
+        with self._services_lock:
+            
+            return [ service for service in self._service_ids_to_services.values() if service.GetServiceType() in limited_types ]
+            
+        
         
     
     def GetServiceId( self, service_key: bytes ) -> int:
         
-        if service_key in self._service_keys_to_service_ids:
+        service_id = self._service_keys_to_service_ids.get( service_key, None )
+        
+        if service_id is not None:
             
-            return self._service_keys_to_service_ids[ service_key ]
+            return service_id
             
         
         raise HydrusExceptions.DataMissing( 'Service id error in database: key "{}" does not exist!'.format( service_key.hex() ) )
@@ -286,12 +316,20 @@ class ClientDBMasterServices( ClientDBModule.ClientDBModule ):
     
     def GetServiceIds( self, service_types ) -> set[ int ]:
         
-        return { service_id for ( service_id, service ) in self._service_ids_to_services.items() if service.GetServiceType() in service_types }
+        with self._services_lock:
+            
+            return { service_id for ( service_id, service ) in self._service_ids_to_services.items() if service.GetServiceType() in service_types }
+            
+        
         
     
     def GetServiceIdsToServiceKeys( self ) -> dict[ int, bytes ]:
         
-        return { service_id : service_key for ( service_key, service_id ) in self._service_keys_to_service_ids.items() }
+        with self._services_lock:
+            
+            return { service_id : service_key for ( service_key, service_id ) in self._service_keys_to_service_ids.items() }
+            
+        
         
     
     def GetServiceKey( self, service_id: int ) -> bytes:
@@ -301,14 +339,20 @@ class ClientDBMasterServices( ClientDBModule.ClientDBModule ):
     
     def GetServiceKeys( self ) -> set[ bytes ]:
         
-        return set( self._service_keys_to_service_ids.keys() )
+        with self._services_lock:
+            
+            return set( self._service_keys_to_service_ids.keys() )
+            
+        
         
     
     def GetServiceType( self, service_id ) -> ClientServices.Service:
         
-        if service_id in self._service_ids_to_services:
+        service = self._service_ids_to_services.get( service_id, None )
+        
+        if service is not None:
             
-            return self._service_ids_to_services[ service_id ].GetServiceType()
+            return service.GetServiceType()
             
         
         raise HydrusExceptions.DataMissing( 'Service id error in database: id "{}" does not exist!'.format( service_id ) )
@@ -326,14 +370,17 @@ class ClientDBMasterServices( ClientDBModule.ClientDBModule ):
             
             service_keys = service_specifier.GetServiceKeys()
             
-            service_ids = [ self._service_keys_to_service_ids[ service_key ] for service_key in service_keys  if service_key in self._service_keys_to_service_ids ]
+            with self._services_lock:
+                
+                service_ids = [ self._service_keys_to_service_ids[ service_key ] for service_key in service_keys  if service_key in self._service_keys_to_service_ids ]
+                
             
         
         service_types_to_service_ids = collections.defaultdict( list )
         
         for service_id in service_ids:
             
-            service_types_to_service_ids[ self._service_ids_to_services[ service_id ].GetServiceType() ].append( service_id )
+            service_types_to_service_ids[ self.GetServiceType( service_id ) ].append( service_id )
             
         
         return service_types_to_service_ids
@@ -374,7 +421,10 @@ class ClientDBMasterServices( ClientDBModule.ClientDBModule ):
         
         self._Execute( 'UPDATE services SET name = ?, dictionary_string = ? WHERE service_id = ?;', ( name, dictionary_string, service_id ) )
         
-        self._service_ids_to_services[ service_id ] = service
+        with self._services_lock:
+            
+            self._service_ids_to_services[ service_id ] = service
+            
         
         service.SetClean()
         
@@ -1,7 +1,9 @@
 import collections
 import collections.abc
-import random
 import sqlite3
+import threading
+
+import numpy
 
 from hydrus.core import HydrusConstants as HC
 from hydrus.core import HydrusData
@@ -18,148 +20,233 @@ from hydrus.client.db import ClientDBModule
 from hydrus.client.db import ClientDBMaster
 from hydrus.client.db import ClientDBServices
 
-class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
+# numpy 2.0 has a native popcount, otherwise we fall back to a byte lookup table
+NUMPY_HAS_BITWISE_COUNT = hasattr( numpy, 'bitwise_count' )
+
+BYTE_POPCOUNT_LOOKUP = numpy.array( [ bin( i ).count( '1' ) for i in range( 256 ) ], dtype = numpy.uint8 )
+
+def GetHammingDistancesFromPackedPerceptualHashes( packed_perceptual_hashes: numpy.ndarray, search_packed_perceptual_hash: numpy.uint64 ) -> numpy.ndarray:
     
-    def __init__(
-        self,
-        cursor: sqlite3.Cursor,
-        cursor_transaction_wrapper: HydrusDBBase.DBCursorTransactionWrapper,
-        modules_services: ClientDBServices.ClientDBMasterServices,
-        modules_hashes: ClientDBMaster.ClientDBMasterHashes,
-        modules_files_storage: ClientDBFilesStorage.ClientDBFilesStorage
-    ):
+    xored = numpy.bitwise_xor( packed_perceptual_hashes, search_packed_perceptual_hash )
+    
+    if NUMPY_HAS_BITWISE_COUNT:
         
-        self._cursor_transaction_wrapper = cursor_transaction_wrapper
-        self.modules_services = modules_services
-        self.modules_hashes = modules_hashes
-        self.modules_files_storage = modules_files_storage
+        return numpy.bitwise_count( xored )
         
-        self._reported_on_a_broken_branch = False
+    else:
         
-        super().__init__( 'client similar files', cursor )
+        return BYTE_POPCOUNT_LOOKUP[ xored.view( numpy.uint8 ) ].reshape( -1, 8 ).sum( axis = 1, dtype = numpy.uint8 )
         
-        self._perceptual_hash_id_to_vp_tree_node_cache = {}
-        self._non_vp_treed_perceptual_hash_ids = set()
-        self._root_node_perceptual_hash_id = None
+    
+
+def PackPerceptualHashes( perceptual_hashes: collections.abc.Sequence[ bytes ] ) -> numpy.ndarray:
+    
+    # hamming distance does not care about byte order, as long as we are consistent
+    
+    return numpy.frombuffer( b''.join( perceptual_hashes ), dtype = numpy.uint64 ).copy()
+    
+
+class PerceptualHashIndex( object ):
+    
+    # every perceptual hash we know about, packed in two parallel arrays, scanned with xor + popcount
+    # this replaced walking the VP-tree with a SELECT per layer. a linear scan of a few million uint64s is a few ms, and it is all in C
+    
+    def __init__( self ):
+        
+        self._lock = threading.Lock()
+        
+        self._perceptual_hash_ids = numpy.empty( 0, dtype = numpy.int64 )
+        self._packed_perceptual_hashes = numpy.empty( 0, dtype = numpy.uint64 )
+        
+        self._pending_perceptual_hash_ids_to_perceptual_hashes = {}
+        self._pending_removee_perceptual_hash_ids = set()
         
     
-    def _AddLeaf( self, perceptual_hash_id, perceptual_hash ):
+    def _MergePending( self ):
         
-        result = self._Execute( 'SELECT phash_id FROM shape_vptree WHERE parent_id IS NULL;' ).fetchone()
+        if len( self._pending_perceptual_hash_ids_to_perceptual_hashes ) == 0 and len( self._pending_removee_perceptual_hash_ids ) == 0:
+            
+            return
+            
         
-        parent_id = None
+        # an id can come back after a rollback, so a new row always overwrites any existing one
+        removee_perceptual_hash_ids = self._pending_removee_perceptual_hash_ids.union( self._pending_perceptual_hash_ids_to_perceptual_hashes.keys() )
         
-        if result is not None:
+        if len( removee_perceptual_hash_ids ) > 0 and len( self._perceptual_hash_ids ) > 0:
             
-            ( root_node_perceptual_hash_id, ) = result
+            keep_mask = numpy.isin( self._perceptual_hash_ids, numpy.fromiter( removee_perceptual_hash_ids, dtype = numpy.int64, count = len( removee_perceptual_hash_ids ) ), invert = True )
             
-            ancestors_we_are_inside = []
-            ancestors_we_are_outside = []
+            self._perceptual_hash_ids = self._perceptual_hash_ids[ keep_mask ]
+            self._packed_perceptual_hashes = self._packed_perceptual_hashes[ keep_mask ]
             
-            an_ancestor_is_unbalanced = False
+        
+        if len( self._pending_perceptual_hash_ids_to_perceptual_hashes ) > 0:
             
-            next_ancestor_id = root_node_perceptual_hash_id
+            new_perceptual_hash_ids = list( self._pending_perceptual_hash_ids_to_perceptual_hashes.keys() )
+            new_perceptual_hashes = [ self._pending_perceptual_hash_ids_to_perceptual_hashes[ perceptual_hash_id ] for perceptual_hash_id in new_perceptual_hash_ids ]
             
-            while next_ancestor_id is not None:
-                
-                ancestor_id = next_ancestor_id
-                
-                result = self._Execute( 'SELECT phash, radius, inner_id, inner_population, outer_id, outer_population FROM shape_perceptual_hashes NATURAL JOIN shape_vptree WHERE phash_id = ?;', ( ancestor_id, ) ).fetchone()
+            self._perceptual_hash_ids = numpy.concatenate( ( self._perceptual_hash_ids, numpy.array( new_perceptual_hash_ids, dtype = numpy.int64 ) ) )
+            self._packed_perceptual_hashes = numpy.concatenate( ( self._packed_perceptual_hashes, PackPerceptualHashes( new_perceptual_hashes ) ) )
+            
+        
+        self._pending_perceptual_hash_ids_to_perceptual_hashes = {}
+        self._pending_removee_perceptual_hash_ids = set()
+        
+    
+    def AddPerceptualHash( self, perceptual_hash_id: int, perceptual_hash: bytes ):
+        
+        with self._lock:
+            
+            self._pending_removee_perceptual_hash_ids.discard( perceptual_hash_id )
+            
+            self._pending_perceptual_hash_ids_to_perceptual_hashes[ perceptual_hash_id ] = perceptual_hash
+            
+        
+    
+    def Clear( self ):
+        
+        with self._lock:
+            
+            self._perceptual_hash_ids = numpy.empty( 0, dtype = numpy.int64 )
+            self._packed_perceptual_hashes = numpy.empty( 0, dtype = numpy.uint64 )
+            
+            self._pending_perceptual_hash_ids_to_perceptual_hashes = {}
+            self._pending_removee_perceptual_hash_ids = set()
+            
+        
+    
+    def GetNumPerceptualHashes( self ) -> int:
+        
+        with self._lock:
+            
+            self._MergePending()
+            
+            return len( self._perceptual_hash_ids )
+            
+        
+    
+    def RemovePerceptualHashIds( self, perceptual_hash_ids: collections.abc.Collection[ int ] ):
+        
+        with self._lock:
+            
+            for perceptual_hash_id in perceptual_hash_ids:
                 
-                if result is None:
-                    
-                    if not self._reported_on_a_broken_branch:
-                        
-                        message = 'Hey, while trying to import a file, hydrus discovered a hole in the similar files search tree. Please run _database->regenerate->similar files search tree_ when it is convenient!'
-                        message += '\n' * 2
-                        message += 'To stop spam, this message will only show one time per program boot. The error may happen again, silently.'
-                        
-                        HydrusData.ShowText( message )
-                        
-                        self._reported_on_a_broken_branch = True
-                        
+                if perceptual_hash_id in self._pending_perceptual_hash_ids_to_perceptual_hashes:
                     
-                    # ok so there is a missing branch. typically from an import crash desync, is my best bet
-                    # we still want to add our leaf because we need to add the file to the tree population, but we will add it to the ghost of the branch. no worries, the regen code will sort it all out
-                    parent_id = ancestor_id
-                    
-                    # TODO: there's a secondary issue that we should add the ancestor_id's files to the file maintenance queue to check for presence in the similar files search system, I think
-                    # but we are too low level to talk to the maintenance queue here, so it'll have to be a more complicated answer
-                    
-                    break
+                    del self._pending_perceptual_hash_ids_to_perceptual_hashes[ perceptual_hash_id ]
                     
                 
-                ( ancestor_perceptual_hash, ancestor_radius, ancestor_inner_id, ancestor_inner_population, ancestor_outer_id, ancestor_outer_population ) = result
+                self._pending_removee_perceptual_hash_ids.add( perceptual_hash_id )
                 
-                distance_to_ancestor = HydrusData.Get64BitHammingDistance( perceptual_hash, ancestor_perceptual_hash )
+            
+        
+    
+    def Search( self, search_perceptual_hashes: collections.abc.Collection[ bytes ], max_hamming_distance: int ) -> dict[ int, int ]:
+        
+        similar_perceptual_hash_ids_to_distances = {}
+        
+        search_perceptual_hashes = [ search_perceptual_hash for search_perceptual_hash in search_perceptual_hashes if isinstance( search_perceptual_hash, bytes ) and len( search_perceptual_hash ) == 8 ]
+        
+        if len( search_perceptual_hashes ) == 0:
+            
+            return similar_perceptual_hash_ids_to_distances
+            
+        
+        with self._lock:
+            
+            self._MergePending()
+            
+            perceptual_hash_ids = self._perceptual_hash_ids
+            packed_perceptual_hashes = self._packed_perceptual_hashes
+            
+        
+        if len( perceptual_hash_ids ) == 0:
+            
+            return similar_perceptual_hash_ids_to_distances
+            
+        
+        # merging makes new arrays rather than editing in place, so we can scan outside the lock
+        
+        for search_packed_perceptual_hash in PackPerceptualHashes( search_perceptual_hashes ):
+            
+            distances = GetHammingDistancesFromPackedPerceptualHashes( packed_perceptual_hashes, search_packed_perceptual_hash )
+            
+            ( match_indices, ) = numpy.nonzero( distances <= max_hamming_distance )
+            
+            for ( perceptual_hash_id, distance ) in zip( perceptual_hash_ids[ match_indices ].tolist(), distances[ match_indices ].tolist() ):
                 
-                if ancestor_radius is None or distance_to_ancestor <= ancestor_radius:
+                if perceptual_hash_id not in similar_perceptual_hash_ids_to_distances or distance < similar_perceptual_hash_ids_to_distances[ perceptual_hash_id ]:
                     
-                    ancestors_we_are_inside.append( ancestor_id )
-                    ancestor_inner_population += 1
-                    next_ancestor_id = ancestor_inner_id
-                    
-                    if ancestor_inner_id is None:
-                        
-                        self._Execute( 'UPDATE shape_vptree SET inner_id = ?, radius = ? WHERE phash_id = ?;', ( perceptual_hash_id, distance_to_ancestor, ancestor_id ) )
-                        
-                        self._ClearPerceptualHashesFromVPTreeNodeCache( ( ancestor_id, ) )
-                        
-                        parent_id = ancestor_id
-                        
-                    
-                else:
-                    
-                    ancestors_we_are_outside.append( ancestor_id )
-                    ancestor_outer_population += 1
-                    next_ancestor_id = ancestor_outer_id
-                    
-                    if ancestor_outer_id is None:
-                        
-                        self._Execute( 'UPDATE shape_vptree SET outer_id = ? WHERE phash_id = ?;', ( perceptual_hash_id, ancestor_id ) )
-                        
-                        self._ClearPerceptualHashesFromVPTreeNodeCache( ( ancestor_id, ) )
-                        
-                        parent_id = ancestor_id
-                        
+                    similar_perceptual_hash_ids_to_distances[ perceptual_hash_id ] = distance
                     
                 
-                is_decent_sized_branch = ancestor_inner_population + ancestor_outer_population > 16
+            
+        
+        return similar_perceptual_hash_ids_to_distances
+        
+    
+    def SetPerceptualHashes( self, rows: collections.abc.Collection[ tuple[ int, bytes ] ] ):
+        
+        # anything pending is newer than these rows, so it stays pending and wins on the next merge
+        
+        with self._lock:
+            
+            if len( rows ) == 0:
+                
+                self._perceptual_hash_ids = numpy.empty( 0, dtype = numpy.int64 )
+                self._packed_perceptual_hashes = numpy.empty( 0, dtype = numpy.uint64 )
                 
-                if not an_ancestor_is_unbalanced and is_decent_sized_branch:
-                    
-                    larger = max( ancestor_inner_population, ancestor_outer_population )
-                    smaller = min( ancestor_inner_population, ancestor_outer_population )
-                    
-                    if smaller / larger < 0.33:
-                        
-                        self._Execute( 'INSERT OR IGNORE INTO shape_maintenance_branch_regen ( phash_id ) VALUES ( ? );', ( ancestor_id, ) )
-                        
-                        self._cursor_transaction_wrapper.pub_after_job( 'notify_new_shape_search_branch_maintenance_work' )
-                        
-                        # we only do this for the eldest ancestor, as the eventual rebalancing will affect all children
-                        
-                        an_ancestor_is_unbalanced = True
-                        
-                    
+            else:
+                
+                ( perceptual_hash_ids, perceptual_hashes ) = zip( *rows )
+                
+                self._perceptual_hash_ids = numpy.array( perceptual_hash_ids, dtype = numpy.int64 )
+                self._packed_perceptual_hashes = PackPerceptualHashes( perceptual_hashes )
                 
             
-            self._ExecuteMany( 'UPDATE shape_vptree SET inner_population = inner_population + 1 WHERE phash_id = ?;', ( ( ancestor_id, ) for ancestor_id in ancestors_we_are_inside ) )
-            self._ExecuteMany( 'UPDATE shape_vptree SET outer_population = outer_population + 1 WHERE phash_id = ?;', ( ( ancestor_id, ) for ancestor_id in ancestors_we_are_outside ) )
+        
+    
+
+class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
+    
+    def __init__(
+        self,
+        cursor: sqlite3.Cursor,
+        cursor_transaction_wrapper: HydrusDBBase.DBCursorTransactionWrapper,
+        modules_services: ClientDBServices.ClientDBMasterServices,
+        modules_hashes: ClientDBMaster.ClientDBMasterHashes,
+        modules_files_storage: ClientDBFilesStorage.ClientDBFilesStorage
+    ):
+        
+        self._cursor_transaction_wrapper = cursor_transaction_wrapper
+        self.modules_services = modules_services
+        self.modules_hashes = modules_hashes
+        self.modules_files_storage = modules_files_storage
+        
+        super().__init__( 'client similar files', cursor )
+        
+        self._perceptual_hash_index = PerceptualHashIndex()
+        self._perceptual_hash_index_loaded = False
+        self._perceptual_hash_index_changed_in_job = False
+        
+    
+    def _DeleteOrphanPerceptualHashes( self, perceptual_hash_ids: collections.abc.Collection[ int ] ):
+        
+        with self._MakeTemporaryIntegerTable( perceptual_hash_ids, 'phash_id' ) as temp_perceptual_hash_ids_table_name:
             
-            self._ClearPerceptualHashesFromVPTreeNodeCache( ancestors_we_are_inside )
-            self._ClearPerceptualHashesFromVPTreeNodeCache( ancestors_we_are_outside )
+            useful_perceptual_hash_ids = self._STS( self._Execute( f'SELECT phash_id FROM {temp_perceptual_hash_ids_table_name} CROSS JOIN shape_perceptual_hash_map USING ( phash_id );' ) )
             
         
-        radius = None
-        inner_id = None
-        inner_population = 0
-        outer_id = None
-        outer_population = 0
-        
-        self._Execute( 'INSERT OR REPLACE INTO shape_vptree ( phash_id, parent_id, radius, inner_id, inner_population, outer_id, outer_population ) VALUES ( ?, ?, ?, ?, ?, ?, ? );', ( perceptual_hash_id, parent_id, radius, inner_id, inner_population, outer_id, outer_population ) )
+        orphan_perceptual_hash_ids = set( perceptual_hash_ids ).difference( useful_perceptual_hash_ids )
         
-        self._ClearPerceptualHashesFromVPTreeNodeCache( ( perceptual_hash_id, ) )
+        if len( orphan_perceptual_hash_ids ) > 0:
+            
+            self._ExecuteMany( 'DELETE FROM shape_perceptual_hashes WHERE phash_id = ?;', ( ( p_id, ) for p_id in orphan_perceptual_hash_ids ) )
+            
+            self._perceptual_hash_index.RemovePerceptualHashIds( orphan_perceptual_hash_ids )
+            
+            self._perceptual_hash_index_changed_in_job = True
+            
         
     
     def _DeltaShapeSearchCacheNumbers( self, searched_distance, delta ):
@@ -208,97 +295,20 @@ class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
             
         
     
-    def _GenerateBranch( self, job_status, parent_id, perceptual_hash_id, perceptual_hash, children ):
-        
-        process_queue = collections.deque()
-        
-        process_queue.append( ( parent_id, perceptual_hash_id, perceptual_hash, children ) )
-        
-        insert_rows = []
+    def _GetLoadedPerceptualHashIndex( self ) -> PerceptualHashIndex:
         
-        num_done = 0
-        num_to_do = len( children ) + 1
+        # the phash table is the persistent copy. we load it once and keep up to date with every add and delete after that
         
-        all_altered_phash_ids = set()
-        
-        while len( process_queue ) > 0:
+        if not self._perceptual_hash_index_loaded:
             
-            job_status.SetStatusText( 'generating new branch -- ' + HydrusNumbers.ValueRangeToPrettyString( num_done, num_to_do ), 2 )
+            rows = [ ( phash_id, phash ) for ( phash_id, phash ) in self._Execute( 'SELECT phash_id, phash FROM shape_perceptual_hashes;' ) if isinstance( phash, bytes ) and len( phash ) == 8 ]
             
-            ( parent_id, perceptual_hash_id, perceptual_hash, children ) = process_queue.popleft()
+            self._perceptual_hash_index.SetPerceptualHashes( rows )
             
-            if len( children ) == 0:
-                
-                inner_id = None
-                inner_population = 0
-                
-                outer_id = None
-                outer_population = 0
-                
-                radius = None
-                
-            else:
-                
-                children = sorted( ( ( HydrusData.Get64BitHammingDistance( perceptual_hash, child_perceptual_hash ), child_id, child_perceptual_hash ) for ( child_id, child_perceptual_hash ) in children ) )
-                
-                median_index = len( children ) // 2
-                
-                median_radius = children[ median_index ][0]
-                
-                inner_children = [ ( child_id, child_perceptual_hash ) for ( distance, child_id, child_perceptual_hash ) in children if distance < median_radius ]
-                radius_children = [ ( child_id, child_perceptual_hash ) for ( distance, child_id, child_perceptual_hash ) in children if distance == median_radius ]
-                outer_children = [ ( child_id, child_perceptual_hash ) for ( distance, child_id, child_perceptual_hash ) in children if distance > median_radius ]
-                
-                if len( inner_children ) <= len( outer_children ):
-                    
-                    radius = median_radius
-                    
-                    inner_children.extend( radius_children )
-                    
-                else:
-                    
-                    radius = median_radius - 1
-                    
-                    outer_children.extend( radius_children )
-                    
-                
-                inner_population = len( inner_children )
-                outer_population = len( outer_children )
-                
-                ( inner_id, inner_perceptual_hash ) = self._PopBestRootNode( inner_children ) #HydrusLists.MedianPop( inner_children )
-                
-                if len( outer_children ) == 0:
-                    
-                    outer_id = None
-                    
-                else:
-                    
-                    ( outer_id, outer_perceptual_hash ) = self._PopBestRootNode( outer_children ) #HydrusLists.MedianPop( outer_children )
-                    
-                
-            
-            insert_rows.append( ( perceptual_hash_id, parent_id, radius, inner_id, inner_population, outer_id, outer_population ) )
-            
-            all_altered_phash_ids.add( perceptual_hash_id )
-            
-            if inner_id is not None:
-                
-                process_queue.append( ( perceptual_hash_id, inner_id, inner_perceptual_hash, inner_children ) )
-                
-            
-            if outer_id is not None:
-                
-                process_queue.append( ( perceptual_hash_id, outer_id, outer_perceptual_hash, outer_children ) )
-                
-            
-            num_done += 1
+            self._perceptual_hash_index_loaded = True
             
         
-        job_status.SetStatusText( 'branch constructed, now committing', 2 )
-        
-        self._ExecuteMany( 'INSERT OR REPLACE INTO shape_vptree ( phash_id, parent_id, radius, inner_id, inner_population, outer_id, outer_population ) VALUES ( ?, ?, ?, ?, ?, ?, ? );', insert_rows )
-        
-        self._ClearPerceptualHashesFromVPTreeNodeCache( all_altered_phash_ids )
+        return self._perceptual_hash_index
         
     
     def _GetHashIdsWithPixelHashId( self, pixel_hash_id: int ) -> set[ int ]:
@@ -316,10 +326,6 @@ class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
             ( [ 'hash_id' ], False, 451 )
         ]
         
-        index_generation_dict[ 'main.shape_vptree' ] = [
-            ( [ 'parent_id' ], False, 536 )
-        ]
-        
         index_generation_dict[ 'main.pixel_hash_map' ] = [
             ( [ 'pixel_hash_id' ], False, 465 )
         ]
@@ -332,7 +338,6 @@ class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
         return {
             'external_master.shape_perceptual_hashes' : ( 'CREATE TABLE IF NOT EXISTS {} ( phash_id INTEGER PRIMARY KEY, phash BLOB_BYTES UNIQUE );', 451 ),
             'external_master.shape_perceptual_hash_map' : ( 'CREATE TABLE IF NOT EXISTS {} ( phash_id INTEGER, hash_id INTEGER, PRIMARY KEY ( phash_id, hash_id ) );', 451 ),
-            'main.shape_vptree' : ( 'CREATE TABLE IF NOT EXISTS {} ( phash_id INTEGER PRIMARY KEY, parent_id INTEGER, radius INTEGER, inner_id INTEGER, inner_population INTEGER, outer_id INTEGER, outer_population INTEGER );', 536 ),
             'main.shape_maintenance_branch_regen' : ( 'CREATE TABLE IF NOT EXISTS {} ( phash_id INTEGER PRIMARY KEY );', 536 ),
             'main.shape_search_cache' : ( 'CREATE TABLE IF NOT EXISTS {} ( hash_id INTEGER PRIMARY KEY, searched_distance INTEGER );', 451 ),
             'main.shape_search_cache_numbers' : ( 'CREATE TABLE IF NOT EXISTS {} ( searched_distance INTEGER PRIMARY KEY, count INTEGER );', 639 ),
@@ -365,7 +370,9 @@ class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
             
             perceptual_hash_id = self._GetLastRowId()
             
-            self._AddLeaf( perceptual_hash_id, perceptual_hash )
+            self._perceptual_hash_index.AddPerceptualHash( perceptual_hash_id, perceptual_hash )
+            
+            self._perceptual_hash_index_changed_in_job = True
             
         else:
             
@@ -398,268 +405,14 @@ class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
             
         
     
-    def _PopBestRootNode( self, node_rows ):
-        
-        if len( node_rows ) == 1:
-            
-            root_row = node_rows.pop()
-            
-            return root_row
-            
-        
-        MAX_VIEWPOINTS = 256
-        MAX_SAMPLE = 64
-        
-        if len( node_rows ) > MAX_VIEWPOINTS:
-            
-            viewpoints = random.sample( node_rows, MAX_VIEWPOINTS )
-            
-        else:
-            
-            viewpoints = node_rows
-            
-        
-        if len( node_rows ) > MAX_SAMPLE:
-            
-            sample = random.sample( node_rows, MAX_SAMPLE )
-            
-        else:
-            
-            sample = node_rows
-            
-        
-        final_scores = []
-        
-        for ( v_id, v_perceptual_hash ) in viewpoints:
-            
-            views = sorted( ( HydrusData.Get64BitHammingDistance( v_perceptual_hash, s_perceptual_hash ) for ( s_id, s_perceptual_hash ) in sample if v_id != s_id ) )
-            
-            # let's figure out the ratio of left_children to right_children, preferring 1:1, and convert it to a discrete integer score
-            
-            median_index = len( views ) // 2
-            
-            radius = views[ median_index ]
-            
-            num_left = len( [ 1 for view in views if view < radius ] )
-            num_radius = len( [ 1 for view in views if view == radius ] )
-            num_right = len( [ 1 for view in views if view > radius ] )
-            
-            if num_left <= num_right:
-                
-                num_left += num_radius
-                
-            else:
-                
-                num_right += num_radius
-                
-            
-            smaller = min( num_left, num_right )
-            larger = max( num_left, num_right )
-            
-            ratio = smaller / larger
-            
-            ratio_score = int( ratio * MAX_SAMPLE / 2 )
-            
-            # now let's calc the standard deviation--larger sd tends to mean less sphere overlap when searching
-            
-            mean_view = sum( views ) / len( views )
-            squared_diffs = [ ( view - mean_view  ) ** 2 for view in views ]
-            sd = ( sum( squared_diffs ) / len( squared_diffs ) ) ** 0.5
-            
-            final_scores.append( ( ratio_score, sd, v_id ) )
-            
-        
-        final_scores.sort()
-        
-        # we now have a list like [ ( 11, 4.0, [id] ), ( 15, 3.7, [id] ), ( 15, 4.3, [id] ) ]
-        
-        ( ratio_gumpf, sd_gumpf, root_id ) = final_scores.pop()
-        
-        for ( i, ( v_id, v_perceptual_hash ) ) in enumerate( node_rows ):
-            
-            if v_id == root_id:
-                
-                root_row = node_rows.pop( i )
-                
-                return root_row
-                
-            
-        
-    
-    def _RegenerateBranch( self, job_status, perceptual_hash_id ):
-        
-        job_status.SetStatusText( 'reviewing existing branch', 2 )
-        
-        # grab everything in the branch
-        
-        ( parent_id, ) = self._Execute( 'SELECT parent_id FROM shape_vptree WHERE phash_id = ?;', ( perceptual_hash_id, ) ).fetchone()
-        
-        # if parent_id here is None, we've got the root node and we are doing the whole tree
-        
-        cte_table_name = 'branch ( branch_phash_id )'
-        initial_select = 'SELECT ?'
-        recursive_select = 'SELECT phash_id FROM shape_vptree, branch ON parent_id = branch_phash_id'
-        query_on_cte_table_name = 'SELECT branch_phash_id, phash FROM branch, shape_perceptual_hashes ON phash_id = branch_phash_id'
-        
-        # use UNION (large memory, set), not UNION ALL (small memory, inifinite loop on damaged cyclic graph causing 200GB journal file and disk full error, jesus)
-        query = f'WITH RECURSIVE {cte_table_name} AS ( {initial_select} UNION {recursive_select} ) {query_on_cte_table_name};'
-        
-        unbalanced_nodes = self._Execute( query, ( perceptual_hash_id, ) ).fetchall()
-        
-        # removal of old branch and maintenance schedule
-        
-        job_status.SetStatusText( HydrusNumbers.ToHumanInt( len( unbalanced_nodes ) ) + ' leaves found--now clearing out old branch', 2 )
-        
-        unbalanced_perceptual_hash_ids = { p_id for ( p_id, p_h ) in unbalanced_nodes }
-        
-        self._ExecuteMany( 'DELETE FROM shape_vptree WHERE phash_id = ?;', ( ( p_id, ) for p_id in unbalanced_perceptual_hash_ids ) )
-        
-        self._ClearPerceptualHashesFromVPTreeNodeCache( unbalanced_perceptual_hash_ids )
-        
-        self._ExecuteMany( 'DELETE FROM shape_maintenance_branch_regen WHERE phash_id = ?;', ( ( p_id, ) for p_id in unbalanced_perceptual_hash_ids ) )
-        
-        # let's take this chance to clear out any nodes that don't actually map to any files
-        
-        with self._MakeTemporaryIntegerTable( unbalanced_perceptual_hash_ids, 'phash_id' ) as temp_perceptual_hash_ids_table_name:
-            
-            useful_perceptual_hash_ids = self._STS( self._Execute( 'SELECT phash_id FROM {} CROSS JOIN shape_perceptual_hash_map USING ( phash_id );'.format( temp_perceptual_hash_ids_table_name ) ) )
-            
-        
-        orphan_perceptual_hash_ids = unbalanced_perceptual_hash_ids.difference( useful_perceptual_hash_ids )
-        
-        if len( orphan_perceptual_hash_ids ) > 0:
-            
-            self._ExecuteMany( 'DELETE FROM shape_perceptual_hashes WHERE phash_id = ?;', ( ( p_id, ) for p_id in orphan_perceptual_hash_ids ) )
-            
-        
-        useful_nodes = [ row for row in unbalanced_nodes if row[0] in useful_perceptual_hash_ids ]
-        
-        num_useful_population = len( useful_nodes )
-        
-        # now create the new branch, starting by choosing a new root and updating the parent's left/right reference to that
-        
-        if num_useful_population > 0:
-            
-            ( new_perceptual_hash_id, new_perceptual_hash ) = self._PopBestRootNode( useful_nodes )
-            
-        else:
-            
-            # the correct regen in this case is to cut the stem here. reset to None/0
-            
-            new_perceptual_hash_id = None
-            new_perceptual_hash = None
-            
-        
-        # ok we have removed the old branch and now picked a better root node for the new one
-        # now we need to construct and insert this branch back into the database
-        
-        if parent_id is not None:
-            
-            # let's first update the pre-existing parent with its new child and perhaps let it know it has lost some orphans
-            
-            result = self._Execute( 'SELECT inner_id FROM shape_vptree WHERE phash_id = ?;', ( parent_id, ) ).fetchone()
-            
-            if result is None:
-                
-                # expected parent is not in the tree!
-                # somehow some stuff got borked
-                
-                self._Execute( 'DELETE FROM shape_maintenance_branch_regen;' )
-                
-                HydrusData.ShowText( 'Your similar files search tree seemed to be damaged. Please regenerate it under the _database_ menu!' )
-                
-                return
-                
-            
-            ( parent_inner_id, ) = result
-            
-            if parent_inner_id == perceptual_hash_id:
-                
-                query = 'UPDATE shape_vptree SET inner_id = ?, inner_population = ? WHERE phash_id = ?;'
-                
-            else:
-                
-                query = 'UPDATE shape_vptree SET outer_id = ?, outer_population = ? WHERE phash_id = ?;'
-                
-            
-            self._Execute( query, ( new_perceptual_hash_id, num_useful_population, parent_id ) )
-            
-            self._ClearPerceptualHashesFromVPTreeNodeCache( ( parent_id, ) )
-            
-        
-        if num_useful_population > 0:
-            
-            self._GenerateBranch( job_status, parent_id, new_perceptual_hash_id, new_perceptual_hash, useful_nodes )
-            
-        
-    
-    def _ClearPerceptualHashesFromVPTreeNodeCache( self, perceptual_hash_ids: collections.abc.Collection[ int ] ):
-        
-        for perceptual_hash_id in perceptual_hash_ids:
-            
-            if perceptual_hash_id in self._perceptual_hash_id_to_vp_tree_node_cache:
-                
-                del self._perceptual_hash_id_to_vp_tree_node_cache[ perceptual_hash_id ]
-                
-            
-            self._non_vp_treed_perceptual_hash_ids.discard( perceptual_hash_id )
-            
-            if self._root_node_perceptual_hash_id == perceptual_hash_id:
-                
-                self._root_node_perceptual_hash_id = None
-                
-            
-        
-    
     def _RepairRepopulateTables( self, repopulate_table_names, cursor_transaction_wrapper: HydrusDBBase.DBCursorTransactionWrapper ):
         
-        if 'main.shape_vptree' in repopulate_table_names or 'main.shape_maintenance_branch_regen' in repopulate_table_names:
+        if 'main.shape_maintenance_branch_regen' in repopulate_table_names:
             
             self.RegenerateTree()
             
         
     
-    def _TryToPopulatePerceptualHashToVPTreeNodeCache( self, perceptual_hash_ids: collections.abc.Collection[ int ] ):
-        
-        # the node cache used to limit itself to 1,000,000 nodes, but on clients with 13m files it was churning
-        # if you got a big client, I'm going to eat some ram, simple as
-        
-        uncached_perceptual_hash_ids = { perceptual_hash_id for perceptual_hash_id in perceptual_hash_ids if perceptual_hash_id not in self._perceptual_hash_id_to_vp_tree_node_cache and perceptual_hash_id not in self._non_vp_treed_perceptual_hash_ids }
-        
-        if len( uncached_perceptual_hash_ids ) > 0:
-            
-            if len( uncached_perceptual_hash_ids ) == 1:
-                
-                ( uncached_perceptual_hash_id, ) = uncached_perceptual_hash_ids
-                
-                rows = self._Execute( 'SELECT phash_id, phash, radius, inner_id, outer_id FROM shape_perceptual_hashes CROSS JOIN shape_vptree USING ( phash_id ) WHERE phash_id = ?;', ( uncached_perceptual_hash_id, ) ).fetchall()
-                
-            else:
-                
-                with self._MakeTemporaryIntegerTable( uncached_perceptual_hash_ids, 'phash_id' ) as temp_table_name:
-                    
-                    # temp perceptual_hash_ids to actual perceptual_hashes and tree info
-                    rows = self._Execute( 'SELECT phash_id, phash, radius, inner_id, outer_id FROM {} CROSS JOIN shape_perceptual_hashes USING ( phash_id ) CROSS JOIN shape_vptree USING ( phash_id );'.format( temp_table_name ) ).fetchall()
-                    
-                
-            
-            uncached_perceptual_hash_ids_to_vp_tree_nodes = { perceptual_hash_id : ( phash, radius, inner_id, outer_id ) for ( perceptual_hash_id, phash, radius, inner_id, outer_id ) in rows }
-            
-            if len( uncached_perceptual_hash_ids_to_vp_tree_nodes ) < len( uncached_perceptual_hash_ids ):
-                
-                for perceptual_hash_id in uncached_perceptual_hash_ids:
-                    
-                    if perceptual_hash_id not in uncached_perceptual_hash_ids_to_vp_tree_nodes:
-                        
-                        self._non_vp_treed_perceptual_hash_ids.add( perceptual_hash_id )
-                        
-                    
-                
-            
-            self._perceptual_hash_id_to_vp_tree_node_cache.update( uncached_perceptual_hash_ids_to_vp_tree_nodes )
-            
-        
-    
     def AssociatePerceptualHashes( self, hash_id, perceptual_hash_ids ):
         
         self._ExecuteMany( 'INSERT OR IGNORE INTO shape_perceptual_hash_map ( phash_id, hash_id ) VALUES ( ?, ? );', ( ( perceptual_hash_id, hash_id ) for perceptual_hash_id in perceptual_hash_ids ) )
@@ -685,6 +438,13 @@ class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
         self._Execute( 'DELETE FROM pixel_hash_map WHERE hash_id = ?;', ( hash_id, ) )
         
     
+    def CommitPerceptualHashIndexChanges( self ):
+        
+        # the job saved, so whatever it did to the index is now true of the db too
+        
+        self._perceptual_hash_index_changed_in_job = False
+        
+    
     def DisassociatePerceptualHashes( self, hash_id, perceptual_hash_ids ):
         
         self._ExecuteMany( 'DELETE FROM shape_perceptual_hash_map WHERE phash_id = ? AND hash_id = ?;', ( ( perceptual_hash_id, hash_id ) for perceptual_hash_id in perceptual_hash_ids ) )
@@ -698,6 +458,20 @@ class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
         self._cursor_transaction_wrapper.pub_after_job( 'notify_new_shape_search_branch_maintenance_work' )
         
     
+    def DiscardUncommittedPerceptualHashIndexChanges( self ):
+        
+        # the job rolled back, so the index may hold rows the db no longer has. we can't unpick them, so reload from the db on next search
+        
+        if self._perceptual_hash_index_changed_in_job:
+            
+            self._perceptual_hash_index.Clear()
+            
+            self._perceptual_hash_index_loaded = False
+            
+            self._perceptual_hash_index_changed_in_job = False
+            
+        
+    
     def FileIsInSystem( self, hash_id ):
         
         result = self._Execute( 'SELECT 1 FROM shape_search_cache WHERE hash_id = ?;', ( hash_id, ) ).fetchone()
@@ -752,6 +526,9 @@ class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
     
     def MaintainTree( self, work_period = None ):
         
+        # there is no search tree any more, just the in-memory index. the only upkeep is dropping perceptual hashes that no longer map to any file
+        # shape_maintenance_branch_regen is the old tree's rebalance queue, now reused as the queue of phashes that may have been orphaned
+        
         if work_period is not None:
             
             stop_time = HydrusTime.GetNowFloat() + work_period
@@ -761,47 +538,23 @@ class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
             stop_time = None
             
         
-        fake_job_status = ClientThreading.JobStatus()
-        
         work_to_do = self._Execute( 'SELECT phash_id FROM shape_maintenance_branch_regen;' ).fetchone() is not None
         
         while work_to_do:
             
-            # temp perceptual hashes to tree
-            result = self._Execute( 'SELECT phash_id FROM shape_maintenance_branch_regen CROSS JOIN shape_vptree USING ( phash_id ) ORDER BY inner_population + outer_population DESC;' ).fetchone()
+            perceptual_hash_ids = self._STS( self._Execute( 'SELECT phash_id FROM shape_maintenance_branch_regen LIMIT 256;' ) )
             
-            if result is None:
-                
-                # looks like there are only orphan branches in the regen cache, so clear it now and exit
-                self._Execute( 'DELETE FROM shape_maintenance_branch_regen;' )
-                
-                work_to_do = False
-                
-                return work_to_do
-                
-            else:
-                
-                ( biggest_perceptual_hash_id, ) = result
-                
+            self._DeleteOrphanPerceptualHashes( perceptual_hash_ids )
             
-            try:
-                
-                self._RegenerateBranch( fake_job_status, biggest_perceptual_hash_id )
-                
-            except Exception as e:
-                
-                HydrusData.ShowText( 'It looks like similar files maintenance had trouble regenerating a branch of the search tree! You should try _database->regenerate->similar files search tree_, and if that still produces errors, let hydev know.' )
-                
-                raise
-                
+            self._ExecuteMany( 'DELETE FROM shape_maintenance_branch_regen WHERE phash_id = ?;', ( ( p_id, ) for p_id in perceptual_hash_ids ) )
+            
+            work_to_do = self._Execute( 'SELECT phash_id FROM shape_maintenance_branch_regen;' ).fetchone() is not None
             
             if stop_time is not None and HydrusTime.TimeHasPassedFloat( stop_time ):
                 
                 return work_to_do
                 
             
-            work_to_do = self._Execute( 'SELECT phash_id FROM shape_maintenance_branch_regen;' ).fetchone() is not None
-            
         
         return work_to_do
         
@@ -828,11 +581,7 @@ class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
             
             job_status.SetStatusText( 'gathering all leaves' )
             
-            self._Execute( 'DELETE FROM shape_vptree;' )
-            
-            self._perceptual_hash_id_to_vp_tree_node_cache = {}
-            self._non_vp_treed_perceptual_hash_ids = set()
-            self._root_node_perceptual_hash_id = None
+            self._perceptual_hash_index_loaded = False
             
             all_nodes = self._Execute( 'SELECT phash_id, phash FROM shape_perceptual_hashes;' ).fetchall()
             
@@ -864,6 +613,10 @@ class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
                 
                 self._ExecuteMany( 'DELETE FROM shape_perceptual_hashes WHERE phash_id = ?;', ( ( phash_id, ) for phash_id in bad_phash_ids ) )
                 
+                self._perceptual_hash_index.RemovePerceptualHashIds( bad_phash_ids )
+                
+                self._perceptual_hash_index_changed_in_job = True
+                
                 with self._MakeTemporaryIntegerTable( bad_phash_ids, 'phash_id' ) as temp_table_name:
                     
                     affected_hash_ids = self._STS( self._Execute( f'SELECT hash_id FROM {temp_table_name} CROSS JOIN shape_perceptual_hash_map USING ( phash_id );' ) )
@@ -905,11 +658,9 @@ class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
                     
                 
             
-            job_status.SetStatusText( HydrusNumbers.ToHumanInt( len( all_nodes ) ) + ' leaves found, now regenerating' )
+            job_status.SetStatusText( HydrusNumbers.ToHumanInt( len( all_nodes ) ) + ' leaves found, now clearing out orphans' )
             
-            ( root_id, root_perceptual_hash ) = self._PopBestRootNode( all_nodes ) #HydrusLists.RandomPop( all_nodes )
-            
-            self._GenerateBranch( job_status, None, root_id, root_perceptual_hash, all_nodes )
+            self._DeleteOrphanPerceptualHashes( [ phash_id for ( phash_id, phash ) in all_nodes ] )
             
             self._Execute( 'DELETE FROM shape_maintenance_branch_regen;' )
             
@@ -1022,115 +773,13 @@ class ClientDBSimilarFiles( ClientDBModule.ClientDBModule ):
             
         else:
             
-            search_radius = max_hamming_distance
-            
-            if self._root_node_perceptual_hash_id is None:
-                
-                top_node_result = self._Execute( 'SELECT phash_id FROM shape_vptree WHERE parent_id IS NULL;' ).fetchone()
-                
-                if top_node_result is None:
-                    
-                    return similar_hash_ids_and_distances
-                    
-                
-                ( self._root_node_perceptual_hash_id, ) = top_node_result
-                
-            
-            similar_perceptual_hash_ids_to_distances = {}
+            perceptual_hash_index = self._GetLoadedPerceptualHashIndex()
             
-            num_cycles = 0
-            total_nodes_searched = 0
-            
-            for search_perceptual_hash in search_perceptual_hashes:
-                
-                next_potentials = [ self._root_node_perceptual_hash_id ]
-                
-                while len( next_potentials ) > 0:
-                    
-                    current_potentials = next_potentials
-                    next_potentials = []
-                    
-                    num_cycles += 1
-                    total_nodes_searched += len( current_potentials )
-                    
-                    # this is no longer an iterable inside the main node SELECT because it was causing crashes on linux!!
-                    # after investigation, it seemed to be SQLite having a problem with part of Get64BitHammingDistance touching perceptual_hashes it presumably was still hanging on to
-                    # the crash was in sqlite code, again presumably on subsequent fetch
-                    # adding a fake delay in seemed to fix it also. guess it was some memory maintenance buffer/bytes thing
-                    # anyway, we now just get the whole lot of results first and then work on the whole lot
-                    # UPDATE: we moved to a cache finally, so the iteration danger is less worrying, but leaving the above up anyway
-                    
-                    self._TryToPopulatePerceptualHashToVPTreeNodeCache( current_potentials )
-                    
-                    for node_perceptual_hash_id in current_potentials:
-                        
-                        result = self._perceptual_hash_id_to_vp_tree_node_cache.get( node_perceptual_hash_id, None )
-                        
-                        if result is None:
-                            
-                            # something crazy happened, probably a broken tree branch, move on
-                            continue
-                            
-                        
-                        ( node_perceptual_hash, node_radius, inner_perceptual_hash_id, outer_perceptual_hash_id ) = result
-                        
-                        # first check the node itself--is it similar?
-                        
-                        node_hamming_distance = HydrusData.Get64BitHammingDistance( search_perceptual_hash, node_perceptual_hash )
-                        
-                        if node_hamming_distance <= search_radius:
-                            
-                            if node_perceptual_hash_id in similar_perceptual_hash_ids_to_distances:
-                                
-                                current_distance = similar_perceptual_hash_ids_to_distances[ node_perceptual_hash_id ]
-                                
-                                similar_perceptual_hash_ids_to_distances[ node_perceptual_hash_id ] = min( node_hamming_distance, current_distance )
-                                
-                            else:
-                                
-                                similar_perceptual_hash_ids_to_distances[ node_perceptual_hash_id ] = node_hamming_distance
-                                
-                            
-                        
-                        # now how about its children--where should we search next?
-                        
-                        if node_radius is not None:
-                            
-                            # we have two spheres--node and search--their centers separated by node_hamming_distance
-                            # we want to search inside/outside the node_sphere if the search_sphere intersects with those spaces
-                            # there are four possibles:
-                            # (----N----)-(--S--)    intersects with outer only - distance between N and S > their radii
-                            # (----N---(-)-S--)      intersects with both
-                            # (----N-(--S-)-)        intersects with both
-                            # (---(-N-S--)-)         intersects with inner only - distance between N and S + radius_S does not exceed radius_N
-                            
-                            if inner_perceptual_hash_id is not None:
-                                
-                                spheres_disjoint = node_hamming_distance > ( node_radius + search_radius )
-                                
-                                if not spheres_disjoint: # i.e. they intersect at some point
-                                    
-                                    next_potentials.append( inner_perceptual_hash_id )
-                                    
-                                
-                            
-                            if outer_perceptual_hash_id is not None:
-                                
-                                search_sphere_subset_of_node_sphere = ( node_hamming_distance + search_radius ) <= node_radius
-                                
-                                if not search_sphere_subset_of_node_sphere: # i.e. search sphere intersects with non-node sphere space at some point
-                                    
-                                    next_potentials.append( outer_perceptual_hash_id )
-                                    
-                                
-                            
-                        
-                    
-                
+            similar_perceptual_hash_ids_to_distances = perceptual_hash_index.Search( search_perceptual_hashes, max_hamming_distance )
             
             if HG.db_report_mode:
                 
-                HydrusData.ShowText( 'Similar file search touched {} nodes over {} cycles.'.format( HydrusNumbers.ToHumanInt( total_nodes_searched ), HydrusNumbers.ToHumanInt( num_cycles ) ) )
+                HydrusData.ShowText( 'Similar file search scanned {} perceptual hashes for {} search hashes.'.format( HydrusNumbers.ToHumanInt( perceptual_hash_index.GetNumPerceptualHashes() ), HydrusNumbers.ToHumanInt( len( search_perceptual_hashes ) ) ) )
                 
             
             # so, now we have perceptual_hash_ids and distances. let's map that to actual files.
@@ -492,6 +492,7 @@ class ClientDBTagSearch( ClientDBModule.ClientDBModule ):
         exact_match = False,
         search_namespaces_into_full_tags = False,
         zero_count_ok = False,
+        max_results = None,
         job_status = None
     ):
         
@@ -528,11 +529,18 @@ class ClientDBTagSearch( ClientDBModule.ClientDBModule ):
         include_current = tag_context.include_current_tags
         include_pending = tag_context.include_pending_tags
         
-        all_predicates = []
+        truncate_results = max_results is not None and not exact_match
+        
+        leaves_and_ids_to_counts = []
         
         file_search_context_branch = self.modules_services.GetFileSearchContextBranch( file_search_context )
         
-        for leaf in file_search_context_branch.IterateLeaves():
+        leaves = list( file_search_context_branch.IterateLeaves() )
+        
+        # a tag's count is summed over the leaves, so a per-leaf top-k can understate it or drop it entirely. we can only cut in sqlite if there is one leaf
+        limit_counts_in_db = truncate_results and len( leaves ) == 1
+        
+        for leaf in leaves:
             
             tag_ids = self.GetAutocompleteTagIds( tag_display_type, leaf, search_text, exact_match, job_status = job_status )
             
@@ -552,30 +560,71 @@ class ClientDBTagSearch( ClientDBModule.ClientDBModule ):
             
             domain_is_cross_referenced = leaf.file_service_id != self.modules_services.combined_deleted_file_service_id
             
-            for group_of_tag_ids in HydrusLists.SplitIteratorIntoChunks( tag_ids, 1000 ):
+            ids_to_count = {}
+            
+            if limit_counts_in_db:
                 
-                if job_status is not None and job_status.IsCancelled():
+                # the count lookup sorts and limits in sqlite, so we only pull the top-k counts out of the db
+                
+                ids_to_count = self.modules_mappings_counts.GetCounts( tag_display_type, leaf.tag_service_id, leaf.file_service_id, tag_ids, include_current, include_pending, domain_is_cross_referenced = domain_is_cross_referenced, zero_count_ok = zero_count_ok, job_status = job_status, max_results = max_results )
+                
+            else:
+                
+                for group_of_tag_ids in HydrusLists.SplitIteratorIntoChunks( tag_ids, 1000 ):
                     
-                    return []
+                    if job_status is not None and job_status.IsCancelled():
+                        
+                        return []
+                        
+                    
+                    ids_to_count.update( self.modules_mappings_counts.GetCounts( tag_display_type, leaf.tag_service_id, leaf.file_service_id, group_of_tag_ids, include_current, include_pending, domain_is_cross_referenced = domain_is_cross_referenced, zero_count_ok = zero_count_ok, job_status = job_status ) )
                     
                 
-                ids_to_count = self.modules_mappings_counts.GetCounts( tag_display_type, leaf.tag_service_id, leaf.file_service_id, group_of_tag_ids, include_current, include_pending, domain_is_cross_referenced = domain_is_cross_referenced, zero_count_ok = zero_count_ok, job_status = job_status )
+            
+            leaves_and_ids_to_counts.append( ( leaf, ids_to_count ) )
+            
+            if job_status is not None and job_status.IsCancelled():
                 
-                if len( ids_to_count ) == 0:
+                return []
+                
+            
+        
+        if truncate_results:
+            
+            # we have exact counts for every leaf now, so we cut the merge down to one top-k before making predicates, which are not cheap
+            
+            tag_ids_to_sort_counts = collections.Counter()
+            
+            for ( leaf, ids_to_count ) in leaves_and_ids_to_counts:
+                
+                for ( tag_id, ( current_min, current_max, pending_min, pending_max ) ) in ids_to_count.items():
                     
-                    continue
+                    tag_ids_to_sort_counts[ tag_id ] += current_max + pending_max
                     
                 
-                #
+            
+            if len( tag_ids_to_sort_counts ) > max_results:
                 
-                predicates = self.modules_tag_display.GeneratePredicatesFromTagIdsAndCounts( tag_display_type, display_tag_service_id, ids_to_count, job_status = job_status )
+                top_tag_ids = { tag_id for ( tag_id, count ) in tag_ids_to_sort_counts.most_common( max_results ) }
                 
-                all_predicates.extend( predicates )
+                leaves_and_ids_to_counts = [ ( leaf, { tag_id : count for ( tag_id, count ) in ids_to_count.items() if tag_id in top_tag_ids } ) for ( leaf, ids_to_count ) in leaves_and_ids_to_counts ]
                 
             
-            if job_status is not None and job_status.IsCancelled():
+        
+        all_predicates = []
+        
+        for ( leaf, ids_to_count ) in leaves_and_ids_to_counts:
+            
+            for group_of_tag_ids in HydrusLists.SplitIteratorIntoChunks( ids_to_count.keys(), 1000 ):
                 
-                return []
+                if job_status is not None and job_status.IsCancelled():
+                    
+                    return []
+                    
+                
+                predicates = self.modules_tag_display.GeneratePredicatesFromTagIdsAndCounts( tag_display_type, display_tag_service_id, { tag_id : ids_to_count[ tag_id ] for tag_id in group_of_tag_ids }, job_status = job_status )
+                
+                all_predicates.extend( predicates )
                 
             
         
@@ -667,31 +716,18 @@ class ClientDBTagSearch( ClientDBModule.ClientDBModule ):
         # for now, this thing can fetch an absolute ton of stuff. you type in '1 female', you are getting a lot of tags, often with no count
         # not a very nice simple way to clear the chaff since in smaller cases those related siblings are useful, including those with no count, so no worries
         
-        tag_ids_without_siblings = list( tag_ids )
-        
-        for ( num_done, num_to_do, batch_of_tag_ids ) in HydrusLists.SplitListIntoChunksRich( tag_ids_without_siblings, 10240 ):
+        if job_status is not None and job_status.IsCancelled():
             
-            with self._MakeTemporaryIntegerTable( batch_of_tag_ids, 'tag_id' ) as temp_tag_ids_table_name:
-                
-                if job_status is not None and job_status.IsCancelled():
-                    
-                    return set()
-                    
-                
-                with self._MakeTemporaryIntegerTable( [], 'ideal_tag_id' ) as temp_ideal_tag_ids_table_name:
-                    
-                    self.modules_tag_siblings.FilterChainedIdealsIntoTable( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, leaf.tag_service_id, temp_tag_ids_table_name, temp_ideal_tag_ids_table_name )
-                    
-                    with self._MakeTemporaryIntegerTable( [], 'tag_id' ) as temp_chained_tag_ids_table_name:
-                        
-                        self.modules_tag_siblings.GetChainsMembersFromIdealsTables( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, leaf.tag_service_id, temp_ideal_tag_ids_table_name, temp_chained_tag_ids_table_name )
-                        
-                        tag_ids.update( self._STI( self._Execute( 'SELECT tag_id FROM {};'.format( temp_chained_tag_ids_table_name ) ) ) )
-                        
-                    
-                
+            return set()
             
         
+        # the chains lookup is an in-memory mirror of the sibling lookup table, so this is all dict work
+        chains_lookup = self.modules_tag_siblings.GetChainsLookup( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, leaf.tag_service_id )
+        
+        ideal_tag_ids = chains_lookup.GetChainedIdealTagIds( tag_ids )
+        
+        tag_ids.update( chains_lookup.GetChainsMembersFromIdeals( ideal_tag_ids ) )
+        
         return tag_ids
         
     
@@ -60,6 +60,111 @@ def GenerateTagSiblingsStorageTableNames( service_id ):
     }
     
 
+class TagSiblingsChainsLookup( object ):
+    
+    # an in-memory mirror of a sibling lookup cache table, so chain expansion is a dict lookup and not a temp table join
+    
+    def __init__( self, rows: collections.abc.Iterable[ tuple[ int, int ] ] ):
+        
+        self._bad_tag_ids_to_ideal_tag_ids = {}
+        self._ideal_tag_ids_to_bad_tag_ids = collections.defaultdict( set )
+        
+        self.AddRows( rows )
+        
+    
+    def AddRows( self, rows: collections.abc.Iterable[ tuple[ int, int ] ] ):
+        
+        for ( bad_tag_id, ideal_tag_id ) in rows:
+            
+            self._bad_tag_ids_to_ideal_tag_ids[ bad_tag_id ] = ideal_tag_id
+            self._ideal_tag_ids_to_bad_tag_ids[ ideal_tag_id ].add( bad_tag_id )
+            
+        
+    
+    def DeleteRows( self, rows: collections.abc.Iterable[ tuple[ int, int ] ] ):
+        
+        for ( bad_tag_id, ideal_tag_id ) in rows:
+            
+            if self._bad_tag_ids_to_ideal_tag_ids.get( bad_tag_id, None ) != ideal_tag_id:
+                
+                continue
+                
+            
+            del self._bad_tag_ids_to_ideal_tag_ids[ bad_tag_id ]
+            
+            bad_tag_ids = self._ideal_tag_ids_to_bad_tag_ids[ ideal_tag_id ]
+            
+            bad_tag_ids.discard( bad_tag_id )
+            
+            if len( bad_tag_ids ) == 0:
+                
+                del self._ideal_tag_ids_to_bad_tag_ids[ ideal_tag_id ]
+                
+            
+        
+    
+    def DeleteRowsInvolving( self, tag_ids: collections.abc.Iterable[ int ] ):
+        
+        rows = set()
+        
+        for tag_id in tag_ids:
+            
+            if tag_id in self._bad_tag_ids_to_ideal_tag_ids:
+                
+                rows.add( ( tag_id, self._bad_tag_ids_to_ideal_tag_ids[ tag_id ] ) )
+                
+            
+            if tag_id in self._ideal_tag_ids_to_bad_tag_ids:
+                
+                rows.update( ( ( bad_tag_id, tag_id ) for bad_tag_id in self._ideal_tag_ids_to_bad_tag_ids[ tag_id ] ) )
+                
+            
+        
+        self.DeleteRows( rows )
+        
+    
+    def GetChainedIdealTagIds( self, tag_ids: collections.abc.Iterable[ int ] ) -> set[ int ]:
+        
+        ideal_tag_ids = set()
+        
+        for tag_id in tag_ids:
+            
+            if tag_id in self._bad_tag_ids_to_ideal_tag_ids:
+                
+                ideal_tag_ids.add( self._bad_tag_ids_to_ideal_tag_ids[ tag_id ] )
+                
+            elif tag_id in self._ideal_tag_ids_to_bad_tag_ids:
+                
+                ideal_tag_ids.add( tag_id )
+                
+            
+        
+        return ideal_tag_ids
+        
+    
+    def GetChainsMembersFromIdeals( self, ideal_tag_ids: collections.abc.Iterable[ int ] ) -> set[ int ]:
+        
+        chain_tag_ids = set()
+        
+        for ideal_tag_id in ideal_tag_ids:
+            
+            chain_tag_ids.add( ideal_tag_id )
+            
+            if ideal_tag_id in self._ideal_tag_ids_to_bad_tag_ids:
+                
+                chain_tag_ids.update( self._ideal_tag_ids_to_bad_tag_ids[ ideal_tag_id ] )
+                
+            
+        
+        return chain_tag_ids
+        
+    
+    def GetRows( self ) -> set[ tuple[ int, int ] ]:
+        
+        return set( self._bad_tag_ids_to_ideal_tag_ids.items() )
+        
+    
+
 class ClientDBTagSiblings( ClientDBModule.ClientDBModule ):
     
     CAN_REPOPULATE_ALL_MISSING_DATA = True
@@ -73,6 +178,8 @@ class ClientDBTagSiblings( ClientDBModule.ClientDBModule ):
         
         self._service_ids_to_display_application_status = {}
         
+        self._display_types_and_service_ids_to_chains_lookups: dict[ tuple[ int, int ], TagSiblingsChainsLookup ] = {}
+        
         self._service_ids_to_applicable_service_ids: collections.defaultdict[ int, list ] | None = None
         self._service_ids_to_interested_service_ids: collections.defaultdict[ int, set ] | None = None
         
@@ -98,6 +205,36 @@ class ClientDBTagSiblings( ClientDBModule.ClientDBModule ):
             
         
     
+    def _ChainsLookupAddRows( self, display_type, tag_service_id, rows ):
+        
+        key = ( display_type, tag_service_id )
+        
+        if key in self._display_types_and_service_ids_to_chains_lookups:
+            
+            self._display_types_and_service_ids_to_chains_lookups[ key ].AddRows( rows )
+            
+        
+    
+    def _ChainsLookupDeleteRows( self, display_type, tag_service_id, rows ):
+        
+        key = ( display_type, tag_service_id )
+        
+        if key in self._display_types_and_service_ids_to_chains_lookups:
+            
+            self._display_types_and_service_ids_to_chains_lookups[ key ].DeleteRows( rows )
+            
+        
+    
+    def _ChainsLookupDeleteRowsInvolving( self, display_type, tag_service_id, tag_ids ):
+        
+        key = ( display_type, tag_service_id )
+        
+        if key in self._display_types_and_service_ids_to_chains_lookups:
+            
+            self._display_types_and_service_ids_to_chains_lookups[ key ].DeleteRowsInvolving( tag_ids )
+            
+        
+    
     def _GetInitialIndexGenerationDict( self ) -> dict:
         
         index_generation_dict = {}
@@ -211,6 +348,26 @@ class ClientDBTagSiblings( ClientDBModule.ClientDBModule ):
         self._ExecuteMany( f'INSERT OR IGNORE INTO {statuses_to_storage_table_names[HC.CONTENT_STATUS_CURRENT]} ( bad_tag_id, good_tag_id ) VALUES ( ?, ? );', pairs )
         
     
+    def ClearChainsLookups( self, tag_service_id = None, display_type = None ):
+        
+        for key in list( self._display_types_and_service_ids_to_chains_lookups.keys() ):
+            
+            ( key_display_type, key_tag_service_id ) = key
+            
+            if tag_service_id is not None and key_tag_service_id != tag_service_id:
+                
+                continue
+                
+            
+            if display_type is not None and key_display_type != display_type:
+                
+                continue
+                
+            
+            del self._display_types_and_service_ids_to_chains_lookups[ key ]
+            
+        
+    
     def ClearActual( self, service_id, tag_ids = None ):
         
         cache_actual_tag_sibling_lookup_table_name = GenerateTagSiblingsLookupCacheTableName( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, service_id )
@@ -219,11 +376,15 @@ class ClientDBTagSiblings( ClientDBModule.ClientDBModule ):
             
             self._Execute( f'DELETE FROM {cache_actual_tag_sibling_lookup_table_name};' )
             
+            self.ClearChainsLookups( tag_service_id = service_id, display_type = ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL )
+            
         else:
             
             self._ExecuteMany( f'DELETE FROM {cache_actual_tag_sibling_lookup_table_name} WHERE bad_tag_id = ?;', ( ( tag_id, ) for tag_id in tag_ids ) )
             self._ExecuteMany( f'DELETE FROM {cache_actual_tag_sibling_lookup_table_name} WHERE ideal_tag_id = ?;', ( ( tag_id, ) for tag_id in tag_ids ) )
             
+            self._ChainsLookupDeleteRowsInvolving( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, service_id, tag_ids )
+            
         
         if service_id in self._service_ids_to_display_application_status:
             
@@ -267,6 +428,8 @@ class ClientDBTagSiblings( ClientDBModule.ClientDBModule ):
         self._service_ids_to_applicable_service_ids = None
         self._service_ids_to_interested_service_ids = None
         
+        self.ClearChainsLookups( tag_service_id = tag_service_id )
+        
     
     def FilterChained( self, display_type, tag_service_id, tag_ids ):
         
@@ -425,6 +588,22 @@ class ClientDBTagSiblings( ClientDBModule.ClientDBModule ):
         return ( actual_sibling_rows, ideal_sibling_rows, sibling_rows_to_add, sibling_rows_to_remove )
         
     
+    def GetChainsLookup( self, display_type, tag_service_id ) -> TagSiblingsChainsLookup:
+        
+        # main connection only. the writer updates these as it goes, before commit, so a read pool snapshot would not match
+        
+        key = ( display_type, tag_service_id )
+        
+        if key not in self._display_types_and_service_ids_to_chains_lookups:
+            
+            cache_tag_siblings_lookup_table_name = GenerateTagSiblingsLookupCacheTableName( display_type, tag_service_id )
+            
+            self._display_types_and_service_ids_to_chains_lookups[ key ] = TagSiblingsChainsLookup( self._Execute( f'SELECT bad_tag_id, ideal_tag_id FROM {cache_tag_siblings_lookup_table_name};' ) )
+            
+        
+        return self._display_types_and_service_ids_to_chains_lookups[ key ]
+        
+    
     def GetChainMembersFromIdeal( self, display_type, tag_service_id, ideal_tag_id ) -> set[ int ]:
         
         cache_tag_siblings_lookup_table_name = GenerateTagSiblingsLookupCacheTableName( display_type, tag_service_id )
@@ -939,6 +1118,8 @@ class ClientDBTagSiblings( ClientDBModule.ClientDBModule ):
             self._service_ids_to_display_application_status[ tag_service_id ] = ( actual_sibling_rows, ideal_sibling_rows, sibling_rows_to_add, sibling_rows_to_remove )
             
         
+        self._ChainsLookupAddRows( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, tag_service_id, ( row, ) )
+        
     
     def NotifySiblingDeleteRowSynced( self, tag_service_id, row ):
         
@@ -952,6 +1133,8 @@ class ClientDBTagSiblings( ClientDBModule.ClientDBModule ):
             self._service_ids_to_display_application_status[ tag_service_id ] = ( actual_sibling_rows, ideal_sibling_rows, sibling_rows_to_add, sibling_rows_to_remove )
             
         
+        self._ChainsLookupDeleteRows( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, tag_service_id, ( row, ) )
+        
     
     def PendTagSiblings( self, service_id, triples ):
         
@@ -1017,6 +1200,8 @@ class ClientDBTagSiblings( ClientDBModule.ClientDBModule ):
             
             self._ExecuteMany( 'INSERT OR IGNORE INTO {} ( bad_tag_id, ideal_tag_id ) VALUES ( ?, ? );'.format( cache_tag_siblings_lookup_table_name ), tss.GetBadTagsToIdealTags().items() )
             
+            self.ClearChainsLookups( tag_service_id = tag_service_id, display_type = ClientTags.TAG_DISPLAY_DISPLAY_IDEAL )
+            
             if tag_service_id in self._service_ids_to_display_application_status:
                 
                 del self._service_ids_to_display_application_status[ tag_service_id ]
@@ -1064,6 +1249,8 @@ class ClientDBTagSiblings( ClientDBModule.ClientDBModule ):
             self._ExecuteMany( f'DELETE FROM {cache_tag_siblings_lookup_table_name} WHERE bad_tag_id = ?;', ( ( tag_id, ) for tag_id in tag_ids_to_clear_and_regen ) )
             self._ExecuteMany( f'DELETE FROM {cache_tag_siblings_lookup_table_name} WHERE ideal_tag_id = ?;', ( ( tag_id, ) for tag_id in tag_ids_to_clear_and_regen ) )
             
+            self._ChainsLookupDeleteRowsInvolving( ClientTags.TAG_DISPLAY_DISPLAY_IDEAL, tag_service_id, tag_ids_to_clear_and_regen )
+            
             applicable_tag_service_ids = self.GetApplicableServiceIds( tag_service_id )
             
             tss = ClientTagsHandling.TagSiblingsStructure()
@@ -1094,6 +1281,8 @@ class ClientDBTagSiblings( ClientDBModule.ClientDBModule ):
             
             self._ExecuteMany( 'INSERT OR IGNORE INTO {} ( bad_tag_id, ideal_tag_id ) VALUES ( ?, ? );'.format( cache_tag_siblings_lookup_table_name ), stuff_added )
             
+            self._ChainsLookupAddRows( ClientTags.TAG_DISPLAY_DISPLAY_IDEAL, tag_service_id, stuff_added )
+            
             if tag_service_id in self._service_ids_to_display_application_status:
                 
                 stuff_no_changes = stuff_deleted.intersection( stuff_added )
@@ -836,7 +836,9 @@ def GetVisualData( media_result: ClientMediaResult.MediaResult ) -> ClientVisual
     
     visual_data_cache = ClientVisualData.VisualDataStorage.instance()
     
-    if not visual_data_cache.HasData( hash ):
+    visual_data = visual_data_cache.GetIfHasData( hash )
+    
+    if visual_data is None:
         
         image_renderer = CG.client_controller.images_cache.GetImageRenderer( media_result )
         
@@ -866,7 +868,7 @@ def GetVisualData( media_result: ClientMediaResult.MediaResult ) -> ClientVisual
         visual_data_cache.AddData( hash, visual_data )
         
     
-    return typing.cast( ClientVisualData.VisualData, visual_data_cache.GetData( hash ) )
+    return typing.cast( ClientVisualData.VisualData, visual_data )
     
 
 def GetVisualDataTiled( media_result: ClientMediaResult.MediaResult ) -> ClientVisualData.VisualDataTiled:
@@ -875,7 +877,9 @@ def GetVisualDataTiled( media_result: ClientMediaResult.MediaResult ) -> ClientV
     
     visual_data_tiled_cache = ClientVisualData.VisualDataTiledStorage.instance()
     
-    if not visual_data_tiled_cache.HasData( hash ):
+    visual_data_tiled = visual_data_tiled_cache.GetIfHasData( hash )
+    
+    if visual_data_tiled is None:
         
         image_renderer = CG.client_controller.images_cache.GetImageRenderer( media_result )
         
@@ -905,7 +909,7 @@ def GetVisualDataTiled( media_result: ClientMediaResult.MediaResult ) -> ClientV
         visual_data_tiled_cache.AddData( hash, visual_data_tiled )
         
     
-    return typing.cast( ClientVisualData.VisualDataTiled, visual_data_tiled_cache.GetData( hash ) )
+    return typing.cast( ClientVisualData.VisualDataTiled, visual_data_tiled )
     
 
 class JpegQuality( ClientCachesBase.CacheableObject ):
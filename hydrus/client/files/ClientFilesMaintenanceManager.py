@@ -1,3 +1,4 @@
+import concurrent.futures
 import os
 import threading
 import time
@@ -76,6 +77,25 @@ class FilesMaintenanceManager( ClientDaemons.ManagerWithMainLoop ):
         
         self._reset_background_event = threading.Event()
         
+        # these jobs are file-crunching that only talk to the file store and db through thread-safe calls, so they can be fanned out to worker threads
+        # PIL, numpy, hashlib and ffmpeg all do their heavy lifting outside the GIL
+        self._parallelisable_job_types_to_calls = {
+            ClientFilesMaintenance.REGENERATE_FILE_DATA_JOB_FILE_MODIFIED_TIMESTAMP : self._RegenFileModifiedTimestampMS,
+            ClientFilesMaintenance.REGENERATE_FILE_DATA_JOB_OTHER_HASHES : self._RegenFileOtherHashes,
+            ClientFilesMaintenance.REGENERATE_FILE_DATA_JOB_FILE_HAS_TRANSPARENCY : self._HasTransparency,
+            ClientFilesMaintenance.REGENERATE_FILE_DATA_JOB_FILE_HAS_EXIF : self._HasEXIF,
+            ClientFilesMaintenance.REGENERATE_FILE_DATA_JOB_FILE_HAS_XMP : self._HasXMP,
+            ClientFilesMaintenance.REGENERATE_FILE_DATA_JOB_FILE_HAS_IPTC : self._HasIPTC,
+            ClientFilesMaintenance.REGENERATE_FILE_DATA_JOB_FILE_HAS_HUMAN_READABLE_EMBEDDED_METADATA : self._HasHumanReadableEmbeddedMetadata,
+            ClientFilesMaintenance.REGENERATE_FILE_DATA_JOB_FILE_HAS_SOFTWARE_SOURCE : self._HasSoftwareSource,
+            ClientFilesMaintenance.REGENERATE_FILE_DATA_JOB_FILE_HAS_ICC_PROFILE : self._HasICCProfile,
+            ClientFilesMaintenance.REGENERATE_FILE_DATA_JOB_PIXEL_HASH : self._RegenPixelHash,
+            ClientFilesMaintenance.REGENERATE_FILE_DATA_JOB_FORCE_THUMBNAIL : self._RegenFileThumbnailForce,
+            ClientFilesMaintenance.REGENERATE_FILE_DATA_JOB_REFIT_THUMBNAIL : self._RegenFileThumbnailRefit,
+            ClientFilesMaintenance.REGENERATE_FILE_DATA_JOB_SIMILAR_FILES_METADATA : self._RegenSimilarFilesMetadata,
+            ClientFilesMaintenance.REGENERATE_FILE_DATA_JOB_BLURHASH : self._RegenBlurhash
+        }
+        
         self._controller.sub( self, 'NotifyNewOptions', 'notify_new_options' )
         self._controller.sub( self, 'Wake', 'checkbox_manager_inverted' )
         
@@ -936,7 +956,7 @@ class FilesMaintenanceManager( ClientDaemons.ManagerWithMainLoop ):
         
         try:
             
-            thumbnail_path = self._controller.client_files_manager.GetThumbnailPath( media_result )
+            thumbnail_bytes = self._controller.client_files_manager.GetThumbnailBytes( media_result )
             
         except HydrusExceptions.FileMissingException as e:
             
@@ -945,9 +965,9 @@ class FilesMaintenanceManager( ClientDaemons.ManagerWithMainLoop ):
         
         try:
             
-            thumbnail_mime = HydrusFileHandling.GetThumbnailMime( thumbnail_path )
+            thumbnail_mime = HydrusFileHandling.GetThumbnailMimeFromBytes( thumbnail_bytes )
             
-            numpy_image = HydrusImageHandling.GenerateNumPyImage( thumbnail_path, thumbnail_mime )
+            numpy_image = HydrusImageHandling.GenerateNumPyImageFromBytes( thumbnail_bytes, thumbnail_mime )
             
             return HydrusBlurhash.GetBlurhashFromNumPy( numpy_image )
             
@@ -984,6 +1004,55 @@ class FilesMaintenanceManager( ClientDaemons.ManagerWithMainLoop ):
         return perceptual_hashes
         
     
+    def _ProcessParallelJobResults( self, hash, results, job_status, cleared_jobs ):
+        
+        # returns False if we should stop work
+        
+        for ( job_type, additional_data, e ) in results:
+            
+            self._work_tracker.ReportRequestUsed( num_requests = ClientFilesMaintenance.regen_file_enum_to_job_weight_lookup[ job_type ] )
+            
+            if e is None:
+                
+                if job_type == ClientFilesMaintenance.REGENERATE_FILE_DATA_JOB_REFIT_THUMBNAIL and additional_data:
+                    
+                    num_thumb_refits = job_status.GetIfHasVariable( 'num_thumb_refits' )
+                    
+                    if num_thumb_refits is None:
+                        
+                        num_thumb_refits = 0
+                        
+                    
+                    num_thumb_refits += 1
+                    
+                    job_status.SetVariable( 'num_thumb_refits', num_thumb_refits )
+                    
+                
+            elif isinstance( e, HydrusExceptions.ShutdownException ):
+                
+                return False
+                
+            elif isinstance( e, IOError ):
+                
+                cleared_jobs.append( ( hash, job_type, None ) )
+                
+                self._ReportIOError( hash, job_type, e )
+                
+                return False
+                
+            else:
+                
+                self._ReportUnexpectedError( hash, job_type, e )
+                
+                additional_data = None
+                
+            
+            cleared_jobs.append( ( hash, job_type, additional_data ) )
+            
+        
+        return True
+        
+    
     def _ReInitialiseWorkRules( self ):
         
         file_maintenance_idle_throttle_files = self._controller.new_options.GetInteger( 'file_maintenance_idle_throttle_files' )
@@ -1001,6 +1070,39 @@ class FilesMaintenanceManager( ClientDaemons.ManagerWithMainLoop ):
         self._active_work_rules.AddRule( HC.BANDWIDTH_TYPE_REQUESTS, file_maintenance_active_throttle_time_delta, file_maintenance_active_throttle_files * ClientFilesMaintenance.NORMALISED_BIG_JOB_WEIGHT )
         
     
+    def _ReportIOError( self, hash, job_type, e ):
+        
+        job_status = ClientThreading.JobStatus()
+        
+        message = 'Hey, while performing file maintenance task "{}" on file {}, the client ran into an I/O Error! This could be just some media library moaning about a weird (probably truncated) file, but it could also be a significant hard drive problem. Look at the error yourself. If it looks serious, you should shut the client down and check your hard drive health immediately. Just to be safe, no more file maintenance jobs will be run this program boot, and a full traceback has been written to the log.'.format( ClientFilesMaintenance.regen_file_enum_to_str_lookup[ job_type ], hash.hex() )
+        message += '\n' * 2
+        message += str( e )
+        
+        job_status.SetStatusText( message )
+        
+        job_status.SetFiles( [ hash ], 'I/O error file' )
+        
+        CG.client_controller.pub( 'message', job_status )
+        
+        self._serious_error_encountered = True
+        self._shutdown = True
+        
+    
+    def _ReportUnexpectedError( self, hash, job_type, e ):
+        
+        job_status = ClientThreading.JobStatus()
+        
+        message = 'There was an unexpected problem performing maintenance task "{}" on file {}! The job will not be reattempted. A full traceback of this error should be written to the log.'.format( ClientFilesMaintenance.regen_file_enum_to_str_lookup[ job_type ], hash.hex() )
+        message += '\n' * 2
+        message += str( e )
+        
+        job_status.SetStatusText( message )
+        
+        job_status.SetFiles( [ hash ], 'failed file' )
+        
+        CG.client_controller.pub( 'message', job_status )
+        
+    
     def _RunJob( self, media_results_to_job_types, job_status, job_done_hook = None ):
         
         if self._serious_error_encountered:
@@ -1010,6 +1112,52 @@ class FilesMaintenanceManager( ClientDaemons.ManagerWithMainLoop ):
         
         cleared_jobs = []
         
+        num_workers = self._controller.new_options.GetInteger( 'file_maintenance_num_workers' )
+        
+        executor = None
+        hashes_to_futures = {}
+        
+        if num_workers > 1:
+            
+            executor = concurrent.futures.ThreadPoolExecutor( max_workers = num_workers, thread_name_prefix = 'file maintenance worker' )
+            
+        
+        def process_done_futures( return_when ):
+            
+            ( done_futures, not_done_futures ) = concurrent.futures.wait( list( hashes_to_futures.values() ), return_when = return_when )
+            
+            for ( hash, future ) in list( hashes_to_futures.items() ):
+                
+                if future in done_futures:
+                    
+                    del hashes_to_futures[ hash ]
+                    
+                    if future.cancelled():
+                        
+                        # never ran, so the job is not cleared and will be picked up again later
+                        continue
+                        
+                    
+                    results = future.result()
+                    
+                    if job_done_hook is not None:
+                        
+                        for result in results:
+                            
+                            job_done_hook()
+                            
+                        
+                    
+                    if not self._ProcessParallelJobResults( hash, results, job_status, cleared_jobs ):
+                        
+                        return False
+                        
+                    
+                
+            
+            return True
+            
+        
         try:
             
             big_pauser = HydrusThreading.BigJobPauser( wait_time = 0.8 )
@@ -1027,6 +1175,30 @@ class FilesMaintenanceManager( ClientDaemons.ManagerWithMainLoop ):
                     return
                     
                 
+                if executor is not None and False not in ( job_type in self._parallelisable_job_types_to_calls for job_type in job_types ):
+                    
+                    for job_type in job_types:
+                        
+                        if HG.file_report_mode:
+                            
+                            HydrusData.ShowText( 'file maintenance (parallel): {} for {}'.format( ClientFilesMaintenance.regen_file_enum_to_str_lookup[ job_type ], hash.hex() ) )
+                            
+                        
+                    
+                    hashes_to_futures[ hash ] = executor.submit( self._RunParallelisableJobs, media_result, job_types )
+                    
+                    # keep the workers fed, but don't race ahead of them
+                    if len( hashes_to_futures ) >= num_workers * 2:
+                        
+                        if not process_done_futures( concurrent.futures.FIRST_COMPLETED ):
+                            
+                            return
+                            
+                        
+                    
+                    job_types = []
+                    
+                
                 for job_type in job_types:
                     
                     if HG.file_report_mode:
@@ -1177,20 +1349,7 @@ class FilesMaintenanceManager( ClientDaemons.ManagerWithMainLoop ):
                         
                         HydrusData.PrintException( e )
                         
-                        job_status = ClientThreading.JobStatus()
-                        
-                        message = 'Hey, while performing file maintenance task "{}" on file {}, the client ran into an I/O Error! This could be just some media library moaning about a weird (probably truncated) file, but it could also be a significant hard drive problem. Look at the error yourself. If it looks serious, you should shut the client down and check your hard drive health immediately. Just to be safe, no more file maintenance jobs will be run this program boot, and a full traceback has been written to the log.'.format( ClientFilesMaintenance.regen_file_enum_to_str_lookup[ job_type ], hash.hex() )
-                        message += '\n' * 2
-                        message += str( e )
-                        
-                        job_status.SetStatusText( message )
-                        
-                        job_status.SetFiles( [ hash ], 'I/O error file' )
-                        
-                        CG.client_controller.pub( 'message', job_status )
-                        
-                        self._serious_error_encountered = True
-                        self._shutdown = True
+                        self._ReportIOError( hash, job_type, e )
                         
                         return
                         
@@ -1198,17 +1357,7 @@ class FilesMaintenanceManager( ClientDaemons.ManagerWithMainLoop ):
                         
                         HydrusData.PrintException( e )
                         
-                        job_status = ClientThreading.JobStatus()
-                        
-                        message = 'There was an unexpected problem performing maintenance task "{}" on file {}! The job will not be reattempted. A full traceback of this error should be written to the log.'.format( ClientFilesMaintenance.regen_file_enum_to_str_lookup[ job_type ], hash.hex() )
-                        message += '\n' * 2
-                        message += str( e )
-                        
-                        job_status.SetStatusText( message )
-                        
-                        job_status.SetFiles( [ hash ], 'failed file' )
-                        
-                        CG.client_controller.pub( 'message', job_status )
+                        self._ReportUnexpectedError( hash, job_type, e )
                         
                     finally:
                         
@@ -1227,12 +1376,28 @@ class FilesMaintenanceManager( ClientDaemons.ManagerWithMainLoop ):
                     
                     last_time_jobs_were_cleared = HydrusTime.GetNow()
                     
-                    cleared_jobs = []
+                    cleared_jobs.clear()
                     
                 
             
+            if len( hashes_to_futures ) > 0:
+                
+                process_done_futures( concurrent.futures.ALL_COMPLETED )
+                
+            
         finally:
             
+            if executor is not None:
+                
+                executor.shutdown( wait = True, cancel_futures = True )
+                
+                # we stopped early. anything that finished in the meantime still gets cleared
+                if len( hashes_to_futures ) > 0 and not self._serious_error_encountered:
+                    
+                    process_done_futures( concurrent.futures.ALL_COMPLETED )
+                    
+                
+            
             if len( cleared_jobs ) > 0:
                 
                 self._controller.Write( 'file_maintenance_clear_jobs', cleared_jobs )
@@ -1240,6 +1405,42 @@ class FilesMaintenanceManager( ClientDaemons.ManagerWithMainLoop ):
             
         
     
+    def _RunParallelisableJobs( self, media_result, job_types ):
+        
+        # this runs in a worker thread, so no job_status or popup stuff in here. we hand back results for the main loop to handle
+        
+        results = []
+        
+        for job_type in job_types:
+            
+            try:
+                
+                additional_data = self._parallelisable_job_types_to_calls[ job_type ]( media_result )
+                
+                results.append( ( job_type, additional_data, None ) )
+                
+            except HydrusExceptions.ShutdownException as e:
+                
+                results.append( ( job_type, None, e ) )
+                
+                break
+                
+            except Exception as e:
+                
+                HydrusData.PrintException( e )
+                
+                results.append( ( job_type, None, e ) )
+                
+                if isinstance( e, IOError ):
+                    
+                    break
+                    
+                
+            
+        
+        return results
+        
+    
     def CancelJobs( self, job_type ):
         
         with self._lock:
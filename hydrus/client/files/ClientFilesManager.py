@@ -25,6 +25,7 @@ from hydrus.client import ClientPaths
 from hydrus.client import ClientThreading
 from hydrus.client.files import ClientFilesMaintenance
 from hydrus.client.files import ClientFilesPhysical
+from hydrus.client.files import ClientFilesThumbnailPacks
 
 class ClientFilesManager( object ):
     
@@ -49,6 +50,10 @@ class ClientFilesManager( object ):
         self._bad_error_occurred = False
         self._missing_subfolders = set()
         
+        # subfolder paths to packs, or None if that subfolder has no pack yet
+        self._thumbnail_packs: dict[ str, ClientFilesThumbnailPacks.ThumbnailPack | None ] = {}
+        self._thumbnail_packs_lock = threading.Lock()
+        
         self._Reinit()
         
         self._DoMissingLocationsCheck()
@@ -112,11 +117,31 @@ class ClientFilesManager( object ):
         
         try:
             
-            HydrusPaths.TryToGiveFileNicePermissionBits( dest_path )
-            
-            with open( dest_path, 'wb' ) as f:
+            if self._UsePackedThumbnailStorage():
+                
+                self._GetThumbnailPack( hash, create = True ).AddThumbnail( hash, thumbnail_bytes )
                 
-                f.write( thumbnail_bytes )
+                # any loose copy is now stale
+                if os.path.exists( dest_path ):
+                    
+                    os.remove( dest_path )
+                    
+                
+            else:
+                
+                HydrusPaths.TryToGiveFileNicePermissionBits( dest_path )
+                
+                with open( dest_path, 'wb' ) as f:
+                    
+                    f.write( thumbnail_bytes )
+                    
+                
+                pack = self._GetThumbnailPack( hash )
+                
+                if pack is not None:
+                    
+                    pack.DeleteThumbnail( hash )
+                    
                 
             
         except Exception as e:
@@ -263,6 +288,22 @@ class ClientFilesManager( object ):
         return needed_to_copy_file
         
     
+    def _CloseThumbnailPacks( self ):
+        
+        with self._thumbnail_packs_lock:
+            
+            for pack in self._thumbnail_packs.values():
+                
+                if pack is not None:
+                    
+                    pack.Close()
+                    
+                
+            
+            self._thumbnail_packs = {}
+            
+        
+    
     def _DoMissingLocationsCheck( self ):
         
         if CG.client_controller.IsFirstStart():
@@ -797,6 +838,40 @@ class ClientFilesManager( object ):
         return self._GetPossibleSubfoldersForFile( hash, prefix_type )[0]
         
     
+    def _GetThumbnailPack( self, hash: bytes, create = False ) -> ClientFilesThumbnailPacks.ThumbnailPack | None:
+        
+        subfolder = self._GetSubfolderForFile( hash, 't' )
+        
+        return self._GetThumbnailPackForSubfolder( subfolder, create = create )
+        
+    
+    def _GetThumbnailPackForSubfolder( self, subfolder: ClientFilesPhysical.FilesStorageSubfolder, create = False ) -> ClientFilesThumbnailPacks.ThumbnailPack | None:
+        
+        with self._thumbnail_packs_lock:
+            
+            pack = self._thumbnail_packs.get( subfolder.path, None )
+            
+            if pack is None and ( create or subfolder.path not in self._thumbnail_packs ):
+                
+                if create or ClientFilesThumbnailPacks.PackExists( subfolder.path ):
+                    
+                    pack = ClientFilesThumbnailPacks.ThumbnailPack( subfolder.path )
+                    
+                
+                self._thumbnail_packs[ subfolder.path ] = pack
+                
+            
+            return pack
+            
+        
+    
+    def _HasPackedThumbnail( self, hash: bytes ) -> bool:
+        
+        pack = self._GetThumbnailPack( hash )
+        
+        return pack is not None and pack.HasThumbnail( hash )
+        
+    
     def _HandleCriticalDriveError( self ):
         
         self._controller.new_options.SetBoolean( 'pause_import_folders_sync', True )
@@ -836,6 +911,98 @@ class ClientFilesManager( object ):
         raise HydrusExceptions.FileMissingException( 'File for ' + hash.hex() + ' not found!' )
         
     
+    def _MaintainThumbnailPack( self, subfolder: ClientFilesPhysical.FilesStorageSubfolder ):
+        
+        if not subfolder.PathExists():
+            
+            return
+            
+        
+        if self._UsePackedThumbnailStorage():
+            
+            # move any loose thumbnails in. a loose thumb that is already packed is just a copy we made for someone who wanted a path
+            
+            pack = self._GetThumbnailPackForSubfolder( subfolder, create = True )
+            
+            for path in subfolder.IterateAllFiles():
+                
+                ( directory, filename ) = os.path.split( path )
+                
+                if not filename.endswith( '.thumbnail' ):
+                    
+                    continue
+                    
+                
+                try:
+                    
+                    hash = bytes.fromhex( filename[:64] )
+                    
+                except ValueError:
+                    
+                    continue
+                    
+                
+                if not pack.HasThumbnail( hash ):
+                    
+                    with open( path, 'rb' ) as f:
+                        
+                        thumbnail_bytes = f.read()
+                        
+                    
+                    if len( thumbnail_bytes ) == 0:
+                        
+                        continue
+                        
+                    
+                    pack.AddThumbnail( hash, thumbnail_bytes )
+                    
+                
+                ClientPaths.DeletePath( path, always_delete_fully = True )
+                
+            
+        
+        pack = self._GetThumbnailPackForSubfolder( subfolder )
+        
+        if pack is not None and pack.WantsCompaction():
+            
+            pack.Compact()
+            
+        
+    
+    def _ReadThumbnailBytes( self, hash: bytes ) -> bytes | None:
+        
+        pack = self._GetThumbnailPack( hash )
+        
+        if pack is not None:
+            
+            thumbnail_bytes = pack.GetThumbnailBytes( hash )
+            
+            if thumbnail_bytes is not None:
+                
+                return thumbnail_bytes
+                
+            
+        
+        path = self._GenerateExpectedThumbnailPath( hash )
+        
+        if HG.file_report_mode:
+            
+            HydrusData.ShowText( 'Thumbnail read: ' + path )
+            
+        
+        try:
+            
+            with open( path, 'rb' ) as f:
+                
+                return f.read()
+                
+            
+        except FileNotFoundError:
+            
+            return None
+            
+        
+    
     def _Reinit( self ):
         
         self._ReinitSubfolders()
@@ -843,6 +1010,8 @@ class ClientFilesManager( object ):
     
     def _ReinitSubfolders( self ):
         
+        self._CloseThumbnailPacks()
+        
         ( self._current_granularity, subfolders ) = self._controller.Read( 'client_files_subfolders' )
         
         self._prefixes_to_client_files_subfolders = collections.defaultdict( list )
@@ -860,6 +1029,43 @@ class ClientFilesManager( object ):
         self._missing_subfolders = { subfolder for subfolders in self._prefixes_to_client_files_subfolders.values() for subfolder in subfolders if not subfolder.PathExists( lazy_check_ok = True ) }
         
     
+    def _UnpackThumbnailPacks( self ):
+        
+        # file storage regranularisation moves files by their hash filenames, so it needs everything loose
+        
+        self._CloseThumbnailPacks()
+        
+        for subfolder in self._GetAllSubfolders():
+            
+            if subfolder.IsForFiles() or not ClientFilesThumbnailPacks.PackExists( subfolder.path ):
+                
+                continue
+                
+            
+            pack = ClientFilesThumbnailPacks.ThumbnailPack( subfolder.path )
+            
+            for ( hash, thumbnail_bytes ) in pack.IterateThumbnails():
+                
+                path = subfolder.GetFilePath( f'{hash.hex()}.thumbnail' )
+                
+                if not os.path.exists( path ):
+                    
+                    with open( path, 'wb' ) as f:
+                        
+                        f.write( thumbnail_bytes )
+                        
+                    
+                
+            
+            pack.DeletePack()
+            
+        
+    
+    def _UsePackedThumbnailStorage( self ):
+        
+        return self._controller.new_options.GetBoolean( 'use_packed_thumbnail_storage' )
+        
+    
     def _WaitOnWakeup( self ):
         
         if CG.client_controller.new_options.GetBoolean( 'file_system_waits_on_wakeup' ):
@@ -1001,6 +1207,11 @@ class ClientFilesManager( object ):
                                 return
                                 
                             
+                            if os.path.basename( path ) in ClientFilesThumbnailPacks.PACK_FILENAMES:
+                                
+                                continue
+                                
+                            
                             if subfolder.IsForFiles():
                                 
                                 if num_files_reviewed % 100 == 0:
@@ -1274,10 +1485,24 @@ class ClientFilesManager( object ):
                         
                         path = self._GenerateExpectedThumbnailPath( thumbnail_hash )
                         
+                        thumbnail_deleted = False
+                        
                         if os.path.exists( path ):
                             
                             ClientPaths.DeletePath( path, always_delete_fully = True )
                             
+                            thumbnail_deleted = True
+                            
+                        
+                        pack = self._GetThumbnailPack( thumbnail_hash )
+                        
+                        if pack is not None and pack.DeleteThumbnail( thumbnail_hash ):
+                            
+                            thumbnail_deleted = True
+                            
+                        
+                        if thumbnail_deleted:
+                            
                             num_thumbnails_deleted += 1
                             
                         
@@ -1380,7 +1605,9 @@ class ClientFilesManager( object ):
             
         
     
-    def GetThumbnailPath( self, media_result ):
+    def GetThumbnailPath( self, media_result ) -> str | None:
+        
+        # a packed thumb has no path of its own, so this gives None for those. anything that can, should use GetThumbnailBytes
         
         hash = media_result.GetHash()
         mime = media_result.GetMime()
@@ -1396,22 +1623,75 @@ class ClientFilesManager( object ):
                 
                 path = self._GenerateExpectedThumbnailPath( hash )
                 
-                thumb_missing = not os.path.exists( path )
+                if os.path.exists( path ):
+                    
+                    return path
+                    
+                
+                if self._HasPackedThumbnail( hash ):
+                    
+                    return None
+                    
                 
             
         
-        if thumb_missing:
+        self.RegenerateThumbnail( media_result )
+        
+        with self._master_locations_rwlock.read:
             
-            self.RegenerateThumbnail( media_result )
+            with self._GetPrefixRWLock( hash, 't' ).read:
+                
+                if not os.path.exists( path ) and self._HasPackedThumbnail( hash ):
+                    
+                    return None
+                    
+                
             
         
         return path
         
     
+    def GetThumbnailBytes( self, media_result ) -> bytes:
+        
+        hash = media_result.GetHash()
+        
+        with self._master_locations_rwlock.read:
+            
+            with self._GetPrefixRWLock( hash, 't' ).read:
+                
+                thumbnail_bytes = self._ReadThumbnailBytes( hash )
+                
+            
+        
+        if not thumbnail_bytes:
+            
+            self.RegenerateThumbnail( media_result )
+            
+            with self._master_locations_rwlock.read:
+                
+                with self._GetPrefixRWLock( hash, 't' ).read:
+                    
+                    thumbnail_bytes = self._ReadThumbnailBytes( hash )
+                    
+                
+            
+            if not thumbnail_bytes:
+                
+                raise HydrusExceptions.FileMissingException( f'The thumbnail for file {hash.hex()} was missing and could not be regenerated!' )
+                
+            
+        
+        return thumbnail_bytes
+        
+    
     def Granularise( self, job_status: ClientThreading.JobStatus, starting_granularity: int, ending_granularity: int ):
         
         with self._master_locations_rwlock.write:
             
+            job_status.SetStatusText( 'unpacking thumbnails' )
+            
+            self._UnpackThumbnailPacks()
+            
             granularise_result = CG.client_controller.WriteSynchronous( 'granularise', job_status, starting_granularity, ending_granularity )
             
             self._Reinit()
@@ -1434,6 +1714,11 @@ class ClientFilesManager( object ):
     
     def LocklessHasThumbnail( self, hash ):
         
+        if self._HasPackedThumbnail( hash ):
+            
+            return True
+            
+        
         path = self._GenerateExpectedThumbnailPath( hash )
         
         if HG.file_report_mode:
@@ -1444,6 +1729,48 @@ class ClientFilesManager( object ):
         return os.path.exists( path )
         
     
+    def MaintainThumbnailPacks( self ):
+        
+        with self._master_locations_rwlock.read:
+            
+            thumbnail_prefixes = sorted( ( prefix for prefix in self._prefixes_to_client_files_subfolders.keys() if prefix.startswith( 't' ) ) )
+            
+        
+        for prefix in thumbnail_prefixes:
+            
+            if HG.started_shutdown or not self._controller.GoodTimeToStartBackgroundWork():
+                
+                return
+                
+            
+            with self._master_locations_rwlock.read:
+                
+                if prefix not in self._prefixes_to_client_files_subfolders:
+                    
+                    continue
+                    
+                
+                with self._prefixes_to_rwlocks[ prefix ].write:
+                    
+                    for subfolder in self._prefixes_to_client_files_subfolders[ prefix ]:
+                        
+                        try:
+                            
+                            self._MaintainThumbnailPack( subfolder )
+                            
+                        except Exception as e:
+                            
+                            HydrusData.Print( f'Problem maintaining the thumbnail pack in {subfolder}! Error follows:' )
+                            HydrusData.PrintException( e, do_wait = False )
+                            
+                            return
+                            
+                        
+                    
+                
+            
+        
+    
     def Rebalance( self, job_status ):
         
         try:
@@ -1474,6 +1801,9 @@ class ClientFilesManager( object ):
                     
                     job_status.SetStatusText( text )
                     
+                    # the pack files move with their subfolder, but we can't hold them open while that happens
+                    self._CloseThumbnailPacks()
+                    
                     # these two lines can cause a deadlock because the db sometimes calls stuff in here.
                     self._controller.WriteSynchronous( 'relocate_client_files', source_subfolder, dest_subfolder )
                     
@@ -1556,16 +1886,16 @@ class ClientFilesManager( object ):
             
             ( media_width, media_height ) = media_result.GetResolution()
             
-            path = self._GenerateExpectedThumbnailPath( hash )
+            thumbnail_bytes = self._ReadThumbnailBytes( hash )
             
-            if not os.path.exists( path ):
+            if not thumbnail_bytes:
                 
                 raise Exception()
                 
             
-            thumbnail_mime = HydrusFileHandling.GetThumbnailMime( path )
+            thumbnail_mime = HydrusFileHandling.GetThumbnailMimeFromBytes( thumbnail_bytes )
             
-            numpy_image = HydrusImageHandling.GenerateNumPyImage( path, thumbnail_mime )
+            numpy_image = HydrusImageHandling.GenerateNumPyImageFromBytes( thumbnail_bytes, thumbnail_mime )
             
             ( current_width, current_height ) = HydrusImageHandling.GetResolutionNumPy( numpy_image )
             
@@ -1639,4 +1969,6 @@ class ClientFilesManager( object ):
         
         self._physical_file_delete_wait.set()
         
+        self._CloseThumbnailPacks()
+        
     
@@ -0,0 +1,432 @@
+import collections.abc
+import mmap
+import os
+import struct
+import threading
+
+from hydrus.core import HydrusData
+from hydrus.core import HydrusExceptions
+
+# a thumbnail subfolder can hold one append-only pack of thumbnails instead of thousands of tiny files
+# it lives inside the subfolder, so prefix locks, rebalancing and moving the subfolder all work as before
+# a record is a 32-byte hash, a 4-byte length, and then the thumbnail bytes. a zero length is a tombstone
+# the index is a snapshot of the offsets as of a certain pack length. anything appended after that is found by scanning
+
+PACK_FILENAME = 'thumbnails.pack'
+INDEX_FILENAME = 'thumbnails.pack.index'
+INDEX_TEMP_FILENAME = 'thumbnails.pack.index.temp'
+COMPACTION_FILENAME = 'thumbnails.pack.compacting'
+
+PACK_FILENAMES = ( PACK_FILENAME, INDEX_FILENAME, INDEX_TEMP_FILENAME, COMPACTION_FILENAME )
+
+RECORD_HEADER = struct.Struct( '<32sI' )
+INDEX_HEADER = struct.Struct( '<4sIQ' )
+INDEX_ROW = struct.Struct( '<32sQI' )
+
+INDEX_MAGIC = b'HTPI'
+INDEX_VERSION = 1
+
+# don't bother compacting small packs
+MIN_COMPACTION_PACK_SIZE = 4 * 1048576
+
+def PackExists( directory: str ) -> bool:
+    
+    return os.path.exists( os.path.join( directory, PACK_FILENAME ) )
+    
+
+class ThumbnailPack( object ):
+    
+    def __init__( self, directory: str ):
+        
+        self._directory = directory
+        
+        self._pack_path = os.path.join( self._directory, PACK_FILENAME )
+        self._index_path = os.path.join( self._directory, INDEX_FILENAME )
+        
+        self._lock = threading.Lock()
+        
+        self._hashes_to_offsets_and_lengths = {}
+        
+        self._pack_length = 0
+        self._num_live_bytes = 0
+        
+        self._index_is_dirty = False
+        
+        self._read_file = None
+        self._mmap = None
+        
+        self._LoadIndex()
+        
+    
+    def _AppendRecord( self, hash: bytes, thumbnail_bytes: bytes ):
+        
+        record_header = RECORD_HEADER.pack( hash, len( thumbnail_bytes ) )
+        
+        with open( self._pack_path, 'ab' ) as f:
+            
+            f.write( record_header )
+            f.write( thumbnail_bytes )
+            
+        
+        self._ForgetHash( hash )
+        
+        if len( thumbnail_bytes ) > 0:
+            
+            self._hashes_to_offsets_and_lengths[ hash ] = ( self._pack_length + RECORD_HEADER.size, len( thumbnail_bytes ) )
+            
+            self._num_live_bytes += RECORD_HEADER.size + len( thumbnail_bytes )
+            
+        
+        self._pack_length += RECORD_HEADER.size + len( thumbnail_bytes )
+        
+        self._index_is_dirty = True
+        
+    
+    def _CloseMMap( self ):
+        
+        if self._mmap is not None:
+            
+            self._mmap.close()
+            
+            self._mmap = None
+            
+        
+        if self._read_file is not None:
+            
+            self._read_file.close()
+            
+            self._read_file = None
+            
+        
+    
+    def _ForgetHash( self, hash: bytes ):
+        
+        if hash in self._hashes_to_offsets_and_lengths:
+            
+            ( offset, length ) = self._hashes_to_offsets_and_lengths[ hash ]
+            
+            del self._hashes_to_offsets_and_lengths[ hash ]
+            
+            self._num_live_bytes -= RECORD_HEADER.size + length
+            
+        
+    
+    def _LoadIndex( self ):
+        
+        if not os.path.exists( self._pack_path ):
+            
+            return
+            
+        
+        actual_pack_length = os.path.getsize( self._pack_path )
+        
+        covered_pack_length = 0
+        
+        try:
+            
+            if os.path.exists( self._index_path ):
+                
+                with open( self._index_path, 'rb' ) as f:
+                    
+                    index_bytes = f.read()
+                    
+                
+                ( magic, version, index_pack_length ) = INDEX_HEADER.unpack_from( index_bytes, 0 )
+                
+                if magic == INDEX_MAGIC and version == INDEX_VERSION and index_pack_length <= actual_pack_length and ( len( index_bytes ) - INDEX_HEADER.size ) % INDEX_ROW.size == 0:
+                    
+                    for ( hash, offset, length ) in INDEX_ROW.iter_unpack( memoryview( index_bytes )[ INDEX_HEADER.size : ] ):
+                        
+                        self._hashes_to_offsets_and_lengths[ hash ] = ( offset, length )
+                        
+                    
+                    covered_pack_length = index_pack_length
+                    
+                
+            
+        except Exception as e:
+            
+            HydrusData.Print( f'The thumbnail pack index at "{self._index_path}" could not be read, so the pack will be rescanned. Error follows:' )
+            HydrusData.PrintException( e, do_wait = False )
+            
+            self._hashes_to_offsets_and_lengths = {}
+            
+            covered_pack_length = 0
+            
+        
+        self._pack_length = covered_pack_length
+        
+        if covered_pack_length < actual_pack_length:
+            
+            self._ScanPack( covered_pack_length, actual_pack_length )
+            
+        
+        self._num_live_bytes = sum( ( RECORD_HEADER.size + length for ( offset, length ) in self._hashes_to_offsets_and_lengths.values() ) )
+        
+    
+    def _MakeSureMMapCovers( self, end: int ):
+        
+        if self._mmap is not None and len( self._mmap ) >= end:
+            
+            return
+            
+        
+        self._CloseMMap()
+        
+        self._read_file = open( self._pack_path, 'rb' )
+        self._mmap = mmap.mmap( self._read_file.fileno(), 0, access = mmap.ACCESS_READ )
+        
+    
+    def _SaveIndex( self ):
+        
+        temp_index_path = os.path.join( self._directory, INDEX_TEMP_FILENAME )
+        
+        with open( temp_index_path, 'wb' ) as f:
+            
+            f.write( INDEX_HEADER.pack( INDEX_MAGIC, INDEX_VERSION, self._pack_length ) )
+            
+            f.write( b''.join( ( INDEX_ROW.pack( hash, offset, length ) for ( hash, ( offset, length ) ) in self._hashes_to_offsets_and_lengths.items() ) ) )
+            
+        
+        os.replace( temp_index_path, self._index_path )
+        
+        self._index_is_dirty = False
+        
+    
+    def _ScanPack( self, start: int, end: int ):
+        
+        good_end = start
+        
+        with open( self._pack_path, 'rb' ) as f:
+            
+            f.seek( start )
+            
+            while good_end + RECORD_HEADER.size <= end:
+                
+                ( hash, length ) = RECORD_HEADER.unpack( f.read( RECORD_HEADER.size ) )
+                
+                data_offset = good_end + RECORD_HEADER.size
+                
+                if data_offset + length > end:
+                    
+                    break
+                    
+                
+                if length == 0:
+                    
+                    self._hashes_to_offsets_and_lengths.pop( hash, None )
+                    
+                else:
+                    
+                    self._hashes_to_offsets_and_lengths[ hash ] = ( data_offset, length )
+                    
+                
+                f.seek( length, os.SEEK_CUR )
+                
+                good_end = data_offset + length
+                
+            
+        
+        if good_end < end:
+            
+            # a half-written record from a crash. it was never acknowledged, so drop it
+            
+            HydrusData.Print( f'The thumbnail pack at "{self._pack_path}" had a partial record at its end, which has been truncated.' )
+            
+            with open( self._pack_path, 'r+b' ) as f:
+                
+                f.truncate( good_end )
+                
+            
+        
+        self._pack_length = good_end
+        
+        self._index_is_dirty = True
+        
+    
+    def AddThumbnail( self, hash: bytes, thumbnail_bytes: bytes ):
+        
+        if len( thumbnail_bytes ) == 0:
+            
+            raise HydrusExceptions.ZeroSizeFileException( 'Cannot pack an empty thumbnail!' )
+            
+        
+        with self._lock:
+            
+            self._AppendRecord( hash, thumbnail_bytes )
+            
+        
+    
+    def Close( self ):
+        
+        with self._lock:
+            
+            self._CloseMMap()
+            
+            if self._index_is_dirty and os.path.exists( self._pack_path ):
+                
+                try:
+                    
+                    self._SaveIndex()
+                    
+                except Exception as e:
+                    
+                    # not a big deal, we'll scan next time
+                    
+                    HydrusData.PrintException( e, do_wait = False )
+                    
+                
+            
+        
+    
+    def Compact( self ):
+        
+        with self._lock:
+            
+            compaction_path = os.path.join( self._directory, COMPACTION_FILENAME )
+            
+            new_hashes_to_offsets_and_lengths = {}
+            
+            new_pack_length = 0
+            
+            # offset order keeps the reads sequential
+            hashes_and_offsets_and_lengths = sorted( self._hashes_to_offsets_and_lengths.items(), key = lambda item: item[1][0] )
+            
+            if len( hashes_and_offsets_and_lengths ) > 0:
+                
+                self._MakeSureMMapCovers( self._pack_length )
+                
+            
+            with open( compaction_path, 'wb' ) as f:
+                
+                for ( hash, ( offset, length ) ) in hashes_and_offsets_and_lengths:
+                    
+                    f.write( RECORD_HEADER.pack( hash, length ) )
+                    f.write( self._mmap[ offset : offset + length ] )
+                    
+                    new_hashes_to_offsets_and_lengths[ hash ] = ( new_pack_length + RECORD_HEADER.size, length )
+                    
+                    new_pack_length += RECORD_HEADER.size + length
+                    
+                
+            
+            self._CloseMMap()
+            
+            # the old index has the old offsets. if we die before the new one is saved, the new pack has to be rescanned, not read with those
+            if os.path.exists( self._index_path ):
+                
+                os.remove( self._index_path )
+                
+            
+            os.replace( compaction_path, self._pack_path )
+            
+            self._hashes_to_offsets_and_lengths = new_hashes_to_offsets_and_lengths
+            self._pack_length = new_pack_length
+            self._num_live_bytes = new_pack_length
+            
+            self._SaveIndex()
+            
+        
+    
+    def DeletePack( self ):
+        
+        with self._lock:
+            
+            self._CloseMMap()
+            
+            for filename in PACK_FILENAMES:
+                
+                path = os.path.join( self._directory, filename )
+                
+                if os.path.exists( path ):
+                    
+                    os.remove( path )
+                    
+                
+            
+            self._hashes_to_offsets_and_lengths = {}
+            self._pack_length = 0
+            self._num_live_bytes = 0
+            self._index_is_dirty = False
+            
+        
+    
+    def DeleteThumbnail( self, hash: bytes ) -> bool:
+        
+        with self._lock:
+            
+            if hash not in self._hashes_to_offsets_and_lengths:
+                
+                return False
+                
+            
+            self._AppendRecord( hash, b'' )
+            
+            return True
+            
+        
+    
+    def GetHashes( self ) -> set[ bytes ]:
+        
+        with self._lock:
+            
+            return set( self._hashes_to_offsets_and_lengths.keys() )
+            
+        
+    
+    def GetNumThumbnails( self ) -> int:
+        
+        with self._lock:
+            
+            return len( self._hashes_to_offsets_and_lengths )
+            
+        
+    
+    def GetThumbnailBytes( self, hash: bytes ) -> bytes | None:
+        
+        with self._lock:
+            
+            if hash not in self._hashes_to_offsets_and_lengths:
+                
+                return None
+                
+            
+            ( offset, length ) = self._hashes_to_offsets_and_lengths[ hash ]
+            
+            self._MakeSureMMapCovers( offset + length )
+            
+            return self._mmap[ offset : offset + length ]
+            
+        
+    
+    def HasThumbnail( self, hash: bytes ) -> bool:
+        
+        with self._lock:
+            
+            return hash in self._hashes_to_offsets_and_lengths
+            
+        
+    
+    def IterateThumbnails( self ) -> collections.abc.Iterator[ tuple[ bytes, bytes ] ]:
+        
+        for hash in self.GetHashes():
+            
+            thumbnail_bytes = self.GetThumbnailBytes( hash )
+            
+            if thumbnail_bytes is not None:
+                
+                yield ( hash, thumbnail_bytes )
+                
+            
+        
+    
+    def WantsCompaction( self ) -> bool:
+        
+        with self._lock:
+            
+            num_dead_bytes = self._pack_length - self._num_live_bytes
+            
+            return self._pack_length > MIN_COMPACTION_PACK_SIZE and num_dead_bytes > self._pack_length // 2
+            
+        
+    
@@ -33,6 +33,7 @@ from hydrus.client import ClientLocation
 from hydrus.client import ClientPaths
 from hydrus.client import ClientServices
 from hydrus.client import ClientThreading
+from hydrus.client.caches import ClientCachesBase
 from hydrus.client.exporting import ClientExportingFiles
 from hydrus.client.gui import ClientGUIAboutWindow
 from hydrus.client.gui import ClientGUIAsync
@@ -1660,6 +1661,18 @@ class FrameGUI( CAC.ApplicationCommandProcessorMixin, ClientGUITopLevelWindows.M
         HydrusMemory.TakeMemoryUseSnapshot()
         
     
+    def _DebugPrintCacheStatistics( self ):
+        
+        for ( name, statistics ) in ClientCachesBase.GetDataCacheStatistics():
+            
+            num_requests = statistics[ 'num_hits' ] + statistics[ 'num_misses' ]
+            
+            hit_rate = HydrusNumbers.FloatToPercentage( statistics[ 'num_hits' ] / num_requests ) if num_requests > 0 else 'n/a'
+            
+            HydrusData.ShowText( f'{name}: {HydrusNumbers.ToHumanInt( statistics[ "num_items" ] )} items ({HydrusNumbers.ToHumanInt( statistics[ "num_protected_items" ] )} protected), {HydrusData.ConvertValueRangeToBytes( statistics[ "estimated_memory_footprint" ], statistics[ "size_limit" ] )}, {HydrusNumbers.ToHumanInt( statistics[ "num_hits" ] )} hits, {HydrusNumbers.ToHumanInt( statistics[ "num_misses" ] )} misses ({hit_rate} hit rate), {HydrusNumbers.ToHumanInt( statistics[ "num_evictions" ] )} evictions' )
+            
+        
+    
     def _DebugPrintMemoryUse( self ):
         
         if not HydrusMemory.PYMPLER_OK:
@@ -3069,6 +3082,8 @@ ATTACH "client.mappings.db" as external_mappings;'''
                         
                         ClientGUIMenus.AppendMenuItem( submenu, 'change update period' + HC.UNICODE_ELLIPSIS, 'Change the update period for this service.', self._ManageServiceOptionsUpdatePeriod, service_key )
                         
+                        ClientGUIMenus.AppendMenuItem( submenu, 'change update format' + HC.UNICODE_ELLIPSIS, 'Change the file format of new updates for this service.', self._ManageServiceOptionsUpdateFormat, service_key )
+                        
                         ClientGUIMenus.AppendMenuItem( submenu, 'change anonymisation period' + HC.UNICODE_ELLIPSIS, 'Change the account history nullification period for this service.', self._ManageServiceOptionsNullificationPeriod, service_key )
                         
                         if service_type == HC.TAG_REPOSITORY:
@@ -3661,6 +3676,7 @@ ATTACH "client.mappings.db" as external_mappings;'''
         ClientGUIMenus.AppendMenuItem( memory_actions, 'run slow memory maintenance', 'Tell all the slow caches to maintain themselves.', self._controller.MaintainMemorySlow )
         ClientGUIMenus.AppendMenuItem( memory_actions, 'clear all rendering caches', 'Tell the image rendering system to forget all current images, tiles, and thumbs. This will often free up a bunch of memory immediately.', self._controller.ClearCaches )
         ClientGUIMenus.AppendMenuItem( memory_actions, 'clear thumbnail cache', 'Tell the thumbnail cache to forget everything and redraw all current thumbs.', self._controller.pub, 'clear_thumbnail_cache' )
+        ClientGUIMenus.AppendMenuItem( memory_actions, 'print cache statistics', 'Print the size, hit rate, and eviction count of the image, tile, thumbnail, and other data caches.', self._DebugPrintCacheStatistics )
         
         if HydrusMemory.PYMPLER_OK:
             
@@ -4821,6 +4837,84 @@ ATTACH "client.mappings.db" as external_mappings;'''
             
         
     
+    def _ManageServiceOptionsUpdateFormat( self, service_key ):
+        
+        service = self._controller.services_manager.GetService( service_key )
+        
+        try:
+            
+            update_format = service.GetUpdateFormat()
+            
+        except HydrusExceptions.DataMissing as e:
+            
+            ClientGUIDialogsMessage.ShowWarning( self, str( e ) )
+            
+            return
+            
+        
+        message = 'This is one setting for the whole repository. Every client downloads the same update files, and clients older than this one cannot read the compact format, so only switch to it if all your users are up to date. Updates that are already made are not converted.'
+        
+        choice_tuples = []
+        
+        for ( possible_update_format, text ) in HydrusNetwork.update_format_string_lookup.items():
+            
+            if possible_update_format == update_format:
+                
+                text += ' (current)'
+                
+            
+            choice_tuples.append( ( text, possible_update_format, text ) )
+            
+        
+        try:
+            
+            new_update_format = ClientGUIDialogsQuick.SelectFromListButtons( self, 'edit update format', choice_tuples, message = message )
+            
+        except HydrusExceptions.CancelledException:
+            
+            return
+            
+        
+        if new_update_format == update_format:
+            
+            return
+            
+        
+        job_status = ClientThreading.JobStatus()
+        
+        job_status.SetStatusTitle( 'setting update format' )
+        job_status.SetStatusText( 'uploading' + HC.UNICODE_ELLIPSIS )
+        
+        self._controller.pub( 'message', job_status )
+        
+        def work_callable():
+            
+            service.Request( HC.POST, 'options_update_format', { 'update_format' : new_update_format } )
+            
+            return 1
+            
+        
+        def publish_callable( gumpf ):
+            
+            job_status.SetStatusText( 'done!' )
+            
+            job_status.FinishAndDismiss( 5 )
+            
+            service.SetAccountRefreshDueNow()
+            
+        
+        def errback_callable( etype, value, tb ):
+            
+            job_status.SetExceptionTuple( etype, value, tb )
+            
+            job_status.Finish()
+            
+        
+        job = ClientGUIAsync.AsyncQtJob( self, work_callable, publish_callable, errback_callable = errback_callable )
+        
+        job.start()
+        
+    
     def _ManageServiceOptionsUpdatePeriod( self, service_key ):
         
         service = self._controller.services_manager.GetService( service_key )
@@ -167,6 +167,7 @@ def ShowAboutWindow( win: QW.QWidget ):
     library_version_lines.append( 'db synchronous mode: {}'.format( HG.db_synchronous ) )
     library_version_lines.append( 'db transaction commit period: {}'.format( HydrusTime.TimeDeltaToPrettyTimeDelta( HG.db_transaction_commit_period ) ) )
     library_version_lines.append( 'db using memory for temp?: {}'.format( HG.no_db_temp_files ) )
+    library_version_lines.append( 'db read-only pool size: {}'.format( HG.db_read_pool_size ) )
     
     description_versions = 'This is the media management application of the hydrus software suite.' + '\n' * 2 + '\n'.join( library_version_lines )
     
@@ -226,6 +227,7 @@ def ShowAboutWindow( win: QW.QWidget ):
     availability_lines.append( render_availability_line( 'lxml', ClientParsing.LXML_IS_OK, not ClientParsing.LXML_IS_OK, '' ) )
     availability_lines.append( render_availability_line( 'lz4', HydrusCompression.LZ4_OK, not HydrusCompression.LZ4_OK, '' ) )
     availability_lines.append( render_availability_line( 'olefile', HydrusOLEHandling.OLEFILE_OK, not HydrusOLEHandling.OLEFILE_OK, '' ) )
+    availability_lines.append( render_availability_line( 'zstd', HydrusCompression.ZSTD_OK, not HydrusCompression.ZSTD_OK, '' ) )
     
     #
     
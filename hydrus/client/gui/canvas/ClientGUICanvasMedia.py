@@ -3327,11 +3327,13 @@ class EmbedButton( QW.QWidget ):
                 
             else:
                 
-                thumbnail_path = CG.client_controller.client_files_manager.GetThumbnailPath( display_media_result )
+                thumbnail_bytes = CG.client_controller.client_files_manager.GetThumbnailBytes( display_media_result )
                 
-                thumbnail_mime = HydrusFileHandling.GetThumbnailMime( thumbnail_path )
+                thumbnail_mime = HydrusFileHandling.GetThumbnailMimeFromBytes( thumbnail_bytes )
                 
-                self._thumbnail_qt_pixmap = ClientRendering.GenerateHydrusBitmap( thumbnail_path, thumbnail_mime ).GetQtPixmap()
+                numpy_image = HydrusImageHandling.GenerateNumPyImageFromBytes( thumbnail_bytes, thumbnail_mime )
+                
+                self._thumbnail_qt_pixmap = ClientRendering.GenerateHydrusBitmapFromNumPyImage( numpy_image ).GetQtPixmap()
                 
                 self.update()
                 
@@ -4,6 +4,7 @@ from hydrus.core import HydrusExceptions
 from hydrus.core import HydrusSerialisable
 
 from hydrus.client import ClientConstants as CC
+from hydrus.client.importing import ClientImportFileSeeds
 
 RESERVED_SESSION_NAMES = { '', 'just a blank page', CC.LAST_SESSION_SESSION_NAME, CC.EXIT_SESSION_SESSION_NAME }
 
@@ -211,27 +212,32 @@ class GUISessionPageData( HydrusSerialisable.SerialisableBase ):
     
     SERIALISABLE_TYPE = HydrusSerialisable.SERIALISABLE_TYPE_GUI_SESSION_PAGE_DATA
     SERIALISABLE_NAME = 'GUI Session Page Data'
-    SERIALISABLE_VERSION = 1
+    SERIALISABLE_VERSION = 2
     
     def __init__( self, page_manager = None, hashes = None ):
         
         super().__init__()
         
+        self._page_manager = None
+        self._serialisable_page_manager = None
+        self._hashes_to_serialisable_file_seed_chunks = {}
+        
         if page_manager is None:
             
-            self._page_manager = None
             self._hashes = None
             
         else:
             
-            self._page_manager = page_manager.Duplicate() # duplicate, which _should_ freeze downloaders etc.. inside the MC
+            # a serialised snapshot, which _should_ freeze downloaders etc.. inside the MC
+            # the file logs in it are split off into chunks that the db stores separately, so a save only writes the chunks that changed
+            ( self._serialisable_page_manager, self._hashes_to_serialisable_file_seed_chunks ) = ClientImportFileSeeds.StripFileSeedChunks( page_manager.GetSerialisableTuple() )
             self._hashes = list( hashes )
             
         
     
     def _GetSerialisableInfo( self ):
         
-        serialisable_page_manager = self._page_manager.GetSerialisableTuple()
+        serialisable_page_manager = self._serialisable_page_manager
         serialisable_hashes = [ hash.hex() for hash in self._hashes ]
         
         return ( serialisable_page_manager, serialisable_hashes )
@@ -241,10 +247,32 @@ class GUISessionPageData( HydrusSerialisable.SerialisableBase ):
         
         ( serialisable_page_manager, serialisable_hashes ) = serialisable_info
         
-        self._page_manager = HydrusSerialisable.CreateFromSerialisableTuple( serialisable_page_manager )
+        self._serialisable_page_manager = serialisable_page_manager
         self._hashes = [ bytes.fromhex( hash_hex ) for hash_hex in serialisable_hashes ]
         
     
+    def _UpdateSerialisableInfo( self, version, old_serialisable_info ):
+        
+        if version == 1:
+            
+            # v1 had its file logs inline, which v2 still loads fine
+            
+            new_serialisable_info = old_serialisable_info
+            
+            return ( 2, new_serialisable_info )
+            
+        
+    
+    def GetFileSeedChunkHashes( self ) -> set[ bytes ]:
+        
+        return ClientImportFileSeeds.GetStrippedFileSeedChunkHashes( self._serialisable_page_manager )
+        
+    
+    def GetFileSeedChunks( self ):
+        
+        return self._hashes_to_serialisable_file_seed_chunks
+        
+    
     def GetHashes( self ):
         
         return self._hashes
@@ -252,7 +280,24 @@ class GUISessionPageData( HydrusSerialisable.SerialisableBase ):
     
     def GetPageManager( self ):
         
+        if self._page_manager is None:
+            
+            serialisable_page_manager = ClientImportFileSeeds.FillFileSeedChunks( self._serialisable_page_manager, self._hashes_to_serialisable_file_seed_chunks )
+            
+            self._page_manager = HydrusSerialisable.CreateFromSerialisableTuple( serialisable_page_manager )
+            
+        
         return self._page_manager
         
     
+    def SetFileSeedChunks( self, hashes_to_serialisable_file_seed_chunks ):
+        
+        self._hashes_to_serialisable_file_seed_chunks = hashes_to_serialisable_file_seed_chunks
+        
+        # we are on the db thread here, so get the heavy object construction done now
+        self._page_manager = None
+        
+        self.GetPageManager()
+        
+    
 HydrusSerialisable.SERIALISABLE_TYPES_TO_OBJECT_TYPES[ HydrusSerialisable.SERIALISABLE_TYPE_GUI_SESSION_PAGE_DATA ] = GUISessionPageData
@@ -276,7 +276,10 @@ class ManageOptionsPanel( ClientGUIScrolledPanels.ManagePanel ):
             
             curl_cffi_changes = self._original_new_options.GetNoneableString( 'curl_cffi_definition' ) != test_new_options.GetNoneableString( 'curl_cffi_definition' )
             
-            if curl_cffi_changes:
+            # sessions size their connection pools to these
+            per_domain_changes = True in ( self._original_new_options.GetInteger( name ) != test_new_options.GetInteger( name ) for name in ( 'max_network_jobs', 'max_network_jobs_per_domain' ) )
+            
+            if curl_cffi_changes or per_domain_changes:
                 
                 CG.client_controller.network_engine.session_manager.ReinitialiseSessions()
                 
@@ -69,6 +69,9 @@ class ConnectionPanel( ClientGUIOptionsPanelBase.OptionsPagePanel ):
         self._max_network_jobs = ClientGUICommon.BetterSpinBox( general, min = 1, max = max_network_jobs_max )
         self._max_network_jobs_per_domain = ClientGUICommon.BetterSpinBox( general, min = 1, max = max_network_jobs_per_domain_max )
         
+        self._max_network_jobs.setToolTip( ClientGUIFunctions.WrapToolTip( 'Every running network job has a thread of its own until it is done. Jobs that are waiting on bandwidth, a login or a free slot do not take one.' ) )
+        self._max_network_jobs_per_domain.setToolTip( ClientGUIFunctions.WrapToolTip( 'This also sets how many connections to each server are kept open between jobs, for reuse.' ) )
+        
         self._set_requests_ca_bundle_env = QW.QCheckBox( general )
         self._set_requests_ca_bundle_env.setToolTip( ClientGUIFunctions.WrapToolTip( 'Just testing something here; ignore unless hydev asks you to use it please. Requires restart. Note: this breaks the self-signed certificates of hydrus services.' ) )
         
@@ -37,6 +37,10 @@ class GUISessionsPanel( ClientGUIOptionsPanelBase.OptionsPagePanel ):
         
         self._show_session_size_warnings.setToolTip( ClientGUIFunctions.WrapToolTip( 'This will give you a once-per-boot warning popup if your active session contains more than 10M weight.' ) )
         
+        self._save_media_result_snapshot_on_exit = QW.QCheckBox( self._sessions_panel )
+        
+        self._save_media_result_snapshot_on_exit.setToolTip( ClientGUIFunctions.WrapToolTip( 'On exit, the client will write the file metadata of everything open in your session to a file in your db directory. On the next boot, your pages will load from this snapshot instead of the database, and the snapshot will be checked against the database in the background. This can make big sessions load much faster. The snapshot is only used once, so if the client crashes, the next boot just loads normally.' ) )
+        
         #
         
         gui_session_names = CG.client_controller.Read( 'serialisable_names', HydrusSerialisable.SERIALISABLE_TYPE_GUI_SESSION_CONTAINER )
@@ -63,6 +67,8 @@ class GUISessionsPanel( ClientGUIOptionsPanelBase.OptionsPagePanel ):
         
         self._show_session_size_warnings.setChecked( self._new_options.GetBoolean( 'show_session_size_warnings' ) )
         
+        self._save_media_result_snapshot_on_exit.setChecked( self._new_options.GetBoolean( 'save_media_result_snapshot_on_exit' ) )
+        
         #
         
         rows = []
@@ -72,6 +78,7 @@ class GUISessionsPanel( ClientGUIOptionsPanelBase.OptionsPagePanel ):
         rows.append( ( 'If \'last session\' above, only autosave during idle time?', self._only_save_last_session_during_idle ) )
         rows.append( ( 'Number of session backups to keep: ', self._number_of_gui_session_backups ) )
         rows.append( ( f'Show warning popup if session size exceeds {HydrusNumbers.ToHumanInt( 10000000 )}: ', self._show_session_size_warnings ) )
+        rows.append( ( 'Save a snapshot of open file metadata on exit to speed up the next boot: ', self._save_media_result_snapshot_on_exit ) )
         
         sessions_gridbox = ClientGUICommon.WrapInGrid( self._sessions_panel, rows )
         
@@ -97,4 +104,6 @@ class GUISessionsPanel( ClientGUIOptionsPanelBase.OptionsPagePanel ):
         
         self._new_options.SetBoolean( 'only_save_last_session_during_idle', self._only_save_last_session_during_idle.isChecked() )
         
+        self._new_options.SetBoolean( 'save_media_result_snapshot_on_exit', self._save_media_result_snapshot_on_exit.isChecked() )
+        
     
@@ -75,6 +75,10 @@ class MaintenanceAndProcessingPanel( ClientGUIOptionsPanelBase.OptionsPagePanel
         self._file_maintenance_idle_throttle_velocity.setToolTip( ClientGUIFunctions.WrapToolTip( tt ) )
         self._file_maintenance_active_throttle_velocity.setToolTip( ClientGUIFunctions.WrapToolTip( tt ) )
         
+        self._file_maintenance_num_workers = ClientGUICommon.BetterSpinBox( self._file_maintenance_panel, min = 1, max = 64 )
+        tt = 'CPU-heavy jobs like thumbnail regeneration, pixel hashes, blurhashes and similar files metadata can run on several threads at once. If you have a big thumbnail regen to get through and a CPU with several cores, try setting this to your number of cores. The throttles above still apply.'
+        self._file_maintenance_num_workers.setToolTip( ClientGUIFunctions.WrapToolTip( tt ) )
+        
         #
         
         self._repository_processing_panel = ClientGUICommon.StaticBox( self, 'repository processing', can_expand = True, start_expanded = False )
@@ -243,6 +247,8 @@ class MaintenanceAndProcessingPanel( ClientGUIOptionsPanelBase.OptionsPagePanel
         
         self._file_maintenance_active_throttle_velocity.SetValue( file_maintenance_active_throttle_velocity )
         
+        self._file_maintenance_num_workers.setValue( self._new_options.GetInteger( 'file_maintenance_num_workers' ) )
+        
         self._repository_processing_work_time_very_idle.SetValue( HydrusTime.SecondiseMSFloat( self._new_options.GetInteger( 'repository_processing_work_time_ms_very_idle' ) ) )
         self._repository_processing_rest_percentage_very_idle.setValue( self._new_options.GetInteger( 'repository_processing_rest_percentage_very_idle' ) )
         
@@ -371,6 +377,7 @@ class MaintenanceAndProcessingPanel( ClientGUIOptionsPanelBase.OptionsPagePanel
         rows.append( ( 'Idle throttle: ', self._file_maintenance_idle_throttle_velocity ) )
         rows.append( ( 'Run file maintenance during normal time: ', self._file_maintenance_during_active ) )
         rows.append( ( 'Normal throttle: ', self._file_maintenance_active_throttle_velocity ) )
+        rows.append( ( 'Number of worker threads for heavy jobs: ', self._file_maintenance_num_workers ) )
         
         gridbox = ClientGUICommon.WrapInGrid( self._file_maintenance_panel, rows )
         
@@ -555,6 +562,8 @@ class MaintenanceAndProcessingPanel( ClientGUIOptionsPanelBase.OptionsPagePanel
         self._new_options.SetInteger( 'file_maintenance_active_throttle_files', file_maintenance_active_throttle_files )
         self._new_options.SetInteger( 'file_maintenance_active_throttle_time_delta', file_maintenance_active_throttle_time_delta )
         
+        self._new_options.SetInteger( 'file_maintenance_num_workers', self._file_maintenance_num_workers.value() )
+        
         self._new_options.SetInteger( 'repository_processing_work_time_ms_very_idle', HydrusTime.MillisecondiseS( self._repository_processing_work_time_very_idle.GetValue() ) )
         self._new_options.SetInteger( 'repository_processing_rest_percentage_very_idle', self._repository_processing_rest_percentage_very_idle.value() )
         
@@ -1,5 +1,6 @@
 from qtpy import QtWidgets as QW
 
+from hydrus.core import HydrusCompression
 from hydrus.core import HydrusConstants as HC
 from hydrus.core import HydrusNumbers
 from hydrus.core import HydrusTime
@@ -42,6 +43,12 @@ class SpeedAndMemoryPanel( ClientGUIOptionsPanelBase.OptionsPagePanel ):
         
         self._thumbnail_cache_timeout.setToolTip( ClientGUIFunctions.WrapToolTip( tt ) )
         
+        self._thumbnail_decode_num_workers = ClientGUICommon.BetterSpinBox( thumbnail_cache_panel, min = 1, max = 64 )
+        
+        tt = 'When a page of new thumbnails needs loading, this many threads will load and resize them at once. If you have a CPU with lots of cores and scroll through big pages of fresh thumbnails, you can bump this up. 1 loads them one at a time.'
+        
+        self._thumbnail_decode_num_workers.setToolTip( ClientGUIFunctions.WrapToolTip( tt ) )
+        
         image_cache_panel = ClientGUICommon.StaticBox( self, 'image cache', can_expand = True, start_expanded = False )
         
         self._image_cache_size = ClientGUIBytes.BytesControl( image_cache_panel )
@@ -124,6 +131,50 @@ class SpeedAndMemoryPanel( ClientGUIOptionsPanelBase.OptionsPagePanel ):
         
         #
         
+        client_api_render_cache_panel = ClientGUICommon.StaticBox( self, 'client api render cache', can_expand = True, start_expanded = False )
+        
+        self._client_api_render_cache_size = ClientGUIBytes.BytesControl( client_api_render_cache_panel )
+        
+        tt = 'When a Client API script asks for a resized/converted render of an image, the result is saved to a folder in your database directory so the next identical request can be served straight from disk. If the folder exceeds this size, the least-recently-requested renders are deleted. Set to 0 to turn it off.'
+        
+        self._client_api_render_cache_size.setToolTip( ClientGUIFunctions.WrapToolTip( tt ) )
+        
+        self._client_api_render_cache_warm_up = QW.QCheckBox( client_api_render_cache_panel )
+        
+        tt = 'If a Client API script asks for a thumbnail, the client will quietly prepare the render that scripts most often ask for, so it is ready if the script wants it next. This costs CPU even if the render is never asked for!'
+        
+        self._client_api_render_cache_warm_up.setToolTip( ClientGUIFunctions.WrapToolTip( tt ) )
+        
+        #
+        
+        tag_postings_cache_panel = ClientGUICommon.StaticBox( self, 'tag search postings cache', can_expand = True, start_expanded = False )
+        
+        self._tag_postings_cache_size = ClientGUIBytes.BytesControl( tag_postings_cache_panel )
+        
+        tt = 'EXPERIMENTAL: When you search for a tag, the list of files that have it can be kept in memory in a compressed form. Searches for several common tags, or \'tag but not other tag\', then do their AND/NOT work in memory rather than asking the database again. Any change to a tag service throws out that service\'s cached lists. Set to 0 to turn it off.'
+        
+        self._tag_postings_cache_size.setToolTip( ClientGUIFunctions.WrapToolTip( tt ) )
+        
+        #
+        
+        database_storage_panel = ClientGUICommon.StaticBox( self, 'database object storage', can_expand = True, start_expanded = False )
+        
+        self._json_dump_compression_codec = ClientGUICommon.BetterChoice( database_storage_panel )
+        
+        self._json_dump_compression_codec.addItem( 'do not compress', None )
+        self._json_dump_compression_codec.addItem( 'zlib', HydrusCompression.CODEC_ZLIB )
+        
+        if HydrusCompression.ZSTD_OK:
+            
+            self._json_dump_compression_codec.addItem( 'zstd (recommended)', HydrusCompression.CODEC_ZSTD )
+            
+        
+        tt = 'EXPERIMENTAL: Sessions, import queues, subscriptions, bandwidth records and other big objects are normally saved to client.db as plain JSON. This compresses them as they are next saved, which makes client.db smaller and can make big session saves faster. zstd is fast and needs python 3.14 or the \'zstandard\' library. Objects already saved are read whatever this is set to, but if you save with zstd and then run the client somewhere without zstd, it will not be able to load them.'
+        
+        self._json_dump_compression_codec.setToolTip( ClientGUIFunctions.WrapToolTip( tt ) )
+        
+        #
+        
         pages_panel = ClientGUICommon.StaticBox( self, 'download pages update', can_expand = True, start_expanded = False )
         
         self._gallery_page_status_update_time_minimum = ClientGUITime.TimeDeltaWidget( pages_panel, min = 0.25, seconds = True, milliseconds = True )
@@ -148,11 +199,19 @@ class SpeedAndMemoryPanel( ClientGUIOptionsPanelBase.OptionsPagePanel ):
         self._image_tile_cache_size.SetValue( self._new_options.GetInteger( 'image_tile_cache_size' ) )
         
         self._thumbnail_cache_timeout.SetValue( self._new_options.GetInteger( 'thumbnail_cache_timeout' ) )
+        self._thumbnail_decode_num_workers.setValue( self._new_options.GetInteger( 'thumbnail_decode_num_workers' ) )
         self._image_cache_timeout.SetValue( self._new_options.GetInteger( 'image_cache_timeout' ) )
         self._image_tile_cache_timeout.SetValue( self._new_options.GetInteger( 'image_tile_cache_timeout' ) )
         
         self._ideal_tile_dimension.setValue( self._new_options.GetInteger( 'ideal_tile_dimension' ) )
         
+        self._client_api_render_cache_size.SetValue( self._new_options.GetInteger( 'client_api_render_cache_size' ) )
+        self._client_api_render_cache_warm_up.setChecked( self._new_options.GetBoolean( 'client_api_render_cache_warm_up' ) )
+        
+        self._tag_postings_cache_size.SetValue( self._new_options.GetInteger( 'tag_postings_cache_size' ) )
+        
+        self._json_dump_compression_codec.SetValue( self._new_options.GetNoneableInteger( 'json_dump_compression_codec' ) )
+        
         self._gallery_page_status_update_time_minimum.SetValue( HydrusTime.SecondiseMSFloat( self._new_options.GetInteger( 'gallery_page_status_update_time_minimum_ms' ) ) )
         self._gallery_page_status_update_time_ratio_denominator.setValue( self._new_options.GetInteger( 'gallery_page_status_update_time_ratio_denominator' ) )
         
@@ -222,6 +281,7 @@ class SpeedAndMemoryPanel( ClientGUIOptionsPanelBase.OptionsPagePanel ):
         
         rows.append( ( 'Memory reserved for thumbnail cache:', thumbnails_sizer ) )
         rows.append( ( 'Thumbnail cache timeout:', self._thumbnail_cache_timeout ) )
+        rows.append( ( 'Number of thumbnail loading threads:', self._thumbnail_decode_num_workers ) )
         
         gridbox = ClientGUICommon.WrapInGrid( thumbnail_cache_panel, rows )
         
@@ -291,6 +351,43 @@ class SpeedAndMemoryPanel( ClientGUIOptionsPanelBase.OptionsPagePanel ):
         
         #
         
+        rows = []
+        
+        rows.append( ( 'Disk space reserved for Client API renders:', self._client_api_render_cache_size ) )
+        rows.append( ( 'Prepare likely renders when a thumbnail is fetched:', self._client_api_render_cache_warm_up ) )
+        
+        gridbox = ClientGUICommon.WrapInGrid( client_api_render_cache_panel, rows )
+        
+        client_api_render_cache_panel.Add( gridbox, CC.FLAGS_EXPAND_SIZER_PERPENDICULAR )
+        
+        QP.AddToLayout( vbox, client_api_render_cache_panel, CC.FLAGS_EXPAND_PERPENDICULAR )
+        
+        #
+        
+        rows = []
+        
+        rows.append( ( 'Memory reserved for tag search postings:', self._tag_postings_cache_size ) )
+        
+        gridbox = ClientGUICommon.WrapInGrid( tag_postings_cache_panel, rows )
+        
+        tag_postings_cache_panel.Add( gridbox, CC.FLAGS_EXPAND_SIZER_PERPENDICULAR )
+        
+        QP.AddToLayout( vbox, tag_postings_cache_panel, CC.FLAGS_EXPAND_PERPENDICULAR )
+        
+        #
+        
+        rows = []
+        
+        rows.append( ( 'Compress big objects saved to the database:', self._json_dump_compression_codec ) )
+        
+        gridbox = ClientGUICommon.WrapInGrid( database_storage_panel, rows )
+        
+        database_storage_panel.Add( gridbox, CC.FLAGS_EXPAND_SIZER_PERPENDICULAR )
+        
+        QP.AddToLayout( vbox, database_storage_panel, CC.FLAGS_EXPAND_PERPENDICULAR )
+        
+        #
+        
         text = 'EXPERIMENTAL, HYDEV ONLY, STAY AWAY!'
         
         st = ClientGUICommon.BetterStaticText( pages_panel, text )
@@ -490,11 +587,19 @@ class SpeedAndMemoryPanel( ClientGUIOptionsPanelBase.OptionsPagePanel ):
         self._new_options.SetInteger( 'image_tile_cache_size', self._image_tile_cache_size.GetValue() )
         
         self._new_options.SetInteger( 'thumbnail_cache_timeout', self._thumbnail_cache_timeout.GetValue() )
+        self._new_options.SetInteger( 'thumbnail_decode_num_workers', self._thumbnail_decode_num_workers.value() )
         self._new_options.SetInteger( 'image_cache_timeout', self._image_cache_timeout.GetValue() )
         self._new_options.SetInteger( 'image_tile_cache_timeout', self._image_tile_cache_timeout.GetValue() )
         
         self._new_options.SetInteger( 'ideal_tile_dimension', self._ideal_tile_dimension.value() )
         
+        self._new_options.SetInteger( 'client_api_render_cache_size', self._client_api_render_cache_size.GetValue() )
+        self._new_options.SetBoolean( 'client_api_render_cache_warm_up', self._client_api_render_cache_warm_up.isChecked() )
+        
+        self._new_options.SetInteger( 'tag_postings_cache_size', self._tag_postings_cache_size.GetValue() )
+        
+        self._new_options.SetNoneableInteger( 'json_dump_compression_codec', self._json_dump_compression_codec.GetValue() )
+        
         self._new_options.SetInteger( 'media_viewer_prefetch_num_previous', self._media_viewer_prefetch_num_previous.value() )
         self._new_options.SetInteger( 'media_viewer_prefetch_num_next', self._media_viewer_prefetch_num_next.value() )
         self._new_options.SetInteger( 'duplicate_filter_prefetch_num_pairs', self._duplicate_filter_prefetch_num_pairs.value() )
@@ -46,6 +46,12 @@ class TagsPanel( ClientGUIOptionsPanelBase.OptionsPagePanel ):
         self._num_to_show_in_ac_dropdown_children_tab.setToolTip( ClientGUIFunctions.WrapToolTip( tt ) )
         self._num_to_show_in_ac_dropdown_children_tab.SetValue( 40 ) # init default
         
+        results_panel = ClientGUICommon.StaticBox( self, 'autocomplete results' )
+        
+        self._autocomplete_max_results = ClientGUICommon.NoneableSpinCtrl( results_panel, 200, none_phrase = 'show all', min = 1, max = 100000 )
+        tt = 'If you have a lot of tags, a short search like "a*" can match hundreds of thousands of them, and building the full results list takes a while. If you set this, the autocomplete will only fetch the tags with the highest counts, which is much faster.'
+        self._autocomplete_max_results.setToolTip( ClientGUIFunctions.WrapToolTip( tt ) )
+        
         #
         
         self._favourites.SetTags( self._new_options.GetStringList( 'favourite_tags' ) )
@@ -54,6 +60,8 @@ class TagsPanel( ClientGUIOptionsPanelBase.OptionsPagePanel ):
         
         self._num_to_show_in_ac_dropdown_children_tab.SetValue( self._new_options.GetNoneableInteger( 'num_to_show_in_ac_dropdown_children_tab' ) )
         
+        self._autocomplete_max_results.SetValue( self._new_options.GetNoneableInteger( 'autocomplete_max_results' ) )
+        
         #
         
         favourites_panel.Add( favourites_st, CC.FLAGS_EXPAND_PERPENDICULAR )
@@ -70,10 +78,19 @@ class TagsPanel( ClientGUIOptionsPanelBase.OptionsPagePanel ):
         
         children_panel.Add( gridbox, CC.FLAGS_EXPAND_SIZER_PERPENDICULAR )
         
+        rows = []
+        
+        rows.append( ( 'Max number of tags to fetch in autocomplete results: ', self._autocomplete_max_results ) )
+        
+        gridbox = ClientGUICommon.WrapInGrid( results_panel, rows )
+        
+        results_panel.Add( gridbox, CC.FLAGS_EXPAND_SIZER_PERPENDICULAR )
+        
         #
         
         vbox = QP.VBoxLayout()
         
+        QP.AddToLayout( vbox, results_panel, CC.FLAGS_EXPAND_PERPENDICULAR )
         QP.AddToLayout( vbox, children_panel, CC.FLAGS_EXPAND_PERPENDICULAR )
         QP.AddToLayout( vbox, favourites_panel, CC.FLAGS_EXPAND_BOTH_WAYS )
         
@@ -103,5 +120,6 @@ class TagsPanel( ClientGUIOptionsPanelBase.OptionsPagePanel ):
         #
         
         self._new_options.SetNoneableInteger( 'num_to_show_in_ac_dropdown_children_tab', self._num_to_show_in_ac_dropdown_children_tab.GetValue() )
+        self._new_options.SetNoneableInteger( 'autocomplete_max_results', self._autocomplete_max_results.GetValue() )
         
     
@@ -81,6 +81,18 @@ class ThumbnailsPanel( ClientGUIOptionsPanelBase.OptionsPagePanel ):
         
         self._media_background_bmp_path = ClientGUIPathWidgets.FilePickerCtrl( thumbnail_misc_box )
         
+        thumbnail_storage_box = ClientGUICommon.StaticBox( self, 'storage' )
+        
+        self._use_packed_thumbnail_storage = QW.QCheckBox( thumbnail_storage_box )
+        
+        tt = 'Normally, every thumbnail is its own small file. With millions of files, opening all those small files can make thumbnail loading slow, particularly on HDDs and network drives. This stores new thumbnails in one big \'pack\' file per thumbnail folder instead. Existing thumbnails are moved into the packs slowly in idle time.'
+        tt += '\n' * 2
+        tt += 'If you turn this off again, existing packs are still read, but new thumbnails go back to being normal files.'
+        tt += '\n' * 2
+        tt += 'A packed thumbnail has no path of its own, so Client API tools that ask for thumbnail paths will get an error for it and have to fetch the thumbnail itself instead.'
+        
+        self._use_packed_thumbnail_storage.setToolTip( ClientGUIFunctions.WrapToolTip( tt ) )
+        
         #
         
         self._test_thumbnails_graphics_view.setChecked( self._new_options.GetBoolean( 'test_thumbnails_graphics_view' ) )
@@ -120,6 +132,8 @@ class ThumbnailsPanel( ClientGUIOptionsPanelBase.OptionsPagePanel ):
         
         self._show_extended_single_file_info_in_status_bar.setChecked( self._new_options.GetBoolean( 'show_extended_single_file_info_in_status_bar' ) )
         
+        self._use_packed_thumbnail_storage.setChecked( self._new_options.GetBoolean( 'use_packed_thumbnail_storage' ) )
+        
         #
         
         rows = []
@@ -176,11 +190,22 @@ class ThumbnailsPanel( ClientGUIOptionsPanelBase.OptionsPagePanel ):
         
         #
         
+        rows = []
+        
+        rows.append( ( 'EXPERIMENTAL: Store thumbnails in pack files: ', self._use_packed_thumbnail_storage ) )
+        
+        gridbox = ClientGUICommon.WrapInGrid( thumbnail_storage_box, rows )
+        
+        thumbnail_storage_box.Add( gridbox, CC.FLAGS_EXPAND_SIZER_PERPENDICULAR )
+        
+        #
+        
         vbox = QP.VBoxLayout()
         
         QP.AddToLayout( vbox, thumbnail_appearance_box, CC.FLAGS_EXPAND_PERPENDICULAR )
         QP.AddToLayout( vbox, thumbnail_interaction_box, CC.FLAGS_EXPAND_PERPENDICULAR )
         QP.AddToLayout( vbox, thumbnail_misc_box, CC.FLAGS_EXPAND_PERPENDICULAR )
+        QP.AddToLayout( vbox, thumbnail_storage_box, CC.FLAGS_EXPAND_PERPENDICULAR )
         QP.AddToLayout( vbox, graphics_view_test_box, CC.FLAGS_EXPAND_PERPENDICULAR )
         vbox.addStretch( 0 )
         
@@ -222,6 +247,8 @@ class ThumbnailsPanel( ClientGUIOptionsPanelBase.OptionsPagePanel ):
         
         self._new_options.SetBoolean( 'show_extended_single_file_info_in_status_bar', self._show_extended_single_file_info_in_status_bar.isChecked() )
         
+        self._new_options.SetBoolean( 'use_packed_thumbnail_storage', self._use_packed_thumbnail_storage.isChecked() )
+        
         try:
             
             thumbnail_scroll_rate = self._thumbnail_scroll_rate.text()
@@ -291,7 +291,11 @@ def ReadFetch(
                     
                     search_namespaces_into_full_tags = parsed_autocomplete_text.GetTagAutocompleteOptions().SearchNamespacesIntoFullTags()
                     
-                    predicates = CG.client_controller.Read( 'autocomplete_predicates', ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, file_search_context, search_text = autocomplete_search_text, job_status = job_status, search_namespaces_into_full_tags = search_namespaces_into_full_tags )
+                    autocomplete_max_results = CG.client_controller.new_options.GetNoneableInteger( 'autocomplete_max_results' )
+                    
+                    predicates = CG.client_controller.Read( 'autocomplete_predicates', ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL, file_search_context, search_text = autocomplete_search_text, job_status = job_status, search_namespaces_into_full_tags = search_namespaces_into_full_tags, max_results = autocomplete_max_results )
+                    
+                    results_are_truncated = autocomplete_max_results is not None and len( predicates ) >= autocomplete_max_results
                     
                     if job_status.IsCancelled():
                         
@@ -304,7 +308,7 @@ def ReadFetch(
                         
                     else:
                         
-                        results_cache = ClientSearchAutocomplete.PredicateResultsCacheTag( predicates, strict_search_text, False )
+                        results_cache = ClientSearchAutocomplete.PredicateResultsCacheTag( predicates, strict_search_text, False, results_are_truncated = results_are_truncated )
                         
                         matches = results_cache.FilterPredicates( tag_service_key, autocomplete_search_text )
                         
@@ -586,7 +590,11 @@ def WriteFetch(
                 
                 search_namespaces_into_full_tags = parsed_autocomplete_text.GetTagAutocompleteOptions().SearchNamespacesIntoFullTags()
                 
-                predicates = CG.client_controller.Read( 'autocomplete_predicates', ClientTags.TAG_DISPLAY_STORAGE, file_search_context, search_text = autocomplete_search_text, job_status = job_status, zero_count_ok = True, search_namespaces_into_full_tags = search_namespaces_into_full_tags )
+                autocomplete_max_results = CG.client_controller.new_options.GetNoneableInteger( 'autocomplete_max_results' )
+                
+                predicates = CG.client_controller.Read( 'autocomplete_predicates', ClientTags.TAG_DISPLAY_STORAGE, file_search_context, search_text = autocomplete_search_text, job_status = job_status, zero_count_ok = True, search_namespaces_into_full_tags = search_namespaces_into_full_tags, max_results = autocomplete_max_results )
+                
+                results_are_truncated = autocomplete_max_results is not None and len( predicates ) >= autocomplete_max_results
                 
                 if is_explicit_wildcard:
                     
@@ -594,7 +602,7 @@ def WriteFetch(
                     
                 else:
                     
-                    results_cache = ClientSearchAutocomplete.PredicateResultsCacheTag( predicates, strict_search_text, False )
+                    results_cache = ClientSearchAutocomplete.PredicateResultsCacheTag( predicates, strict_search_text, False, results_are_truncated = results_are_truncated )
                     
                     matches = results_cache.FilterPredicates( display_tag_service_key, autocomplete_search_text )
                     
@@ -1,6 +1,8 @@
 import collections
 import collections.abc
+import hashlib
 import itertools
+import json
 import os
 import random
 import re
@@ -39,6 +41,9 @@ from hydrus.client.parsing import ClientParsingResults
 FILE_SEED_TYPE_HDD = 0
 FILE_SEED_TYPE_URL = 1
 
+# a file log is serialised in chunks of this many file seeds, so a save only has to redo the chunks that changed
+FILE_SEED_CACHE_CHUNK_SIZE = 256
+
 def ConvertParsedPostsToParsedPostsAndFileSeeds( parsed_posts: list[ ClientParsingResults.ParsedPost ], source_url: str ) -> "list[ FileSeed ]":
     
     parsed_posts_and_file_seeds = []
@@ -2219,11 +2224,20 @@ def WalkToNextFileSeed( status, starting_file_seed, file_seeds, file_seeds_to_in
     return ( result, wrong_file_seeds )
     
 
+def GenerateSerialisableFileSeedChunk( file_seeds: collections.abc.Collection[ "FileSeed" ] ):
+    
+    serialisable_file_seed_chunk = HydrusSerialisable.SerialisableList( file_seeds ).GetSerialisableTuple()
+    
+    file_seed_chunk_hash_hex = hashlib.sha256( bytes( json.dumps( serialisable_file_seed_chunk ), 'utf-8' ) ).hexdigest()
+    
+    return ( file_seed_chunk_hash_hex, serialisable_file_seed_chunk )
+    
+
 class FileSeedCache( HydrusSerialisable.SerialisableBase ):
     
     SERIALISABLE_TYPE = HydrusSerialisable.SERIALISABLE_TYPE_FILE_SEED_CACHE
     SERIALISABLE_NAME = 'Import File Status Cache'
-    SERIALISABLE_VERSION = 8
+    SERIALISABLE_VERSION = 9
     
     def __init__( self ):
         
@@ -2546,12 +2560,10 @@ class FileSeedCache( HydrusSerialisable.SerialisableBase ):
     
     def _GetSerialisableInfo( self ):
         
-        if not isinstance( self._file_seeds, HydrusSerialisable.SerialisableList ):
-            
-            self._file_seeds = HydrusSerialisable.SerialisableList( self._file_seeds )
-            
+        # file seeds are edited in place all over, so we always serialise from what they are now. the db only writes chunks whose hash it has not seen
+        serialisable_file_seed_chunks = [ GenerateSerialisableFileSeedChunk( self._file_seeds[ start_index : start_index + FILE_SEED_CACHE_CHUNK_SIZE ] ) for start_index in range( 0, len( self._file_seeds ), FILE_SEED_CACHE_CHUNK_SIZE ) ]
         
-        return self._file_seeds.GetSerialisableTuple()
+        return serialisable_file_seed_chunks
         
     
     def _GetSourceTimestampForVelocityCalculations( self, file_seed: FileSeed ):
@@ -2639,9 +2651,18 @@ class FileSeedCache( HydrusSerialisable.SerialisableBase ):
     
     def _InitialiseFromSerialisableInfo( self, serialisable_info ):
         
+        serialisable_file_seed_chunks = serialisable_info
+        
         with self._lock:
             
-            self._file_seeds = HydrusSerialisable.CreateFromSerialisableTuple( serialisable_info )
+            self._file_seeds = HydrusSerialisable.SerialisableList()
+            
+            for ( file_seed_chunk_hash_hex, serialisable_file_seed_chunk ) in serialisable_file_seed_chunks:
+                
+                file_seed_chunk = HydrusSerialisable.CreateFromSerialisableTuple( serialisable_file_seed_chunk )
+                
+                self._file_seeds.extend( file_seed_chunk )
+                
             
         
     
@@ -2802,6 +2823,15 @@ class FileSeedCache( HydrusSerialisable.SerialisableBase ):
             return ( 8, new_serialisable_info )
             
         
+        if version == 8:
+            
+            file_seeds = HydrusSerialisable.CreateFromSerialisableTuple( old_serialisable_info )
+            
+            new_serialisable_info = [ GenerateSerialisableFileSeedChunk( file_seeds[ start_index : start_index + FILE_SEED_CACHE_CHUNK_SIZE ] ) for start_index in range( 0, len( file_seeds ), FILE_SEED_CACHE_CHUNK_SIZE ) ]
+            
+            return ( 9, new_serialisable_info )
+            
+        
     
     def AddFileSeeds( self, file_seeds: collections.abc.Collection[ FileSeed ], dupe_try_again = False ):
         
@@ -3494,6 +3524,127 @@ class FileSeedCache( HydrusSerialisable.SerialisableBase ):
     
 HydrusSerialisable.SERIALISABLE_TYPES_TO_OBJECT_TYPES[ HydrusSerialisable.SERIALISABLE_TYPE_FILE_SEED_CACHE ] = FileSeedCache
 
+def IsSerialisableFileSeedCache( serialisable ) -> bool:
+    
+    if not ( isinstance( serialisable, ( list, tuple ) ) and len( serialisable ) == 3 ):
+        
+        return False
+        
+    
+    ( serialisable_type, version, serialisable_info ) = serialisable
+    
+    if serialisable_type != HydrusSerialisable.SERIALISABLE_TYPE_FILE_SEED_CACHE or version != FileSeedCache.SERIALISABLE_VERSION or not isinstance( serialisable_info, ( list, tuple ) ):
+        
+        return False
+        
+    
+    return False not in ( isinstance( row, ( list, tuple ) ) and len( row ) == 2 and isinstance( row[0], str ) for row in serialisable_info )
+    
+
+def WalkSerialisableFileSeedCaches( serialisable, file_seed_cache_callable ):
+    
+    # rebuilds a serialisable tuple, swapping every file log in it for what the callable makes of it
+    
+    if IsSerialisableFileSeedCache( serialisable ):
+        
+        return file_seed_cache_callable( serialisable )
+        
+    elif isinstance( serialisable, ( list, tuple ) ):
+        
+        return [ WalkSerialisableFileSeedCaches( item, file_seed_cache_callable ) for item in serialisable ]
+        
+    elif isinstance( serialisable, dict ):
+        
+        return { key : WalkSerialisableFileSeedCaches( value, file_seed_cache_callable ) for ( key, value ) in serialisable.items() }
+        
+    else:
+        
+        return serialisable
+        
+    
+
+def FillFileSeedChunks( serialisable, hashes_to_serialisable_file_seed_chunks: dict[ bytes, typing.Any ] ):
+    
+    # the opposite of StripFileSeedChunks. anything we do not have is dropped from its file log
+    
+    def fill( serialisable_file_seed_cache ):
+        
+        ( serialisable_type, version, serialisable_file_seed_chunks ) = serialisable_file_seed_cache
+        
+        filled_file_seed_chunks = []
+        
+        for ( file_seed_chunk_hash_hex, serialisable_file_seed_chunk ) in serialisable_file_seed_chunks:
+            
+            if serialisable_file_seed_chunk is None:
+                
+                file_seed_chunk_hash = bytes.fromhex( file_seed_chunk_hash_hex )
+                
+                if file_seed_chunk_hash not in hashes_to_serialisable_file_seed_chunks:
+                    
+                    continue
+                    
+                
+                serialisable_file_seed_chunk = hashes_to_serialisable_file_seed_chunks[ file_seed_chunk_hash ]
+                
+            
+            filled_file_seed_chunks.append( ( file_seed_chunk_hash_hex, serialisable_file_seed_chunk ) )
+            
+        
+        return ( serialisable_type, version, filled_file_seed_chunks )
+        
+    
+    return WalkSerialisableFileSeedCaches( serialisable, fill )
+    
+
+def GetStrippedFileSeedChunkHashes( serialisable ) -> set[ bytes ]:
+    
+    file_seed_chunk_hashes = set()
+    
+    def collect( serialisable_file_seed_cache ):
+        
+        ( serialisable_type, version, serialisable_file_seed_chunks ) = serialisable_file_seed_cache
+        
+        file_seed_chunk_hashes.update( ( bytes.fromhex( file_seed_chunk_hash_hex ) for ( file_seed_chunk_hash_hex, serialisable_file_seed_chunk ) in serialisable_file_seed_chunks if serialisable_file_seed_chunk is None ) )
+        
+        return serialisable_file_seed_cache
+        
+    
+    WalkSerialisableFileSeedCaches( serialisable, collect )
+    
+    return file_seed_chunk_hashes
+    
+
+def StripFileSeedChunks( serialisable ):
+    
+    # pulls the file seed chunks out of every file log in a serialisable tuple, leaving only their hashes
+    # the db can then store each chunk once and share it between every save that has it
+    
+    hashes_to_serialisable_file_seed_chunks = {}
+    
+    def strip( serialisable_file_seed_cache ):
+        
+        ( serialisable_type, version, serialisable_file_seed_chunks ) = serialisable_file_seed_cache
+        
+        stripped_file_seed_chunks = []
+        
+        for ( file_seed_chunk_hash_hex, serialisable_file_seed_chunk ) in serialisable_file_seed_chunks:
+            
+            if serialisable_file_seed_chunk is not None:
+                
+                hashes_to_serialisable_file_seed_chunks[ bytes.fromhex( file_seed_chunk_hash_hex ) ] = serialisable_file_seed_chunk
+                
+            
+            stripped_file_seed_chunks.append( ( file_seed_chunk_hash_hex, None ) )
+            
+        
+        return ( serialisable_type, version, stripped_file_seed_chunks )
+        
+    
+    stripped_serialisable = WalkSerialisableFileSeedCaches( serialisable, strip )
+    
+    return ( stripped_serialisable, hashes_to_serialisable_file_seed_chunks )
+    
+
 def GenerateFileSeedCachesStatus( file_seed_caches: collections.abc.Iterable[ FileSeedCache ] ):
     
     fscs = FileSeedCacheStatus()
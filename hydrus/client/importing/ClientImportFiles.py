@@ -225,6 +225,7 @@ class FileImportJob( object ):
             status_hook( 'calculating hash' )
             
         
+        # just the sha256 here. most files we see are already in the db, so GenerateInfo gets the other hashes only when the file is new
         hash = HydrusFileHandling.GetHashFromPath( self._temp_path )
         
         if HG.file_import_report_mode:
@@ -21,6 +21,8 @@ from hydrus.client.search import ClientSearchTagContext
 
 class FileDuplicatesManager( object ):
     
+    __slots__ = ( 'media_group_king_hash', 'alternates_group_id', 'dupe_statuses_to_count' )
+    
     def __init__( self, media_group_king_hash, alternates_group_id, dupe_statuses_to_counts ):
         
         self.media_group_king_hash = media_group_king_hash
@@ -48,6 +50,8 @@ class FileDuplicatesManager( object ):
 
 class FileInfoManager( object ):
     
+    __slots__ = ( 'hash_id', 'hash', 'size', 'mime', 'width', 'height', 'duration_ms', 'num_frames', 'has_audio', 'num_words', 'original_mime', 'has_transparency', 'has_exif', 'has_xmp', 'has_iptc', 'has_human_readable_embedded_metadata', 'has_software_source', 'has_icc_profile', 'blurhash', 'pixel_hash' )
+    
     def __init__(
         self,
         hash_id: int,
@@ -152,12 +156,15 @@ class FileInfoManager( object ):
 
 class TimesManager( object ):
     
+    __slots__ = ( '_simple_timestamp_types_to_timestamps_ms', '_domains_to_modified_timestamps_ms', '_timestamp_types_to_service_keys_to_timestamps_ms', '_canvas_types_to_last_viewed_timestamps_ms', '_aggregate_modified_is_generated' )
+    
     def __init__( self ):
         
         self._simple_timestamp_types_to_timestamps_ms = {}
         self._domains_to_modified_timestamps_ms = {}
         
-        self._timestamp_types_to_service_keys_to_timestamps_ms = { timestamp_type : {} for timestamp_type in ClientTime.FILE_SERVICE_TIMESTAMP_TYPES }
+        # filled in as needed, since most files only ever have imported times
+        self._timestamp_types_to_service_keys_to_timestamps_ms = {}
         
         self._canvas_types_to_last_viewed_timestamps_ms = {}
         
@@ -177,6 +184,11 @@ class TimesManager( object ):
     
     def _ClearFileServiceTime( self, timestamp_type: int, service_key: bytes ):
         
+        if timestamp_type not in self._timestamp_types_to_service_keys_to_timestamps_ms:
+            
+            return
+            
+        
         service_keys_to_timestamps_ms = self._timestamp_types_to_service_keys_to_timestamps_ms[ timestamp_type ]
         
         if service_key in service_keys_to_timestamps_ms:
@@ -225,6 +237,11 @@ class TimesManager( object ):
     
     def _GetFileServiceTimestampMS( self, timestamp_type: int, service_key: bytes ) -> int | None:
         
+        if timestamp_type not in self._timestamp_types_to_service_keys_to_timestamps_ms:
+            
+            return None
+            
+        
         return self._timestamp_types_to_service_keys_to_timestamps_ms[ timestamp_type ].get( service_key, None )
         
     
@@ -257,6 +274,11 @@ class TimesManager( object ):
     
     def _SetFileServiceTimestampMS( self, timestamp_type: int, service_key: bytes, timestamp_ms: int ):
         
+        if timestamp_type not in self._timestamp_types_to_service_keys_to_timestamps_ms:
+            
+            self._timestamp_types_to_service_keys_to_timestamps_ms[ timestamp_type ] = {}
+            
+        
         self._timestamp_types_to_service_keys_to_timestamps_ms[ timestamp_type ][ service_key ] = timestamp_ms
         
     
@@ -561,6 +583,8 @@ class TimesManager( object ):
 
 class FileViewingStatsManager( object ):
     
+    __slots__ = ( '_times_manager', 'views', 'viewtimes_ms' )
+    
     def __init__(
         self,
         times_manager: TimesManager,
@@ -755,6 +779,8 @@ class FileViewingStatsManager( object ):
 
 class LocationsManager( object ):
     
+    __slots__ = ( '_current', '_deleted', '_pending', '_petitioned', '_times_manager', 'inbox', '_urls', '_service_keys_to_filenames', '_local_file_deletion_reason' )
+    
     def __init__(
         self,
         current: set[ bytes ],
@@ -1362,6 +1388,8 @@ class LocationsManager( object ):
     
 class NotesManager( object ):
     
+    __slots__ = ( '_names_to_notes', )
+    
     def __init__( self, names_to_notes: dict[ str, str ] ):
         
         self._names_to_notes = names_to_notes
@@ -1444,6 +1472,8 @@ class NotesManager( object ):
     
 class RatingsManager( object ):
     
+    __slots__ = ( '_service_keys_to_ratings', )
+    
     def __init__( self, service_keys_to_ratings: dict[ bytes, int | float | None ] ):
         
         self._service_keys_to_ratings = service_keys_to_ratings
@@ -1530,6 +1560,11 @@ class RatingsManager( object ):
             
         
     
+    def GetServiceKeysToRatings( self ) -> dict[ bytes, int | float | None ]:
+        
+        return dict( self._service_keys_to_ratings )
+        
+    
     def GetStarRatingSlice( self, service_keys ):
         
         return frozenset( { self._service_keys_to_ratings[ service_key ] for service_key in service_keys if service_key in self._service_keys_to_ratings } )
@@ -1565,6 +1600,8 @@ class RatingsManager( object ):
 
 class TagsManager( object ):
     
+    __slots__ = ( '_tag_display_types_to_service_keys_to_statuses_to_tags', '_storage_cache_is_dirty', '_display_cache_is_dirty', '_single_media_cache_is_dirty', '_selection_list_cache_is_dirty', '_lock' )
+    
     def __init__(
         self,
         service_keys_to_statuses_to_storage_tags: dict[ bytes, dict[ int, set[ str ] ] ],
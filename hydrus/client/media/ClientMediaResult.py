@@ -7,6 +7,10 @@ from hydrus.client.media import ClientMediaManagers
 
 class MediaResult( object ):
     
+    # a big page can have hundreds of thousands of these, each with several managers, so none of them get a __dict__
+    # the weakref slot is for the media result cache
+    __slots__ = ( '_file_info_manager', '_tags_manager', '_times_manager', '_locations_manager', '_ratings_manager', '_notes_manager', '_file_viewing_stats_manager', '__weakref__' )
+    
     def __init__(
         self,
         file_info_manager: ClientMediaManagers.FileInfoManager,
@@ -314,6 +318,18 @@ class MediaResult( object ):
         self._file_info_manager = file_info_manager
         
     
+    def SetManagersFromMediaResult( self, media_result: 'MediaResult' ):
+        
+        # viewing stats are published before they are written, so ours can be ahead of the db. we keep them on the fresh times manager
+        # the locations and viewing stats managers share the times manager, so we swap them all in one assignment
+        
+        times_manager = media_result._times_manager
+        
+        file_viewing_stats_manager = self._file_viewing_stats_manager.Duplicate( times_manager )
+        
+        ( self._file_info_manager, self._tags_manager, self._times_manager, self._locations_manager, self._ratings_manager, self._notes_manager, self._file_viewing_stats_manager ) = ( media_result._file_info_manager, media_result._tags_manager, times_manager, media_result._locations_manager, media_result._ratings_manager, media_result._notes_manager, file_viewing_stats_manager )
+        
+    
     def SetTagsManager( self, tags_manager ):
         
         self._tags_manager = tags_manager
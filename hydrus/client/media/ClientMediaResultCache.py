@@ -1,13 +1,20 @@
+import collections
 import collections.abc
+import os
 import threading
 import weakref
 
 from hydrus.core import HydrusConstants as HC
+from hydrus.core import HydrusData
 from hydrus.core import HydrusLists
+from hydrus.core import HydrusSerialisable
 from hydrus.core.processes import HydrusThreading
 
+from hydrus.client import ClientConstants as CC
 from hydrus.client import ClientGlobals as CG
 from hydrus.client import ClientServices
+from hydrus.client import ClientTime
+from hydrus.client.media import ClientMediaManagers
 from hydrus.client.media import ClientMediaResult
 from hydrus.client.metadata import ClientContentUpdates
 from hydrus.client.metadata import ClientTags
@@ -31,6 +38,223 @@ class MediaResultCacheContainer( ClientCachesBase.CacheableObject ):
         
     
 
+def GetSerialisableMediaResult( media_result: ClientMediaResult.MediaResult ):
+    
+    fim = media_result.GetFileInfoManager()
+    
+    serialisable_file_info = (
+        fim.hash_id,
+        fim.hash.hex(),
+        fim.size,
+        fim.mime,
+        fim.width,
+        fim.height,
+        fim.duration_ms,
+        fim.num_frames,
+        fim.has_audio,
+        fim.num_words,
+        fim.original_mime,
+        fim.has_transparency,
+        fim.has_exif,
+        fim.has_xmp,
+        fim.has_iptc,
+        fim.has_human_readable_embedded_metadata,
+        fim.has_software_source,
+        fim.has_icc_profile,
+        fim.blurhash,
+        None if fim.pixel_hash is None else fim.pixel_hash.hex()
+    )
+    
+    # the combined service is regenerated from the others, so we skip it
+    
+    tags_manager = media_result.GetTagsManager()
+    
+    serialisable_tags = []
+    
+    for tag_display_type in ( ClientTags.TAG_DISPLAY_STORAGE, ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL ):
+        
+        service_keys_to_statuses_to_tags = tags_manager.GetServiceKeysToStatusesToTags( tag_display_type )
+        
+        serialisable_tags.append( [ ( service_key.hex(), [ ( status, list( tags ) ) for ( status, tags ) in statuses_to_tags.items() if len( tags ) > 0 ] ) for ( service_key, statuses_to_tags ) in service_keys_to_statuses_to_tags.items() if service_key != CC.COMBINED_TAG_SERVICE_KEY ] )
+        
+    
+    # last viewed times travel with the view rows, everything else is a timestamp data
+    
+    times_manager = media_result.GetTimesManager()
+    
+    timestamp_datas = [
+        ClientTime.TimestampData.STATICArchivedTime( times_manager.GetArchivedTimestampMS() ),
+        ClientTime.TimestampData.STATICFileModifiedTime( times_manager.GetFileModifiedTimestampMS() )
+    ]
+    
+    timestamp_datas.extend( times_manager.GetDomainModifiedTimestampDatas() )
+    timestamp_datas.extend( times_manager.GetFileServiceTimestampDatas() )
+    
+    serialisable_timestamp_datas = [ timestamp_data.GetSerialisableTuple() for timestamp_data in timestamp_datas if timestamp_data.timestamp_ms is not None ]
+    
+    file_viewing_stats_manager = media_result.GetFileViewingStatsManager()
+    
+    view_rows = []
+    
+    for canvas_type in ( CC.CANVAS_MEDIA_VIEWER, CC.CANVAS_PREVIEW, CC.CANVAS_CLIENT_API ):
+        
+        view_rows.append( ( canvas_type, times_manager.GetLastViewedTimestampMS( canvas_type ), file_viewing_stats_manager.views[ canvas_type ], file_viewing_stats_manager.viewtimes_ms[ canvas_type ] ) )
+        
+    
+    locations_manager = media_result.GetLocationsManager()
+    
+    serialisable_locations = (
+        [ service_key.hex() for service_key in locations_manager.GetCurrent() ],
+        [ service_key.hex() for service_key in locations_manager.GetDeleted() ],
+        [ service_key.hex() for service_key in locations_manager.GetPending() ],
+        [ service_key.hex() for service_key in locations_manager.GetPetitioned() ],
+        locations_manager.GetInbox(),
+        list( locations_manager.GetURLs() ),
+        [ ( service_key.hex(), filename ) for ( service_key, filename ) in locations_manager.GetServiceFilenames().items() ],
+        locations_manager.GetLocalFileDeletionReason() if locations_manager.HasLocalFileDeletionReason() else None
+    )
+    
+    serialisable_ratings = [ ( service_key.hex(), rating ) for ( service_key, rating ) in media_result.GetRatingsManager().GetServiceKeysToRatings().items() ]
+    
+    names_to_notes = media_result.GetNotesManager().GetNamesToNotes()
+    
+    return ( serialisable_file_info, serialisable_tags, serialisable_timestamp_datas, view_rows, serialisable_locations, serialisable_ratings, list( names_to_notes.items() ) )
+    
+
+def GetMediaResultFromSerialisable( serialisable_media_result ) -> ClientMediaResult.MediaResult:
+    
+    ( serialisable_file_info, serialisable_tags, serialisable_timestamp_datas, view_rows, serialisable_locations, serialisable_ratings, names_and_notes ) = serialisable_media_result
+    
+    (
+        hash_id,
+        hash_hex,
+        size,
+        mime,
+        width,
+        height,
+        duration_ms,
+        num_frames,
+        has_audio,
+        num_words,
+        original_mime,
+        has_transparency,
+        has_exif,
+        has_xmp,
+        has_iptc,
+        has_human_readable_embedded_metadata,
+        has_software_source,
+        has_icc_profile,
+        blurhash,
+        pixel_hash_hex
+    ) = serialisable_file_info
+    
+    file_info_manager = ClientMediaManagers.FileInfoManager( hash_id, bytes.fromhex( hash_hex ), size = size, mime = mime, width = width, height = height, duration_ms = duration_ms, num_frames = num_frames, has_audio = has_audio, num_words = num_words )
+    
+    file_info_manager.original_mime = original_mime
+    file_info_manager.has_transparency = has_transparency
+    file_info_manager.has_exif = has_exif
+    file_info_manager.has_xmp = has_xmp
+    file_info_manager.has_iptc = has_iptc
+    file_info_manager.has_human_readable_embedded_metadata = has_human_readable_embedded_metadata
+    file_info_manager.has_software_source = has_software_source
+    file_info_manager.has_icc_profile = has_icc_profile
+    file_info_manager.blurhash = blurhash
+    file_info_manager.pixel_hash = None if pixel_hash_hex is None else bytes.fromhex( pixel_hash_hex )
+    
+    ( service_keys_to_statuses_to_storage_tags, service_keys_to_statuses_to_display_tags ) = [
+        collections.defaultdict(
+            HydrusData.default_dict_set,
+            { bytes.fromhex( service_key_hex ) : collections.defaultdict( set, { status : set( tags ) for ( status, tags ) in statuses_and_tags } ) for ( service_key_hex, statuses_and_tags ) in serialisable_service_keys_to_statuses_to_tags }
+        )
+        for serialisable_service_keys_to_statuses_to_tags in serialisable_tags
+    ]
+    
+    tags_manager = ClientMediaManagers.TagsManager( service_keys_to_statuses_to_storage_tags, service_keys_to_statuses_to_display_tags )
+    
+    times_manager = ClientMediaManagers.TimesManager()
+    
+    for serialisable_timestamp_data in serialisable_timestamp_datas:
+        
+        times_manager.SetTime( HydrusSerialisable.CreateFromSerialisableTuple( serialisable_timestamp_data ) )
+        
+    
+    file_viewing_stats_manager = ClientMediaManagers.FileViewingStatsManager( times_manager, view_rows )
+    
+    ( current_hex, deleted_hex, pending_hex, petitioned_hex, inbox, urls, service_key_hexes_and_filenames, local_file_deletion_reason ) = serialisable_locations
+    
+    locations_manager = ClientMediaManagers.LocationsManager(
+        { bytes.fromhex( service_key_hex ) for service_key_hex in current_hex },
+        { bytes.fromhex( service_key_hex ) for service_key_hex in deleted_hex },
+        { bytes.fromhex( service_key_hex ) for service_key_hex in pending_hex },
+        { bytes.fromhex( service_key_hex ) for service_key_hex in petitioned_hex },
+        times_manager,
+        inbox = inbox,
+        urls = set( urls ),
+        service_keys_to_filenames = { bytes.fromhex( service_key_hex ) : filename for ( service_key_hex, filename ) in service_key_hexes_and_filenames },
+        local_file_deletion_reason = local_file_deletion_reason
+    )
+    
+    ratings_manager = ClientMediaManagers.RatingsManager( { bytes.fromhex( service_key_hex ) : rating for ( service_key_hex, rating ) in serialisable_ratings } )
+    
+    notes_manager = ClientMediaManagers.NotesManager( dict( names_and_notes ) )
+    
+    return ClientMediaResult.MediaResult( file_info_manager, tags_manager, times_manager, locations_manager, ratings_manager, notes_manager, file_viewing_stats_manager )
+    
+
+class MediaResultSnapshot( HydrusSerialisable.SerialisableBase ):
+    
+    SERIALISABLE_TYPE = HydrusSerialisable.SERIALISABLE_TYPE_MEDIA_RESULT_SNAPSHOT
+    SERIALISABLE_NAME = 'Media Result Snapshot'
+    SERIALISABLE_VERSION = 1
+    
+    def __init__( self, media_results: list[ ClientMediaResult.MediaResult ] | None = None ):
+        
+        super().__init__()
+        
+        if media_results is None:
+            
+            media_results = []
+            
+        
+        # a snapshot is only trusted by the same software version that wrote it, so there is no update code here
+        self._software_version = HC.SOFTWARE_VERSION
+        self._media_results = media_results
+        
+    
+    def _GetSerialisableInfo( self ):
+        
+        serialisable_media_results = [ GetSerialisableMediaResult( media_result ) for media_result in self._media_results ]
+        
+        return ( self._software_version, serialisable_media_results )
+        
+    
+    def _InitialiseFromSerialisableInfo( self, serialisable_info ):
+        
+        ( self._software_version, serialisable_media_results ) = serialisable_info
+        
+        if self._software_version == HC.SOFTWARE_VERSION:
+            
+            self._media_results = [ GetMediaResultFromSerialisable( serialisable_media_result ) for serialisable_media_result in serialisable_media_results ]
+            
+        else:
+            
+            self._media_results = []
+            
+        
+    
+    def GetMediaResults( self ) -> list[ ClientMediaResult.MediaResult ]:
+        
+        return list( self._media_results )
+        
+    
+    def GetSoftwareVersion( self ) -> int:
+        
+        return self._software_version
+        
+    
+
+HydrusSerialisable.SERIALISABLE_TYPES_TO_OBJECT_TYPES[ HydrusSerialisable.SERIALISABLE_TYPE_MEDIA_RESULT_SNAPSHOT ] = MediaResultSnapshot
+
 class MediaResultCache( object ):
     
     my_instance = None
@@ -48,6 +272,9 @@ class MediaResultCache( object ):
         # then that won't be a chance for the weakvaluedict to step in. we'll keep this scratchpad of stuff
         self._fifo_timeout_cache = ClientCachesBase.DataCache( CG.client_controller, 'media result cache', 2048, 120 )
         
+        # strong refs to the media results we are saving to or just loaded from a snapshot, so the weakrefs don't drop them
+        self._snapshot_media_results = None
+        
         CG.client_controller.sub( self, 'ProcessContentUpdatePackage', 'content_updates_data' )
         CG.client_controller.sub( self, 'ProcessServiceUpdates', 'service_updates_data' )
         CG.client_controller.sub( self, 'ForceRefreshTags', 'notify_force_refresh_tags_data' )
@@ -213,6 +440,71 @@ class MediaResultCache( object ):
             
         
     
+    def LoadSnapshot( self, path: str ) -> int:
+        
+        if not os.path.exists( path ):
+            
+            return 0
+            
+        
+        try:
+            
+            with open( path, 'rb' ) as f:
+                
+                snapshot = HydrusSerialisable.CreateFromNetworkBytes( f.read() )
+                
+            
+            if not isinstance( snapshot, MediaResultSnapshot ):
+                
+                raise Exception( 'The media result snapshot file did not hold a snapshot!' )
+                
+            
+        except Exception as e:
+            
+            HydrusData.Print( 'Could not load the media result snapshot! Error follows:' )
+            HydrusData.PrintException( e, do_wait = False )
+            
+            snapshot = None
+            
+        finally:
+            
+            # a snapshot is only good for the boot right after the exit that wrote it
+            
+            try:
+                
+                os.remove( path )
+                
+            except Exception:
+                
+                pass
+                
+            
+        
+        if snapshot is None or snapshot.GetSoftwareVersion() != HC.SOFTWARE_VERSION:
+            
+            return 0
+            
+        
+        media_results = snapshot.GetMediaResults()
+        
+        # make sure the hash_ids still mean the same files, in case the db was swapped out
+        
+        hashes = [ media_result.GetHash() for media_result in media_results ]
+        
+        hash_ids_to_hashes = CG.client_controller.Read( 'hash_ids_to_hashes', hashes = hashes, create_new_hash_ids = False )
+        
+        media_results = [ media_result for media_result in media_results if hash_ids_to_hashes.get( media_result.GetHashId(), None ) == media_result.GetHash() ]
+        
+        self.AddMediaResults( media_results )
+        
+        with self._lock:
+            
+            self._snapshot_media_results = media_results
+            
+        
+        return len( media_results )
+        
+    
     def NewTagDisplayRules( self ):
         
         with self._lock:
@@ -226,6 +518,14 @@ class MediaResultCache( object ):
         CG.client_controller.pub( 'refresh_all_tag_presentation_gui' )
         
     
+    def PrepareSnapshot( self ):
+        
+        with self._lock:
+            
+            self._snapshot_media_results = list( self._hash_ids_to_media_results.values() )
+            
+        
+    
     def ProcessContentUpdatePackage( self, content_update_package: ClientContentUpdates.ContentUpdatePackage ):
         
         with self._lock:
@@ -279,6 +579,93 @@ class MediaResultCache( object ):
             
         
     
+    def RevalidateSnapshotChunk( self ) -> bool:
+        
+        # the snapshot may have missed some content updates, so we re-fetch it from the db a chunk at a time
+        # the db reads and swaps in one job, so no content update can land between the two
+        
+        with self._lock:
+            
+            if self._snapshot_media_results is None or len( self._snapshot_media_results ) == 0:
+                
+                self._snapshot_media_results = None
+                
+                return False
+                
+            
+            hash_ids = [ media_result.GetHashId() for media_result in self._snapshot_media_results[ : 256 ] ]
+            
+            self._snapshot_media_results = self._snapshot_media_results[ 256 : ]
+            
+        
+        CG.client_controller.Read( 'revalidate_media_results', hash_ids )
+        
+        return True
+        
+    
+    def SaveSnapshot( self, path: str ):
+        
+        with self._lock:
+            
+            media_results = self._snapshot_media_results
+            
+            self._snapshot_media_results = None
+            
+        
+        if media_results is None or len( media_results ) == 0:
+            
+            return
+            
+        
+        temp_path = path + '.temp'
+        
+        try:
+            
+            snapshot = MediaResultSnapshot( media_results )
+            
+            with open( temp_path, 'wb' ) as f:
+                
+                f.write( snapshot.DumpToNetworkBytes() )
+                
+            
+            os.replace( temp_path, path )
+            
+        except Exception as e:
+            
+            HydrusData.Print( 'Could not save the media result snapshot! Error follows:' )
+            HydrusData.PrintException( e, do_wait = False )
+            
+            if os.path.exists( temp_path ):
+                
+                os.remove( temp_path )
+                
+            
+        
+    
+    def SilentlyTakeFreshMediaResults( self, fresh_media_results: collections.abc.Collection[ ClientMediaResult.MediaResult ] ):
+        
+        # the db calls this in the same job it read them in
+        
+        updated_hashes = []
+        
+        with self._lock:
+            
+            for fresh_media_result in fresh_media_results:
+                
+                media_result = self._hash_ids_to_media_results.get( fresh_media_result.GetHashId(), None )
+                
+                if media_result is not None:
+                    
+                    media_result.SetManagersFromMediaResult( fresh_media_result )
+                    
+                    updated_hashes.append( media_result.GetHash() )
+                    
+                
+            
+        
+        return updated_hashes
+        
+    
     def SilentlyTakeNewTagsManagers( self, hash_ids_to_tags_managers ):
         
         with self._lock:
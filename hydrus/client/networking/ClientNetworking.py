@@ -418,6 +418,8 @@ class NetworkEngine( object ):
                     
                     self._active_domains_counter[ job.GetSecondLevelDomain() ] += 1
                     
+                    # this is the only place a job gets a thread, and it keeps it, blocking on requests, until it is done. jobs that are waiting hold none, so MAX_JOBS is the thread cost
+                    # there is no async/multiplexed executor. NetworkJob's chunked reads, bandwidth throttling and retries are all blocking code, and the sessions only pool keep-alive connections per domain
                     self.controller.CallToThread( job.Start )
                     
                     self._jobs_running.append( job )
@@ -2,6 +2,7 @@ import collections.abc
 import http.cookiejar
 import pickle
 import requests
+import requests.adapters
 import threading
 import typing
 
@@ -27,6 +28,9 @@ except Exception as e:
     SOCKS_PROXY_OK = False
     
 
+# how many different hosts each session will keep a keep-alive pool for
+SESSION_POOL_NUM_HOSTS = 32
+
 def AddCookieToSession( session, name, value, domain, path, expires, secure = False, rest = None ):
     
     version = 0
@@ -66,6 +70,22 @@ def AddCookiesToSessionActualCookies( session, list_of_cookies: list[ http.cooki
     EnsureSessionCookiesAreSynced( session, cookies )
     
 
+def MountConnectionPoolAdapters( session: requests.Session ):
+    
+    # a session serves a whole second-level domain, often over several hosts (cdn subdomains and so on), and requests only keeps pools for ten hosts by default
+    # the engine never runs more jobs on one second-level domain than the per-domain limit, so that is all the connections we will ever want to keep alive per host
+    
+    max_network_jobs = CG.client_controller.new_options.GetInteger( 'max_network_jobs' )
+    max_network_jobs_per_domain = CG.client_controller.new_options.GetInteger( 'max_network_jobs_per_domain' )
+    
+    pool_maxsize = max( 1, min( max_network_jobs, max_network_jobs_per_domain ) )
+    
+    for prefix in ( 'https://', 'http://' ):
+        
+        session.mount( prefix, requests.adapters.HTTPAdapter( pool_connections = SESSION_POOL_NUM_HOSTS, pool_maxsize = pool_maxsize ) )
+        
+    
+
 def CleanseHeadersForSession( ambiguous_session, headers: dict[ str, str ] ):
     
     if ClientNetworkingCurlCFFI.SessionIsCurlCFFI( ambiguous_session ):
@@ -187,6 +207,8 @@ class NetworkSessionManagerSessionContainer( HydrusSerialisable.SerialisableBase
             
             session = requests.Session()
             
+            MountConnectionPoolAdapters( session )
+            
         
         if self.network_context.context_type == CC.NETWORK_CONTEXT_HYDRUS:
             
@@ -48,7 +48,8 @@ CLIENT_API_INT_PARAMS = {
     'width',
     'height',
     'render_format',
-    'render_quality'
+    'render_quality',
+    'page_size'
 }
 
 CLIENT_API_BYTE_PARAMS = {
@@ -77,7 +78,8 @@ CLIENT_API_STRING_PARAMS = {
     'reason',
     'tag_display_type',
     'source_hash_type',
-    'desired_hash_type'
+    'desired_hash_type',
+    'cursor'
 }
 
 CLIENT_API_JSON_PARAMS = {
@@ -109,13 +111,15 @@ CLIENT_API_JSON_PARAMS = {
     'doublecheck_file_system',
     'only_in_view',
     'include_current_tags',
-    'include_pending_tags'
+    'include_pending_tags',
+    'columns'
 }
 
 CLIENT_API_JSON_BYTE_LIST_PARAMS = {
     'file_service_keys',
     'deleted_file_service_keys',
-    'hashes'
+    'hashes',
+    'tag_service_keys'
 }
 
 CLIENT_API_JSON_BYTE_DICT_PARAMS = {
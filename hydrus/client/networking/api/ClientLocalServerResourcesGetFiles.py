@@ -1,11 +1,10 @@
 import os
-import time
 
 from hydrus.core import HydrusConstants as HC
 from hydrus.core import HydrusData
 from hydrus.core import HydrusExceptions
+from hydrus.core import HydrusLists
 from hydrus.core.files import HydrusFileHandling
-from hydrus.core.files.images import HydrusImageHandling
 from hydrus.core.networking import HydrusServerRequest
 from hydrus.core.networking import HydrusServerResources
 
@@ -24,6 +23,9 @@ from hydrus.client.networking.api import ClientLocalServerResources
 from hydrus.client.search import ClientSearchFileSearchContext
 from hydrus.client.search import ClientSearchTagContext
 
+# the lean columns file_metadata can project for bulk sync jobs
+METADATA_COLUMNS = ( 'size', 'mime', 'filetype_enum', 'width', 'height', 'duration', 'num_frames', 'num_words', 'has_audio' )
+
 
 class HydrusResourceClientAPIRestrictedGetFiles( ClientLocalServerResources.HydrusResourceClientAPIRestricted ):
     
@@ -37,83 +39,79 @@ class HydrusResourceClientAPIRestrictedGetFilesSearchFiles( HydrusResourceClient
     
     def _threadDoGETJob( self, request: HydrusServerRequest.HydrusRequest ):
         
-        location_context = ClientLocalServerCore.ParseLocationContext( request, ClientLocation.LocationContext.STATICCreateSimple( CC.COMBINED_LOCAL_FILE_DOMAINS_SERVICE_KEY ) )
+        return_hashes = request.parsed_request_args.GetValue( 'return_hashes', bool, default_value = False )
+        return_file_ids = request.parsed_request_args.GetValue( 'return_file_ids', bool, default_value = True )
         
-        tag_service_key = ClientLocalServerCore.ParseTagServiceKey( request )
+        page_size = request.parsed_request_args.GetValueOrNone( 'page_size', int )
         
-        if tag_service_key == CC.COMBINED_TAG_SERVICE_KEY and location_context.IsAllKnownFiles():
+        if page_size is not None and page_size < 1:
             
-            raise HydrusExceptions.BadRequestException( 'Sorry, search for all known tags over all known files is not supported!' )
+            raise HydrusExceptions.BadRequestException( 'Sorry, the page size has to be at least 1!' )
             
         
-        include_current_tags = request.parsed_request_args.GetValue( 'include_current_tags', bool, default_value = True )
-        include_pending_tags = request.parsed_request_args.GetValue( 'include_pending_tags', bool, default_value = True )
-        
-        tag_context = ClientSearchTagContext.TagContext( service_key = tag_service_key, include_current_tags = include_current_tags, include_pending_tags = include_pending_tags )
-        predicates = ClientLocalServerCore.ParseClientAPISearchPredicates( request )
-        
-        return_hashes = False
-        return_file_ids = True
-        
-        if len( predicates ) == 0:
+        if 'cursor' in request.parsed_request_args:
+            
+            ( cursor_key, offset ) = ParseSearchCursor( request.parsed_request_args.GetValue( 'cursor', str ) )
             
-            hash_ids = []
+            ( page_hash_ids, num_files, page_size ) = request.client_api_permissions.GetSearchCursorPage( cursor_key, offset, page_size = page_size )
             
         else:
             
-            file_search_context = ClientSearchFileSearchContext.FileSearchContext( location_context = location_context, tag_context = tag_context, predicates = predicates )
+            hash_ids = self._DoSearch( request )
             
-            file_sort_type = CC.SORT_FILES_BY_IMPORT_TIME
+            request.client_api_permissions.SetLastSearchResults( hash_ids )
             
-            if 'file_sort_type' in request.parsed_request_args:
+            cursor_key = None
+            offset = 0
+            num_files = len( hash_ids )
+            
+            if page_size is None:
                 
-                file_sort_type = request.parsed_request_args[ 'file_sort_type' ]
+                page_hash_ids = hash_ids
                 
-            
-            if file_sort_type not in CC.SYSTEM_SORT_TYPES:
+            else:
                 
-                raise HydrusExceptions.BadRequestException( 'Sorry, did not understand that sort type!' )
+                hash_ids = list( hash_ids )
+                
+                # we only do the hash lookup and the json for the page, not the whole search
+                page_hash_ids = hash_ids[ : page_size ]
+                
+                if num_files > page_size:
+                    
+                    cursor_key = request.client_api_permissions.AddSearchCursor( hash_ids, page_size )
+                    
                 
             
-            file_sort_asc = request.parsed_request_args.GetValue( 'file_sort_asc', bool, default_value = True )
-            
-            sort_order = CC.SORT_ASC if file_sort_asc else CC.SORT_DESC
+        
+        body_dict = {}
+        
+        if page_size is not None:
             
-            # newest first
-            sort_by = ClientMediaSort.MediaSort( sort_type = ( 'system', file_sort_type ), sort_order = sort_order )
+            next_offset = offset + page_size
             
-            if 'return_hashes' in request.parsed_request_args:
+            if cursor_key is not None and next_offset < num_files:
                 
-                return_hashes = request.parsed_request_args.GetValue( 'return_hashes', bool )
+                body_dict[ 'next_cursor' ] = GenerateSearchCursor( cursor_key, next_offset )
                 
-            
-            if 'return_file_ids' in request.parsed_request_args:
+            else:
                 
-                return_file_ids = request.parsed_request_args.GetValue( 'return_file_ids', bool )
+                body_dict[ 'next_cursor' ] = None
                 
             
-            job_status = ClientThreading.JobStatus( cancellable = True )
-            
-            request.disconnect_callables.append( job_status.Cancel )
-            
-            hash_ids = CG.client_controller.Read( 'file_query_ids', file_search_context, job_status = job_status, sort_by = sort_by, apply_implicit_limit = False )
+            body_dict[ 'num_files' ] = num_files
             
         
-        request.client_api_permissions.SetLastSearchResults( hash_ids )
-        
-        body_dict = {}
-        
         if return_hashes:
             
-            hash_ids_to_hashes = CG.client_controller.Read( 'hash_ids_to_hashes', hash_ids = hash_ids )
+            hash_ids_to_hashes = CG.client_controller.Read( 'hash_ids_to_hashes', hash_ids = page_hash_ids )
             
             # maintain sort
-            body_dict[ 'hashes' ] = [ hash_ids_to_hashes[ hash_id ].hex() for hash_id in hash_ids ]
+            body_dict[ 'hashes' ] = [ hash_ids_to_hashes[ hash_id ].hex() for hash_id in page_hash_ids ]
             
         
         if return_file_ids:
             
-            body_dict[ 'file_ids' ] = list( hash_ids )
+            body_dict[ 'file_ids' ] = list( page_hash_ids )
             
         
         body = ClientLocalServerCore.Dumps( body_dict, request.preferred_mime )
@@ -123,6 +121,85 @@ class HydrusResourceClientAPIRestrictedGetFilesSearchFiles( HydrusResourceClient
         return response_context
         
     
+    def _DoSearch( self, request: HydrusServerRequest.HydrusRequest ) -> list[ int ]:
+        
+        location_context = ClientLocalServerCore.ParseLocationContext( request, ClientLocation.LocationContext.STATICCreateSimple( CC.COMBINED_LOCAL_FILE_DOMAINS_SERVICE_KEY ) )
+        
+        tag_service_key = ClientLocalServerCore.ParseTagServiceKey( request )
+        
+        if tag_service_key == CC.COMBINED_TAG_SERVICE_KEY and location_context.IsAllKnownFiles():
+            
+            raise HydrusExceptions.BadRequestException( 'Sorry, search for all known tags over all known files is not supported!' )
+            
+        
+        include_current_tags = request.parsed_request_args.GetValue( 'include_current_tags', bool, default_value = True )
+        include_pending_tags = request.parsed_request_args.GetValue( 'include_pending_tags', bool, default_value = True )
+        
+        tag_context = ClientSearchTagContext.TagContext( service_key = tag_service_key, include_current_tags = include_current_tags, include_pending_tags = include_pending_tags )
+        predicates = ClientLocalServerCore.ParseClientAPISearchPredicates( request )
+        
+        if len( predicates ) == 0:
+            
+            return []
+            
+        
+        file_search_context = ClientSearchFileSearchContext.FileSearchContext( location_context = location_context, tag_context = tag_context, predicates = predicates )
+        
+        file_sort_type = CC.SORT_FILES_BY_IMPORT_TIME
+        
+        if 'file_sort_type' in request.parsed_request_args:
+            
+            file_sort_type = request.parsed_request_args[ 'file_sort_type' ]
+            
+        
+        if file_sort_type not in CC.SYSTEM_SORT_TYPES:
+            
+            raise HydrusExceptions.BadRequestException( 'Sorry, did not understand that sort type!' )
+            
+        
+        file_sort_asc = request.parsed_request_args.GetValue( 'file_sort_asc', bool, default_value = True )
+        
+        sort_order = CC.SORT_ASC if file_sort_asc else CC.SORT_DESC
+        
+        # newest first
+        sort_by = ClientMediaSort.MediaSort( sort_type = ( 'system', file_sort_type ), sort_order = sort_order )
+        
+        job_status = ClientThreading.JobStatus( cancellable = True )
+        
+        request.disconnect_callables.append( job_status.Cancel )
+        
+        hash_ids = CG.client_controller.Read( 'file_query_ids', file_search_context, job_status = job_status, sort_by = sort_by, apply_implicit_limit = False )
+        
+        return hash_ids
+        
+    
+
+def GenerateSearchCursor( cursor_key: bytes, offset: int ) -> str:
+    
+    return f'{cursor_key.hex()}:{offset}'
+    
+
+def ParseSearchCursor( cursor: str ) -> tuple[ bytes, int ]:
+    
+    try:
+        
+        ( cursor_key_hex, offset_string ) = cursor.split( ':', 1 )
+        
+        cursor_key = bytes.fromhex( cursor_key_hex )
+        offset = int( offset_string )
+        
+        if offset < 0:
+            
+            raise Exception()
+            
+        
+    except Exception as e:
+        
+        raise HydrusExceptions.BadRequestException( f'Sorry, I could not understand the search cursor "{cursor}"!' )
+        
+    
+    return ( cursor_key, offset )
+    
 
 def ParseAndFetchMediaResult( request: HydrusServerRequest.HydrusRequest ) -> ClientMediaResult.MediaResult:
     
@@ -245,19 +322,7 @@ class HydrusResourceClientAPIRestrictedGetFilesGetRenderedFile( HydrusResourceCl
                 format = HC.IMAGE_PNG
                 
             
-            renderer = CG.client_controller.images_cache.GetImageRenderer( media_result )
-            
-            while not renderer.IsReady():
-                
-                if request.disconnected:
-                    
-                    return
-                    
-                
-                time.sleep( 0.01 )
-                
-            
-            numpy_image = renderer.GetNumPyImage()
+            target_resolution = None
             
             if 'width' in request.parsed_request_args and 'height' in request.parsed_request_args:
                 
@@ -274,7 +339,7 @@ class HydrusResourceClientAPIRestrictedGetFilesGetRenderedFile( HydrusResourceCl
                     raise HydrusExceptions.BadRequestException( 'Height must be greater than 0!' )
                     
                 
-                numpy_image = HydrusImageHandling.ResizeNumPyImage( numpy_image, ( width, height ) )
+                target_resolution = ( width, height )
                 
             
             if 'render_quality' in request.parsed_request_args:
@@ -294,7 +359,12 @@ class HydrusResourceClientAPIRestrictedGetFilesGetRenderedFile( HydrusResourceCl
                 
             max_age = 86400 * 365
             
-            body = HydrusImageHandling.GenerateFileBytesForRenderAPI( numpy_image, format, quality )
+            body = CG.client_controller.client_api_render_cache.GetRenderBytes( media_result, target_resolution, format, quality, abort_call = lambda: request.disconnected )
+            
+            if body is None:
+                
+                return
+                
             
         elif media_result.GetMime() == HC.ANIMATION_UGOIRA:
             
@@ -405,6 +475,86 @@ class HydrusResourceClientAPIRestrictedGetFilesFileHashes( HydrusResourceClientA
 
 class HydrusResourceClientAPIRestrictedGetFilesFileMetadata( HydrusResourceClientAPIRestrictedGetFiles ):
     
+    def _DoColumnarGETJob( self, request: HydrusServerRequest.HydrusRequest, columns: list[ str ] | None, tag_service_keys: list[ bytes ], create_new_file_ids: bool, include_services_object: bool ):
+        
+        if columns is None:
+            
+            columns = []
+            
+        
+        for column in columns:
+            
+            if column not in METADATA_COLUMNS:
+                
+                raise HydrusExceptions.BadRequestException( f'Sorry, I do not know the metadata column "{column}"! Try one of: {", ".join( METADATA_COLUMNS )}' )
+                
+            
+        
+        for tag_service_key in tag_service_keys:
+            
+            ClientLocalServerCore.CheckTagService( tag_service_key )
+            
+        
+        hashes = ClientLocalServerCore.ParseHashes( request )
+        
+        hash_ids_to_hashes = CG.client_controller.Read( 'hash_ids_to_hashes', hashes = hashes, create_new_hash_ids = create_new_file_ids )
+        
+        hashes_to_hash_ids = { hash : hash_id for ( hash_id, hash ) in hash_ids_to_hashes.items() }
+        
+        request.client_api_permissions.CheckPermissionToSeeFiles( set( hash_ids_to_hashes.keys() ) )
+        
+        hashes = HydrusLists.DedupeList( hashes )
+        
+        hash_ids = [ hashes_to_hash_ids[ hash ] for hash in hashes if hash in hashes_to_hash_ids ]
+        
+        db_column_names = { 'mime' if column == 'filetype_enum' else column for column in columns }
+        
+        db_columns = CG.client_controller.Read( 'file_metadata_columns', hash_ids, db_column_names, tag_service_keys )
+        
+        api_columns = {}
+        
+        for column in columns:
+            
+            if column == 'mime':
+                
+                api_columns[ column ] = [ None if mime is None else HC.mime_mimetype_string_lookup[ mime ] for mime in db_columns[ 'mime' ] ]
+                
+            elif column == 'filetype_enum':
+                
+                api_columns[ column ] = db_columns[ 'mime' ]
+                
+            else:
+                
+                api_columns[ column ] = db_columns[ column ]
+                
+            
+        
+        if len( tag_service_keys ) > 0:
+            
+            api_columns[ 'tags' ] = { tag_service_key.hex() : tag_lists for ( tag_service_key, tag_lists ) in db_columns[ 'tags' ].items() }
+            
+        
+        body_dict = {
+            'file_ids' : hash_ids,
+            'hashes' : [ hash_ids_to_hashes[ hash_id ].hex() for hash_id in hash_ids ],
+            'missing_hashes' : [ hash.hex() for hash in hashes if hash not in hashes_to_hash_ids ],
+            'columns' : api_columns
+        }
+        
+        if include_services_object:
+            
+            body_dict[ 'services' ] = ClientLocalServerCore.GetServicesDict()
+            body_dict[ 'services_v2' ] = ClientLocalServerCore.GetServicesList()
+            
+        
+        mime = request.preferred_mime
+        body = ClientLocalServerCore.Dumps( body_dict, mime )
+        
+        response_context = HydrusServerResources.ResponseContext( 200, mime = mime, body = body )
+        
+        return response_context
+        
+    
     def _threadDoGETJob( self, request: HydrusServerRequest.HydrusRequest ):
         
         only_return_identifiers = request.parsed_request_args.GetValue( 'only_return_identifiers', bool, default_value = False )
@@ -417,6 +567,14 @@ class HydrusResourceClientAPIRestrictedGetFilesFileMetadata( HydrusResourceClien
         create_new_file_ids = request.parsed_request_args.GetValue( 'create_new_file_ids', bool, default_value = False )
         include_blurhash = request.parsed_request_args.GetValue( 'include_blurhash', bool, default_value = False )
         
+        columns = request.parsed_request_args.GetValueOrNone( 'columns', list, expected_list_type = str )
+        tag_service_keys = request.parsed_request_args.GetValue( 'tag_service_keys', list, expected_list_type = bytes, default_value = [] )
+        
+        if columns is not None or len( tag_service_keys ) > 0:
+            
+            return self._DoColumnarGETJob( request, columns, tag_service_keys, create_new_file_ids, include_services_object )
+            
+        
         hashes = ClientLocalServerCore.ParseHashes( request )
         
         hash_ids_to_hashes = CG.client_controller.Read( 'hash_ids_to_hashes', hashes = hashes, create_new_hash_ids = create_new_file_ids )
@@ -532,6 +690,8 @@ class HydrusResourceClientAPIRestrictedGetFilesGetThumbnail( HydrusResourceClien
         
         media_result = ParseAndFetchMediaResult( request )
         
+        CG.client_controller.client_api_render_cache.NotifyFileAccessed( media_result )
+        
         mime = media_result.GetMime()
         
         if mime in HC.MIMES_WITH_THUMBNAILS:
@@ -540,6 +700,18 @@ class HydrusResourceClientAPIRestrictedGetFilesGetThumbnail( HydrusResourceClien
                 
                 path = CG.client_controller.client_files_manager.GetThumbnailPath( media_result )
                 
+                if path is None:
+                    
+                    # packed thumbnail, no file of its own to serve
+                    thumbnail_bytes = CG.client_controller.client_files_manager.GetThumbnailBytes( media_result )
+                    
+                    response_mime = HydrusFileHandling.GetThumbnailMimeFromBytes( thumbnail_bytes )
+                    
+                    response_context = HydrusServerResources.ResponseContext( 200, mime = response_mime, body = thumbnail_bytes )
+                    
+                    return response_context
+                    
+                
                 if not os.path.exists( path ):
                     
                     # not _supposed_ to happen, but it seems in odd situations it can
@@ -669,6 +841,11 @@ class HydrusResourceClientAPIRestrictedGetFilesGetThumbnailPath( HydrusResourceC
                 
                 path = CG.client_controller.client_files_manager.GetThumbnailPath( media_result )
                 
+                if path is None:
+                    
+                    raise HydrusExceptions.BadRequestException( 'Sorry, that thumbnail is in a packed thumbnail file, so it does not have a path of its own! Please fetch it with /get_files/thumbnail instead.' )
+                    
+                
                 if not os.path.exists( path ):
                     
                     # not _supposed_ to happen, but it seems in odd situations it can
@@ -497,7 +497,7 @@ class PredicateResultsCacheMedia( PredicateResultsCache ):
     
 class PredicateResultsCacheTag( PredicateResultsCache ):
     
-    def __init__( self, predicates: collections.abc.Iterable[ ClientSearchPredicate.Predicate ], strict_search_text: str, exact_match: bool ):
+    def __init__( self, predicates: collections.abc.Iterable[ ClientSearchPredicate.Predicate ], strict_search_text: str, exact_match: bool, results_are_truncated: bool = False ):
         
         super().__init__( predicates )
         
@@ -506,12 +506,19 @@ class PredicateResultsCacheTag( PredicateResultsCache ):
         ( self._strict_search_text_namespace, self._strict_search_text_subtag ) = HydrusTags.SplitTag( self._strict_search_text )
         
         self._exact_match = exact_match
+        self._results_are_truncated = results_are_truncated
         
     
     def CanServeTagResults( self, parsed_autocomplete_text: ParsedAutocompleteText, exact_match: bool, allow_auto_wildcard_conversion = True ):
         
         strict_search_text = parsed_autocomplete_text.GetSearchText( False, allow_auto_wildcard_conversion = allow_auto_wildcard_conversion )
         
+        if self._results_are_truncated:
+            
+            # we only have the top-k of a bigger result, so a narrower search may need tags we never fetched
+            return exact_match == self._exact_match and strict_search_text == self._strict_search_text
+            
+        
         if self._exact_match:
             
             if exact_match and strict_search_text == self._strict_search_text:
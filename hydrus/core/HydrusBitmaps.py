@@ -0,0 +1,309 @@
+import collections.abc
+import numpy
+
+# a simple roaring-style bitmap for big sets of non-negative ints, like hash_ids
+# the number space is cut into 65536-wide chunks. a sparse chunk is a sorted uint16 array, a dense one is a packed 8KB bitmap
+
+CHUNK_BITS = 16
+CHUNK_SIZE = 1 << CHUNK_BITS
+CHUNK_MASK = CHUNK_SIZE - 1
+
+# above this many members, a packed bitmap is smaller than a uint16 array
+MAX_ARRAY_CONTAINER_SIZE = 4096
+
+def _ContainerIsBitmap( container: numpy.ndarray ) -> bool:
+    
+    return container.dtype == numpy.uint8
+    
+
+def _ContainerToArray( container: numpy.ndarray ) -> numpy.ndarray:
+    
+    if _ContainerIsBitmap( container ):
+        
+        return numpy.flatnonzero( numpy.unpackbits( container, bitorder = 'little' ) ).astype( numpy.uint16 )
+        
+    
+    return container
+    
+
+def _ContainerToBools( container: numpy.ndarray ) -> numpy.ndarray:
+    
+    if _ContainerIsBitmap( container ):
+        
+        return numpy.unpackbits( container, bitorder = 'little' ).view( numpy.bool_ )
+        
+    
+    bools = numpy.zeros( CHUNK_SIZE, dtype = numpy.bool_ )
+    
+    bools[ container ] = True
+    
+    return bools
+    
+
+def _ContainerFromArray( array: numpy.ndarray ) -> numpy.ndarray | None:
+    
+    if len( array ) == 0:
+        
+        return None
+        
+    
+    if len( array ) > MAX_ARRAY_CONTAINER_SIZE:
+        
+        bools = numpy.zeros( CHUNK_SIZE, dtype = numpy.bool_ )
+        
+        bools[ array ] = True
+        
+        return numpy.packbits( bools, bitorder = 'little' )
+        
+    
+    return array.astype( numpy.uint16 )
+    
+
+def _ContainerFromBools( bools: numpy.ndarray ) -> numpy.ndarray | None:
+    
+    num_set = int( numpy.count_nonzero( bools ) )
+    
+    if num_set == 0:
+        
+        return None
+        
+    
+    if num_set > MAX_ARRAY_CONTAINER_SIZE:
+        
+        return numpy.packbits( bools, bitorder = 'little' )
+        
+    
+    return numpy.flatnonzero( bools ).astype( numpy.uint16 )
+    
+
+def _ContainerLen( container: numpy.ndarray ) -> int:
+    
+    if _ContainerIsBitmap( container ):
+        
+        return int( numpy.count_nonzero( numpy.unpackbits( container ) ) )
+        
+    
+    return len( container )
+    
+
+def _IntersectContainers( container_a: numpy.ndarray, container_b: numpy.ndarray ) -> numpy.ndarray | None:
+    
+    a_is_bitmap = _ContainerIsBitmap( container_a )
+    b_is_bitmap = _ContainerIsBitmap( container_b )
+    
+    if a_is_bitmap and b_is_bitmap:
+        
+        return _ContainerFromBools( _ContainerToBools( container_a ) & _ContainerToBools( container_b ) )
+        
+    elif a_is_bitmap:
+        
+        return _ContainerFromArray( container_b[ _ContainerToBools( container_a )[ container_b ] ] )
+        
+    elif b_is_bitmap:
+        
+        return _ContainerFromArray( container_a[ _ContainerToBools( container_b )[ container_a ] ] )
+        
+    else:
+        
+        return _ContainerFromArray( numpy.intersect1d( container_a, container_b, assume_unique = True ) )
+        
+    
+
+def _UnionContainers( container_a: numpy.ndarray, container_b: numpy.ndarray ) -> numpy.ndarray | None:
+    
+    if _ContainerIsBitmap( container_a ) or _ContainerIsBitmap( container_b ):
+        
+        return _ContainerFromBools( _ContainerToBools( container_a ) | _ContainerToBools( container_b ) )
+        
+    else:
+        
+        return _ContainerFromArray( numpy.union1d( container_a, container_b ) )
+        
+    
+
+def _DifferenceContainers( container_a: numpy.ndarray, container_b: numpy.ndarray ) -> numpy.ndarray | None:
+    
+    if _ContainerIsBitmap( container_a ):
+        
+        return _ContainerFromBools( _ContainerToBools( container_a ) & ~_ContainerToBools( container_b ) )
+        
+    elif _ContainerIsBitmap( container_b ):
+        
+        return _ContainerFromArray( container_a[ ~_ContainerToBools( container_b )[ container_a ] ] )
+        
+    else:
+        
+        return _ContainerFromArray( numpy.setdiff1d( container_a, container_b, assume_unique = True ) )
+        
+    
+
+class CompressedBitmap( object ):
+    
+    def __init__( self, highs_to_containers: dict[ int, numpy.ndarray ] | None = None ):
+        
+        if highs_to_containers is None:
+            
+            highs_to_containers = {}
+            
+        
+        # these are never edited in place, so bitmaps can share them
+        self._highs_to_containers = highs_to_containers
+        
+        self._len = None
+        
+    
+    def __contains__( self, i ):
+        
+        high = i >> CHUNK_BITS
+        
+        if high not in self._highs_to_containers:
+            
+            return False
+            
+        
+        container = self._highs_to_containers[ high ]
+        low = i & CHUNK_MASK
+        
+        if _ContainerIsBitmap( container ):
+            
+            return bool( container[ low >> 3 ] & ( 1 << ( low & 7 ) ) )
+            
+        
+        index = numpy.searchsorted( container, low )
+        
+        return index < len( container ) and container[ index ] == low
+        
+    
+    def __len__( self ):
+        
+        if self._len is None:
+            
+            self._len = sum( ( _ContainerLen( container ) for container in self._highs_to_containers.values() ) )
+            
+        
+        return self._len
+        
+    
+    @staticmethod
+    def FromIntegers( ints: collections.abc.Iterable[ int ] ) -> 'CompressedBitmap':
+        
+        if isinstance( ints, numpy.ndarray ):
+            
+            array = ints.astype( numpy.int64 )
+            
+        else:
+            
+            array = numpy.fromiter( ints, dtype = numpy.int64 )
+            
+        
+        if len( array ) == 0:
+            
+            return CompressedBitmap()
+            
+        
+        array = numpy.unique( array )
+        
+        ( highs, starts ) = numpy.unique( array >> CHUNK_BITS, return_index = True )
+        
+        lows = ( array & CHUNK_MASK ).astype( numpy.uint16 )
+        
+        highs_to_containers = {}
+        
+        for ( high, low_chunk ) in zip( highs.tolist(), numpy.split( lows, starts[ 1 : ] ) ):
+            
+            highs_to_containers[ high ] = _ContainerFromArray( low_chunk )
+            
+        
+        return CompressedBitmap( highs_to_containers )
+        
+    
+    def Difference( self, other: 'CompressedBitmap' ) -> 'CompressedBitmap':
+        
+        highs_to_containers = {}
+        
+        for ( high, container ) in self._highs_to_containers.items():
+            
+            if high in other._highs_to_containers:
+                
+                container = _DifferenceContainers( container, other._highs_to_containers[ high ] )
+                
+                if container is None:
+                    
+                    continue
+                    
+                
+            
+            highs_to_containers[ high ] = container
+            
+        
+        return CompressedBitmap( highs_to_containers )
+        
+    
+    def GetSizeInBytes( self ) -> int:
+        
+        return sum( ( container.nbytes for container in self._highs_to_containers.values() ) )
+        
+    
+    def Intersection( self, other: 'CompressedBitmap' ) -> 'CompressedBitmap':
+        
+        highs_to_containers = {}
+        
+        if len( other._highs_to_containers ) < len( self._highs_to_containers ):
+            
+            ( smaller, larger ) = ( other, self )
+            
+        else:
+            
+            ( smaller, larger ) = ( self, other )
+            
+        
+        for ( high, container ) in smaller._highs_to_containers.items():
+            
+            if high in larger._highs_to_containers:
+                
+                container = _IntersectContainers( container, larger._highs_to_containers[ high ] )
+                
+                if container is not None:
+                    
+                    highs_to_containers[ high ] = container
+                    
+                
+            
+        
+        return CompressedBitmap( highs_to_containers )
+        
+    
+    def ToArray( self ) -> numpy.ndarray:
+        
+        if len( self._highs_to_containers ) == 0:
+            
+            return numpy.zeros( 0, dtype = numpy.int64 )
+            
+        
+        arrays = [ ( high << CHUNK_BITS ) + _ContainerToArray( self._highs_to_containers[ high ] ).astype( numpy.int64 ) for high in sorted( self._highs_to_containers.keys() ) ]
+        
+        return numpy.concatenate( arrays )
+        
+    
+    def ToSet( self ) -> set[ int ]:
+        
+        return set( self.ToArray().tolist() )
+        
+    
+    def Union( self, other: 'CompressedBitmap' ) -> 'CompressedBitmap':
+        
+        highs_to_containers = dict( self._highs_to_containers )
+        
+        for ( high, container ) in other._highs_to_containers.items():
+            
+            if high in highs_to_containers:
+                
+                container = _UnionContainers( highs_to_containers[ high ], container )
+                
+            
+            highs_to_containers[ high ] = container
+            
+        
+        return CompressedBitmap( highs_to_containers )
+        
+    
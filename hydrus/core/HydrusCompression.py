@@ -1,5 +1,8 @@
+import struct
 import zlib
 
+from hydrus.core import HydrusExceptions
+
 LZ4_OK = False
 
 try:
@@ -14,9 +17,109 @@ except Exception as e: # ImportError wasn't enough here as Linux went up the sho
     pass # this is no big deal
     
 
-def CompressBytesToBytes( obj_bytes: bytes ) -> bytes:
+ZSTD_OK = False
+ZSTD_MODULE_NAME = None
+
+try:
+    
+    # python 3.14 has it in the standard library
+    from compression import zstd
+    
+    ZSTD_OK = True
+    ZSTD_MODULE_NAME = 'compression.zstd'
+    
+except Exception as e:
+    
+    try:
+        
+        import zstandard
+        
+        ZSTD_OK = True
+        ZSTD_MODULE_NAME = 'zstandard'
+        
+    except Exception as e:
+        
+        pass # this is no big deal
+        
+    
+
+CODEC_ZLIB = 0
+CODEC_ZSTD = 1
+
+codec_str_lookup = {
+    CODEC_ZLIB : 'zlib',
+    CODEC_ZSTD : 'zstd'
+}
+
+ZSTD_LEVEL = 3
+
+# an explicitly chosen codec writes a small header so we know how to read it back
+# plain zlib output never starts with 0xff, so old blobs are still read as before
+FRAME_PREFIX = b'\xffHYCF'
+FRAME_VERSION = 1
+
+# version, codec
+FRAME_HEADER_FORMAT = '>BB'
+FRAME_HEADER_SIZE = len( FRAME_PREFIX ) + struct.calcsize( FRAME_HEADER_FORMAT )
+
+def _ZstdCompress( obj_bytes: bytes ) -> bytes:
+    
+    if ZSTD_MODULE_NAME == 'compression.zstd':
+        
+        return zstd.compress( obj_bytes, level = ZSTD_LEVEL )
+        
+    else:
+        
+        return zstandard.ZstdCompressor( level = ZSTD_LEVEL ).compress( obj_bytes )
+        
+    
+def _ZstdDecompress( compressed_bytes: bytes ) -> bytes:
+    
+    if ZSTD_MODULE_NAME == 'compression.zstd':
+        
+        return zstd.decompress( compressed_bytes )
+        
+    else:
+        
+        return zstandard.ZstdDecompressor().decompress( compressed_bytes )
+        
+    
+def CodecIsAvailable( codec: int ) -> bool:
+    
+    if codec == CODEC_ZLIB:
+        
+        return True
+        
+    elif codec == CODEC_ZSTD:
+        
+        return ZSTD_OK
+        
     
-    return zlib.compress( obj_bytes, 9 )
+    return False
+    
+def CompressBytesToBytes( obj_bytes: bytes, codec: int | None = None ) -> bytes:
+    
+    if codec is None:
+        
+        # the legacy format everything can read
+        return zlib.compress( obj_bytes, 9 )
+        
+    
+    if not CodecIsAvailable( codec ):
+        
+        raise HydrusExceptions.UnsupportedCodecException( 'Cannot compress with {}, since it is not available!'.format( codec_str_lookup.get( codec, 'unknown codec {}'.format( codec ) ) ) )
+        
+    
+    if codec == CODEC_ZSTD:
+        
+        compressed_bytes = _ZstdCompress( obj_bytes )
+        
+    else:
+        
+        compressed_bytes = zlib.compress( obj_bytes, 9 )
+        
+    
+    return FRAME_PREFIX + struct.pack( FRAME_HEADER_FORMAT, FRAME_VERSION, codec ) + compressed_bytes
     
 def CompressFastBytesToBytes( obj_bytes: bytes ) -> bytes:
     
@@ -29,14 +132,19 @@ def CompressFastBytesToBytes( obj_bytes: bytes ) -> bytes:
         return obj_bytes
         
     
-def CompressStringToBytes( obj_string: str ) -> bytes:
+def CompressStringToBytes( obj_string: str, codec: int | None = None ) -> bytes:
     
     obj_bytes = bytes( obj_string, 'utf-8' )
     
-    return CompressBytesToBytes( obj_bytes )
+    return CompressBytesToBytes( obj_bytes, codec = codec )
     
 def DecompressBytesToBytes( compressed_bytes: bytes ) -> bytes:
     
+    if IsFramed( compressed_bytes ):
+        
+        return DecompressFramedBytesToBytes( compressed_bytes )
+        
+    
     try:
         
         obj_bytes = zlib.decompress( compressed_bytes )
@@ -63,6 +171,38 @@ def DecompressBytesToString( compressed_bytes: bytes ) -> str:
     
     return obj_string
     
+def DecompressFramedBytesToBytes( compressed_bytes: bytes ) -> bytes:
+    
+    try:
+        
+        ( frame_version, codec ) = struct.unpack_from( FRAME_HEADER_FORMAT, compressed_bytes, len( FRAME_PREFIX ) )
+        
+    except struct.error:
+        
+        raise HydrusExceptions.SerialisationException( 'Compressed data had a truncated header!' )
+        
+    
+    if frame_version > FRAME_VERSION:
+        
+        raise HydrusExceptions.UnsupportedCodecException( 'Compressed data was frame version {}, but this program only understands up to version {}! Please update your software.'.format( frame_version, FRAME_VERSION ) )
+        
+    
+    if not CodecIsAvailable( codec ):
+        
+        raise HydrusExceptions.UnsupportedCodecException( 'Some data was compressed with {}, but that is not available here! If it is zstd, you need python 3.14 or the "zstandard" library.'.format( codec_str_lookup.get( codec, 'unknown codec {}'.format( codec ) ) ) )
+        
+    
+    body = compressed_bytes[ FRAME_HEADER_SIZE : ]
+    
+    if codec == CODEC_ZSTD:
+        
+        return _ZstdDecompress( body )
+        
+    else:
+        
+        return zlib.decompress( body )
+        
+    
 def DecompressFastBytesToBytes( compressed_bytes: bytes ) -> bytes:
     
     if LZ4_OK:
@@ -74,3 +214,7 @@ def DecompressFastBytesToBytes( compressed_bytes: bytes ) -> bytes:
         return compressed_bytes
         
     
+def IsFramed( compressed_bytes: bytes ) -> bool:
+    
+    return compressed_bytes[ : len( FRAME_PREFIX ) ] == FRAME_PREFIX
+    
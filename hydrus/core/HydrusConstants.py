@@ -127,8 +127,8 @@ options = {}
 # Misc
 
 NETWORK_VERSION = 20
-SOFTWARE_VERSION = 682
-CLIENT_API_VERSION = 95
+SOFTWARE_VERSION = 683
+CLIENT_API_VERSION = 97
 
 SERVER_THUMBNAIL_DIMENSIONS = ( 200, 200 )
 
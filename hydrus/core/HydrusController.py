@@ -568,6 +568,11 @@ class HydrusController( object ):
         return self._Read( action, *args, **kwargs )
         
     
+    def ReadOnCommittedSnapshot( self, action, *args, **kwargs ):
+        
+        return self.db.ReadOnCommittedSnapshot( action, *args, **kwargs )
+        
+    
     def RecordRunningStart( self ):
         
         self._last_shutdown_was_bad = HydrusData.LastShutdownWasBad( self.db_dir, self._name )
@@ -1,4 +1,6 @@
+import copy
 import os
+import pathlib
 import queue
 import sqlite3
 import threading
@@ -6,6 +8,8 @@ import traceback
 import time
 
 from hydrus.core import HydrusDBBase
+from hydrus.core import HydrusDBModule
+from hydrus.core import HydrusDBPopulateCache
 from hydrus.core import HydrusConstants as HC
 from hydrus.core import HydrusData
 from hydrus.core import HydrusEncryption
@@ -300,9 +304,245 @@ def VacuumDBInto( db_path: str ):
 SHUTDOWN_SENTINEL = object()
 COMMIT_CHECK_TOKEN_SENTINEL = object()
 
+class ReadOnlyConnectionPool( object ):
+    
+    def __init__( self, db: "HydrusDB", num_connections: int ):
+        
+        self._db = db
+        self._num_connections = num_connections
+        
+        self._jobs_queue = queue.Queue()
+        
+        self._condition = threading.Condition()
+        
+        self._connections_allowed = True
+        self._num_busy = 0
+        self._shutdown = False
+        
+        self._worker_indices_to_connections = {}
+        
+        for worker_index in range( self._num_connections ):
+            
+            self._db._controller.CallToThreadLongRunning( self._WorkerLoop, worker_index )
+            
+        
+    
+    def _ForwardJobToMainQueue( self, job: HydrusDBBase.JobDatabase ):
+        
+        if self._shutdown:
+            
+            job.PutResult( HydrusExceptions.ShutdownException() )
+            
+            return
+            
+        
+        try:
+            
+            self._db._PutJob( job )
+            
+        except HydrusExceptions.ShutdownException as e:
+            
+            job.PutResult( e )
+            
+        
+    
+    def _ManageJobError( self, job: HydrusDBBase.JobDatabase, e: Exception ):
+        
+        # a pool job never writes and works on its own copies of the db modules, so unlike on the main connection there is nothing shared to clear or roll back
+        
+        tb = traceback.format_exc()
+        
+        HydrusData.Print( 'A db job on the read-only pool failed: ' + job.ToString() )
+        HydrusData.Print( tb )
+        
+        if job.IsSynchronous():
+            
+            db_traceback = 'Database ' + tb
+            
+            first_line = str( type( e ).__name__ ) + ': ' + str( e )
+            
+            new_e = HydrusExceptions.DBException( e, first_line, db_traceback )
+            
+            job.PutResult( new_e )
+            
+        
+    
+    def _ProcessJob( self, worker_index: int, job: HydrusDBBase.JobDatabase ):
+        
+        if worker_index not in self._worker_indices_to_connections:
+            
+            ( db, c ) = self._db._GenerateReadOnlyConnection()
+            
+            temporary_integer_table_name_cache = HydrusDBBase.TemporaryIntegerTableNameCache( is_global_instance = False )
+            
+            ( read_pool_commands_to_methods, id_caches ) = self._db._GenerateReadPoolCommandsToMethods( c, temporary_integer_table_name_cache )
+            
+            self._worker_indices_to_connections[ worker_index ] = ( db, c, temporary_integer_table_name_cache, read_pool_commands_to_methods, id_caches )
+            
+        
+        ( db, c, temporary_integer_table_name_cache, read_pool_commands_to_methods, id_caches ) = self._worker_indices_to_connections[ worker_index ]
+        
+        ( action, args, kwargs ) = job.GetCallableTuple()
+        
+        if HG.db_report_mode:
+            
+            HydrusData.ShowText( 'Running db job on read-only pool: ' + job.ToString() )
+            
+        
+        # the id caches we fill never outlive the snapshot they came from
+        for id_cache in id_caches:
+            
+            id_cache.clear()
+            
+        
+        try:
+            
+            # one transaction per job, so a multi-query read sees one consistent snapshot
+            c.execute( 'BEGIN DEFERRED;' )
+            
+            result = read_pool_commands_to_methods[ action ]( *args, **kwargs )
+            
+            # we commit, not rollback, so our 'mem' temp tables stay in sync with the name cache
+            c.execute( 'COMMIT;' )
+            
+            if job.IsSynchronous():
+                
+                job.PutResult( result )
+                
+            
+        except Exception as e:
+            
+            try:
+                
+                c.execute( 'ROLLBACK;' )
+                
+            except Exception:
+                
+                pass
+                
+            
+            temporary_integer_table_name_cache.Clear()
+            
+            # pool actions are audited to never write, so a 'readonly' error here is a bug, not something to quietly retry on the main connection
+            
+            self._ManageJobError( job, e )
+            
+        
+    
+    def _WorkerLoop( self, worker_index: int ):
+        
+        while True:
+            
+            job = self._jobs_queue.get()
+            
+            if job is SHUTDOWN_SENTINEL:
+                
+                break
+                
+            
+            with self._condition:
+                
+                can_do_job = self._connections_allowed and not self._shutdown
+                
+                if can_do_job:
+                    
+                    self._num_busy += 1
+                    
+                
+            
+            if not can_do_job:
+                
+                self._ForwardJobToMainQueue( job )
+                
+                continue
+                
+            
+            try:
+                
+                self._ProcessJob( worker_index, job )
+                
+            except Exception as e:
+                
+                # could not connect or similar. the main connection can still do it
+                
+                HydrusData.PrintException( e )
+                
+                self._ForwardJobToMainQueue( job )
+                
+            finally:
+                
+                with self._condition:
+                    
+                    self._num_busy -= 1
+                    
+                    self._condition.notify_all()
+                    
+                
+            
+        
+    
+    def AllowConnections( self ):
+        
+        with self._condition:
+            
+            self._connections_allowed = True
+            
+        
+    
+    def CloseConnections( self ):
+        
+        # the main connection is going away for a vacuum, a lock, or shutdown, so we wait for current jobs to finish and then let go of the files
+        
+        with self._condition:
+            
+            self._connections_allowed = False
+            
+            while self._num_busy > 0:
+                
+                self._condition.wait()
+                
+            
+            for ( db, c, temporary_integer_table_name_cache, read_pool_commands_to_methods, id_caches ) in self._worker_indices_to_connections.values():
+                
+                c.close()
+                db.close()
+                
+            
+            self._worker_indices_to_connections = {}
+            
+        
+    
+    def Shutdown( self ):
+        
+        self._shutdown = True
+        
+        self.CloseConnections()
+        
+        for i in range( self._num_connections ):
+            
+            self._jobs_queue.put( SHUTDOWN_SENTINEL )
+            
+        
+    
+    def TryToPutJob( self, job: HydrusDBBase.JobDatabase ) -> bool:
+        
+        with self._condition:
+            
+            if not self._connections_allowed or self._shutdown:
+                
+                return False
+                
+            
+        
+        self._jobs_queue.put( job )
+        
+        return True
+        
+    
 class HydrusDB( HydrusDBBase.DBBase ):
     
     READ_WRITE_ACTIONS = []
+    READ_POOL_ACTIONS = []
     UPDATE_WAIT = 2
     
     def __init__( self, controller: "HG.HydrusController.HydrusController", db_dir, db_name ):
@@ -379,6 +619,12 @@ class HydrusDB( HydrusDBBase.DBBase ):
         
         self._jobs_queue = queue.Queue()
         
+        self._read_pool: ReadOnlyConnectionPool | None = None
+        
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_connection = None
+        self._snapshot_connections_allowed = False
+        
         self._currently_doing_job = False
         self._current_status = ''
         self._current_job_name = ''
@@ -532,6 +778,28 @@ class HydrusDB( HydrusDBBase.DBBase ):
         
         HydrusDBBase.TemporaryIntegerTableNameCache.instance().Clear()
         
+        if self._read_pool is not None:
+            
+            self._read_pool.CloseConnections()
+            
+        
+        with self._snapshot_lock:
+            
+            # if a snapshot read is running, we wait for it here
+            
+            self._snapshot_connections_allowed = False
+            
+            if self._snapshot_connection is not None:
+                
+                ( db, c, temporary_integer_table_name_cache, read_pool_commands_to_methods, id_caches ) = self._snapshot_connection
+                
+                c.close()
+                db.close()
+                
+                self._snapshot_connection = None
+                
+            
+        
         if self._db is not None:
             
             if self._cursor_transaction_wrapper.InTransaction():
@@ -579,11 +847,130 @@ class HydrusDB( HydrusDBBase.DBBase ):
         return HydrusDBBase.JobDatabase( job_type, synchronous, action, *args, **kwargs )
         
     
+    def _GenerateReadOnlyConnection( self ):
+        
+        # WAL lets these read the last committed state while the main connection holds its long write transaction
+        
+        main_db_path = os.path.join( self._db_dir, self._db_filenames[ 'main' ] )
+        
+        db = sqlite3.connect( pathlib.Path( main_db_path ).as_uri() + '?mode=ro', uri = True, isolation_level = None, detect_types = sqlite3.PARSE_DECLTYPES, check_same_thread = False )
+        
+        c = db.cursor()
+        
+        if HG.no_db_temp_files:
+            
+            c.execute( 'PRAGMA temp_store = 2;' )
+            
+        
+        for ( name, filename ) in self._db_filenames.items():
+            
+            if name == 'main':
+                
+                continue
+                
+            
+            db_path = os.path.join( self._db_dir, filename )
+            
+            c.execute( 'ATTACH ? AS ' + name + ';', ( pathlib.Path( db_path ).as_uri() + '?mode=ro', ) )
+            
+        
+        c.execute( 'ATTACH ":memory:" AS mem;' )
+        
+        # these share the OS disk cache with the main connection, so they do not need the full allowance each
+        cache_size = max( 16, HG.db_cache_size // 4 ) * 1024
+        
+        db_names = [ name for ( index, name, path ) in c.execute( 'PRAGMA database_list;' ) if name not in ( 'mem', 'temp' ) ]
+        
+        for db_name in db_names:
+            
+            c.execute( 'PRAGMA {}.cache_size = -{};'.format( db_name, cache_size ) )
+            
+        
+        return ( db, c )
+        
+    
+    def _GenerateReadPoolCommandsToMethods( self, c: sqlite3.Cursor, temporary_integer_table_name_cache: HydrusDBBase.TemporaryIntegerTableNameCache ):
+        
+        # a pool connection gets its own read-only copies of us and every module we can reach, made once when the connection is opened and pointed at its cursor
+        # the copies keep immutable values and get their own empty id caches. any other state is blocked unless the owner says it is safe to share, so a pool action cannot race the main thread on a plain dict or set
+        # the objects the main connection uses are never touched, so there is no per-access cost or swapping on the main thread
+        
+        immutable_types = ( type( None ), bool, int, float, str, bytes, tuple, frozenset )
+        
+        originals_to_copies = {}
+        
+        originals_to_do = [ self ]
+        
+        while len( originals_to_do ) > 0:
+            
+            original = originals_to_do.pop()
+            
+            if id( original ) in originals_to_copies:
+                
+                continue
+                
+            
+            originals_to_copies[ id( original ) ] = copy.copy( original )
+            
+            originals_to_do.extend( ( value for value in vars( original ).values() if isinstance( value, HydrusDBModule.HydrusDBModule ) ) )
+            
+        
+        id_caches = []
+        
+        for read_pool_copy in originals_to_copies.values():
+            
+            shared_attribute_names = read_pool_copy._GetReadPoolSharedAttributeNames()
+            owner_name = type( read_pool_copy ).__name__
+            
+            for ( name, value ) in list( vars( read_pool_copy ).items() ):
+                
+                if id( value ) in originals_to_copies:
+                    
+                    setattr( read_pool_copy, name, originals_to_copies[ id( value ) ] )
+                    
+                elif isinstance( value, HydrusDBPopulateCache.IdToPrimitiveCache ):
+                    
+                    id_cache = value.empty_copy()
+                    
+                    id_caches.append( id_cache )
+                    
+                    setattr( read_pool_copy, name, id_cache )
+                    
+                elif isinstance( value, immutable_types ) or name in shared_attribute_names:
+                    
+                    continue
+                    
+                else:
+                    
+                    setattr( read_pool_copy, name, HydrusDBBase.ReadPoolBlockedAttribute( owner_name, name ) )
+                    
+                
+            
+            read_pool_copy._SetReadPoolConnection( c, temporary_integer_table_name_cache )
+            
+        
+        read_pool_commands_to_methods = {}
+        
+        for action in self.READ_POOL_ACTIONS:
+            
+            method = self._read_commands_to_methods[ action ]
+            
+            read_pool_commands_to_methods[ action ] = getattr( originals_to_copies[ id( method.__self__ ) ], method.__name__ )
+            
+        
+        return ( read_pool_commands_to_methods, id_caches )
+        
+    
     def _GetPossibleAdditionalDBFilenames( self ):
         
         return [ self._ssl_cert_filename, self._ssl_key_filename ]
         
     
+    def _GetReadPoolSize( self ) -> int:
+        
+        return HG.db_read_pool_size
+        
+    
     def _InitCaches( self ):
         
         pass
@@ -841,6 +1228,16 @@ class HydrusDB( HydrusDBBase.DBBase ):
             raise HydrusExceptions.DBAccessException( str( e ) )
             
         
+        if self._read_pool is not None:
+            
+            self._read_pool.AllowConnections()
+            
+        
+        with self._snapshot_lock:
+            
+            self._snapshot_connections_allowed = True
+            
+        
     
     def _InitExternalDatabases( self ):
         
@@ -1184,6 +1581,13 @@ class HydrusDB( HydrusDBBase.DBBase ):
             return
             
         
+        read_pool_size = self._GetReadPoolSize()
+        
+        if read_pool_size > 0 and len( self.READ_POOL_ACTIONS ) > 0 and HG.db_journal_mode == 'WAL':
+            
+            self._read_pool = ReadOnlyConnectionPool( self, read_pool_size )
+            
+        
         self._ready_to_serve_requests = True
         
         while not ( ( self._local_shutdown or HG.model_shutdown ) and self._jobs_queue.empty() ):
@@ -1276,6 +1680,11 @@ class HydrusDB( HydrusDBBase.DBBase ):
         
         self._CloseDBConnection()
         
+        if self._read_pool is not None:
+            
+            self._read_pool.Shutdown()
+            
+        
         temp_path = os.path.join( self._db_dir, self._durable_temp_db_filename )
         
         HydrusPaths.DeletePath( temp_path )
@@ -1316,11 +1725,98 @@ class HydrusDB( HydrusDBBase.DBBase ):
         
         job = self._GenerateDBJob( job_type, synchronous, action, *args, **kwargs )
         
+        if job_type == 'read' and action in self.READ_POOL_ACTIONS and self._read_pool is not None and not self._pause_and_disconnect:
+            
+            # the pool reads the last committed snapshot, so anything still uncommitted on the main connection is not seen yet. pool actions are the reads that are fine with that
+            
+            if self._read_pool.TryToPutJob( job ):
+                
+                return job.GetResult()
+                
+            
+        
         self._PutJob( job )
         
         return job.GetResult()
         
     
+    def ReadOnCommittedSnapshot( self, action, *args, **kwargs ):
+        
+        # for big reads that are happy with everything committed so far. we commit what we have and then read on our own read-only connection in this thread, so the main connection stays free the whole time
+        # this does not use the pool, which can be busy, closed, or hand a job back to the main queue
+        
+        if action not in self.READ_POOL_ACTIONS:
+            
+            raise Exception( 'db received an unknown snapshot read command: ' + action )
+            
+        
+        if HG.db_journal_mode != 'WAL':
+            
+            # a long read on a rollback journal blocks the main connection's commits, so it has to wait its turn in the main queue
+            
+            return self.Read( action, *args, **kwargs )
+            
+        
+        self.ForceACommit()
+        
+        with self._snapshot_lock:
+            
+            if self._loop_finished:
+                
+                raise HydrusExceptions.ShutdownException( 'Application has shut down!' )
+                
+            
+            if not self._snapshot_connections_allowed:
+                
+                raise HydrusExceptions.DBAccessException( 'The database is not connected right now, so it cannot do a snapshot read!' )
+                
+            
+            if self._snapshot_connection is None:
+                
+                ( db, c ) = self._GenerateReadOnlyConnection()
+                
+                temporary_integer_table_name_cache = HydrusDBBase.TemporaryIntegerTableNameCache( is_global_instance = False )
+                
+                ( read_pool_commands_to_methods, id_caches ) = self._GenerateReadPoolCommandsToMethods( c, temporary_integer_table_name_cache )
+                
+                self._snapshot_connection = ( db, c, temporary_integer_table_name_cache, read_pool_commands_to_methods, id_caches )
+                
+            
+            ( db, c, temporary_integer_table_name_cache, read_pool_commands_to_methods, id_caches ) = self._snapshot_connection
+            
+            for id_cache in id_caches:
+                
+                id_cache.clear()
+                
+            
+            try:
+                
+                c.execute( 'BEGIN DEFERRED;' )
+                
+                result = read_pool_commands_to_methods[ action ]( *args, **kwargs )
+                
+                c.execute( 'COMMIT;' )
+                
+            except Exception:
+                
+                try:
+                    
+                    c.execute( 'ROLLBACK;' )
+                    
+                except Exception:
+                    
+                    pass
+                    
+                
+                temporary_integer_table_name_cache.Clear()
+                
+                raise
+                
+            
+            return result
+            
+        
+    
     def ReadyToServeRequests( self ):
         
         return self._ready_to_serve_requests
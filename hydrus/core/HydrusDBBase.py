@@ -135,9 +135,12 @@ class TemporaryIntegerTableNameCache( object ):
     
     my_instance = None
     
-    def __init__( self ):
+    def __init__( self, is_global_instance = True ):
         
-        TemporaryIntegerTableNameCache.my_instance = self
+        if is_global_instance:
+            
+            TemporaryIntegerTableNameCache.my_instance = self
+            
         
         self._column_name_tuples_to_table_names = collections.defaultdict( collections.deque )
         self._column_name_tuples_counter = collections.Counter()
@@ -204,7 +207,12 @@ class TemporaryIntegerTableNameCache( object ):
 
 class TemporaryIntegerTable( object ):
     
-    def __init__( self, cursor: sqlite3.Cursor, integers_iterable, column_names ):
+    def __init__( self, cursor: sqlite3.Cursor, integers_iterable, column_names, temporary_integer_table_name_cache: TemporaryIntegerTableNameCache | None = None ):
+        
+        if temporary_integer_table_name_cache is None:
+            
+            temporary_integer_table_name_cache = TemporaryIntegerTableNameCache.instance()
+            
         
         if not isinstance( integers_iterable, set ):
             
@@ -219,8 +227,9 @@ class TemporaryIntegerTable( object ):
         self._cursor = cursor
         self._integers_iterable = integers_iterable
         self._column_names = column_names
+        self._temporary_integer_table_name_cache = temporary_integer_table_name_cache
         
-        ( self._initialised, self._table_name ) = TemporaryIntegerTableNameCache.instance().GetName( self._column_names )
+        ( self._initialised, self._table_name ) = self._temporary_integer_table_name_cache.GetName( self._column_names )
         
     
     def __enter__( self ):
@@ -278,7 +287,7 @@ class TemporaryIntegerTable( object ):
         
         self._cursor.execute( 'DELETE FROM {};'.format( self._table_name ) )
         
-        TemporaryIntegerTableNameCache.instance().ReleaseName( self._column_names, self._table_name )
+        self._temporary_integer_table_name_cache.ReleaseName( self._column_names, self._table_name )
         
         return False
         
@@ -347,12 +356,44 @@ class JobDatabase( object ):
         
     
 
+class ReadPoolBlockedAttribute( object ):
+    
+    # a read-only pool copy of a module gets one of these in place of any mutable state it does not explicitly share, so a pool action that wanders into a cache fails loudly rather than racing the main thread
+    
+    def __init__( self, owner_name: str, attribute_name: str ):
+        
+        self._owner_name = owner_name
+        self._attribute_name = attribute_name
+        
+    
+    def _Raise( self, *args, **kwargs ):
+        
+        raise Exception( 'The read-only pool copy of "{}" does not have "{}"! If a pool action needs it, it has to be made safe to share and named in _GetReadPoolSharedAttributeNames.'.format( self._owner_name, self._attribute_name ) )
+        
+    
+    def __getattr__( self, name ):
+        
+        self._Raise()
+        
+    
+    __bool__ = _Raise
+    __call__ = _Raise
+    __contains__ = _Raise
+    __getitem__ = _Raise
+    __iter__ = _Raise
+    __len__ = _Raise
+    
+
 class DBBase( object ):
     
     def __init__( self ):
         
         self._c = None
         
+        # a read-only pool worker points copies of us at its own connection
+        self._temporary_integer_table_name_cache = None
+        self._on_read_pool_connection = False
+        
     
     def _AnalyzeTempTable( self, temp_table_name ):
         
@@ -479,6 +520,13 @@ class DBBase( object ):
         return self._c.lastrowid
         
     
+    def _GetReadPoolSharedAttributeNames( self ) -> collections.abc.Collection[ str ]:
+        
+        # anything mutable that a read-only pool copy of us may still use from the main thread's instance. it has to be safe to read while the main thread writes to it
+        
+        return ()
+        
+    
     def _GetRowCount( self ):
         
         row_count = self._c.rowcount
@@ -583,7 +631,14 @@ class DBBase( object ):
     
     def _MakeTemporaryIntegerTable( self, integers_iterable, column_names ):
         
-        return TemporaryIntegerTable( self._c, integers_iterable, column_names )
+        return TemporaryIntegerTable( self._c, integers_iterable, column_names, temporary_integer_table_name_cache = self._temporary_integer_table_name_cache )
+        
+    
+    def _OnReadPoolConnection( self ) -> bool:
+        
+        # a read-only pool job sees a snapshot that can be older than what the main connection sees, so it must not fill shared caches
+        
+        return self._on_read_pool_connection
         
     
     def _SetCursor( self, c: sqlite3.Cursor ):
@@ -591,6 +646,13 @@ class DBBase( object ):
         self._c = c
         
     
+    def _SetReadPoolConnection( self, c: sqlite3.Cursor, temporary_integer_table_name_cache: TemporaryIntegerTableNameCache ):
+        
+        self._c = c
+        self._temporary_integer_table_name_cache = temporary_integer_table_name_cache
+        self._on_read_pool_connection = True
+        
+    
     def _STI( self, iterable_cursor ):
         
         # strip singleton tuples to an iterator
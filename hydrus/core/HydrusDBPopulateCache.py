@@ -353,6 +353,11 @@ class IdToPrimitiveCache( object ):
         self._ids_to_values.clear()
         
     
+    def empty_copy( self ) -> "IdToPrimitiveCache":
+        
+        return IdToPrimitiveCache( self._name, self._max_size )
+        
+    
     def maintain_touch_record( self ):
         
         current_size = len( self._ids_to_values )
@@ -51,6 +51,7 @@ class DBVersionException( HydrusException ): pass
 class FileMissingException( HydrusException ): pass
 class DirectoryMissingException( HydrusException ): pass
 class SerialisationException( HydrusException ): pass
+class UnsupportedCodecException( SerialisationException ): pass
 class NameException( HydrusException ): pass
 class ShutdownException( HydrusException ): pass
 class QtDeadWindowException( HydrusException ): pass
@@ -32,6 +32,7 @@ boot_debug = False
 
 db_cache_size = 256
 db_transaction_commit_period = 30
+db_read_pool_size = 0
 
 # if this is set to 1, transactions are not immediately synced to the journal so multiple can be undone following a power-loss
 # if set to 2, all transactions are synced, so once a new one starts you know the last one is on disk
@@ -110,3 +111,4 @@ twisted_is_broke_exception = None
 dirty_object_lock = threading.Lock()
 client_busy = threading.Lock()
 server_busy = threading.Lock()
+server_generating_update = threading.Lock()
@@ -1695,15 +1695,15 @@ def PotentialPathDeviceIsConnected( path: str ):
     return True
     
 
-def ReadFileLikeAsBlocks( f ) -> collections.abc.Iterator[ bytes ]:
+def ReadFileLikeAsBlocks( f, block_size = HC.READ_BLOCK_SIZE ) -> collections.abc.Iterator[ bytes ]:
     
-    next_block = f.read( HC.READ_BLOCK_SIZE )
+    next_block = f.read( block_size )
     
     while len( next_block ) > 0:
         
         yield next_block
         
-        next_block = f.read( HC.READ_BLOCK_SIZE )
+        next_block = f.read( block_size )
         
     
 
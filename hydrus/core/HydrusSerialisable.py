@@ -1,6 +1,7 @@
 import collections
 import hashlib
 import json
+import struct
 import typing
 
 from hydrus.core import HydrusCompression
@@ -171,11 +172,79 @@ SERIALISABLE_TYPE_EXECUTABLE_MANAGER = 155
 SERIALISABLE_TYPE_EXECUTABLE_CALLABLE = 156
 SERIALISABLE_TYPE_EXECUTABLE_CALL_LOCAL_PROCESS = 157
 SERIALISABLE_TYPE_ID_AND_NAME = 158
+SERIALISABLE_TYPE_MEDIA_RESULT_SNAPSHOT = 159
 
 SERIALISABLE_TYPES_TO_OBJECT_TYPES = {}
 
+# some objects, like repository updates, can also dump to a compact binary format rather than compressed json
+# zlib output never starts with 0xff, so we can tell the two apart by looking at the first bytes
+COMPACT_NETWORK_BYTES_PREFIX = b'\xffHYDCB'
+COMPACT_NETWORK_BYTES_VERSION = 2
+
+COMPACT_CODEC_ZLIB = 0
+COMPACT_CODEC_ZSTD = 1
+
+compact_codecs_to_compression_codecs = {
+    COMPACT_CODEC_ZLIB : None,
+    COMPACT_CODEC_ZSTD : HydrusCompression.CODEC_ZSTD
+}
+
+COMPACT_HEADER_FORMAT = '>BHB'
+COMPACT_HEADER_SIZE = len( COMPACT_NETWORK_BYTES_PREFIX ) + struct.calcsize( COMPACT_HEADER_FORMAT )
+
+def CreateFromCompactNetworkBytes( network_bytes: bytes ) -> typing.Any:
+    
+    try:
+        
+        ( compact_version, serialisable_type, codec ) = struct.unpack_from( COMPACT_HEADER_FORMAT, network_bytes, len( COMPACT_NETWORK_BYTES_PREFIX ) )
+        
+    except struct.error:
+        
+        raise HydrusExceptions.SerialisationException( 'Compact network bytes had a truncated header!' )
+        
+    
+    if compact_version > COMPACT_NETWORK_BYTES_VERSION:
+        
+        raise HydrusExceptions.SerialisationException( 'Compact network bytes were version {}, but this program only understands up to version {}! Please update your software.'.format( compact_version, COMPACT_NETWORK_BYTES_VERSION ) )
+        
+    
+    if serialisable_type not in SERIALISABLE_TYPES_TO_OBJECT_TYPES:
+        
+        raise HydrusExceptions.SerialisationException( 'Compact network bytes had an unknown serialisable type, {}!'.format( serialisable_type ) )
+        
+    
+    if codec not in compact_codecs_to_compression_codecs:
+        
+        raise HydrusExceptions.SerialisationException( 'Compact network bytes had an unknown codec, {}!'.format( codec ) )
+        
+    
+    obj = SERIALISABLE_TYPES_TO_OBJECT_TYPES[ serialisable_type ]()
+    
+    try:
+        
+        body = HydrusCompression.DecompressBytesToBytes( network_bytes[ COMPACT_HEADER_SIZE : ] )
+        
+        obj.InitialiseFromCompactBody( compact_version, body )
+        
+    except HydrusExceptions.SerialisationException:
+        
+        raise
+        
+    except Exception as e:
+        
+        raise HydrusExceptions.SerialisationException( 'Could not parse compact network bytes: {}'.format( e ) )
+        
+    
+    return obj
+    
+
 def CreateFromNetworkBytes( network_bytes: bytes, raise_error_on_future_version = False ) -> typing.Any:
     
+    if network_bytes.startswith( COMPACT_NETWORK_BYTES_PREFIX ):
+        
+        return CreateFromCompactNetworkBytes( network_bytes )
+        
+    
     obj_string = HydrusCompression.DecompressBytesToString( network_bytes )
     
     return CreateFromString( obj_string, raise_error_on_future_version = raise_error_on_future_version )
@@ -268,6 +337,16 @@ class SerialisableBase( object ):
         raise NotImplementedError()
         
     
+    def _GetCompactBody( self ) -> bytes:
+        
+        raise HydrusExceptions.SerialisationException( '{} objects cannot be dumped to the compact network format!'.format( self.SERIALISABLE_NAME ) )
+        
+    
+    def _InitialiseFromCompactBody( self, compact_version, body: bytes ):
+        
+        raise HydrusExceptions.SerialisationException( '{} objects cannot be loaded from the compact network format!'.format( self.SERIALISABLE_NAME ) )
+        
+    
     def _InitialiseFromSerialisableInfo( self, serialisable_info ):
         
         raise NotImplementedError()
@@ -278,11 +357,20 @@ class SerialisableBase( object ):
         return old_serialisable_info
         
     
-    def DumpToNetworkBytes( self ):
+    def DumpToCompactNetworkBytes( self, codec = COMPACT_CODEC_ZLIB ) -> bytes:
+        
+        body = self._GetCompactBody()
+        
+        header = COMPACT_NETWORK_BYTES_PREFIX + struct.pack( COMPACT_HEADER_FORMAT, COMPACT_NETWORK_BYTES_VERSION, self.SERIALISABLE_TYPE, codec )
+        
+        return header + HydrusCompression.CompressBytesToBytes( body, codec = compact_codecs_to_compression_codecs[ codec ] )
+        
+    
+    def DumpToNetworkBytes( self, codec = None ):
         
         obj_string = self.DumpToString()
         
-        return HydrusCompression.CompressStringToBytes( obj_string )
+        return HydrusCompression.CompressStringToBytes( obj_string, codec = codec )
         
     
     def DumpToString( self ):
@@ -326,6 +414,11 @@ class SerialisableBase( object ):
         return ( self.SERIALISABLE_TYPE, self.SERIALISABLE_VERSION, serialisable_info )
         
     
+    def InitialiseFromCompactBody( self, compact_version, body: bytes ):
+        
+        self._InitialiseFromCompactBody( compact_version, body )
+        
+    
     def InitialiseFromSerialisableInfo( self, original_version, serialisable_info, raise_error_on_future_version = False ):
         
         object_is_newer = original_version > self.SERIALISABLE_VERSION
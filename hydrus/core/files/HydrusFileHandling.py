@@ -1,6 +1,8 @@
 import collections.abc
 import hashlib
 import os
+import queue
+import threading
 
 from hydrus.core import HydrusConstants as HC
 from hydrus.core import HydrusData
@@ -451,27 +453,118 @@ def GenerateThumbnailNumPyWeirdApplicationGubbins( path, target_resolution, mime
     return thumbnail_numpy
     
 
-def GetExtraHashesFromPath( path ):
+# big blocks so hashlib, which drops the GIL for anything over 2KB, spends its time in C and not looping in python
+MULTI_DIGEST_READ_BLOCK_SIZE = 4 * 1024 * 1024
+
+# below this, the thread startup costs more than we save
+MULTI_DIGEST_THREADED_MINIMUM_SIZE = 32 * 1024 * 1024
+
+def _HashBlocksWorker( h, block_queue: queue.Queue, errors: list ):
+    
+    while True:
+        
+        block = block_queue.get()
+        
+        if block is None:
+            
+            return
+            
+        
+        if len( errors ) > 0:
+            
+            # something already broke. we keep draining so the reader never blocks on a full queue
+            
+            continue
+            
+        
+        try:
+            
+            h.update( block )
+            
+        except Exception as e:
+            
+            errors.append( e )
+            
+        
     
-    h_md5 = hashlib.md5()
-    h_sha1 = hashlib.sha1()
-    h_sha512 = hashlib.sha512()
+
+def _GetHashesFromPath( path, hashers ):
+    
+    # one read of the file for all the given digests
+    
+    size = os.path.getsize( path )
     
     with open( path, 'rb' ) as f:
         
-        for block in HydrusPaths.ReadFileLikeAsBlocks( f ):
+        if size < MULTI_DIGEST_THREADED_MINIMUM_SIZE:
+            
+            for block in HydrusPaths.ReadFileLikeAsBlocks( f, block_size = MULTI_DIGEST_READ_BLOCK_SIZE ):
+                
+                for h in hashers:
+                    
+                    h.update( block )
+                    
+                
             
-            h_md5.update( block )
-            h_sha1.update( block )
-            h_sha512.update( block )
+        else:
+            
+            # each digest gets its own thread. hashlib releases the GIL on these updates, so they run in parallel while we read the next block
+            # the small queues keep memory use bounded if the disk is faster than the slowest digest
+            
+            errors = []
+            
+            block_queues = [ queue.Queue( maxsize = 4 ) for h in hashers ]
+            
+            workers = [ threading.Thread( target = _HashBlocksWorker, args = ( h, block_queue, errors ), daemon = True ) for ( h, block_queue ) in zip( hashers, block_queues ) ]
+            
+            for worker in workers:
+                
+                worker.start()
+                
+            
+            try:
+                
+                for block in HydrusPaths.ReadFileLikeAsBlocks( f, block_size = MULTI_DIGEST_READ_BLOCK_SIZE ):
+                    
+                    if len( errors ) > 0:
+                        
+                        break
+                        
+                    
+                    for block_queue in block_queues:
+                        
+                        block_queue.put( block )
+                        
+                    
+                
+            finally:
+                
+                for block_queue in block_queues:
+                    
+                    block_queue.put( None )
+                    
+                
+                for worker in workers:
+                    
+                    worker.join()
+                    
+                
+            
+            if len( errors ) > 0:
+                
+                raise errors[0]
+                
             
         
     
-    md5 = h_md5.digest()
-    sha1 = h_sha1.digest()
-    sha512 = h_sha512.digest()
+    return tuple( ( h.digest() for h in hashers ) )
+    
+
+def GetExtraHashesFromPath( path ):
+    
+    # returns ( md5, sha1, sha512 )
     
-    return ( md5, sha1, sha512 )
+    return _GetHashesFromPath( path, [ hashlib.md5(), hashlib.sha1(), hashlib.sha512() ] )
     
 
 def GetFileInfo( path, mime = None, ok_to_look_for_hydrus_updates = False ):
@@ -748,7 +841,7 @@ def GetHashFromPath( path ):
     
     with open( path, 'rb' ) as f:
         
-        for block in HydrusPaths.ReadFileLikeAsBlocks( f ):
+        for block in HydrusPaths.ReadFileLikeAsBlocks( f, block_size = MULTI_DIGEST_READ_BLOCK_SIZE ):
             
             h.update( block )
             
@@ -1233,6 +1326,42 @@ def GetIsPNGRealQuick( path ):
 
 headers_and_mime_thumbnails = [ ( offsets_and_headers, mime ) for ( offsets_and_headers, mime ) in headers_and_mime if mime in ( HC.IMAGE_JPEG, HC.UNDETERMINED_PNG ) ]
 
+def GetThumbnailMimeFromBytes( thumbnail_bytes: bytes ):
+    
+    bit_to_check = thumbnail_bytes[:256]
+    
+    for ( offsets_and_headers, mime ) in headers_and_mime_thumbnails:
+        
+        if passes_offsets_and_headers( offsets_and_headers, bit_to_check ):
+            
+            if mime == HC.UNDETERMINED_PNG:
+                
+                return HC.IMAGE_PNG
+                
+            
+            return mime
+            
+        
+    
+    # we only make jpegs and pngs, so this is an old or odd thumb. let the full mime check have a go at it
+    ( os_file_handle, temp_path ) = HydrusTemp.GetTempPath( 'thumbnail_mime' )
+    
+    try:
+        
+        with open( temp_path, 'wb' ) as f:
+            
+            f.write( thumbnail_bytes )
+            
+        
+        return GetMime( temp_path )
+        
+    finally:
+        
+        HydrusTemp.CleanUpTempPath( os_file_handle, temp_path )
+        
+    
+    
+
 def GetThumbnailMime( path ):
     
     with open( path, 'rb' ) as f:
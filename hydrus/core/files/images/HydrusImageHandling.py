@@ -418,6 +418,61 @@ def GenerateNumPyImage( path, mime, force_pil = False, human_file_description =
     return numpy_image
     
 
+def GenerateNumPyImageFromBytes( image_bytes: bytes, mime, force_pil = False ) -> numpy.ndarray:
+    
+    # for small images we already hold in memory, like packed thumbnails. only the simple formats go to OpenCV
+    
+    force_pil = force_pil or FORCE_PIL_ALWAYS or mime not in ( HC.IMAGE_JPEG, HC.IMAGE_PNG )
+    
+    if not force_pil:
+        
+        raw_pil_image = HydrusImageOpening.RawOpenPILImage( io.BytesIO( image_bytes ) )
+        
+        try:
+            
+            if raw_pil_image.mode == 'LAB' or HydrusImageMetadata.HasICCProfile( raw_pil_image ):
+                
+                force_pil = True
+                
+            
+        finally:
+            
+            raw_pil_image.close()
+            
+        
+    
+    numpy_image = None
+    
+    if not force_pil:
+        
+        flags = CV_IMREAD_FLAGS_JPEG if mime == HC.IMAGE_JPEG else CV_IMREAD_FLAGS_PNG
+        
+        numpy_image = cv2.imdecode( numpy.frombuffer( image_bytes, dtype = numpy.uint8 ), flags )
+        
+    
+    if numpy_image is None:
+        
+        pil_image = GeneratePILImage( io.BytesIO( image_bytes ) )
+        
+        try:
+            
+            numpy_image = GenerateNumPyImageFromPILImage( pil_image )
+            
+        finally:
+            
+            pil_image.close()
+            
+        
+    else:
+        
+        numpy_image = HydrusImageNormalisation.DequantizeFreshlyLoadedNumPyImage( numpy_image )
+        
+        numpy_image = HydrusImageNormalisation.StripOutAnyUselessAlphaChannel( numpy_image )
+        
+    
+    return numpy_image
+    
+
 def GenerateNumPyImageFromPILImage( pil_image: PILImage.Image, strip_useless_alpha = True ) -> numpy.ndarray:
     
     try:
@@ -1,5 +1,7 @@
 import collections
 import collections.abc
+import numpy
+import struct
 import threading
 import time
 
@@ -21,6 +23,251 @@ MAX_UPDATE_PERIOD = 100000 * 100 # three months or so jej
 MIN_NULLIFICATION_PERIOD = 86400
 MAX_NULLIFICATION_PERIOD = 86400 * 365 * 5
 
+UPDATE_FORMAT_JSON = 0
+UPDATE_FORMAT_COMPACT = 1
+
+update_format_string_lookup = {
+    UPDATE_FORMAT_JSON : 'compressed json (all clients)',
+    UPDATE_FORMAT_COMPACT : 'compact binary (faster, needs a recent client)'
+}
+
+# the compact update body is a run of int columns and byte blobs
+# an int column is delta-encoded, so sorted ids become small numbers, and then stored at the narrowest width that fits
+COMPACT_INT_DTYPES = [ numpy.dtype( '<i1' ), numpy.dtype( '<i2' ), numpy.dtype( '<i4' ), numpy.dtype( '<i8' ) ]
+
+COMPACT_ROWS_INTS = 0
+COMPACT_ROWS_TABLE = 1
+COMPACT_ROWS_ID_TO_IDS = 2
+
+def ConvertIntsToCompactArray( ints: collections.abc.Sequence[ int ] ) -> numpy.ndarray:
+    
+    if isinstance( ints, numpy.ndarray ):
+        
+        return ints.astype( numpy.int64 )
+        
+    
+    try:
+        
+        return numpy.fromiter( ints, dtype = numpy.int64, count = len( ints ) )
+        
+    except ( TypeError, ValueError, OverflowError ) as e:
+        
+        raise HydrusExceptions.SerialisationException( 'Could not write a compact int column: {}'.format( e ) )
+        
+    
+
+class CompactBodyReader( object ):
+    
+    def __init__( self, body: bytes ):
+        
+        self._body = body
+        self._offset = 0
+        
+    
+    def _ReadDeltas( self ) -> numpy.ndarray:
+        
+        ( width_index, num_ints ) = struct.unpack( '>BI', self._ReadRaw( 5 ) )
+        
+        if width_index >= len( COMPACT_INT_DTYPES ):
+            
+            raise HydrusExceptions.SerialisationException( 'Compact body had an unknown int width!' )
+            
+        
+        dtype = COMPACT_INT_DTYPES[ width_index ]
+        
+        return numpy.frombuffer( self._ReadRaw( num_ints * dtype.itemsize ), dtype = dtype ).astype( numpy.int64 )
+        
+    
+    def _ReadRaw( self, num_bytes ) -> bytes:
+        
+        if self._offset + num_bytes > len( self._body ):
+            
+            raise HydrusExceptions.SerialisationException( 'Compact body was truncated!' )
+            
+        
+        raw = self._body[ self._offset : self._offset + num_bytes ]
+        
+        self._offset += num_bytes
+        
+        return raw
+        
+    
+    def ReadBytesList( self ) -> list[ bytes ]:
+        
+        lengths = self.ReadInts()
+        
+        blob = self._ReadRaw( sum( lengths ) )
+        
+        bytes_list = []
+        position = 0
+        
+        for length in lengths:
+            
+            bytes_list.append( blob[ position : position + length ] )
+            
+            position += length
+            
+        
+        return bytes_list
+        
+    
+    def ReadGroupedIntArray( self, group_lengths: numpy.ndarray ) -> numpy.ndarray:
+        
+        # see WriteGroupedInts. each group's first value has its own column, and the rest are deltas that restart at each group
+        
+        group_lengths = numpy.asarray( group_lengths, dtype = numpy.int64 )
+        
+        firsts = self.ReadIntArray()
+        rest = self._ReadDeltas()
+        
+        num_ints = int( group_lengths.sum() )
+        
+        group_starts = numpy.cumsum( group_lengths ) - group_lengths
+        
+        nonempty = group_lengths > 0
+        
+        group_starts = group_starts[ nonempty ]
+        group_lengths = group_lengths[ nonempty ]
+        
+        if len( firsts ) != len( group_starts ) or len( firsts ) + len( rest ) != num_ints:
+            
+            raise HydrusExceptions.SerialisationException( 'Compact body had a grouped int column of the wrong size!' )
+            
+        
+        is_first = numpy.zeros( num_ints, dtype = bool )
+        is_first[ group_starts ] = True
+        
+        deltas = numpy.zeros( num_ints, dtype = numpy.int64 )
+        deltas[ ~is_first ] = rest
+        
+        running_totals = numpy.cumsum( deltas )
+        
+        return running_totals - numpy.repeat( running_totals[ group_starts ] - firsts, group_lengths )
+        
+    
+    def ReadIntArray( self ) -> numpy.ndarray:
+        
+        return numpy.cumsum( self._ReadDeltas() )
+        
+    
+    def ReadInts( self ) -> list[ int ]:
+        
+        return self.ReadIntArray().tolist()
+        
+    
+    def ReadNullableIntArray( self ) -> numpy.ndarray:
+        
+        present = self.ReadIntArray()
+        
+        # an object array holds python ints, which is what everything downstream (sqlite in particular) wants
+        
+        values = self.ReadIntArray().astype( object )
+        
+        if len( present ) != len( values ):
+            
+            raise HydrusExceptions.SerialisationException( 'Compact body had a nullable int column of the wrong size!' )
+            
+        
+        values[ present == 0 ] = None
+        
+        return values
+        
+    
+    def ReadStrings( self ) -> list[ str ]:
+        
+        return [ str( b, 'utf-8' ) for b in self.ReadBytesList() ]
+        
+    
+    def IsDone( self ) -> bool:
+        
+        return self._offset == len( self._body )
+        
+    
+
+class CompactBodyWriter( object ):
+    
+    def __init__( self ):
+        
+        self._chunks = []
+        
+    
+    def _WriteDeltas( self, deltas: numpy.ndarray ):
+        
+        if len( deltas ) == 0:
+            
+            ( lowest, highest ) = ( 0, 0 )
+            
+        else:
+            
+            ( lowest, highest ) = ( int( deltas.min() ), int( deltas.max() ) )
+            
+        
+        for ( width_index, dtype ) in enumerate( COMPACT_INT_DTYPES ):
+            
+            info = numpy.iinfo( dtype )
+            
+            if info.min <= lowest and highest <= info.max:
+                
+                break
+                
+            
+        
+        self._chunks.append( struct.pack( '>BI', width_index, len( deltas ) ) )
+        self._chunks.append( deltas.astype( dtype ).tobytes() )
+        
+    
+    def GetBytes( self ) -> bytes:
+        
+        return b''.join( self._chunks )
+        
+    
+    def WriteBytesList( self, bytes_list: collections.abc.Sequence[ bytes ] ):
+        
+        self.WriteInts( [ len( b ) for b in bytes_list ] )
+        
+        self._chunks.append( b''.join( bytes_list ) )
+        
+    
+    def WriteGroupedInts( self, ints: collections.abc.Sequence[ int ], group_lengths: collections.abc.Sequence[ int ] ):
+        
+        # for id -> ids rows, like tag_id -> hash_ids. the deltas restart inside each group, so the big jump from one group to the next is not in the delta column
+        # the first value of each group goes in its own column, so it doesn't force the whole delta column to a wider int
+        
+        array = ConvertIntsToCompactArray( ints )
+        group_lengths = ConvertIntsToCompactArray( group_lengths )
+        
+        if int( group_lengths.sum() ) != len( array ):
+            
+            raise HydrusExceptions.SerialisationException( 'Compact grouped int column did not match its group lengths!' )
+            
+        
+        group_starts = ( numpy.cumsum( group_lengths ) - group_lengths )[ group_lengths > 0 ]
+        
+        deltas = numpy.diff( array, prepend = 0 )
+        
+        self.WriteInts( array[ group_starts ] )
+        self._WriteDeltas( numpy.delete( deltas, group_starts ) )
+        
+    
+    def WriteInts( self, ints: collections.abc.Sequence[ int ] ):
+        
+        array = ConvertIntsToCompactArray( ints )
+        
+        self._WriteDeltas( numpy.diff( array, prepend = 0 ) )
+        
+    
+    def WriteNullableInts( self, ints: collections.abc.Sequence[ int | None ] ):
+        
+        self.WriteInts( [ 0 if i is None else 1 for i in ints ] )
+        self.WriteInts( [ 0 if i is None else i for i in ints ] )
+        
+    
+    def WriteStrings( self, strings: collections.abc.Sequence[ str ] ):
+        
+        self.WriteBytesList( [ bytes( s, 'utf-8' ) for s in strings ] )
+        
+    
+
 def GenerateDefaultServiceDictionary( service_type ):
     
     # don't store bytes key/value data here until ~version 537
@@ -43,6 +290,7 @@ def GenerateDefaultServiceDictionary( service_type ):
             
             dictionary[ 'service_options' ][ 'update_period' ] = update_period
             dictionary[ 'service_options' ][ 'nullification_period' ] = 90 * 86400
+            dictionary[ 'service_options' ][ 'update_format' ] = UPDATE_FORMAT_JSON
             
             dictionary[ 'next_nullification_update_index' ] = 0
             
@@ -1543,6 +1791,124 @@ class ContentUpdate( HydrusSerialisable.SerialisableBase ):
         return []
         
     
+    def _GetCompactBody( self ) -> bytes:
+        
+        writer = CompactBodyWriter()
+        
+        blocks = [ ( content_type, action, data ) for ( content_type, actions_to_datas ) in self._content_data.items() for ( action, data ) in actions_to_datas.items() ]
+        
+        writer.WriteInts( [ len( blocks ) ] )
+        
+        for ( content_type, action, data ) in blocks:
+            
+            if content_type == HC.CONTENT_TYPE_MAPPINGS:
+                
+                writer.WriteInts( [ content_type, action, COMPACT_ROWS_ID_TO_IDS ] )
+                
+                nums_hash_ids = [ len( hash_ids ) for ( tag_id, hash_ids ) in data ]
+                
+                writer.WriteInts( [ tag_id for ( tag_id, hash_ids ) in data ] )
+                writer.WriteInts( nums_hash_ids )
+                writer.WriteGroupedInts( [ hash_id for ( tag_id, hash_ids ) in data for hash_id in hash_ids ], nums_hash_ids )
+                
+            elif len( data ) > 0 and isinstance( data[0], ( tuple, list ) ):
+                
+                num_columns = len( data[0] )
+                
+                if False in ( isinstance( row, ( tuple, list ) ) and len( row ) == num_columns for row in data ):
+                    
+                    raise HydrusExceptions.SerialisationException( 'Content update rows were not all the same shape!' )
+                    
+                
+                writer.WriteInts( [ content_type, action, COMPACT_ROWS_TABLE, num_columns ] )
+                
+                for column in zip( *data ):
+                    
+                    writer.WriteNullableInts( column )
+                    
+                
+            else:
+                
+                writer.WriteInts( [ content_type, action, COMPACT_ROWS_INTS ] )
+                
+                writer.WriteInts( data )
+                
+            
+        
+        return writer.GetBytes()
+        
+    
+    def _InitialiseFromCompactBody( self, compact_version, body: bytes ):
+        
+        reader = CompactBodyReader( body )
+        
+        ( num_blocks, ) = reader.ReadInts()
+        
+        for i in range( num_blocks ):
+            
+            ( content_type, action, rows_type, *rows_type_info ) = reader.ReadInts()
+            
+            if rows_type == COMPACT_ROWS_ID_TO_IDS:
+                
+                ids = reader.ReadIntArray()
+                nums_sub_ids = reader.ReadIntArray()
+                
+                if compact_version < 2:
+                    
+                    # version 1 delta-encoded all the sub ids as one column
+                    all_sub_ids = reader.ReadIntArray()
+                    
+                else:
+                    
+                    all_sub_ids = reader.ReadGroupedIntArray( nums_sub_ids )
+                    
+                
+                if len( ids ) != len( nums_sub_ids ) or len( all_sub_ids ) != int( nums_sub_ids.sum() ):
+                    
+                    raise HydrusExceptions.SerialisationException( 'Compact content update had id rows of the wrong size!' )
+                    
+                
+                # object arrays give us python ints for sqlite, and the split is one numpy call rather than a python loop over the rows
+                sub_ids_lists = numpy.split( all_sub_ids.astype( object ), numpy.cumsum( nums_sub_ids )[ : -1 ] )
+                
+                data = list( zip( ids.astype( object ), map( list, sub_ids_lists ) ) )
+                
+            elif rows_type == COMPACT_ROWS_TABLE:
+                
+                ( num_columns, ) = rows_type_info
+                
+                columns = [ reader.ReadNullableIntArray() for j in range( num_columns ) ]
+                
+                if len( { len( column ) for column in columns } ) > 1:
+                    
+                    raise HydrusExceptions.SerialisationException( 'Compact content update had table columns of different sizes!' )
+                    
+                
+                data = list( zip( *columns ) )
+                
+            elif rows_type == COMPACT_ROWS_INTS:
+                
+                data = list( reader.ReadIntArray().astype( object ) )
+                
+            else:
+                
+                raise HydrusExceptions.SerialisationException( 'Unknown compact content update rows type: {}'.format( rows_type ) )
+                
+            
+            if content_type not in self._content_data:
+                
+                self._content_data[ content_type ] = {}
+                
+            
+            self._content_data[ content_type ][ action ] = data
+            
+        
+        if not reader.IsDone():
+            
+            raise HydrusExceptions.SerialisationException( 'Compact content update had trailing data!' )
+            
+        
+    
     def _GetSerialisableInfo( self ):
         
         serialisable_info = []
@@ -1881,6 +2247,39 @@ class DefinitionsUpdate( HydrusSerialisable.SerialisableBase ):
         self._tag_ids_to_tags = {}
         
     
+    def _GetCompactBody( self ) -> bytes:
+        
+        writer = CompactBodyWriter()
+        
+        writer.WriteInts( list( self._hash_ids_to_hashes.keys() ) )
+        writer.WriteBytesList( list( self._hash_ids_to_hashes.values() ) )
+        
+        writer.WriteInts( list( self._tag_ids_to_tags.keys() ) )
+        writer.WriteStrings( list( self._tag_ids_to_tags.values() ) )
+        
+        return writer.GetBytes()
+        
+    
+    def _InitialiseFromCompactBody( self, compact_version, body: bytes ):
+        
+        reader = CompactBodyReader( body )
+        
+        hash_ids = reader.ReadInts()
+        hashes = reader.ReadBytesList()
+        
+        self._hash_ids_to_hashes = dict( zip( hash_ids, hashes ) )
+        
+        tag_ids = reader.ReadInts()
+        tags = reader.ReadStrings()
+        
+        self._tag_ids_to_tags = dict( zip( tag_ids, tags ) )
+        
+        if not reader.IsDone():
+            
+            raise HydrusExceptions.SerialisationException( 'Compact definitions update had trailing data!' )
+            
+        
+    
     def _GetSerialisableInfo( self ):
         
         serialisable_info = []
@@ -2885,6 +3284,19 @@ class ServerServiceRestricted( ServerService ):
     
 class ServerServiceRepository( ServerServiceRestricted ):
     
+    def __init__( self, service_key, service_type, name, port, dictionary ):
+        
+        ServerServiceRestricted.__init__( self, service_key, service_type, name, port, dictionary )
+        
+        # content writes are stamped into the next update period. while that period is being built, new writes are stamped into the one after
+        # the build waits on writes already stamped into its period, so its snapshot always has them
+        
+        self._update_timestamps_condition = threading.Condition( self._lock )
+        
+        self._update_being_built_end = None
+        self._update_timestamps_in_flight = collections.Counter()
+        
+    
     def _GetSerialisableDictionary( self ):
         
         dictionary = ServerServiceRestricted._GetSerialisableDictionary( self )
@@ -2927,9 +3339,33 @@ class ServerServiceRepository( ServerServiceRestricted ):
         
         self._next_nullification_update_index = dictionary[ 'next_nullification_update_index' ]
         
+        if 'update_format' not in self._service_options:
+            
+            self._service_options[ 'update_format' ] = UPDATE_FORMAT_JSON
+            
+        
         self._metadata = dictionary[ 'metadata' ]
         
     
+    def AcquireUpdateTimestamp( self ) -> int:
+        
+        with self._lock:
+            
+            if self._update_being_built_end is None:
+                
+                timestamp = self._metadata.GetNextUpdateBegin() + 1
+                
+            else:
+                
+                timestamp = self._update_being_built_end + 2
+                
+            
+            self._update_timestamps_in_flight[ timestamp ] += 1
+            
+            return timestamp
+            
+        
+    
     def GetMetadata( self ):
         
         with self._lock:
@@ -2954,6 +3390,14 @@ class ServerServiceRepository( ServerServiceRestricted ):
             
         
     
+    def GetUpdateFormat( self ) -> int:
+        
+        with self._lock:
+            
+            return self._service_options[ 'update_format' ]
+            
+        
+    
     def GetUpdatePeriod( self ) -> int:
         
         with self._lock:
@@ -2970,6 +3414,21 @@ class ServerServiceRepository( ServerServiceRestricted ):
             
         
     
+    def ReleaseUpdateTimestamp( self, timestamp: int ):
+        
+        with self._lock:
+            
+            self._update_timestamps_in_flight[ timestamp ] -= 1
+            
+            if self._update_timestamps_in_flight[ timestamp ] <= 0:
+                
+                del self._update_timestamps_in_flight[ timestamp ]
+                
+            
+            self._update_timestamps_condition.notify_all()
+            
+        
+    
     def NullifyHistory( self ):
         
         # when there is a huge amount to catch up on, we don't want to bosh the server for ages
@@ -3080,6 +3539,16 @@ class ServerServiceRepository( ServerServiceRestricted ):
         HG.controller.pub( 'notify_new_nullification' )
         
     
+    def SetUpdateFormat( self, update_format: int ):
+        
+        with self._lock:
+            
+            self._service_options[ 'update_format' ] = update_format
+            
+            self._SetDirty()
+            
+        
+    
     def SetUpdatePeriod( self, update_period: int ):
         
         with self._lock:
@@ -3112,6 +3581,22 @@ class ServerServiceRepository( ServerServiceRestricted ):
                 return
                 
             
+            # we only hold the busy lock long enough to mark the build, so a backup or vacuum cannot start between our check and the mark. they refuse to run while we build
+            
+            try:
+                
+                generating = HG.server_generating_update.acquire( False ) # pylint: disable=E1111
+                
+            finally:
+                
+                HG.server_busy.release()
+                
+            
+            if not generating:
+                
+                return
+                
+            
             try:
                 
                 while update_due:
@@ -3122,28 +3607,49 @@ class ServerServiceRepository( ServerServiceRestricted ):
                         
                         begin = self._metadata.GetNextUpdateBegin()
                         
+                        update_format = self._service_options[ 'update_format' ]
+                        update_period = self._service_options[ 'update_period' ]
+                        
+                        end = begin + update_period
+                        
+                        self._update_being_built_end = end
+                        
+                        while len( [ timestamp for timestamp in self._update_timestamps_in_flight if timestamp <= end ] ) > 0:
+                            
+                            self._update_timestamps_condition.wait()
+                            
+                        
                     
-                    update_period = self._service_options[ 'update_period' ]
-                    
-                    end = begin + update_period
-                    
-                    update_hashes = HG.controller.WriteSynchronous( 'create_update', service_key, begin, end )
-                    
-                    update_created = True
-                    
-                    next_update_due = end + update_period
-                    
-                    with self._lock:
+                    try:
+                        
+                        # the slow part reads a committed snapshot and writes the update files off the main db connection, so we don't block the server while it works
+                        update_hashes = HG.controller.ReadOnCommittedSnapshot( 'repository_update_files', service_key, begin, end, update_format = update_format )
+                        
+                        HG.controller.WriteSynchronous( 'register_update', service_key, update_hashes )
+                        
+                        update_created = True
+                        
+                        next_update_due = end + update_period
+                        
+                        with self._lock:
+                            
+                            self._metadata.AppendUpdate( update_hashes, begin, end, next_update_due )
+                            
+                            update_due = self._metadata.UpdateDue()
+                            
                         
-                        self._metadata.AppendUpdate( update_hashes, begin, end, next_update_due )
+                    finally:
                         
-                        update_due = self._metadata.UpdateDue()
+                        with self._lock:
+                            
+                            self._update_being_built_end = None
+                            
                         
                     
                 
             finally:
                 
-                HG.server_busy.release()
+                HG.server_generating_update.release()
                 
                 if update_created:
                     
@@ -3316,3 +3822,14 @@ class UpdateBuilder( object ):
         return self._updates
         
     
+    def PopUpdates( self ):
+        
+        # the updates that have filled up so far, for callers that want to stream them out
+        
+        updates = self._updates
+        
+        self._updates = []
+        
+        return updates
+        
+    
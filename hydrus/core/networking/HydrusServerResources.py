@@ -5,9 +5,10 @@ import time
 import twisted.internet.error
 from twisted.internet import reactor, defer
 from twisted.internet.threads import deferToThread
+from twisted.web import http
 from twisted.web.server import NOT_DONE_YET
 from twisted.web.resource import Resource
-from twisted.web.static import NoRangeStaticProducer, SingleRangeStaticProducer
+from twisted.web.static import NoRangeStaticProducer, SingleRangeStaticProducer, MultipleRangeStaticProducer
 
 from hydrus.core import HydrusConstants as HC
 from hydrus.core import HydrusData
@@ -18,6 +19,9 @@ from hydrus.core import HydrusSerialisable
 from hydrus.core import HydrusTemp
 from hydrus.core.networking import HydrusServerRequest
 
+# more than this and we just send the whole file, which a client always has to accept
+MAX_NUM_RANGES = 32
+
 def GetServerSummaryTexts( service ):
     
     name = service.GetName()
@@ -371,6 +375,13 @@ def GenerateNormieEris( service ):
     )
     
 
+def GenerateETag( stat_result: os.stat_result ) -> str:
+    
+    # cheap and strong enough for files we never edit in place--if the bytes change, the mtime or size changes
+    
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+    
+
 class HydrusDomain( object ):
     
     def __init__( self, local_only ):
@@ -560,27 +571,56 @@ class HydrusResource( Resource ):
         
         response_context: ResponseContext = request.hydrus_response_context
         
+        status_code = response_context.GetStatusCode()
+        
+        not_modified = False
+        
         if response_context.HasPath():
             
             path = response_context.GetPath()
             
-            if not os.path.exists( path ):
+            try:
+                
+                stat_result = os.stat( path )
+                
+            except FileNotFoundError:
                 
                 raise HydrusExceptions.NotFoundException( 'File not found. This was discovered later than expected, so hydev might like to know about this.' )
                 
             
-            filesize = os.path.getsize( path )
+            filesize = stat_result.st_size
+            
+            if status_code == 200:
+                
+                etag = GenerateETag( stat_result )
+                last_modified_timestamp = int( stat_result.st_mtime )
+                
+                request.setHeader( 'Accept-Ranges', 'bytes' )
+                request.setHeader( 'ETag', etag )
+                request.setHeader( 'Last-Modified', str( http.datetimeToString( last_modified_timestamp ), 'ascii' ) )
+                
+                not_modified = self._checkNotModified( request, etag, last_modified_timestamp )
+                
             
-            offset_and_block_size_pairs = self._parseRangeHeader( request, filesize )
+            if not_modified or not self._checkIfRange( request, etag if status_code == 200 else None ):
+                
+                offset_and_block_size_pairs = []
+                
+            else:
+                
+                offset_and_block_size_pairs = self._parseRangeHeader( request, filesize )
+                
             
         else:
             
             offset_and_block_size_pairs = []
             
         
-        status_code = response_context.GetStatusCode()
-        
-        if status_code == 200 and response_context.HasPath() and len( offset_and_block_size_pairs ) > 0:
+        if not_modified:
+            
+            status_code = 304
+            
+        elif status_code == 200 and response_context.HasPath() and len( offset_and_block_size_pairs ) > 0:
             
             status_code = 206
             
@@ -612,11 +652,13 @@ class HydrusResource( Resource ):
             request.setHeader( 'Cache-Control', 'max-age={}'.format( max_age ) )
             
         
-        if response_context.HasPath():
+        if not_modified:
             
-            path = response_context.GetPath()
+            # 304 has no body, the client uses the copy it has
+            
+            content_length = 0
             
-            filesize = os.path.getsize( path )
+        elif response_context.HasPath():
             
             mime = response_context.GetMime()
             
@@ -646,12 +688,10 @@ class HydrusResource( Resource ):
                     
                     ( range_start, range_end, offset, block_size ) = offset_and_block_size_pairs[0]
                     
-                    header_range_end = filesize - 1 if range_end is None else range_end
-                    
                     content_length = block_size
                     
                     request.setHeader( 'Accept-Ranges', 'bytes' )
-                    request.setHeader( 'Content-Range', 'bytes {}-{}/{}'.format( offset, header_range_end, filesize ) )
+                    request.setHeader( 'Content-Range', 'bytes {}-{}/{}'.format( offset, offset + block_size - 1, filesize ) )
                     request.setHeader( 'Content-Length', str( content_length ) )
                     
                     producer = SingleRangeStaticProducer( request, fileObject, offset, block_size )
@@ -660,10 +700,33 @@ class HydrusResource( Resource ):
             else:
                 
                 # hey, what a surprise, an http data transmission standard turned out to be a massive PITA
-                # MultipleRangeStaticProducer is the lad to use, but you have to figure out your own separation bits, which have even more finicky rules. more than I can deal with with the current time I have
-                # if/when you want to do this, check out the FileResource, it does it in its internal gubbins
+                # each part gets its own little header block, and the whole thing is a multipart/byteranges with a boundary that must not appear in the data
+                
+                boundary = os.urandom( 16 ).hex()
+                
+                range_info = []
                 
-                raise HydrusExceptions.RangeNotSatisfiableException( 'Can only support Single Range requests at the moment!' )
+                content_length = 0
+                
+                for ( range_start, range_end, offset, block_size ) in offset_and_block_size_pairs:
+                    
+                    part_separator = f'\r\n--{boundary}\r\nContent-Type: {content_type}\r\nContent-Range: bytes {offset}-{offset + block_size - 1}/{filesize}\r\n\r\n'.encode( 'utf-8' )
+                    
+                    range_info.append( ( part_separator, offset, block_size ) )
+                    
+                    content_length += len( part_separator ) + block_size
+                    
+                
+                final_boundary = f'\r\n--{boundary}--\r\n'.encode( 'utf-8' )
+                
+                range_info.append( ( final_boundary, 0, 0 ) )
+                
+                content_length += len( final_boundary )
+                
+                request.setHeader( 'Content-Type', f'multipart/byteranges; boundary={boundary}' )
+                request.setHeader( 'Content-Length', str( content_length ) )
+                
+                producer = MultipleRangeStaticProducer( request, fileObject, range_info )
                 
             
             producer.start()
@@ -712,6 +775,65 @@ class HydrusResource( Resource ):
             
         
     
+    def _checkIfRange( self, request: HydrusServerRequest.HydrusRequest, etag: str | None ) -> bool:
+        
+        # If-Range says 'send me the range if this is still the same file, otherwise send the whole thing'
+        
+        if not request.requestHeaders.hasHeader( 'If-Range' ):
+            
+            return True
+            
+        
+        if etag is None:
+            
+            return False
+            
+        
+        if_range = request.requestHeaders.getRawHeaders( 'If-Range' )[0].strip()
+        
+        # we only do strong comparison here, and our ETags are the only validators we trust, dates are too coarse
+        return if_range == etag
+        
+    
+    def _checkNotModified( self, request: HydrusServerRequest.HydrusRequest, etag: str, last_modified_timestamp: int ) -> bool:
+        
+        if request.method not in ( b'GET', b'HEAD' ):
+            
+            return False
+            
+        
+        if request.requestHeaders.hasHeader( 'If-None-Match' ):
+            
+            # when If-None-Match is present, If-Modified-Since is ignored
+            
+            if_none_match = ','.join( request.requestHeaders.getRawHeaders( 'If-None-Match' ) )
+            
+            candidate_etags = [ candidate.strip() for candidate in if_none_match.split( ',' ) ]
+            
+            # weak comparison is fine for If-None-Match
+            candidate_etags = [ candidate[2:] if candidate.startswith( 'W/' ) else candidate for candidate in candidate_etags ]
+            
+            return '*' in candidate_etags or etag in candidate_etags
+            
+        
+        if request.requestHeaders.hasHeader( 'If-Modified-Since' ):
+            
+            try:
+                
+                if_modified_since_timestamp = http.stringToDatetime( request.requestHeaders.getRawHeaders( 'If-Modified-Since' )[0].encode( 'ascii' ) )
+                
+            except Exception as e:
+                
+                # RFC says ignore a bad date
+                return False
+                
+            
+            return last_modified_timestamp <= if_modified_since_timestamp
+            
+        
+        return False
+        
+    
     def _checkService( self, request: HydrusServerRequest.HydrusRequest ):
         
         return request
@@ -1033,16 +1155,26 @@ class HydrusResource( Resource ):
             
             range_pair_strings = range_pairs_string.split( ',' )
             
+            if len( range_pair_strings ) > MAX_NUM_RANGES:
+                
+                return []
+                
+            
             if True in ( '-' not in range_pair_string for range_pair_string in range_pair_strings ):
                 
                 raise HydrusExceptions.RangeNotSatisfiableException( 'Did not understand the Range header\'s range pair(s)!' )
                 
             
-            range_pairs = [ range_pair_string.strip().split( '-' ) for range_pair_string in range_pair_strings ]
-            
-            offset_and_block_size_pairs = []
+            offsets_and_ends = []
             
-            for ( range_start, range_end ) in range_pairs:
+            for range_pair_string in range_pair_strings:
+                
+                ( range_start, range_end ) = [ part.strip() for part in range_pair_string.split( '-', 1 ) ]
+                
+                if True in ( part != '' and not part.isdigit() for part in ( range_start, range_end ) ):
+                    
+                    raise HydrusExceptions.RangeNotSatisfiableException( 'Did not understand the Range header\'s range pair(s)!' )
+                    
                 
                 if range_start == '':
                     
@@ -1051,57 +1183,74 @@ class HydrusResource( Resource ):
                         raise HydrusExceptions.RangeNotSatisfiableException( 'Undefined Range header pair given!' )
                         
                     
-                    range_start = None
+                    # the last n bytes. bytes=-0 asks for nothing, so it cannot be satisfied
                     
-                else:
-                    
-                    range_start = abs( int( range_start ) )
+                    suffix_length = min( int( range_end ), filesize )
                     
-                
-                if range_end == '':
+                    if suffix_length == 0:
+                        
+                        continue
+                        
                     
-                    range_end = None
+                    offsets_and_ends.append( ( filesize - suffix_length, filesize - 1 ) )
                     
                 else:
                     
-                    range_end = abs( int( range_end ) )
-                    
-                
-                if range_start is not None and range_end is not None and range_start > range_end:
-                    
-                    raise HydrusExceptions.RangeNotSatisfiableException( 'The Range header had an invalid pair!' )
+                    range_start = int( range_start )
                     
-                
-                if range_start is None:
-                    
-                    offset = filesize - range_end
-                    block_size = range_end
-                    
-                elif range_end is None:
-                    
-                    offset = range_start
-                    block_size = filesize - range_start
-                    
-                else:
-                    
-                    if range_start > filesize:
+                    if range_end == '':
                         
-                        offset_and_block_size_pairs = []
+                        range_end = filesize - 1
+                        
+                    else:
+                        
+                        range_end = int( range_end )
+                        
+                        if range_start > range_end:
+                            
+                            raise HydrusExceptions.RangeNotSatisfiableException( 'The Range header had an invalid pair!' )
+                            
                         
-                        break
+                        range_end = min( range_end, filesize - 1 )
                         
                     
-                    if range_end > filesize:
+                    if range_start >= filesize:
                         
-                        range_end = filesize - 1
+                        continue
                         
                     
-                    offset = range_start
-                    block_size = ( range_end + 1 ) - range_start
+                    offsets_and_ends.append( ( range_start, range_end ) )
                     
                 
-                offset_and_block_size_pairs.append( ( range_start, range_end, offset, block_size ) )
+            
+            if len( offsets_and_ends ) == 0:
                 
+                request.setHeader( 'Content-Range', f'bytes */{filesize}' )
+                
+                raise HydrusExceptions.RangeNotSatisfiableException( 'None of the Range header\'s ranges overlapped the file!' )
+                
+            
+            # overlapping or touching ranges become one, so a client cannot make us send the same bytes over and over
+            
+            offsets_and_ends.sort()
+            
+            merged_offsets_and_ends = [ offsets_and_ends[0] ]
+            
+            for ( offset, end ) in offsets_and_ends[1:]:
+                
+                ( previous_offset, previous_end ) = merged_offsets_and_ends[-1]
+                
+                if offset <= previous_end + 1:
+                    
+                    merged_offsets_and_ends[-1] = ( previous_offset, max( previous_end, end ) )
+                    
+                else:
+                    
+                    merged_offsets_and_ends.append( ( offset, end ) )
+                    
+                
+            
+            offset_and_block_size_pairs = [ ( offset, end, offset, ( end + 1 ) - offset ) for ( offset, end ) in merged_offsets_and_ends ]
             
         
         return offset_and_block_size_pairs
@@ -62,6 +62,7 @@ try:
     argparser.add_argument( '--db_cache_size', type = int, help = 'override SQLite cache_size per db file, in MB (default=256)' )
     argparser.add_argument( '--db_transaction_commit_period', type = int, help = 'override how often (in seconds) database changes are saved to disk (default=30,min=10)' )
     argparser.add_argument( '--db_synchronous_override', type = int, choices = range(4), help = 'override SQLite Synchronous PRAGMA (default=2)' )
+    argparser.add_argument( '--db_read_pool_size', type = int, help = 'run some heavy read-only db jobs on this many extra read-only connections, WAL only (default=0, off)' )
     argparser.add_argument( '--no_db_temp_files', action='store_true', help = 'run db temp operations entirely in memory' )
     argparser.add_argument( '--boot_debug', action='store_true', help = 'print additional bootup information to the log' )
     argparser.add_argument( '--no_user_static_dir', action='store_true', help = 'do not allow a static dir in the db dir to override the install static dir contents' )
@@ -122,6 +123,11 @@ try:
             
         
     
+    if result.db_read_pool_size is not None:
+        
+        HG.db_read_pool_size = max( 0, result.db_read_pool_size )
+        
+    
     HG.no_db_temp_files = result.no_db_temp_files
     
     if result.no_qt_multimedia:
@@ -1,5 +1,6 @@
 import os
 import requests
+import threading
 import time
 import traceback
 
@@ -8,6 +9,7 @@ from twisted.internet import threads, reactor, defer
 from hydrus.core import HydrusConstants as HC
 from hydrus.core import HydrusController
 from hydrus.core import HydrusData
+from hydrus.core import HydrusDBBase
 from hydrus.core import HydrusExceptions
 from hydrus.core import HydrusGlobals as HG
 from hydrus.core import HydrusNumbers
@@ -167,6 +169,91 @@ def ShutdownSiblingInstance( db_dir ):
     HydrusData.Print( 'The existing server is shut down!' )
     
 
+class ClientToServerUpdateWriter( object ):
+    
+    # when lots of clients upload at once, we write their updates to the db in groups rather than one job each
+    # whichever request thread finds no group being written writes everything that has queued up, and the others wait for their result
+    
+    MAX_BATCH_SIZE = 64
+    
+    def __init__( self, controller: "Controller" ):
+        
+        self._controller = controller
+        
+        self._condition = threading.Condition()
+        
+        self._queue = []
+        
+        self._batch_in_flight = False
+        
+    
+    def _WriteBatch( self, batch ):
+        
+        try:
+            
+            results = self._controller.WriteSynchronous( 'updates', [ job.GetCallableTuple()[1] for job in batch ] )
+            
+        except Exception as e:
+            
+            results = [ e for job in batch ]
+            
+        
+        for ( job, result ) in zip( batch, results ):
+            
+            job.PutResult( result )
+            
+        
+    
+    def WriteUpdate( self, service_key: bytes, account: HydrusNetwork.Account, client_to_server_update: HydrusNetwork.ClientToServerUpdate, timestamp: int ):
+        
+        job = HydrusDBBase.JobDatabase( 'write', True, 'update', service_key, account, client_to_server_update, timestamp )
+        
+        with self._condition:
+            
+            self._queue.append( job )
+            
+        
+        while True:
+            
+            with self._condition:
+                
+                while self._batch_in_flight and job in self._queue:
+                    
+                    self._condition.wait()
+                    
+                
+                if job not in self._queue:
+                    
+                    # someone else's batch has it
+                    break
+                    
+                
+                self._batch_in_flight = True
+                
+                batch = self._queue[ : self.MAX_BATCH_SIZE ]
+                
+                self._queue = self._queue[ self.MAX_BATCH_SIZE : ]
+                
+            
+            try:
+                
+                self._WriteBatch( batch )
+                
+            finally:
+                
+                with self._condition:
+                    
+                    self._batch_in_flight = False
+                    
+                    self._condition.notify_all()
+                    
+                
+            
+        
+        return job.GetResult()
+        
+    
+
 class Controller( HydrusController.HydrusController ):
     
     def __init__( self, db_dir, logger ):
@@ -179,6 +266,8 @@ class Controller( HydrusController.HydrusController ):
         
         SG.server_controller = self
         
+        self._client_to_server_update_writer = ClientToServerUpdateWriter( self )
+        
         self.CallToThreadLongRunning( self.DAEMONPubSub )
         
     
@@ -618,3 +707,8 @@ class Controller( HydrusController.HydrusController ):
             
         
     
+    def WriteClientToServerUpdate( self, service_key: bytes, account: HydrusNetwork.Account, client_to_server_update: HydrusNetwork.ClientToServerUpdate, timestamp: int ):
+        
+        self._client_to_server_update_writer.WriteUpdate( service_key, account, client_to_server_update, timestamp )
+        
+    
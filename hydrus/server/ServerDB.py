@@ -1,6 +1,7 @@
 import collections
 import collections.abc
 import hashlib
+import itertools
 import os
 import sqlite3
 import sys
@@ -10,6 +11,7 @@ import traceback
 from hydrus.core import HydrusConstants as HC
 from hydrus.core import HydrusData
 from hydrus.core import HydrusDB
+from hydrus.core import HydrusDBBase
 from hydrus.core import HydrusExceptions
 from hydrus.core import HydrusGlobals as HG
 from hydrus.core import HydrusLists
@@ -96,6 +98,7 @@ def GenerateRepositoryUpdateTableName( service_id ):
 class DB( HydrusDB.HydrusDB ):
     
     READ_WRITE_ACTIONS = [ 'access_key', 'immediate_content_update', 'registration_keys' ]
+    READ_POOL_ACTIONS = [ 'repository_update_files' ]
     
     def __init__( self, controller, db_dir, db_name ):
         
@@ -323,6 +326,16 @@ class DB( HydrusDB.HydrusDB ):
         
         try:
             
+            if HG.server_generating_update.locked():
+                
+                # update files are being written and registered. they have to land in the same backup as their db rows
+                # we cannot wait for it here, since registering the update is a job behind us in the queue
+                
+                HydrusData.Print( 'Could not backup because a repository update was being generated.' )
+                
+                raise HydrusExceptions.ServerBusyException( 'Sorry, the server is generating a repository update and cannot backup right now!' )
+                
+            
             self._CloseDBConnection()
             
             backup_path = os.path.join( self._db_dir, 'server_backup' )
@@ -559,6 +572,31 @@ class DB( HydrusDB.HydrusDB ):
         return orphan_master_hash_ids
         
     
+    def _GenerateReportableException( self, e ):
+        
+        # call this in the except block. network errors go back as-is, anything else carries the full traceback
+        
+        if isinstance( e, HydrusExceptions.NetworkException ):
+            
+            return e
+            
+        
+        ( exception_type, value, tb ) = sys.exc_info()
+        
+        text = '\n'.join( traceback.format_exception( exception_type, value, tb ) )
+        
+        try:
+            
+            return type( e )( text )
+            
+        except Exception:
+            
+            # some exception types need more than a message, e.g. UnicodeDecodeError
+            
+            return Exception( text )
+            
+        
+    
     def _GenerateRegistrationKeysFromAccount( self, service_key, account: HydrusNetwork.Account, num, account_type_key, expires ):
         
         service_id = self._GetServiceId( service_key )
@@ -1294,6 +1332,7 @@ class DB( HydrusDB.HydrusDB ):
                 'petition' : self._RepositoryGetPetition,
                 'petitions_summary' : self._RepositoryGetPetitionsSummary,
                 'registration_keys' : self._GenerateRegistrationKeysFromAccount,
+                'repository_update_files' : self._RepositoryGenerateUpdateFiles,
                 'service_has_file' : self._RepositoryHasFile,
                 'service_info' : self._GetServiceInfo,
                 'service_keys' : self._GetServiceKeys,
@@ -1322,9 +1361,11 @@ class DB( HydrusDB.HydrusDB ):
                 'modify_account_set_message' : self._ModifyAccountSetMessage,
                 'modify_account_unban' : self._ModifyAccountUnban,
                 'nullify_history' : self._RepositoryNullifyHistory,
+                'register_update' : self._RepositoryRegisterUpdate,
                 'services' : self._ModifyServices,
                 'session' : self._AddSession,
                 'update' : self._RepositoryProcessClientToServerUpdate,
+                'updates' : self._RepositoryProcessClientToServerUpdates,
                 'vacuum' : self._Vacuum
             }
         )
@@ -1361,18 +1402,7 @@ class DB( HydrusDB.HydrusDB ):
     
     def _ManageDBError( self, job, e ):
         
-        if isinstance( e, HydrusExceptions.NetworkException ):
-            
-            job.PutResult( e )
-            
-        else:
-            
-            ( exception_type, value, tb ) = sys.exc_info()
-            
-            new_e = type( e )( '\n'.join( traceback.format_exception( exception_type, value, tb ) ) )
-            
-            job.PutResult( new_e )
-            
+        job.PutResult( self._GenerateReportableException( e ) )
         
     
     def _MasterHashExists( self, hash ):
@@ -2077,63 +2107,11 @@ class DB( HydrusDB.HydrusDB ):
         self._RepositoryRegenerateServiceInfo( service_id = service_id )
         
     
-    def _RepositoryCreateUpdate( self, service_key, begin, end ):
+    def _RepositoryCreateUpdate( self, service_key, begin, end, update_format = HydrusNetwork.UPDATE_FORMAT_JSON ):
         
-        service_id = self._GetServiceId( service_key )
+        update_hashes = self._RepositoryGenerateUpdateFiles( service_key, begin, end, update_format = update_format )
         
-        ( name, ) = self._Execute( 'SELECT name FROM services WHERE service_id = ?;', ( service_id, ) ).fetchone()
-        
-        HydrusData.Print( 'Creating update for ' + repr( name ) + ' from ' + HydrusTime.TimestampToPrettyTime( begin, in_utc = True ) + ' to ' + HydrusTime.TimestampToPrettyTime( end, in_utc = True ) )
-        
-        updates = self._RepositoryGenerateUpdates( service_id, begin, end )
-        
-        update_hashes = []
-        
-        total_definition_rows = 0
-        total_content_rows = 0
-        
-        if len( updates ) > 0:
-            
-            for update in updates:
-                
-                num_rows = update.GetNumRows()
-                
-                if isinstance( update, HydrusNetwork.DefinitionsUpdate ):
-                    
-                    total_definition_rows += num_rows
-                    
-                elif isinstance( update, HydrusNetwork.ContentUpdate ):
-                    
-                    total_content_rows += num_rows
-                    
-                
-                update_bytes = update.DumpToNetworkBytes()
-                
-                update_hash = hashlib.sha256( update_bytes ).digest()
-                
-                dest_path = ServerFiles.GetExpectedFilePath( update_hash )
-                
-                with open( dest_path, 'wb' ) as f:
-                    
-                    f.write( update_bytes )
-                    
-                
-                update_hashes.append( update_hash )
-                
-            
-            update_table_name = GenerateRepositoryUpdateTableName( service_id )
-            
-            master_hash_ids = self._GetMasterHashIds( update_hashes )
-            
-            self._ExecuteMany( 'INSERT OR IGNORE INTO ' + update_table_name + ' ( master_hash_id ) VALUES ( ? );', ( ( master_hash_id, ) for master_hash_id in master_hash_ids ) )
-            
-            for master_hash_id in master_hash_ids:
-                
-                self._ClearDeferredPhysicalDeleteIds( file_master_hash_id = master_hash_id )
-                
-            
-        
-        HydrusData.Print( 'Update OK. ' + HydrusNumbers.ToHumanInt( total_definition_rows ) + ' definition rows and ' + HydrusNumbers.ToHumanInt( total_content_rows ) + ' content rows in ' + HydrusNumbers.ToHumanInt( len( updates ) ) + ' update files.' )
+        self._RepositoryRegisterUpdate( service_key, update_hashes )
         
         return update_hashes
         
@@ -2524,11 +2502,47 @@ class DB( HydrusDB.HydrusDB ):
         
         service_id = self._GetServiceId( service_key )
         
-        updates = self._RepositoryGenerateUpdates( service_id, begin, end )
+        updates = list( self._RepositoryGenerateUpdates( service_id, begin, end ) )
         
         return updates
         
     
+    def _RepositoryGenerateUpdateFiles( self, service_key, begin, end, update_format = HydrusNetwork.UPDATE_FORMAT_JSON ):
+        
+        # this only reads, so it can run on a read-only connection. the update files are written as each update fills up, and registering them is a separate write
+        
+        service_id = self._GetServiceId( service_key )
+        
+        ( name, ) = self._Execute( 'SELECT name FROM services WHERE service_id = ?;', ( service_id, ) ).fetchone()
+        
+        HydrusData.Print( 'Creating update for ' + repr( name ) + ' from ' + HydrusTime.TimestampToPrettyTime( begin, in_utc = True ) + ' to ' + HydrusTime.TimestampToPrettyTime( end, in_utc = True ) )
+        
+        update_hashes = []
+        
+        total_definition_rows = 0
+        total_content_rows = 0
+        
+        for update in self._RepositoryGenerateUpdates( service_id, begin, end ):
+            
+            num_rows = update.GetNumRows()
+            
+            if isinstance( update, HydrusNetwork.DefinitionsUpdate ):
+                
+                total_definition_rows += num_rows
+                
+            elif isinstance( update, HydrusNetwork.ContentUpdate ):
+                
+                total_content_rows += num_rows
+                
+            
+            update_hashes.append( self._RepositoryWriteUpdateFile( update, update_format ) )
+            
+        
+        HydrusData.Print( 'Update OK. ' + HydrusNumbers.ToHumanInt( total_definition_rows ) + ' definition rows and ' + HydrusNumbers.ToHumanInt( total_content_rows ) + ' content rows in ' + HydrusNumbers.ToHumanInt( len( update_hashes ) ) + ' update files.' )
+        
+        return update_hashes
+        
+    
     def _RepositoryGenerateUpdates( self, service_id, begin, end ):
         
         MAX_DEFINITIONS_ROWS = 50000
@@ -2536,7 +2550,8 @@ class DB( HydrusDB.HydrusDB ):
         
         MAX_CONTENT_CHUNK = 25000
         
-        updates = []
+        # a generator, so the caller can write out each update as it fills and we never hold the whole period in memory
+        # we stream off the shared cursor, so the caller must not touch the db until we are done
         
         definitions_update_builder = HydrusNetwork.UpdateBuilder( HydrusNetwork.DefinitionsUpdate, MAX_DEFINITIONS_ROWS )
         content_update_builder = HydrusNetwork.UpdateBuilder( HydrusNetwork.ContentUpdate, MAX_CONTENT_ROWS )
@@ -2549,6 +2564,8 @@ class DB( HydrusDB.HydrusDB ):
             
             definitions_update_builder.AddRow( row )
             
+            yield from definitions_update_builder.PopUpdates()
+            
         
         for ( service_tag_id, tag ) in self._Execute( 'SELECT service_tag_id, tag FROM ' + service_tag_ids_table_name + ' NATURAL JOIN tags WHERE tag_id_timestamp BETWEEN ? AND ?;', ( begin, end ) ):
             
@@ -2556,10 +2573,12 @@ class DB( HydrusDB.HydrusDB ):
             
             definitions_update_builder.AddRow( row )
             
+            yield from definitions_update_builder.PopUpdates()
+            
         
         definitions_update_builder.Finish()
         
-        updates.extend( definitions_update_builder.GetUpdates() )
+        yield from definitions_update_builder.PopUpdates()
         
         #
         
@@ -2573,21 +2592,27 @@ class DB( HydrusDB.HydrusDB ):
             
             content_update_builder.AddRow( ( HC.CONTENT_TYPE_FILES, HC.CONTENT_UPDATE_ADD, file_row ) )
             
+            yield from content_update_builder.PopUpdates()
+            
         
-        service_hash_ids = [ service_hash_id for ( service_hash_id, ) in self._Execute( 'SELECT service_hash_id FROM ' + deleted_files_table_name + ' WHERE file_timestamp BETWEEN ? AND ?;', ( begin, end ) ) ]
-        
-        for service_hash_id in service_hash_ids:
+        for ( service_hash_id, ) in self._Execute( 'SELECT service_hash_id FROM ' + deleted_files_table_name + ' WHERE file_timestamp BETWEEN ? AND ?;', ( begin, end ) ):
             
             content_update_builder.AddRow( ( HC.CONTENT_TYPE_FILES, HC.CONTENT_UPDATE_DELETE, service_hash_id ) )
             
+            yield from content_update_builder.PopUpdates()
+            
         
         #
         
         ( current_mappings_table_name, deleted_mappings_table_name, pending_mappings_table_name, petitioned_mappings_table_name ) = GenerateRepositoryMappingsTableNames( service_id )
         
-        service_tag_ids_to_service_hash_ids = HydrusData.BuildKeyToListDict( self._Execute( 'SELECT service_tag_id, service_hash_id FROM ' + current_mappings_table_name + ' WHERE mapping_timestamp BETWEEN ? AND ?;', ( begin, end ) ) )
+        # sqlite does the grouping, so we only ever hold one tag's worth of rows
         
-        for ( service_tag_id, service_hash_ids ) in list(service_tag_ids_to_service_hash_ids.items()):
+        cursor = self._Execute( 'SELECT service_tag_id, service_hash_id FROM ' + current_mappings_table_name + ' WHERE mapping_timestamp BETWEEN ? AND ? ORDER BY service_tag_id;', ( begin, end ) )
+        
+        for ( service_tag_id, rows ) in itertools.groupby( cursor, key = lambda row: row[0] ):
+            
+            service_hash_ids = [ service_hash_id for ( service_tag_id_, service_hash_id ) in rows ]
             
             for block_of_service_hash_ids in HydrusLists.SplitListIntoChunks( service_hash_ids, MAX_CONTENT_CHUNK ):
                 
@@ -2595,11 +2620,15 @@ class DB( HydrusDB.HydrusDB ):
                 
                 content_update_builder.AddRow( ( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD, ( service_tag_id, block_of_service_hash_ids ) ), row_weight )
                 
+                yield from content_update_builder.PopUpdates()
+                
             
         
-        service_tag_ids_to_service_hash_ids = HydrusData.BuildKeyToListDict( self._Execute( 'SELECT service_tag_id, service_hash_id FROM ' + deleted_mappings_table_name + ' WHERE mapping_timestamp BETWEEN ? AND ?;', ( begin, end ) ) )
+        cursor = self._Execute( 'SELECT service_tag_id, service_hash_id FROM ' + deleted_mappings_table_name + ' WHERE mapping_timestamp BETWEEN ? AND ? ORDER BY service_tag_id;', ( begin, end ) )
         
-        for ( service_tag_id, service_hash_ids ) in list(service_tag_ids_to_service_hash_ids.items()):
+        for ( service_tag_id, rows ) in itertools.groupby( cursor, key = lambda row: row[0] ):
+            
+            service_hash_ids = [ service_hash_id for ( service_tag_id_, service_hash_id ) in rows ]
             
             for block_of_service_hash_ids in HydrusLists.SplitListIntoChunks( service_hash_ids, MAX_CONTENT_CHUNK ):
                 
@@ -2607,6 +2636,8 @@ class DB( HydrusDB.HydrusDB ):
                 
                 content_update_builder.AddRow( ( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_DELETE, ( service_tag_id, block_of_service_hash_ids ) ), row_weight )
                 
+                yield from content_update_builder.PopUpdates()
+                
             
         
         #
@@ -2619,6 +2650,8 @@ class DB( HydrusDB.HydrusDB ):
             
             content_update_builder.AddRow( ( HC.CONTENT_TYPE_TAG_PARENTS, HC.CONTENT_UPDATE_ADD, pair ) )
             
+            yield from content_update_builder.PopUpdates()
+            
         
         pairs = self._Execute( 'SELECT child_service_tag_id, parent_service_tag_id FROM ' + deleted_tag_parents_table_name + ' WHERE parent_timestamp BETWEEN ? AND ?;', ( begin, end ) ).fetchall()
         
@@ -2626,6 +2659,8 @@ class DB( HydrusDB.HydrusDB ):
             
             content_update_builder.AddRow( ( HC.CONTENT_TYPE_TAG_PARENTS, HC.CONTENT_UPDATE_DELETE, pair ) )
             
+            yield from content_update_builder.PopUpdates()
+            
         
         #
         
@@ -2637,6 +2672,8 @@ class DB( HydrusDB.HydrusDB ):
             
             content_update_builder.AddRow( ( HC.CONTENT_TYPE_TAG_SIBLINGS, HC.CONTENT_UPDATE_ADD, pair ) )
             
+            yield from content_update_builder.PopUpdates()
+            
         
         pairs = self._Execute( 'SELECT bad_service_tag_id, good_service_tag_id FROM ' + deleted_tag_siblings_table_name + ' WHERE sibling_timestamp BETWEEN ? AND ?;', ( begin, end ) ).fetchall()
         
@@ -2644,14 +2681,14 @@ class DB( HydrusDB.HydrusDB ):
             
             content_update_builder.AddRow( ( HC.CONTENT_TYPE_TAG_SIBLINGS, HC.CONTENT_UPDATE_DELETE, pair ) )
             
+            yield from content_update_builder.PopUpdates()
+            
         
         #
         
         content_update_builder.Finish()
         
-        updates.extend( content_update_builder.GetUpdates() )
-        
-        return updates
+        yield from content_update_builder.PopUpdates()
         
     
     def _RepositoryGetAccountIdsWithProbableActionableAddTagSiblingPetitions( self, service_id: int, bad_master_tag_id: int, good_master_tag_id: int ):
@@ -4533,6 +4570,39 @@ class DB( HydrusDB.HydrusDB ):
             
         
     
+    def _RepositoryProcessClientToServerUpdates( self, updates ):
+        
+        # several uploads in one job. each gets its own savepoint, so one bad update does not take the others down with it
+        
+        results = []
+        
+        for ( service_key, account, client_to_server_update, timestamp ) in updates:
+            
+            self._Execute( 'SAVEPOINT client_to_server_update;' )
+            
+            try:
+                
+                self._RepositoryProcessClientToServerUpdate( service_key, account, client_to_server_update, timestamp )
+                
+                self._Execute( 'RELEASE client_to_server_update;' )
+                
+                results.append( None )
+                
+            except Exception as e:
+                
+                self._Execute( 'ROLLBACK TO client_to_server_update;' )
+                self._Execute( 'RELEASE client_to_server_update;' )
+                
+                # any temp int tables made in there are gone
+                HydrusDBBase.TemporaryIntegerTableNameCache.instance().Clear()
+                
+                results.append( self._GenerateReportableException( e ) )
+                
+            
+        
+        return results
+        
+    
     def _RepositoryRegenerateServiceInfo( self, service_id = None, info_type = None ):
         
         if service_id is None:
@@ -4720,6 +4790,27 @@ class DB( HydrusDB.HydrusDB ):
             
         
     
+    def _RepositoryRegisterUpdate( self, service_key, update_hashes ):
+        
+        if len( update_hashes ) == 0:
+            
+            return
+            
+        
+        service_id = self._GetServiceId( service_key )
+        
+        update_table_name = GenerateRepositoryUpdateTableName( service_id )
+        
+        master_hash_ids = self._GetMasterHashIds( update_hashes )
+        
+        self._ExecuteMany( 'INSERT OR IGNORE INTO ' + update_table_name + ' ( master_hash_id ) VALUES ( ? );', ( ( master_hash_id, ) for master_hash_id in master_hash_ids ) )
+        
+        for master_hash_id in master_hash_ids:
+            
+            self._ClearDeferredPhysicalDeleteIds( file_master_hash_id = master_hash_id )
+            
+        
+    
     def _RepositoryRewardFilePetitioners( self, service_id, service_hash_ids, multiplier ):
         
         ( current_files_table_name, deleted_files_table_name, pending_files_table_name, petitioned_files_table_name, ip_addresses_table_name ) = GenerateRepositoryFilesTableNames( service_id )
@@ -4886,6 +4977,39 @@ class DB( HydrusDB.HydrusDB ):
         self._Execute( 'UPDATE service_info SET info = info + ? WHERE service_id = ? AND info_type = ?;', ( delta, service_id, info_type ) )
         
     
+    def _RepositoryWriteUpdateFile( self, update, update_format ):
+        
+        update_bytes = None
+        
+        if update_format == HydrusNetwork.UPDATE_FORMAT_COMPACT:
+            
+            try:
+                
+                update_bytes = update.DumpToCompactNetworkBytes()
+                
+            except HydrusExceptions.SerialisationException as e:
+                
+                HydrusData.Print( 'Could not create a compact update file, so falling back to json: {}'.format( e ) )
+                
+            
+        
+        if update_bytes is None:
+            
+            update_bytes = update.DumpToNetworkBytes()
+            
+        
+        update_hash = hashlib.sha256( update_bytes ).digest()
+        
+        dest_path = ServerFiles.GetExpectedFilePath( update_hash )
+        
+        with open( dest_path, 'wb' ) as f:
+            
+            f.write( update_bytes )
+            
+        
+        return update_hash
+        
+    
     def _RewardAccounts( self, service_id, score_type, scores ):
         
         self._ExecuteMany( 'INSERT OR IGNORE INTO account_scores ( service_id, account_id, score_type, score ) VALUES ( ?, ?, ?, ? );', [ ( service_id, account_id, score_type, 0 ) for ( account_id, score ) in scores ] )
@@ -5039,6 +5163,15 @@ class DB( HydrusDB.HydrusDB ):
         
         try:
             
+            if HG.server_generating_update.locked():
+                
+                # closing our connections would wait on the snapshot read, and registering the update is a job behind us in the queue
+                
+                HydrusData.Print( 'Could not vacuum because a repository update was being generated.' )
+                
+                return
+                
+            
             db_names = [ name for ( index, name, path ) in self._Execute( 'PRAGMA database_list;' ) if name not in ( 'mem', 'temp', 'durable_temp' ) ]
             
             db_names = [ name for name in db_names if name in self._db_filenames ]
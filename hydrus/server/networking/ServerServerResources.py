@@ -376,7 +376,8 @@ class HydrusResourceRestrictedOptions( HydrusResourceRestricted ):
             
             service_options = {
                 'update_period' : self._service.GetUpdatePeriod(),
-                'nullification_period' : self._service.GetNullificationPeriod()
+                'nullification_period' : self._service.GetNullificationPeriod(),
+                'update_format' : self._service.GetUpdateFormat()
             }
             
         else:
@@ -437,6 +438,38 @@ class HydrusResourceRestrictedOptionsModifyNullificationPeriod( HydrusResourceRe
         
     
 
+class HydrusResourceRestrictedOptionsModifyUpdateFormat( HydrusResourceRestrictedOptionsModify ):
+    
+    def _threadDoPOSTJob( self, request: HydrusServerRequest.HydrusRequest ):
+        
+        update_format = request.parsed_request_args[ 'update_format' ]
+        
+        if update_format not in HydrusNetwork.update_format_string_lookup:
+            
+            raise HydrusExceptions.BadRequestException( 'Did not understand that update format!' )
+            
+        
+        old_update_format = self._service.GetUpdateFormat()
+        
+        if old_update_format != update_format:
+            
+            self._service.SetUpdateFormat( update_format )
+            
+            HydrusData.Print(
+                'Account {} changed the update format from "{}" to "{}".'.format(
+                    request.hydrus_account.GetAccountKey().hex(),
+                    HydrusNetwork.update_format_string_lookup[ old_update_format ],
+                    HydrusNetwork.update_format_string_lookup[ update_format ]
+                )
+            )
+            
+        
+        response_context = HydrusServerResources.ResponseContext( 200 )
+        
+        return response_context
+        
+    
+
 class HydrusResourceRestrictedOptionsModifyUpdatePeriod( HydrusResourceRestrictedOptionsModify ):
     
     def _threadDoPOSTJob( self, request: HydrusServerRequest.HydrusRequest ):
@@ -808,6 +841,11 @@ class HydrusResourceRestrictedBackup( HydrusResourceRestricted ):
     
     def _threadDoPOSTJob( self, request: HydrusServerRequest.HydrusRequest ):
         
+        if HG.server_generating_update.locked():
+            
+            raise HydrusExceptions.ServerBusyException( 'Sorry, the server is generating a repository update and cannot backup right now!' )
+            
+        
         SG.server_controller.Write( 'backup' )
         
         response_context = HydrusServerResources.ResponseContext( 200 )
@@ -1081,9 +1119,16 @@ class HydrusResourceRestrictedRepositoryFile( HydrusResourceRestricted ):
             file_dict[ 'ip' ] = request.getClientIP()
             
         
-        timestamp = self._service.GetMetadata().GetNextUpdateBegin() + 1
+        timestamp = self._service.AcquireUpdateTimestamp()
         
-        SG.server_controller.WriteSynchronous( 'file', self._service, request.hydrus_account, file_dict, timestamp )
+        try:
+            
+            SG.server_controller.WriteSynchronous( 'file', self._service, request.hydrus_account, file_dict, timestamp )
+            
+        finally:
+            
+            self._service.ReleaseUpdateTimestamp( timestamp )
+            
         
         response_context = HydrusServerResources.ResponseContext( 200 )
         
@@ -1301,9 +1346,16 @@ class HydrusResourceRestrictedUpdate( HydrusResourceRestricted ):
             client_to_server_update.ApplyTagFilterToPendingMappings( self._service.GetTagFilter() )
             
         
-        timestamp = self._service.GetMetadata().GetNextUpdateBegin() + 1
+        timestamp = self._service.AcquireUpdateTimestamp()
         
-        SG.server_controller.WriteSynchronous( 'update', self._service_key, request.hydrus_account, client_to_server_update, timestamp )
+        try:
+            
+            SG.server_controller.WriteClientToServerUpdate( self._service_key, request.hydrus_account, client_to_server_update, timestamp )
+            
+        finally:
+            
+            self._service.ReleaseUpdateTimestamp( timestamp )
+            
         
         response_context = HydrusServerResources.ResponseContext( 200 )
         
@@ -7304,6 +7304,112 @@ class TestClientAPI( unittest.TestCase ):
         
         self.assertEqual( set( hash_ids ), sample_hash_ids )
         
+        # paginated search
+        
+        TG.test_controller.ClearReads( 'file_query_ids' )
+        TG.test_controller.ClearReads( 'hash_ids_to_hashes' )
+        
+        sorted_hash_ids = list( range( 1000, 1025 ) )
+        
+        hash_ids_to_hashes = { hash_id : os.urandom( 32 ) for hash_id in sorted_hash_ids }
+        
+        TG.test_controller.SetRead( 'file_query_ids', list( sorted_hash_ids ) )
+        TG.test_controller.SetRead( 'hash_ids_to_hashes', hash_ids_to_hashes )
+        
+        tags = [ 'kino', 'green' ]
+        
+        path = '/get_files/search_files?tags={}&page_size=10'.format( urllib.parse.quote( json.dumps( tags ) ) )
+        
+        fetched_hash_ids = []
+        num_pages = 0
+        
+        while path is not None:
+            
+            connection.request( 'GET', path, headers = headers )
+            
+            response = connection.getresponse()
+            
+            data = response.read()
+            
+            text = str( data, 'utf-8' )
+            
+            self.assertEqual( response.status, 200 )
+            
+            d = json.loads( text )
+            
+            self.assertEqual( d[ 'num_files' ], len( sorted_hash_ids ) )
+            self.assertLessEqual( len( d[ 'file_ids' ] ), 10 )
+            
+            fetched_hash_ids.extend( d[ 'file_ids' ] )
+            num_pages += 1
+            
+            if d[ 'next_cursor' ] is None:
+                
+                path = None
+                
+            else:
+                
+                path = '/get_files/search_files?cursor={}'.format( urllib.parse.quote( d[ 'next_cursor' ] ) )
+                
+            
+        
+        self.assertEqual( fetched_hash_ids, sorted_hash_ids )
+        self.assertEqual( num_pages, 3 )
+        
+        # the search only ran once
+        self.assertEqual( len( TG.test_controller.GetRead( 'file_query_ids' ) ), 1 )
+        
+        # hashes are only looked up for the page asked for
+        
+        path = '/get_files/search_files?tags={}&page_size=10&return_hashes=true&return_file_ids=false'.format( urllib.parse.quote( json.dumps( tags ) ) )
+        
+        connection.request( 'GET', path, headers = headers )
+        
+        response = connection.getresponse()
+        
+        data = response.read()
+        
+        text = str( data, 'utf-8' )
+        
+        self.assertEqual( response.status, 200 )
+        
+        d = json.loads( text )
+        
+        self.assertEqual( d[ 'hashes' ], [ hash_ids_to_hashes[ hash_id ].hex() for hash_id in sorted_hash_ids[ : 10 ] ] )
+        
+        [ ( args, kwargs ) ] = TG.test_controller.GetRead( 'hash_ids_to_hashes' )
+        
+        self.assertEqual( list( kwargs[ 'hash_ids' ] ), sorted_hash_ids[ : 10 ] )
+        
+        # a bad cursor
+        
+        path = '/get_files/search_files?cursor={}'.format( urllib.parse.quote( os.urandom( 32 ).hex() + ':10' ) )
+        
+        connection.request( 'GET', path, headers = headers )
+        
+        response = connection.getresponse()
+        
+        data = response.read()
+        
+        self.assertEqual( response.status, 400 )
+        
+        # stored cursors are capped by how many file ids they hold, and the oldest go first
+        
+        with mock.patch.object( ClientAPI, 'MAX_NUM_SEARCH_CURSOR_HASH_IDS', 50 ):
+            
+            cursor_keys = [ api_permissions.AddSearchCursor( list( range( 20 ) ), 10 ) for i in range( 3 ) ]
+            
+        
+        with self.assertRaises( HydrusExceptions.BadRequestException ):
+            
+            api_permissions.GetSearchCursorPage( cursor_keys[0], 10 )
+            
+        
+        self.assertEqual( api_permissions.GetSearchCursorPage( cursor_keys[1], 10 ), ( list( range( 10, 20 ) ), 20, 10 ) )
+        self.assertEqual( api_permissions.GetSearchCursorPage( cursor_keys[2], 15, page_size = 3 ), ( [ 15, 16, 17 ], 20, 3 ) )
+        
+        hash_ids = set( sorted_hash_ids )
+        
         # sort
         
         # this just tests if it parses, we don't have a full test for read params yet
@@ -8145,6 +8251,68 @@ class TestClientAPI( unittest.TestCase ):
         
         self.assertEqual( d, expected_identifier_result )
         
+        # files served from a later page of a paginated search are seeable, even after another search
+        
+        TG.test_controller.ClearReads( 'file_query_ids' )
+        
+        TG.test_controller.SetRead( 'file_query_ids', [ 7, 8, 9, 1, 2, 3 ] )
+        
+        path = '/get_files/search_files?tags={}&page_size=3'.format( urllib.parse.quote( json.dumps( [ 'green' ] ) ) )
+        
+        connection.request( 'GET', path, headers = headers )
+        
+        response = connection.getresponse()
+        
+        data = response.read()
+        
+        self.assertEqual( response.status, 200 )
+        
+        next_cursor = json.loads( str( data, 'utf-8' ) )[ 'next_cursor' ]
+        
+        TG.test_controller.ClearReads( 'file_query_ids' )
+        
+        TG.test_controller.SetRead( 'file_query_ids', [ 10 ] )
+        
+        path = '/get_files/search_files?tags={}'.format( urllib.parse.quote( json.dumps( [ 'green' ] ) ) )
+        
+        connection.request( 'GET', path, headers = headers )
+        
+        response = connection.getresponse()
+        
+        data = response.read()
+        
+        self.assertEqual( response.status, 200 )
+        
+        path = '/get_files/search_files?cursor={}'.format( urllib.parse.quote( next_cursor ) )
+        
+        connection.request( 'GET', path, headers = headers )
+        
+        response = connection.getresponse()
+        
+        data = response.read()
+        
+        self.assertEqual( response.status, 200 )
+        
+        self.assertEqual( json.loads( str( data, 'utf-8' ) )[ 'file_ids' ], [ 1, 2, 3 ] )
+        
+        path = '/get_files/file_metadata?file_ids={}&only_return_identifiers=true'.format( urllib.parse.quote( json.dumps( [ 1, 2, 3 ] ) ) )
+        
+        connection.request( 'GET', path, headers = headers )
+        
+        response = connection.getresponse()
+        
+        data = response.read()
+        
+        text = str( data, 'utf-8' )
+        
+        self.assertEqual( response.status, 200 )
+        
+        d = json.loads( text )
+        
+        self.assertEqual( d, expected_identifier_result )
+        
+        api_permissions.SetLastSearchResults( [ 1, 2, 3, 4, 5, 6 ] )
+        
         # basic metadata from file_ids
         
         TG.test_controller.SetRead( 'hash_ids_to_hashes', { k : v for ( k, v ) in file_ids_to_hashes.items() if k in [ 1, 2, 3 ] } )
@@ -8185,6 +8353,74 @@ class TestClientAPI( unittest.TestCase ):
         
         self.assertEqual( d, expected_only_return_basic_information_but_blurhash_too_result )
         
+        # columnar metadata
+        
+        TG.test_controller.SetRead( 'hash_ids_to_hashes', { k : v for ( k, v ) in file_ids_to_hashes.items() if k in [ 1, 2, 3 ] } )
+        
+        db_columns = {
+            'size' : [ 100, 200, None ],
+            'mime' : [ HC.IMAGE_PNG, HC.VIDEO_WEBM, None ],
+            'tags' : { CC.DEFAULT_LOCAL_TAG_SERVICE_KEY : [ [ 'blue eyes', 'character:samus aran' ], [], [] ] }
+        }
+        
+        TG.test_controller.SetRead( 'file_metadata_columns', db_columns )
+        
+        path = '/get_files/file_metadata?file_ids={}&columns={}&tag_service_keys={}&include_services_object=false'.format(
+            urllib.parse.quote( json.dumps( [ 1, 2, 3 ] ) ),
+            urllib.parse.quote( json.dumps( [ 'size', 'mime', 'filetype_enum' ] ) ),
+            urllib.parse.quote( json.dumps( [ CC.DEFAULT_LOCAL_TAG_SERVICE_KEY.hex() ] ) )
+        )
+        
+        connection.request( 'GET', path, headers = headers )
+        
+        response = connection.getresponse()
+        
+        data = response.read()
+        
+        text = str( data, 'utf-8' )
+        
+        self.assertEqual( response.status, 200 )
+        
+        d = json.loads( text )
+        
+        expected_result = {
+            'file_ids' : [ 1, 2, 3 ],
+            'hashes' : [ file_ids_to_hashes[ file_id ].hex() for file_id in [ 1, 2, 3 ] ],
+            'missing_hashes' : [],
+            'columns' : {
+                'size' : [ 100, 200, None ],
+                'mime' : [ 'image/png', 'video/webm', None ],
+                'filetype_enum' : [ HC.IMAGE_PNG, HC.VIDEO_WEBM, None ],
+                'tags' : { CC.DEFAULT_LOCAL_TAG_SERVICE_KEY.hex() : [ [ 'blue eyes', 'character:samus aran' ], [], [] ] }
+            }
+        }
+        
+        wash_example_json_response( expected_result )
+        
+        self.assertEqual( d, expected_result )
+        
+        [ ( args, kwargs ) ] = TG.test_controller.GetRead( 'file_metadata_columns' )
+        
+        ( hash_ids, db_column_names, tag_service_keys ) = args
+        
+        self.assertEqual( hash_ids, [ 1, 2, 3 ] )
+        self.assertEqual( db_column_names, { 'size', 'mime' } )
+        self.assertEqual( tag_service_keys, [ CC.DEFAULT_LOCAL_TAG_SERVICE_KEY ] )
+        
+        # bad column
+        
+        TG.test_controller.SetRead( 'hash_ids_to_hashes', { k : v for ( k, v ) in file_ids_to_hashes.items() if k in [ 1, 2, 3 ] } )
+        
+        path = '/get_files/file_metadata?file_ids={}&columns={}'.format( urllib.parse.quote( json.dumps( [ 1, 2, 3 ] ) ), urllib.parse.quote( json.dumps( [ 'size', 'favourite colour' ] ) ) )
+        
+        connection.request( 'GET', path, headers = headers )
+        
+        response = connection.getresponse()
+        
+        data = response.read()
+        
+        self.assertEqual( response.status, 400 )
+        
         # same but diff order
         
         expected_order = [ 3, 1, 2 ]
@@ -8810,7 +9046,7 @@ class TestClientAPI( unittest.TestCase ):
         
         self.assertEqual( response.status, 416 )
         
-        # multi range request, not currently supported
+        # multi range request
         
         path = '/get_files/file?file_id={}'.format( 1 )
         
@@ -8823,7 +9059,175 @@ class TestClientAPI( unittest.TestCase ):
         
         data = response.read()
         
-        self.assertEqual( response.status, 416 )
+        self.assertEqual( response.status, 206 )
+        
+        content_type = response.headers[ 'Content-Type' ]
+        
+        self.assertTrue( content_type.startswith( 'multipart/byteranges; boundary=' ) )
+        
+        boundary = content_type.split( 'boundary=' )[1].encode( 'utf-8' )
+        
+        self.assertEqual( int( response.headers[ 'Content-Length' ] ), len( data ) )
+        
+        with open( file_path, 'rb' ) as f:
+            
+            file_data = f.read()
+            
+        
+        self.assertTrue( data.endswith( b'\r\n--' + boundary + b'--\r\n' ) )
+        
+        parts = data.split( b'\r\n--' + boundary )[1:-1]
+        
+        self.assertEqual( len( parts ), 2 )
+        
+        for ( part, ( start, end ) ) in zip( parts, [ ( 100, 199 ), ( 300, 399 ) ] ):
+            
+            ( part_headers, part_data ) = part.split( b'\r\n\r\n', 1 )
+            
+            self.assertIn( 'Content-Range: bytes {}-{}/{}'.format( start, end, len( file_data ) ).encode( 'utf-8' ), part_headers )
+            self.assertEqual( part_data, file_data[ start : end + 1 ] )
+            
+        
+        # an end past the file is clamped
+        
+        partial_headers = dict( headers )
+        partial_headers[ 'Range' ] = 'bytes=100-{}'.format( len( file_data ) + 1000 )
+        
+        connection.request( 'GET', path, headers = partial_headers )
+        
+        response = connection.getresponse()
+        
+        data = response.read()
+        
+        self.assertEqual( response.status, 206 )
+        self.assertEqual( response.headers[ 'Content-Range' ], 'bytes 100-{}/{}'.format( len( file_data ) - 1, len( file_data ) ) )
+        self.assertEqual( data, file_data[ 100 : ] )
+        
+        # overlapping ranges are merged
+        
+        partial_headers = dict( headers )
+        partial_headers[ 'Range' ] = 'bytes=200-299,100-249,300-349'
+        
+        connection.request( 'GET', path, headers = partial_headers )
+        
+        response = connection.getresponse()
+        
+        data = response.read()
+        
+        self.assertEqual( response.status, 206 )
+        self.assertEqual( response.headers[ 'Content-Range' ], 'bytes 100-349/{}'.format( len( file_data ) ) )
+        self.assertEqual( data, file_data[ 100 : 350 ] )
+        
+        # unsatisfiable ranges
+        
+        for range_header in ( 'bytes={}-'.format( len( file_data ) ), 'bytes={}-{}'.format( len( file_data ) + 10, len( file_data ) + 20 ), 'bytes=-0' ):
+            
+            partial_headers = dict( headers )
+            partial_headers[ 'Range' ] = range_header
+            
+            connection.request( 'GET', path, headers = partial_headers )
+            
+            response = connection.getresponse()
+            
+            data = response.read()
+            
+            self.assertEqual( response.status, 416 )
+            self.assertEqual( response.headers[ 'Content-Range' ], 'bytes */{}'.format( len( file_data ) ) )
+            
+        
+        # too many ranges, so we get the whole file
+        
+        partial_headers = dict( headers )
+        partial_headers[ 'Range' ] = 'bytes=' + ','.join( '{}-{}'.format( i * 10, i * 10 + 4 ) for i in range( 100 ) )
+        
+        connection.request( 'GET', path, headers = partial_headers )
+        
+        response = connection.getresponse()
+        
+        data = response.read()
+        
+        self.assertEqual( response.status, 200 )
+        self.assertEqual( data, file_data )
+        
+        # conditional requests
+                
+        path = '/get_files/file?file_id={}'.format( 1 )
+        
+        connection.request( 'GET', path, headers = headers )
+        
+        response = connection.getresponse()
+        
+        data = response.read()
+        
+        self.assertEqual( response.status, 200 )
+        
+        etag = response.headers[ 'ETag' ]
+        last_modified = response.headers[ 'Last-Modified' ]
+        
+        self.assertIsNotNone( etag )
+        self.assertIsNotNone( last_modified )
+        
+        conditional_headers = dict( headers )
+        conditional_headers[ 'If-None-Match' ] = etag
+        
+        connection.request( 'GET', path, headers = conditional_headers )
+        
+        response = connection.getresponse()
+        
+        data = response.read()
+        
+        self.assertEqual( response.status, 304 )
+        self.assertEqual( data, b'' )
+        
+        conditional_headers = dict( headers )
+        conditional_headers[ 'If-None-Match' ] = '"some other file"'
+        conditional_headers[ 'If-Modified-Since' ] = last_modified
+        
+        connection.request( 'GET', path, headers = conditional_headers )
+        
+        response = connection.getresponse()
+        
+        data = response.read()
+        
+        self.assertEqual( response.status, 200 )
+        self.assertEqual( data, file_data )
+        
+        conditional_headers = dict( headers )
+        conditional_headers[ 'If-Modified-Since' ] = last_modified
+        
+        connection.request( 'GET', path, headers = conditional_headers )
+        
+        response = connection.getresponse()
+        
+        data = response.read()
+        
+        self.assertEqual( response.status, 304 )
+        
+        # if-range with a stale etag gets the whole file
+        
+        partial_headers = dict( headers )
+        partial_headers[ 'Range' ] = 'bytes=100-199'
+        partial_headers[ 'If-Range' ] = '"some other file"'
+        
+        connection.request( 'GET', path, headers = partial_headers )
+        
+        response = connection.getresponse()
+        
+        data = response.read()
+        
+        self.assertEqual( response.status, 200 )
+        self.assertEqual( data, file_data )
+        
+        partial_headers[ 'If-Range' ] = etag
+        
+        connection.request( 'GET', path, headers = partial_headers )
+        
+        response = connection.getresponse()
+        
+        data = response.read()
+        
+        self.assertEqual( response.status, 206 )
+        self.assertEqual( data, file_data[ 100 : 200 ] )
         
         #
         
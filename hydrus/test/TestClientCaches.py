@@ -0,0 +1,533 @@
+import concurrent.futures
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from unittest import mock
+
+from hydrus.core import HydrusConstants as HC
+from hydrus.core import HydrusTime
+
+from hydrus.client.caches import ClientCaches
+from hydrus.client.caches import ClientCachesBase
+
+class FakeCacheableObject( ClientCachesBase.CacheableObject ):
+    
+    def __init__( self, size ):
+        
+        self._size = size
+        
+    
+    def GetEstimatedMemoryFootprint( self ) -> int:
+        
+        return self._size
+        
+    
+    def IsFinishedLoading( self ):
+        
+        return True
+        
+    
+
+class TestDataCache( unittest.TestCase ):
+    
+    def setUp( self ):
+        
+        self._now = 1000.0
+        
+        patcher = mock.patch.object( ClientCachesBase.time, 'monotonic', side_effect = lambda: self._now )
+        
+        patcher.start()
+        
+        self.addCleanup( patcher.stop )
+        
+    
+    def _NextTick( self ):
+        
+        self._now += ClientCachesBase.PROMOTION_TICK_DURATION
+        
+    
+    def test_segmented_eviction( self ):
+        
+        data_cache = ClientCachesBase.DataCache( mock.Mock(), 'test cache', 100 )
+        
+        # a hot set, accessed again in a later tick, so protected
+        
+        for i in range( 5 ):
+            
+            data_cache.AddData( ( 'hot', i ), FakeCacheableObject( 10 ) )
+            
+        
+        self._NextTick()
+        
+        for i in range( 5 ):
+            
+            data_cache.GetData( ( 'hot', i ) )
+            
+        
+        # a long scan of one-off items
+        
+        for i in range( 100 ):
+            
+            data_cache.AddData( ( 'scan', i ), FakeCacheableObject( 10 ) )
+            
+        
+        for i in range( 5 ):
+            
+            self.assertTrue( data_cache.HasData( ( 'hot', i ) ) )
+            
+        
+        self.assertFalse( data_cache.HasData( ( 'scan', 0 ) ) )
+        self.assertTrue( data_cache.HasData( ( 'scan', 99 ) ) )
+        
+        # one big render doesn't get to push out the hot set either
+        
+        data_cache.AddData( 'big', FakeCacheableObject( 90 ) )
+        
+        self._NextTick()
+        
+        data_cache.GetData( 'big' )
+        
+        data_cache.AddData( 'next', FakeCacheableObject( 10 ) )
+        
+        self.assertFalse( data_cache.HasData( 'big' ) )
+        
+        for i in range( 5 ):
+            
+            self.assertTrue( data_cache.HasData( ( 'hot', i ) ) )
+            
+        
+        statistics = data_cache.GetStatistics()
+        
+        self.assertEqual( statistics[ 'num_hits' ], 6 )
+        self.assertEqual( statistics[ 'num_protected_items' ], 5 )
+        self.assertGreater( statistics[ 'num_evictions' ], 0 )
+        
+        self.assertIsNone( data_cache.GetIfHasData( 'missing' ) )
+        
+        self.assertEqual( data_cache.GetStatistics()[ 'num_misses' ], 1 )
+        
+        data_cache.DeleteData( ( 'hot', 0 ) )
+        
+        self.assertFalse( data_cache.HasData( ( 'hot', 0 ) ) )
+        
+        data_cache.Clear()
+        
+        self.assertEqual( data_cache.GetAllKeys(), [] )
+        self.assertEqual( data_cache.GetStatistics()[ 'estimated_memory_footprint' ], 0 )
+        
+    
+    def test_same_tick_promotion( self ):
+        
+        data_cache = ClientCachesBase.DataCache( mock.Mock(), 'test cache', 100 )
+        
+        # the same paint asking several times is not a real second access
+        
+        data_cache.AddData( 'a', FakeCacheableObject( 10 ) )
+        
+        data_cache.GetData( 'a' )
+        data_cache.GetData( 'a' )
+        
+        self.assertEqual( data_cache.GetStatistics()[ 'num_protected_items' ], 0 )
+        
+        self._NextTick()
+        
+        data_cache.GetData( 'a' )
+        
+        self.assertEqual( data_cache.GetStatistics()[ 'num_protected_items' ], 1 )
+        
+    
+    def test_demotion_restamps( self ):
+        
+        data_cache = ClientCachesBase.DataCache( mock.Mock(), 'test cache', 100, timeout = 10 )
+        
+        # protected holds 80, so the ninth promotion pushes the first hot guy back to probation
+        
+        for i in range( 9 ):
+            
+            data_cache.AddData( i, FakeCacheableObject( 10 ) )
+            
+        
+        data_cache.AddData( 'fresh', FakeCacheableObject( 1 ) )
+        
+        self._now += 5
+        
+        for i in range( 8 ):
+            
+            data_cache.GetData( i )
+            
+        
+        self._now += 3
+        
+        data_cache.GetData( 8 )
+        
+        self.assertEqual( data_cache.GetStatistics()[ 'num_protected_items' ], 8 )
+        
+        self._now += 8
+        
+        # 'fresh' has timed out and sits at the front of probation. the demoted guy is behind it, and should carry his demotion time, not his older access time
+        
+        data_cache.MaintainCache()
+        
+        self.assertFalse( data_cache.HasData( 'fresh' ) )
+        self.assertTrue( data_cache.HasData( 0 ) )
+        
+        self._now += 10
+        
+        data_cache.MaintainCache()
+        
+        self.assertFalse( data_cache.HasData( 0 ) )
+        
+    
+
+class TestClientAPIRenderCache( unittest.TestCase ):
+    
+    def setUp( self ):
+        
+        self._cache_dir = tempfile.mkdtemp()
+        
+        self._controller = mock.Mock()
+        self._controller.new_options.GetInteger.return_value = 1000
+        
+    
+    def tearDown( self ):
+        
+        shutil.rmtree( self._cache_dir )
+        
+    
+    def test_disk_lru( self ):
+        
+        render_cache = ClientCaches.ClientAPIRenderCache( self._controller, cache_dir = self._cache_dir )
+        
+        hashes = [ os.urandom( 32 ) for i in range( 6 ) ]
+        
+        # each is 32 * 7 = 224 bytes, so four fit in the 1000 budget
+        
+        for hash in hashes[:4]:
+            
+            render_cache.AddData( hash, ( 1024, 768 ), HC.IMAGE_WEBP, 80, hash * 7 )
+            
+        
+        self.assertEqual( render_cache.GetData( hashes[0], ( 1024, 768 ), HC.IMAGE_WEBP, 80 ), hashes[0] * 7 )
+        
+        # different profile is a different key
+        
+        self.assertIsNone( render_cache.GetData( hashes[0], None, HC.IMAGE_WEBP, 80 ) )
+        self.assertIsNone( render_cache.GetData( hashes[0], ( 1024, 768 ), HC.IMAGE_PNG, 80 ) )
+        
+        # the fifth goes over budget, so the least recently used goes, and that is no longer hashes[0]
+        
+        render_cache.AddData( hashes[4], ( 1024, 768 ), HC.IMAGE_WEBP, 80, hashes[4] * 7 )
+        
+        self.assertTrue( render_cache.HasData( hashes[0], ( 1024, 768 ), HC.IMAGE_WEBP, 80 ) )
+        self.assertFalse( render_cache.HasData( hashes[1], ( 1024, 768 ), HC.IMAGE_WEBP, 80 ) )
+        self.assertTrue( render_cache.HasData( hashes[2], ( 1024, 768 ), HC.IMAGE_WEBP, 80 ) )
+        self.assertTrue( render_cache.HasData( hashes[4], ( 1024, 768 ), HC.IMAGE_WEBP, 80 ) )
+        
+        render_cache.AddData( hashes[5], ( 1024, 768 ), HC.IMAGE_WEBP, 80, hashes[5] * 7 )
+        
+        self.assertTrue( render_cache.HasData( hashes[0], ( 1024, 768 ), HC.IMAGE_WEBP, 80 ) )
+        self.assertFalse( render_cache.HasData( hashes[2], ( 1024, 768 ), HC.IMAGE_WEBP, 80 ) )
+        self.assertTrue( render_cache.HasData( hashes[5], ( 1024, 768 ), HC.IMAGE_WEBP, 80 ) )
+        
+        # one giant render does not get to flush everything
+        
+        render_cache.AddData( hashes[1], None, HC.IMAGE_PNG, 1, hashes[1] * 16 )
+        
+        self.assertFalse( render_cache.HasData( hashes[1], None, HC.IMAGE_PNG, 1 ) )
+        self.assertTrue( render_cache.HasData( hashes[0], ( 1024, 768 ), HC.IMAGE_WEBP, 80 ) )
+        
+        # persists across boots
+        
+        render_cache = ClientCaches.ClientAPIRenderCache( self._controller, cache_dir = self._cache_dir )
+        
+        self.assertEqual( render_cache.GetData( hashes[4], ( 1024, 768 ), HC.IMAGE_WEBP, 80 ), hashes[4] * 7 )
+        
+        render_cache.ClearSpecificFiles( ( hashes[4], ) )
+        
+        self.assertFalse( render_cache.HasData( hashes[4], ( 1024, 768 ), HC.IMAGE_WEBP, 80 ) )
+        self.assertTrue( render_cache.HasData( hashes[0], ( 1024, 768 ), HC.IMAGE_WEBP, 80 ) )
+        
+        render_cache.Clear()
+        
+        self.assertFalse( render_cache.HasData( hashes[0], ( 1024, 768 ), HC.IMAGE_WEBP, 80 ) )
+        
+        # budget shrinks
+        
+        render_cache.AddData( hashes[0], None, HC.IMAGE_PNG, 1, hashes[0] * 4 )
+        
+        self._controller.new_options.GetInteger.return_value = 0
+        
+        render_cache.NotifyNewOptions()
+        
+        self.assertFalse( render_cache.HasData( hashes[0], None, HC.IMAGE_PNG, 1 ) )
+        
+    
+    def test_warm_up_profile_counting( self ):
+        
+        render_cache = ClientCaches.ClientAPIRenderCache( self._controller, cache_dir = self._cache_dir )
+        
+        media_result = mock.Mock()
+        media_result.GetHash.return_value = os.urandom( 32 )
+        
+        with mock.patch.object( render_cache, '_GetRenderBytes', return_value = b'render' ) as get_render_bytes, mock.patch.object( ClientCaches.HydrusThreading, 'IsThreadShuttingDown', return_value = False ):
+            
+            # an api request counts
+            
+            self.assertEqual( render_cache.GetRenderBytes( media_result, ( 1024, 768 ), HC.IMAGE_WEBP, 80 ), b'render' )
+            
+            self.assertEqual( render_cache._render_profiles_counter[ ( ( 1024, 768 ), HC.IMAGE_WEBP, 80 ) ], 1 )
+            
+            # a warm-up of that profile does not, or it would feed on itself
+            
+            render_cache._warm_up_queue.append( ( media_result, ( ( 1024, 768 ), HC.IMAGE_WEBP, 80 ) ) )
+            
+            render_cache.THREADWarmUp()
+            
+            self.assertEqual( get_render_bytes.call_count, 2 )
+            self.assertEqual( render_cache._render_profiles_counter[ ( ( 1024, 768 ), HC.IMAGE_WEBP, 80 ) ], 1 )
+            
+        
+    
+
+class TestThumbnailCacheParallelWaterfall( unittest.TestCase ):
+    
+    def setUp( self ):
+        
+        self._controller = mock.Mock()
+        self._controller.new_options.GetInteger.side_effect = lambda name: { 'thumbnail_cache_size' : 1000, 'thumbnail_cache_timeout' : 100, 'thumbnail_decode_num_workers' : 4 }[ name ]
+        self._controller.new_options.GetBoolean.return_value = False
+        
+        with mock.patch.object( ClientCaches.ThumbnailCache, 'Clear' ):
+            
+            self._thumbnail_cache = ClientCaches.ThumbnailCache( self._controller )
+            
+        
+        self._rendered_hashes = []
+        
+        patcher = mock.patch.object( self._thumbnail_cache, 'GetThumbnail', side_effect = lambda media_result: self._rendered_hashes.append( media_result.GetHash() ) )
+        
+        patcher.start()
+        
+        self.addCleanup( patcher.stop )
+        
+        patcher = mock.patch.object( ClientCaches.HydrusThreading, 'IsThreadShuttingDown', return_value = False )
+        
+        patcher.start()
+        
+        self.addCleanup( patcher.stop )
+        
+        # one worker takes jobs in the order they were submitted, so what finishes when is still up to the thread, but the order is not
+        self._executor = concurrent.futures.ThreadPoolExecutor( max_workers = 1 )
+        
+        self.addCleanup( self._executor.shutdown )
+        
+    
+    def _GetMedias( self, mimes ):
+        
+        medias = []
+        
+        for mime in mimes:
+            
+            media_result = mock.Mock()
+            media_result.GetHash.return_value = os.urandom( 32 )
+            media_result.GetMime.return_value = mime
+            
+            media = mock.Mock()
+            media.GetDisplayMediaResult.return_value = media_result
+            
+            medias.append( media )
+            
+        
+        return medias
+        
+    
+    def _GetPubs( self ):
+        
+        return [ call.args[1:] for call in self._controller.pub.call_args_list if call.args[0] == 'waterfall_thumbnails' ]
+        
+    
+    def _GetSortKey( self, media ):
+        
+        media_result = media.GetDisplayMediaResult()
+        
+        return ( self._thumbnail_cache._magic_mime_thumbnail_ease_score_lookup[ media_result.GetMime() ], media_result.GetHash() )
+        
+    
+    def test_delivery_order( self ):
+        
+        page_key = os.urandom( 32 )
+        
+        medias = self._GetMedias( [ HC.VIDEO_MP4, HC.IMAGE_JPEG, HC.ANIMATION_GIF, HC.IMAGE_PNG, HC.VIDEO_WEBM, HC.IMAGE_JPEG, HC.APPLICATION_UNKNOWN ] )
+        
+        self._thumbnail_cache.Waterfall( page_key, medias )
+        
+        self._thumbnail_cache._DoParallelWaterfall( self._executor, 2 )
+        
+        expected_medias = sorted( medias, key = self._GetSortKey )
+        
+        delivered_medias = []
+        
+        for ( pub_page_key, rendered_medias ) in self._GetPubs():
+            
+            self.assertEqual( pub_page_key, page_key )
+            
+            delivered_medias.extend( rendered_medias )
+            
+        
+        self.assertEqual( delivered_medias, expected_medias )
+        self.assertEqual( self._rendered_hashes, [ media.GetDisplayMediaResult().GetHash() for media in expected_medias ] )
+        
+        self.assertEqual( self._thumbnail_cache._waterfall_in_flight, set() )
+        self.assertTrue( self._thumbnail_cache._waterfall_queue_empty_event.is_set() )
+        
+    
+    def test_cancel_in_flight( self ):
+        
+        page_key = os.urandom( 32 )
+        
+        medias = sorted( self._GetMedias( [ HC.IMAGE_JPEG ] * 3 ), key = self._GetSortKey )
+        
+        self._thumbnail_cache.Waterfall( page_key, medias )
+        
+        # the first thumb cancels itself and the second while it is rendering. the second is already submitted in the window, but not started
+        
+        def get_thumbnail( media_result ):
+            
+            self._rendered_hashes.append( media_result.GetHash() )
+            
+            if media_result == medias[0].GetDisplayMediaResult():
+                
+                self._thumbnail_cache.CancelWaterfall( page_key, medias[:2] )
+                
+            
+        
+        with mock.patch.object( self._thumbnail_cache, 'GetThumbnail', side_effect = get_thumbnail ):
+            
+            self._thumbnail_cache._DoParallelWaterfall( self._executor, 1 )
+            
+        
+        self.assertEqual( self._rendered_hashes, [ medias[0].GetDisplayMediaResult().GetHash(), medias[2].GetDisplayMediaResult().GetHash() ] )
+        
+        self.assertEqual( self._GetPubs(), [ ( page_key, [ medias[2] ] ) ] )
+        
+        self.assertEqual( self._thumbnail_cache._waterfall_in_flight, set() )
+        
+    
+    def test_wait_until_free( self ):
+        
+        page_key = os.urandom( 32 )
+        
+        ( media, ) = self._GetMedias( [ HC.IMAGE_JPEG ] )
+        
+        self._thumbnail_cache.Waterfall( page_key, [ media ] )
+        
+        render_started = threading.Event()
+        render_release = threading.Event()
+        
+        def get_thumbnail( media_result ):
+            
+            render_started.set()
+            
+            render_release.wait( 10 )
+            
+        
+        waterfall_thread = threading.Thread( target = self._thumbnail_cache._DoParallelWaterfall, args = ( self._executor, 1 ) )
+        wait_thread = threading.Thread( target = self._thumbnail_cache.WaitUntilFree )
+        
+        try:
+            
+            with mock.patch.object( self._thumbnail_cache, 'GetThumbnail', side_effect = get_thumbnail ):
+                
+                waterfall_thread.start()
+                
+                self.assertTrue( render_started.wait( 10 ) )
+                
+                # the queue is empty now, but the thumb is still with the worker
+                
+                self.assertEqual( self._thumbnail_cache._waterfall_queue, [] )
+                
+                wait_thread.start()
+                
+                wait_thread.join( 0.2 )
+                
+                self.assertTrue( wait_thread.is_alive() )
+                
+                render_release.set()
+                
+                waterfall_thread.join( 10 )
+                wait_thread.join( 10 )
+                
+            
+        finally:
+            
+            render_release.set()
+            
+        
+        self.assertFalse( wait_thread.is_alive() )
+        
+        self.assertEqual( self._GetPubs(), [ ( page_key, [ media ] ) ] )
+        
+    
+    def test_batched_publishing( self ):
+        
+        page_key_1 = os.urandom( 32 )
+        page_key_2 = os.urandom( 32 )
+        
+        medias_1 = sorted( self._GetMedias( [ HC.IMAGE_JPEG ] * 6 ), key = self._GetSortKey )
+        medias_2 = sorted( self._GetMedias( [ HC.VIDEO_MP4 ] * 4 ), key = self._GetSortKey )
+        
+        self._thumbnail_cache.Waterfall( page_key_1, medias_1 )
+        self._thumbnail_cache.Waterfall( page_key_2, medias_2 )
+        
+        # the frame never ends, so everything goes out in one pub per page, even across several windows of work
+        
+        with mock.patch.object( HydrusTime, 'GetNowPrecise', return_value = 100.0 ):
+            
+            self._thumbnail_cache._DoParallelWaterfall( self._executor, 1 )
+            
+        
+        self.assertEqual( len( self._rendered_hashes ), 10 )
+        
+        self.assertEqual( self._GetPubs(), [ ( page_key_1, medias_1 ), ( page_key_2, medias_2 ) ] )
+        
+        # and when every check says the frame is over, what has finished goes out each time round
+        
+        self._controller.pub.reset_mock()
+        
+        self._thumbnail_cache.Waterfall( page_key_1, medias_1 )
+        
+        now = [ 100.0 ]
+        
+        def get_now_precise():
+            
+            now[0] += 0.01
+            
+            return now[0]
+            
+        
+        with mock.patch.object( HydrusTime, 'GetNowPrecise', side_effect = get_now_precise ):
+            
+            self._thumbnail_cache._DoParallelWaterfall( self._executor, 1 )
+            
+        
+        pubs = self._GetPubs()
+        
+        self.assertGreater( len( pubs ), 1 )
+        
+        delivered_medias = []
+        
+        for ( pub_page_key, rendered_medias ) in pubs:
+            
+            self.assertEqual( pub_page_key, page_key_1 )
+            self.assertGreater( len( rendered_medias ), 0 )
+            self.assertLessEqual( len( rendered_medias ), 2 )
+            
+            delivered_medias.extend( rendered_medias )
+            
+        
+        self.assertEqual( delivered_medias, medias_1 )
+        
+    
@@ -3,9 +3,14 @@ import time
 import typing
 import unittest
 
+from unittest import mock
+
+from hydrus.core import HydrusCompression
 from hydrus.core import HydrusConstants as HC
 from hydrus.core import HydrusData
+from hydrus.core import HydrusDBBase
 from hydrus.core import HydrusNumbers
+from hydrus.core import HydrusGlobals as HG
 from hydrus.core import HydrusSerialisable
 from hydrus.core import HydrusStaticDir
 from hydrus.core import HydrusTime
@@ -23,11 +28,13 @@ from hydrus.client.files import ClientFilesPhysical
 from hydrus.client.files.images import ClientImagePerceptualHashes
 from hydrus.client.gui.pages import ClientGUIPageManager
 from hydrus.client.gui.pages import ClientGUISession
+from hydrus.client.importing import ClientImportFileSeeds
 from hydrus.client.importing import ClientImportLocal
 from hydrus.client.importing import ClientImportFiles
 from hydrus.client.importing.options import ImportOptionsConstants as IOC
 from hydrus.client.importing.options import ImportOptionsContainer
 from hydrus.client.importing.options import ImportOptionsManager
+from hydrus.client.media import ClientMediaResultCache
 from hydrus.client.metadata import ClientContentUpdates
 from hydrus.client.metadata import ClientTags
 from hydrus.client.search import ClientNumberTest
@@ -1285,6 +1292,64 @@ class TestClientDB( unittest.TestCase ):
         
         
     
+    def test_gui_session_file_seed_chunks( self ):
+        
+        page_manager = ClientGUIPageManager.CreatePageManagerImportURLs()
+        
+        file_seed_cache = page_manager.GetVariable( 'urls_import' ).GetFileSeedCache()
+        
+        file_seeds = [ ClientImportFileSeeds.FileSeed( ClientImportFileSeeds.FILE_SEED_TYPE_URL, f'https://example.com/post/{i}' ) for i in range( ClientImportFileSeeds.FILE_SEED_CACHE_CHUNK_SIZE * 3 ) ]
+        
+        file_seed_cache.AddFileSeeds( file_seeds )
+        
+        def save_and_load():
+            
+            page_data = ClientGUISession.GUISessionPageData( page_manager, [] )
+            
+            page_data_hash = page_data.GetSerialisedHash()
+            
+            page_container = ClientGUISession.GUISessionContainerPageSingle( 'url import', page_data_hash = page_data_hash )
+            
+            top_notebook_container = ClientGUISession.GUISessionContainerPageNotebook( 'top notebook', page_containers = [ page_container ] )
+            
+            session = ClientGUISession.GUISessionContainer( 'file log session', top_notebook_container = top_notebook_container, hashes_to_page_data = { page_data_hash : page_data } )
+            
+            self._write( 'serialisable', session )
+            
+            loaded_session = self._read( 'gui_session', 'file log session' )
+            
+            self.assertTrue( loaded_session.HasAllPageData() )
+            
+            loaded_page_manager = loaded_session.GetPageData( page_data_hash ).GetPageManager()
+            
+            return ( page_data, loaded_page_manager.GetVariable( 'urls_import' ).GetFileSeedCache() )
+            
+        
+        ( first_page_data, loaded_file_seed_cache ) = save_and_load()
+        
+        # the stored page only has the chunk hashes, the chunks themselves go in their own table
+        self.assertEqual( len( first_page_data.GetFileSeedChunkHashes() ), 3 )
+        self.assertEqual( len( first_page_data.GetFileSeedChunks() ), 3 )
+        
+        self.assertEqual( [ file_seed.file_seed_data for file_seed in loaded_file_seed_cache.GetFileSeeds() ], [ file_seed.file_seed_data for file_seed in file_seeds ] )
+        
+        #
+        
+        file_seeds[ -1 ].SetStatus( CC.STATUS_ERROR )
+        
+        file_seed_cache.NotifyFileSeedsUpdated( ( file_seeds[ -1 ], ) )
+        
+        ( second_page_data, loaded_file_seed_cache ) = save_and_load()
+        
+        # only the last chunk changed
+        self.assertEqual( len( first_page_data.GetFileSeedChunkHashes().intersection( second_page_data.GetFileSeedChunkHashes() ) ), 2 )
+        
+        self.assertEqual( loaded_file_seed_cache.GetFileSeedCount( CC.STATUS_ERROR ), 1 )
+        self.assertEqual( loaded_file_seed_cache.GetFileSeeds()[ -1 ].status, CC.STATUS_ERROR )
+        
+        self._write( 'delete_serialisable_named', HydrusSerialisable.SERIALISABLE_TYPE_GUI_SESSION_CONTAINER, 'file log session' )
+        
+    
     def test_import( self ):
         
         TestClientDB._clear_db()
@@ -1570,6 +1635,57 @@ class TestClientDB( unittest.TestCase ):
         self.assertEqual( written_hash, hash )
         
     
+    def test_json_dump_compression( self ):
+        
+        codecs = [ None, HydrusCompression.CODEC_ZLIB ]
+        
+        if HydrusCompression.ZSTD_OK:
+            
+            codecs.append( HydrusCompression.CODEC_ZSTD )
+            
+        
+        # big enough to be compressed
+        shortcuts = max( ClientDefaults.GetDefaultShortcuts(), key = lambda s: len( list( s ) ) )
+        
+        try:
+            
+            for codec in codecs:
+                
+                TG.test_controller.new_options.SetNoneableInteger( 'json_dump_compression_codec', codec )
+                
+                name = 'compressed shortcuts {}'.format( codec )
+                
+                shortcuts.SetName( name )
+                
+                self._write( 'serialisable', shortcuts )
+                
+                result = self._read( 'serialisable_named', HydrusSerialisable.SERIALISABLE_TYPE_SHORTCUT_SET, name )
+                
+                for ( shortcut, command ) in shortcuts:
+                    
+                    self.assertEqual( tuple( result.GetCommand( shortcut )._data ), tuple( command._data ) )
+                    
+                
+            
+            # turning it off does not stop us reading what was compressed
+            
+            TG.test_controller.new_options.SetNoneableInteger( 'json_dump_compression_codec', None )
+            
+            result = self._read( 'serialisable_named', HydrusSerialisable.SERIALISABLE_TYPE_SHORTCUT_SET, 'compressed shortcuts {}'.format( HydrusCompression.CODEC_ZLIB ) )
+            
+            self.assertEqual( len( list( result ) ), len( list( shortcuts ) ) )
+            
+        finally:
+            
+            TG.test_controller.new_options.SetNoneableInteger( 'json_dump_compression_codec', None )
+            
+            for codec in codecs:
+                
+                self._write( 'delete_serialisable_named', HydrusSerialisable.SERIALISABLE_TYPE_SHORTCUT_SET, 'compressed shortcuts {}'.format( codec ) )
+                
+            
+        
+    
     def test_media_results( self ):
         
         TestClientDB._clear_db()
@@ -1634,6 +1750,118 @@ class TestClientDB( unittest.TestCase ):
         self.assertEqual( mr_has_audio, False )
         self.assertEqual( mr_num_words, None )
         
+        #
+        
+        content_updates = []
+        
+        content_updates.append( ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD, ( 'series:cars', ( hash, ) ) ) )
+        content_updates.append( ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD, ( 'car', ( hash, ) ) ) )
+        
+        content_update_package = ClientContentUpdates.ContentUpdatePackage.STATICCreateFromContentUpdates( CC.DEFAULT_LOCAL_TAG_SERVICE_KEY, content_updates )
+        
+        self._write( 'content_updates', content_update_package )
+        
+        missing_hash_id = 12345
+        
+        columns = self._read( 'file_metadata_columns', [ mr_hash_id, missing_hash_id ], { 'size', 'mime', 'has_audio' }, [ CC.DEFAULT_LOCAL_TAG_SERVICE_KEY ] )
+        
+        expected_columns = {
+            'size' : [ 5270, None ],
+            'mime' : [ HC.IMAGE_PNG, None ],
+            'has_audio' : [ False, None ],
+            'tags' : { CC.DEFAULT_LOCAL_TAG_SERVICE_KEY : [ [ 'car', 'series:cars' ], [] ] }
+        }
+        
+        self.assertEqual( columns, expected_columns )
+        
+    
+    def test_media_result_snapshot( self ):
+        
+        TestClientDB._clear_db()
+        
+        path = HydrusStaticDir.GetStaticPath( 'hydrus.png' )
+        
+        full_import_options_container = ImportOptionsManager.ImportOptionsManager.STATICGetDefaultInitialisedManager().GetDefaultImportOptionsContainerForCallerType( IOC.IMPORT_OPTIONS_CALLER_TYPE_GLOBAL )
+        
+        file_import_job = ClientImportFiles.FileImportJob( path, full_import_options_container )
+        
+        file_import_job.GeneratePreImportHashAndStatus()
+        
+        file_import_job.GenerateInfo()
+        
+        self._write( 'import_file', file_import_job )
+        
+        hash = file_import_job.GetHash()
+        
+        content_update = ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD, ( 'car', ( hash, ) ) )
+        
+        self._write( 'content_updates', ClientContentUpdates.ContentUpdatePackage.STATICCreateFromContentUpdates( CC.DEFAULT_LOCAL_TAG_SERVICE_KEY, [ content_update ] ) )
+        
+        media_result_cache = ClientMediaResultCache.MediaResultCache.instance()
+        
+        media_result_cache.Clear()
+        
+        media_result = self._read( 'media_result', hash )
+        
+        hash_id = media_result.GetHashId()
+        
+        original_current = media_result.GetLocationsManager().GetCurrent()
+        original_inbox = media_result.GetInbox()
+        original_imported_timestamp_ms = media_result.GetTimesManager().GetImportedTimestampMS( CC.COMBINED_LOCAL_FILE_DOMAINS_SERVICE_KEY )
+        original_display_tags = media_result.GetTagsManager().GetServiceKeysToStatusesToTags( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL )
+        
+        snapshot_path = os.path.join( TestController.DB_DIR, 'test_media_result_snapshot.bin' )
+        
+        media_result_cache.PrepareSnapshot()
+        media_result_cache.SaveSnapshot( snapshot_path )
+        
+        self.assertTrue( os.path.exists( snapshot_path ) )
+        
+        media_result_cache.DropMediaResult( hash_id, hash )
+        
+        del media_result
+        
+        self.assertEqual( media_result_cache.LoadSnapshot( snapshot_path ), 1 )
+        
+        # it is only good for one boot
+        self.assertFalse( os.path.exists( snapshot_path ) )
+        
+        self.assertTrue( media_result_cache.HasFile( hash_id ) )
+        
+        media_result = self._read( 'media_result', hash )
+        
+        self.assertEqual( media_result.GetHash(), hash )
+        self.assertEqual( media_result.GetFileInfoManager().size, 5270 )
+        self.assertEqual( media_result.GetTagsManager().GetCurrent( CC.DEFAULT_LOCAL_TAG_SERVICE_KEY, ClientTags.TAG_DISPLAY_STORAGE ), { 'car' } )
+        self.assertEqual( media_result.GetTagsManager().GetServiceKeysToStatusesToTags( ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL ), original_display_tags )
+        self.assertEqual( media_result.GetLocationsManager().GetCurrent(), original_current )
+        self.assertEqual( media_result.GetInbox(), original_inbox )
+        self.assertIsNotNone( original_imported_timestamp_ms )
+        self.assertEqual( media_result.GetTimesManager().GetImportedTimestampMS( CC.COMBINED_LOCAL_FILE_DOMAINS_SERVICE_KEY ), original_imported_timestamp_ms )
+        
+        # make the snapshot stale, as if it missed an update
+        
+        content_update = ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_DELETE, ( 'car', ( hash, ) ) )
+        
+        media_result.ProcessContentUpdate( CC.DEFAULT_LOCAL_TAG_SERVICE_KEY, content_update )
+        
+        self.assertEqual( media_result.GetTagsManager().GetCurrent( CC.DEFAULT_LOCAL_TAG_SERVICE_KEY, ClientTags.TAG_DISPLAY_STORAGE ), set() )
+        
+        # and a view that is published but not yet flushed to the db
+        
+        content_update = ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_FILE_VIEWING_STATS, HC.CONTENT_UPDATE_ADD, ( hash, CC.CANVAS_MEDIA_VIEWER, 123456000, 1, 5000 ) )
+        
+        media_result.ProcessContentUpdate( CC.HYDRUS_LOCAL_FILE_STORAGE_SERVICE_KEY, content_update )
+        
+        self.assertTrue( media_result_cache.RevalidateSnapshotChunk() )
+        self.assertFalse( media_result_cache.RevalidateSnapshotChunk() )
+        
+        self.assertIs( self._read( 'media_result', hash ), media_result )
+        self.assertEqual( media_result.GetTagsManager().GetCurrent( CC.DEFAULT_LOCAL_TAG_SERVICE_KEY, ClientTags.TAG_DISPLAY_STORAGE ), { 'car' } )
+        self.assertEqual( media_result.GetFileViewingStatsManager().GetViews( CC.CANVAS_MEDIA_VIEWER ), 1 )
+        self.assertEqual( media_result.GetTimesManager().GetLastViewedTimestampMS( CC.CANVAS_MEDIA_VIEWER ), 123456000 )
+        self.assertIs( media_result.GetLocationsManager().GetTimesManager(), media_result.GetTimesManager() )
+        
     
     def test_mr_bones( self ):
         
@@ -2001,6 +2229,123 @@ class TestClientDB( unittest.TestCase ):
         TestClientDB._clear_db()
         
     
+    def test_read_pool_copies( self ):
+        
+        pool_cursor = mock.Mock()
+        
+        ( read_pool_commands_to_methods, id_caches ) = self._db._GenerateReadPoolCommandsToMethods( pool_cursor, HydrusDBBase.TemporaryIntegerTableNameCache( is_global_instance = False ) )
+        
+        self.assertEqual( set( read_pool_commands_to_methods.keys() ), set( self._db.READ_POOL_ACTIONS ) )
+        
+        pool_modules_files_metadata_rich = read_pool_commands_to_methods[ 'hash_status' ].__self__
+        
+        # the pool gets its own copies, pointed at its cursor, and the main connection's objects are untouched
+        
+        self.assertIsNot( pool_modules_files_metadata_rich, self._db.modules_files_metadata_rich )
+        self.assertIs( pool_modules_files_metadata_rich._c, pool_cursor )
+        self.assertTrue( pool_modules_files_metadata_rich._OnReadPoolConnection() )
+        
+        self.assertIsNot( self._db.modules_files_metadata_rich._c, pool_cursor )
+        self.assertFalse( self._db.modules_files_metadata_rich._OnReadPoolConnection() )
+        
+        # modules the copy talks to are copies too, with their own empty id caches
+        
+        pool_modules_hashes_local_cache = pool_modules_files_metadata_rich.modules_hashes_local_cache
+        
+        self.assertIsNot( pool_modules_hashes_local_cache, self._db.modules_hashes_local_cache )
+        self.assertIs( pool_modules_hashes_local_cache._c, pool_cursor )
+        
+        self.assertIsNot( pool_modules_hashes_local_cache._hash_ids_to_hashes_cache, self._db.modules_hashes_local_cache._hash_ids_to_hashes_cache )
+        self.assertIn( pool_modules_hashes_local_cache._hash_ids_to_hashes_cache, id_caches )
+        
+        pool_modules_hashes_local_cache._hash_ids_to_hashes_cache[ -5 ] = b'pool hash'
+        
+        self.assertNotIn( -5, self._db.modules_hashes_local_cache._hash_ids_to_hashes_cache )
+        
+        # other mutable state is blocked unless the module says it is safe to share
+        
+        pool_modules_files_inbox = read_pool_commands_to_methods[ 'file_info_managers_from_ids' ].__self__.modules_files_inbox
+        
+        self.assertIsInstance( pool_modules_files_inbox.inbox_hash_ids, HydrusDBBase.ReadPoolBlockedAttribute )
+        
+        with self.assertRaises( Exception ):
+            
+            _ = 5 in pool_modules_files_inbox.inbox_hash_ids
+            
+        
+        with self.assertRaises( Exception ):
+            
+            pool_modules_files_inbox.inbox_hash_ids.add( 5 )
+            
+        
+        self.assertIsInstance( self._db.modules_files_inbox.inbox_hash_ids, set )
+        
+        pool_modules_services = pool_modules_files_metadata_rich.modules_services
+        
+        self.assertIs( pool_modules_services._service_keys_to_service_ids, self._db.modules_services._service_keys_to_service_ids )
+        
+        # and real reads on a read-only connection, every pool action, twice, on the same copies
+        
+        if HG.db_journal_mode == 'WAL':
+            
+            TestClientDB._clear_db()
+            
+            hash = os.urandom( 32 )
+            
+            content_update_package = ClientContentUpdates.ContentUpdatePackage.STATICCreateFromContentUpdate( CC.DEFAULT_LOCAL_TAG_SERVICE_KEY, ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD, ( 'pool test', ( hash, ) ) ) )
+            
+            self._write( 'content_updates', content_update_package )
+            
+            ( hash_id, ) = self._read( 'hash_ids_to_hashes', hashes = ( hash, ) ).keys()
+            
+            # the pool only sees what the main connection has committed
+            self._db.ForceACommit()
+            
+            ( db, c ) = self._db._GenerateReadOnlyConnection()
+            
+            try:
+                
+                ( read_pool_commands_to_methods, id_caches ) = self._db._GenerateReadPoolCommandsToMethods( c, HydrusDBBase.TemporaryIntegerTableNameCache( is_global_instance = False ) )
+                
+                for i in range( 2 ):
+                    
+                    for id_cache in id_caches:
+                        
+                        id_cache.clear()
+                        
+                    
+                    c.execute( 'BEGIN DEFERRED;' )
+                    
+                    file_import_status = read_pool_commands_to_methods[ 'hash_status' ]( 'sha256', os.urandom( 32 ) )
+                    
+                    self.assertEqual( file_import_status.status, CC.STATUS_UNKNOWN )
+                    
+                    self.assertEqual( read_pool_commands_to_methods[ 'file_hashes' ]( [ hash ], 'sha256', 'sha256' ), { hash : hash } )
+                    
+                    ( file_info_manager, ) = read_pool_commands_to_methods[ 'file_info_managers_from_ids' ]( [ hash_id ] )
+                    
+                    self.assertEqual( file_info_manager.hash, hash )
+                    self.assertEqual( file_info_manager.size, None )
+                    
+                    columns = read_pool_commands_to_methods[ 'file_metadata_columns' ]( [ hash_id ], [ 'size', 'mime' ], [ CC.DEFAULT_LOCAL_TAG_SERVICE_KEY ] )
+                    
+                    self.assertEqual( columns, { 'size' : [ None ], 'mime' : [ None ], 'tags' : { CC.DEFAULT_LOCAL_TAG_SERVICE_KEY : [ [ 'pool test' ] ] } } )
+                    
+                    self.assertEqual( read_pool_commands_to_methods[ 'filter_hashes' ]( ClientLocation.LocationContext.STATICCreateSimple( CC.LOCAL_FILE_SERVICE_KEY ), [ hash ] ), [] )
+                    
+                    self.assertEqual( read_pool_commands_to_methods[ 'url_statuses' ]( 'https://site.com/post/123456' ), [] )
+                    
+                    c.execute( 'COMMIT;' )
+                    
+                
+            finally:
+                
+                c.close()
+                db.close()
+                
+            
+        
+    
     def test_services( self ):
         
         TestClientDB._clear_db()
@@ -2087,3 +2432,34 @@ class TestClientDB( unittest.TestCase ):
             
         
     
+    def test_similar_files_index_rollback( self ):
+        
+        modules_similar_files = self._db.modules_similar_files
+        
+        perceptual_hash_index = modules_similar_files._perceptual_hash_index
+        
+        perceptual_hash = bytes( [ 0xa5 ] * 8 )
+        
+        # a job that saved keeps its index changes
+        
+        perceptual_hash_index.AddPerceptualHash( -5, perceptual_hash )
+        
+        modules_similar_files._perceptual_hash_index_changed_in_job = True
+        
+        modules_similar_files.CommitPerceptualHashIndexChanges()
+        modules_similar_files.DiscardUncommittedPerceptualHashIndexChanges()
+        
+        self.assertEqual( perceptual_hash_index.Search( [ perceptual_hash ], 0 ), { -5 : 0 } )
+        
+        # a job that rolled back throws the index away, to be reloaded from the db
+        
+        perceptual_hash_index.AddPerceptualHash( -6, perceptual_hash )
+        
+        modules_similar_files._perceptual_hash_index_changed_in_job = True
+        
+        modules_similar_files.DiscardUncommittedPerceptualHashIndexChanges()
+        
+        self.assertFalse( modules_similar_files._perceptual_hash_index_loaded )
+        self.assertEqual( perceptual_hash_index.Search( [ perceptual_hash ], 0 ), {} )
+        
+    
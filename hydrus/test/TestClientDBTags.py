@@ -4,6 +4,8 @@ import time
 import typing
 import unittest
 
+from unittest import mock
+
 from hydrus.core import HydrusConstants as HC
 from hydrus.core import HydrusData
 from hydrus.core import HydrusLists
@@ -13,6 +15,8 @@ from hydrus.client import ClientConstants as CC
 from hydrus.client import ClientLocation
 from hydrus.client import ClientServices
 from hydrus.client.db import ClientDB
+from hydrus.client.db import ClientDBFilesSearch
+from hydrus.client.db import ClientDBMappingsStorage
 from hydrus.client.importing import ClientImportFiles
 from hydrus.client.importing.options import ImportOptionsConstants as IOC
 from hydrus.client.importing.options import ImportOptionsManager
@@ -2442,6 +2446,163 @@ class TestClientDBTags( unittest.TestCase ):
         pass
         
     
+    def test_siblings_chains_lookup( self ):
+        
+        self._clear_db()
+        
+        def do_ac( search_text ):
+            
+            location_context = ClientLocation.LocationContext.STATICCreateSimple( CC.COMBINED_FILE_SERVICE_KEY )
+            tag_context = ClientSearchTagContext.TagContext( self._my_service_key )
+            
+            file_search_context = ClientSearchFileSearchContext.FileSearchContext( location_context = location_context, tag_context = tag_context )
+            
+            results = []
+            
+            for tag_display_type in ( ClientTags.TAG_DISPLAY_STORAGE, ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL ):
+                
+                preds = self._read( 'autocomplete_predicates', tag_display_type, file_search_context, search_text = search_text )
+                
+                results.append( { pred.GetValue() : pred.GetCount().GetMinCount() for pred in preds } )
+                
+            
+            return results
+            
+        
+        content_update_package = ClientContentUpdates.ContentUpdatePackage()
+        
+        content_update_package.AddContentUpdate( self._my_service_key, ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD, ( 'samus_aran', ( self._sbh_bad, ) ) ) )
+        content_update_package.AddContentUpdate( self._my_service_key, ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD, ( 'character:samus aran', ( self._sbh_good, ) ) ) )
+        
+        self._write( 'content_updates', content_update_package )
+        
+        self.assertEqual( do_ac( 'samus*' ), [ { 'samus_aran' : 1, 'character:samus aran' : 1 }, { 'samus_aran' : 1, 'character:samus aran' : 1 } ] )
+        self.assertEqual( do_ac( 'character:samus*' ), [ { 'character:samus aran' : 1 }, { 'character:samus aran' : 1 } ] )
+        
+        # adding the sibling puts the bad tag in the ideal's chain, so searching for the ideal now finds it too
+        
+        content_update_package = ClientContentUpdates.ContentUpdatePackage()
+        
+        content_update_package.AddContentUpdate( self._my_service_key, ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_TAG_SIBLINGS, HC.CONTENT_UPDATE_ADD, ( 'samus_aran', 'character:samus aran' ) ) )
+        
+        self._write( 'content_updates', content_update_package )
+        
+        self._sync_display()
+        
+        self.assertEqual( do_ac( 'samus*' ), [ { 'samus_aran' : 1, 'character:samus aran' : 1 }, { 'character:samus aran' : 2 } ] )
+        self.assertEqual( do_ac( 'character:samus*' ), [ { 'samus_aran' : 1, 'character:samus aran' : 1 }, { 'character:samus aran' : 2 } ] )
+        
+        # and deleting it has to get through to the in-memory chains
+        
+        content_update_package = ClientContentUpdates.ContentUpdatePackage()
+        
+        content_update_package.AddContentUpdate( self._my_service_key, ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_TAG_SIBLINGS, HC.CONTENT_UPDATE_DELETE, ( 'samus_aran', 'character:samus aran' ) ) )
+        
+        self._write( 'content_updates', content_update_package )
+        
+        self._sync_display()
+        
+        self.assertEqual( do_ac( 'samus*' ), [ { 'samus_aran' : 1, 'character:samus aran' : 1 }, { 'samus_aran' : 1, 'character:samus aran' : 1 } ] )
+        self.assertEqual( do_ac( 'character:samus*' ), [ { 'character:samus aran' : 1 }, { 'character:samus aran' : 1 } ] )
+        
+    
+    def test_autocomplete_max_results( self ):
+        
+        self._clear_db()
+        
+        content_update_package = ClientContentUpdates.ContentUpdatePackage()
+        
+        content_update_package.AddContentUpdate( self._my_service_key, ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD, ( 'samus aran', ( self._sbh_bad, self._sbh_both, self._sbh_good ) ) ) )
+        content_update_package.AddContentUpdate( self._my_service_key, ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD, ( 'samus', ( self._sbh_bad, self._sbh_both ) ) ) )
+        content_update_package.AddContentUpdate( self._my_service_key, ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD, ( 'samus_aran', ( self._sbh_good, ) ) ) )
+        
+        self._write( 'content_updates', content_update_package )
+        
+        location_context = ClientLocation.LocationContext.STATICCreateSimple( CC.COMBINED_FILE_SERVICE_KEY )
+        tag_context = ClientSearchTagContext.TagContext( self._my_service_key )
+        
+        file_search_context = ClientSearchFileSearchContext.FileSearchContext( location_context = location_context, tag_context = tag_context )
+        
+        for tag_display_type in ( ClientTags.TAG_DISPLAY_STORAGE, ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL ):
+            
+            for ( max_results, expected_result ) in [
+                ( None, { 'samus aran' : 3, 'samus' : 2, 'samus_aran' : 1 } ),
+                ( 5, { 'samus aran' : 3, 'samus' : 2, 'samus_aran' : 1 } ),
+                ( 2, { 'samus aran' : 3, 'samus' : 2 } ),
+                ( 1, { 'samus aran' : 3 } )
+            ]:
+                
+                preds = self._read( 'autocomplete_predicates', tag_display_type, file_search_context, search_text = 'samus*', max_results = max_results )
+                
+                self.assertEqual( { pred.GetValue() : pred.GetCount().GetMinCount() for pred in preds }, expected_result )
+                
+            
+            # exact match does not truncate
+            
+            preds = self._read( 'autocomplete_predicates', tag_display_type, file_search_context, search_text = 'samus', exact_match = True, max_results = 1 )
+            
+            self.assertEqual( { pred.GetValue() for pred in preds }, { 'samus' } )
+            
+        
+    
+    def test_autocomplete_max_results_across_services( self ):
+        
+        self._clear_db()
+        
+        hashes = []
+        
+        for filename in ( 'jpeg_non_progressive.jpg', 'jpeg_progressive.jpg', 'visual_dupe_original.jpg' ):
+            
+            TG.test_controller.SetRead( 'hash_status', ClientImportFiles.FileImportStatus.STATICGetUnknownStatus() )
+            
+            path = HydrusStaticDir.GetStaticPath( os.path.join( 'testing', filename ) )
+            
+            full_import_options_container = ImportOptionsManager.ImportOptionsManager.STATICGetDefaultInitialisedManager().GetDefaultImportOptionsContainerForCallerType( IOC.IMPORT_OPTIONS_CALLER_TYPE_GLOBAL )
+            
+            file_import_job = ClientImportFiles.FileImportJob( path, full_import_options_container )
+            
+            file_import_job.GeneratePreImportHashAndStatus()
+            
+            file_import_job.GenerateInfo()
+            
+            self._write( 'import_file', file_import_job )
+            
+            hashes.append( file_import_job.GetHash() )
+            
+        
+        # 'samus x' is only second on each service, but it is top when the two are added up
+        
+        content_update_package = ClientContentUpdates.ContentUpdatePackage()
+        
+        content_update_package.AddContentUpdate( self._my_service_key, ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD, ( 'samus a', hashes ) ) )
+        content_update_package.AddContentUpdate( self._my_service_key, ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD, ( 'samus x', hashes[:2] ) ) )
+        content_update_package.AddContentUpdate( self._processing_service_key, ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD, ( 'samus b', hashes ) ) )
+        content_update_package.AddContentUpdate( self._processing_service_key, ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD, ( 'samus x', hashes[1:] ) ) )
+        
+        self._write( 'content_updates', content_update_package )
+        
+        location_context = ClientLocation.LocationContext.STATICCreateSimple( CC.LOCAL_FILE_SERVICE_KEY )
+        tag_context = ClientSearchTagContext.TagContext( CC.COMBINED_TAG_SERVICE_KEY )
+        
+        file_search_context = ClientSearchFileSearchContext.FileSearchContext( location_context = location_context, tag_context = tag_context )
+        
+        for tag_display_type in ( ClientTags.TAG_DISPLAY_STORAGE, ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL ):
+            
+            preds = self._read( 'autocomplete_predicates', tag_display_type, file_search_context, search_text = 'samus*' )
+            
+            self.assertEqual( { pred.GetValue() : pred.GetCount().max_current_count for pred in preds }, { 'samus a' : 3, 'samus b' : 3, 'samus x' : 4 } )
+            
+            preds = self._read( 'autocomplete_predicates', tag_display_type, file_search_context, search_text = 'samus*', max_results = 1 )
+            
+            self.assertEqual( { pred.GetValue() : pred.GetCount().max_current_count for pred in preds }, { 'samus x' : 4 } )
+            
+            preds = self._read( 'autocomplete_predicates', tag_display_type, file_search_context, search_text = 'samus*', max_results = 2 )
+            
+            self.assertEqual( len( preds ), 2 )
+            self.assertIn( 'samus x', { pred.GetValue() for pred in preds } )
+            
+        
+    
     def test_siblings_files_tag_autocomplete_counts_specific( self ):
         
         # set up some siblings
@@ -2493,6 +2654,119 @@ class TestClientDBTags( unittest.TestCase ):
         pass
         
     
+    def test_tag_postings_cache( self ):
+        
+        self._clear_db()
+        
+        TG.test_controller.new_options.SetInteger( 'tag_postings_cache_size', 64 * 1024 * 1024 )
+        
+        ClientDBMappingsStorage.TAG_POSTINGS_CACHE.SetMaxSize( 64 * 1024 * 1024 )
+        
+        try:
+            
+            hashes = []
+            
+            for filename in ( 'muh_jpg.jpg', 'muh_png.png' ):
+                
+                TG.test_controller.SetRead( 'hash_status', ClientImportFiles.FileImportStatus.STATICGetUnknownStatus() )
+                
+                path = HydrusStaticDir.GetStaticPath( os.path.join( 'testing', filename ) )
+                
+                full_import_options_container = ImportOptionsManager.ImportOptionsManager.STATICGetDefaultInitialisedManager().GetDefaultImportOptionsContainerForCallerType( IOC.IMPORT_OPTIONS_CALLER_TYPE_GLOBAL )
+                
+                file_import_job = ClientImportFiles.FileImportJob( path, full_import_options_container )
+                
+                file_import_job.GeneratePreImportHashAndStatus()
+                
+                file_import_job.GenerateInfo()
+                
+                self._write( 'import_file', file_import_job )
+                
+                hashes.append( file_import_job.GetHash() )
+                
+            
+            ( jpg_hash, png_hash ) = hashes
+            
+            def do_search( tags_and_inclusives ):
+                
+                predicates = [ ClientSearchPredicate.Predicate( ClientSearchPredicate.PREDICATE_TYPE_TAG, tag, inclusive ) for ( tag, inclusive ) in tags_and_inclusives ]
+                
+                location_context = ClientLocation.LocationContext.STATICCreateSimple( CC.LOCAL_FILE_SERVICE_KEY )
+                tag_context = ClientSearchTagContext.TagContext( self._my_service_key )
+                
+                file_search_context = ClientSearchFileSearchContext.FileSearchContext( location_context = location_context, tag_context = tag_context, predicates = predicates )
+                
+                hash_ids = self._read( 'file_query_ids', file_search_context )
+                
+                return { hash_id_to_hash[ hash_id ] for hash_id in hash_ids }
+                
+            
+            content_update_package = ClientContentUpdates.ContentUpdatePackage()
+            
+            content_update_package.AddContentUpdate( self._my_service_key, ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD, ( 'samus', ( jpg_hash, png_hash ) ) ) )
+            content_update_package.AddContentUpdate( self._my_service_key, ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD, ( 'blonde hair', ( jpg_hash, ) ) ) )
+            
+            self._write( 'content_updates', content_update_package )
+            
+            media_results = self._read( 'media_results', ( jpg_hash, png_hash ) )
+            
+            hash_id_to_hash = { media_result.GetHashId() : media_result.GetHash() for media_result in media_results }
+            
+            # a read pool job searches fine but leaves the cache alone
+            
+            with mock.patch.object( ClientDBFilesSearch.ClientDBFilesSearchTags, '_OnReadPoolConnection', return_value = True ):
+                
+                self.assertEqual( do_search( [ ( 'samus', True ), ( 'blonde hair', True ) ] ), { jpg_hash } )
+                
+            
+            self.assertEqual( ClientDBMappingsStorage.TAG_POSTINGS_CACHE.GetSizeInBytes(), 0 )
+            
+            # AND and NOT, twice so the second go is from the cache
+            
+            for i in range( 2 ):
+                
+                self.assertEqual( do_search( [ ( 'samus', True ) ] ), { jpg_hash, png_hash } )
+                self.assertEqual( do_search( [ ( 'samus', True ), ( 'blonde hair', True ) ] ), { jpg_hash } )
+                self.assertEqual( do_search( [ ( 'samus', True ), ( 'blonde hair', False ) ] ), { png_hash } )
+                self.assertEqual( do_search( [ ( 'samus', True ), ( 'missing tag', True ) ] ), set() )
+                
+            
+            self.assertTrue( ClientDBMappingsStorage.TAG_POSTINGS_CACHE.GetSizeInBytes() > 0 )
+            
+            # a mappings change has to get through
+            
+            content_update_package = ClientContentUpdates.ContentUpdatePackage()
+            
+            content_update_package.AddContentUpdate( self._my_service_key, ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD, ( 'blonde hair', ( png_hash, ) ) ) )
+            content_update_package.AddContentUpdate( self._my_service_key, ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_DELETE, ( 'samus', ( jpg_hash, ) ) ) )
+            
+            self._write( 'content_updates', content_update_package )
+            
+            self.assertEqual( do_search( [ ( 'samus', True ), ( 'blonde hair', True ) ] ), { png_hash } )
+            self.assertEqual( do_search( [ ( 'blonde hair', True ), ( 'samus', False ) ] ), { jpg_hash } )
+            
+            # and so does a display change
+            
+            content_update_package = ClientContentUpdates.ContentUpdatePackage()
+            
+            content_update_package.AddContentUpdate( self._my_service_key, ClientContentUpdates.ContentUpdate( HC.CONTENT_TYPE_TAG_SIBLINGS, HC.CONTENT_UPDATE_ADD, ( 'samus', 'character:samus aran' ) ) )
+            
+            self._write( 'content_updates', content_update_package )
+            
+            self._sync_display()
+            
+            self.assertEqual( do_search( [ ( 'character:samus aran', True ) ] ), { png_hash } )
+            self.assertEqual( do_search( [ ( 'blonde hair', True ), ( 'character:samus aran', False ) ] ), { jpg_hash } )
+            
+        finally:
+            
+            TG.test_controller.new_options.SetInteger( 'tag_postings_cache_size', 0 )
+            
+            ClientDBMappingsStorage.TAG_POSTINGS_CACHE.SetMaxSize( 0 )
+            ClientDBMappingsStorage.TAG_POSTINGS_CACHE.Clear()
+            
+        
+    
     def test_tag_siblings( self ):
         
         # this sucks big time and should really be broken into specific scenarios to test add_file with tags and sibs etc...
@@ -1,14 +1,23 @@
 import os
+import threading
+import time
 import unittest
 
+from unittest import mock
+
 from hydrus.core import HydrusExceptions
 from hydrus.core import HydrusPaths
 from hydrus.core import HydrusTemp
+from hydrus.core import HydrusTime
 from hydrus.core.files import HydrusFilesPhysicalStorage
 
 from hydrus.client import ClientThreading
+from hydrus.client.files import ClientFilesMaintenance
+from hydrus.client.files import ClientFilesMaintenanceManager
 from hydrus.client.files import ClientFilesPhysical
+from hydrus.client.files import ClientFilesThumbnailPacks
 
+from hydrus.test import HelperFunctions
 from hydrus.test import TestGlobals as TG
 
 def get_good_prefixes():
@@ -434,3 +443,354 @@ class TestClientGranularisation( unittest.TestCase ):
         HydrusPaths.DeletePath( test_dir )
         
     
+
+class TestClientThumbnailPacks( unittest.TestCase ):
+    
+    def test_pack( self ):
+        
+        test_dir = HydrusTemp.GetSubTempDir( 'test_thumbnail_pack' )
+        
+        hashes = [ os.urandom( 32 ) for i in range( 5 ) ]
+        
+        hashes_to_bytes = { hash : os.urandom( 1000 + i ) for ( i, hash ) in enumerate( hashes ) }
+        
+        pack = ClientFilesThumbnailPacks.ThumbnailPack( test_dir )
+        
+        self.assertFalse( ClientFilesThumbnailPacks.PackExists( test_dir ) )
+        self.assertEqual( pack.GetThumbnailBytes( hashes[0] ), None )
+        
+        for hash in hashes:
+            
+            pack.AddThumbnail( hash, hashes_to_bytes[ hash ] )
+            
+        
+        self.assertTrue( ClientFilesThumbnailPacks.PackExists( test_dir ) )
+        
+        with self.assertRaises( HydrusExceptions.ZeroSizeFileException ):
+            
+            pack.AddThumbnail( os.urandom( 32 ), b'' )
+            
+        
+        for hash in hashes:
+            
+            self.assertEqual( pack.GetThumbnailBytes( hash ), hashes_to_bytes[ hash ] )
+            
+        
+        # replace and delete
+        
+        hashes_to_bytes[ hashes[0] ] = os.urandom( 500 )
+        
+        pack.AddThumbnail( hashes[0], hashes_to_bytes[ hashes[0] ] )
+        
+        self.assertTrue( pack.DeleteThumbnail( hashes[1] ) )
+        self.assertFalse( pack.DeleteThumbnail( hashes[1] ) )
+        
+        del hashes_to_bytes[ hashes[1] ]
+        
+        self.assertEqual( pack.GetThumbnailBytes( hashes[0] ), hashes_to_bytes[ hashes[0] ] )
+        self.assertFalse( pack.HasThumbnail( hashes[1] ) )
+        
+        pack.Close()
+        
+        # from the index, and then from the index plus a scan of what was appended after it
+        
+        pack = ClientFilesThumbnailPacks.ThumbnailPack( test_dir )
+        
+        self.assertEqual( pack.GetHashes(), set( hashes_to_bytes.keys() ) )
+        
+        new_hash = os.urandom( 32 )
+        
+        hashes_to_bytes[ new_hash ] = os.urandom( 2000 )
+        
+        pack.AddThumbnail( new_hash, hashes_to_bytes[ new_hash ] )
+        pack.DeleteThumbnail( hashes[2] )
+        
+        del hashes_to_bytes[ hashes[2] ]
+        
+        for pack_to_check in ( pack, ClientFilesThumbnailPacks.ThumbnailPack( test_dir ) ):
+            
+            self.assertEqual( pack_to_check.GetHashes(), set( hashes_to_bytes.keys() ) )
+            
+            for ( hash, thumbnail_bytes ) in hashes_to_bytes.items():
+                
+                self.assertEqual( pack_to_check.GetThumbnailBytes( hash ), thumbnail_bytes )
+                
+            
+            pack_to_check.Close()
+            
+        
+        # a crash halfway through an append
+        
+        pack_path = os.path.join( test_dir, ClientFilesThumbnailPacks.PACK_FILENAME )
+        
+        good_pack_length = os.path.getsize( pack_path )
+        
+        with open( pack_path, 'ab' ) as f:
+            
+            f.write( ClientFilesThumbnailPacks.RECORD_HEADER.pack( os.urandom( 32 ), 5000 ) )
+            f.write( b'half a thumb' )
+            
+        
+        pack = ClientFilesThumbnailPacks.ThumbnailPack( test_dir )
+        
+        self.assertEqual( pack.GetHashes(), set( hashes_to_bytes.keys() ) )
+        self.assertEqual( os.path.getsize( pack_path ), good_pack_length )
+        
+        # compaction
+        
+        pack.Compact()
+        
+        self.assertLess( os.path.getsize( pack_path ), good_pack_length )
+        
+        # if we die after the new pack is in but before its index is saved, the old index must not be trusted
+        
+        index_path = os.path.join( test_dir, ClientFilesThumbnailPacks.INDEX_FILENAME )
+        
+        self.assertTrue( os.path.exists( index_path ) )
+        
+        with mock.patch.object( ClientFilesThumbnailPacks.ThumbnailPack, '_SaveIndex', side_effect = Exception( 'power cut' ) ):
+            
+            with self.assertRaises( Exception ):
+                
+                pack.Compact()
+                
+            
+        
+        self.assertFalse( os.path.exists( index_path ) )
+        
+        for pack_to_check in ( pack, ClientFilesThumbnailPacks.ThumbnailPack( test_dir ) ):
+            
+            self.assertEqual( dict( pack_to_check.IterateThumbnails() ), hashes_to_bytes )
+            
+            pack_to_check.Close()
+            
+        
+        pack.DeletePack()
+        
+        self.assertFalse( ClientFilesThumbnailPacks.PackExists( test_dir ) )
+        
+        HydrusPaths.DeletePath( test_dir )
+        
+    
+    def test_files_manager( self ):
+        
+        client_files_manager = TG.test_controller.client_files_manager
+        
+        hash = os.urandom( 32 )
+        
+        thumbnail_bytes = os.urandom( 4096 )
+        
+        media_result = HelperFunctions.GetFakeMediaResult( hash )
+        
+        TG.test_controller.new_options.SetBoolean( 'use_packed_thumbnail_storage', True )
+        
+        try:
+            
+            client_files_manager.AddThumbnailFromBytes( hash, thumbnail_bytes, silent = True )
+            
+            loose_path = client_files_manager._GenerateExpectedThumbnailPath( hash )
+            
+            self.assertFalse( os.path.exists( loose_path ) )
+            self.assertTrue( client_files_manager.LocklessHasThumbnail( hash ) )
+            self.assertEqual( client_files_manager.GetThumbnailBytes( media_result ), thumbnail_bytes )
+            
+            # a packed thumb has no path, and we do not write a loose copy to make one
+            
+            self.assertIs( client_files_manager.GetThumbnailPath( media_result ), None )
+            self.assertFalse( os.path.exists( loose_path ) )
+            
+            # the pack takes priority, so new loose thumbs take the pack's copy out
+            
+            TG.test_controller.new_options.SetBoolean( 'use_packed_thumbnail_storage', False )
+            
+            new_thumbnail_bytes = os.urandom( 4096 )
+            
+            client_files_manager.AddThumbnailFromBytes( hash, new_thumbnail_bytes, silent = True )
+            
+            self.assertEqual( client_files_manager.GetThumbnailBytes( media_result ), new_thumbnail_bytes )
+            self.assertEqual( client_files_manager.GetThumbnailPath( media_result ), loose_path )
+            
+            os.remove( loose_path )
+            
+            self.assertFalse( client_files_manager.LocklessHasThumbnail( hash ) )
+            
+        finally:
+            
+            TG.test_controller.new_options.SetBoolean( 'use_packed_thumbnail_storage', False )
+            
+        
+    
+    
+
+class TestClientFilesMaintenance( unittest.TestCase ):
+    
+    def _RunParallelJob( self, fake_call, media_results, job_status = None ):
+        
+        job_type = ClientFilesMaintenance.REGENERATE_FILE_DATA_JOB_BLURHASH
+        
+        manager = ClientFilesMaintenanceManager.FilesMaintenanceManager( TG.test_controller )
+        
+        manager._parallelisable_job_types_to_calls[ job_type ] = fake_call
+        
+        if job_status is None:
+            
+            job_status = ClientThreading.JobStatus( cancellable = True )
+            
+        
+        cleared_jobs = []
+        hook_calls = []
+        
+        def do_write( name, *args, **kwargs ):
+            
+            if name == 'file_maintenance_clear_jobs':
+                
+                # the manager reuses its list, so copy now
+                cleared_jobs.extend( args[0] )
+                
+            
+        
+        media_results_to_job_types = { media_result : [ job_type ] for media_result in media_results }
+        
+        TG.test_controller.new_options.SetInteger( 'file_maintenance_num_workers', 4 )
+        
+        try:
+            
+            with mock.patch.object( TG.test_controller, 'Write', side_effect = do_write ), mock.patch.object( TG.test_controller, 'WriteSynchronous', side_effect = do_write ):
+                
+                manager._RunJob( media_results_to_job_types, job_status, job_done_hook = lambda: hook_calls.append( HydrusTime.GetNowFloat() ) )
+                
+            
+        finally:
+            
+            TG.test_controller.new_options.SetInteger( 'file_maintenance_num_workers', 1 )
+            
+        
+        return ( manager, cleared_jobs, hook_calls )
+        
+    
+    def test_parallel_jobs( self ):
+        
+        media_results = [ HelperFunctions.GetFakeMediaResult( os.urandom( 32 ) ) for i in range( 20 ) ]
+        
+        lock = threading.Lock()
+        hashes_to_finish_times = {}
+        
+        def fake_call( media_result ):
+            
+            time.sleep( ( media_result.GetHash()[0] % 5 ) / 100 )
+            
+            with lock:
+                
+                hashes_to_finish_times[ media_result.GetHash() ] = HydrusTime.GetNowFloat()
+                
+            
+            return media_result.GetHash().hex()
+            
+        
+        ( manager, cleared_jobs, hook_calls ) = self._RunParallelJob( fake_call, media_results )
+        
+        job_type = ClientFilesMaintenance.REGENERATE_FILE_DATA_JOB_BLURHASH
+        
+        self.assertEqual( sorted( cleared_jobs ), sorted( [ ( media_result.GetHash(), job_type, media_result.GetHash().hex() ) for media_result in media_results ] ) )
+        
+        # progress is only reported for work that is actually done
+        
+        self.assertEqual( len( hook_calls ), len( media_results ) )
+        
+        finish_times = sorted( hashes_to_finish_times.values() )
+        
+        for ( i, hook_time ) in enumerate( hook_calls ):
+            
+            self.assertGreaterEqual( hook_time, finish_times[ i ] )
+            
+        
+    
+    def test_parallel_job_errors( self ):
+        
+        media_results = [ HelperFunctions.GetFakeMediaResult( os.urandom( 32 ) ) for i in range( 10 ) ]
+        
+        bad_hash = media_results[3].GetHash()
+        
+        def fake_call( media_result ):
+            
+            if media_result.GetHash() == bad_hash:
+                
+                raise Exception( 'test error' )
+                
+            
+            return media_result.GetHash().hex()
+            
+        
+        with mock.patch.object( ClientFilesMaintenanceManager.FilesMaintenanceManager, '_ReportUnexpectedError' ) as report:
+            
+            ( manager, cleared_jobs, hook_calls ) = self._RunParallelJob( fake_call, media_results )
+            
+        
+        job_type = ClientFilesMaintenance.REGENERATE_FILE_DATA_JOB_BLURHASH
+        
+        # an unexpected error is reported and the job cleared, and everything else carries on
+        
+        self.assertEqual( report.call_count, 1 )
+        self.assertEqual( report.call_args[0][0], bad_hash )
+        self.assertIn( ( bad_hash, job_type, None ), cleared_jobs )
+        self.assertEqual( len( cleared_jobs ), len( media_results ) )
+        self.assertFalse( manager._serious_error_encountered )
+        
+        # an I/O error stops the run and anything after it
+        
+        def fake_call( media_result ):
+            
+            if media_result.GetHash() == bad_hash:
+                
+                raise IOError( 'test io error' )
+                
+            
+            return media_result.GetHash().hex()
+            
+        
+        original_report_io_error = ClientFilesMaintenanceManager.FilesMaintenanceManager._ReportIOError
+        
+        with mock.patch.object( ClientFilesMaintenanceManager.FilesMaintenanceManager, '_ReportIOError', autospec = True, side_effect = original_report_io_error ) as report:
+            
+            ( manager, cleared_jobs, hook_calls ) = self._RunParallelJob( fake_call, media_results )
+            
+        
+        self.assertEqual( report.call_count, 1 )
+        self.assertEqual( report.call_args[0][1], bad_hash )
+        self.assertTrue( manager._serious_error_encountered )
+        self.assertIn( ( bad_hash, job_type, None ), cleared_jobs )
+        self.assertLess( len( cleared_jobs ), len( media_results ) )
+        
+    
+    def test_parallel_job_cancel( self ):
+        
+        media_results = [ HelperFunctions.GetFakeMediaResult( os.urandom( 32 ) ) for i in range( 20 ) ]
+        
+        job_status = ClientThreading.JobStatus( cancellable = True )
+        
+        lock = threading.Lock()
+        hashes_run = set()
+        
+        def fake_call( media_result ):
+            
+            job_status.Cancel()
+            
+            time.sleep( 0.05 )
+            
+            with lock:
+                
+                hashes_run.add( media_result.GetHash() )
+                
+            
+            return media_result.GetHash().hex()
+            
+        
+        ( manager, cleared_jobs, hook_calls ) = self._RunParallelJob( fake_call, media_results, job_status = job_status )
+        
+        # queued work is dropped and left for later, but whatever finished is still cleared
+        
+        self.assertLess( len( hashes_run ), len( media_results ) )
+        self.assertEqual( { hash for ( hash, job_type, additional_data ) in cleared_jobs }, hashes_run )
+        self.assertEqual( len( hook_calls ), len( hashes_run ) )
+        
+    
@@ -1,9 +1,12 @@
+import os
 import unittest
 
 from hydrus.core import HydrusConstants as HC
+from hydrus.core import HydrusData
 from hydrus.core import HydrusStaticDir
 
 from hydrus.client import ClientConstants as CC
+from hydrus.client.db import ClientDBSimilarFiles
 from hydrus.client.files.images import ClientImagePerceptualHashes
 
 class TestImageHandling( unittest.TestCase ):
@@ -23,3 +26,52 @@ class TestImageHandling( unittest.TestCase ):
         self.assertEqual( perceptual_hashes, set( [ b'\xb4M\xc7\xb2M\xcb8\x1c' ] ) )
         
     
+    def test_perceptual_hash_index( self ):
+        
+        perceptual_hash_ids_to_perceptual_hashes = { i : os.urandom( 8 ) for i in range( 1, 2001 ) }
+        
+        index = ClientDBSimilarFiles.PerceptualHashIndex()
+        
+        index.SetPerceptualHashes( list( perceptual_hash_ids_to_perceptual_hashes.items() )[ : 1000 ] )
+        
+        for ( perceptual_hash_id, perceptual_hash ) in list( perceptual_hash_ids_to_perceptual_hashes.items() )[ 1000 : ]:
+            
+            index.AddPerceptualHash( perceptual_hash_id, perceptual_hash )
+            
+        
+        index.RemovePerceptualHashIds( [ 5, 1500 ] )
+        
+        del perceptual_hash_ids_to_perceptual_hashes[ 5 ]
+        del perceptual_hash_ids_to_perceptual_hashes[ 1500 ]
+        
+        self.assertEqual( index.GetNumPerceptualHashes(), 1998 )
+        
+        search_perceptual_hashes = [ perceptual_hash_ids_to_perceptual_hashes[ 10 ], perceptual_hash_ids_to_perceptual_hashes[ 1800 ], os.urandom( 8 ) ]
+        
+        for max_hamming_distance in ( 0, 8, 24 ):
+            
+            expected = {}
+            
+            for search_perceptual_hash in search_perceptual_hashes:
+                
+                for ( perceptual_hash_id, perceptual_hash ) in perceptual_hash_ids_to_perceptual_hashes.items():
+                    
+                    distance = HydrusData.Get64BitHammingDistance( search_perceptual_hash, perceptual_hash )
+                    
+                    if distance <= max_hamming_distance:
+                        
+                        expected[ perceptual_hash_id ] = min( distance, expected.get( perceptual_hash_id, distance ) )
+                        
+                    
+                
+            
+            self.assertEqual( index.Search( search_perceptual_hashes, max_hamming_distance ), expected )
+            
+        
+        # a reused id overwrites what was there
+        
+        index.AddPerceptualHash( 10, perceptual_hash_ids_to_perceptual_hashes[ 11 ] )
+        
+        self.assertEqual( index.Search( [ perceptual_hash_ids_to_perceptual_hashes[ 11 ] ], 0 ), { 10 : 0, 11 : 0 } )
+        self.assertEqual( index.GetNumPerceptualHashes(), 1998 )
+        
@@ -3,6 +3,7 @@ import random
 import unittest
 
 from hydrus.core import HydrusConstants as HC
+from hydrus.core import HydrusSerialisable
 
 from hydrus.client import ClientConstants as CC
 from hydrus.client import ClientStrings
@@ -260,6 +261,137 @@ class TestFileSeedCache( unittest.TestCase ):
             
         
     
+    def test_file_seed_chunks( self ):
+        
+        chunk_size = ClientImportFileSeeds.FILE_SEED_CACHE_CHUNK_SIZE
+        
+        file_seed_cache = ClientImportFileSeeds.FileSeedCache()
+        
+        file_seeds = [ ClientImportFileSeeds.FileSeed( ClientImportFileSeeds.FILE_SEED_TYPE_URL, f'https://example.com/post/{i}' ) for i in range( int( chunk_size * 2.5 ) ) ]
+        
+        file_seed_cache.AddFileSeeds( file_seeds )
+        
+        def get_chunk_hashes( fsc ):
+            
+            ( serialisable_type, version, serialisable_file_seed_chunks ) = fsc.GetSerialisableTuple()
+            
+            return [ file_seed_chunk_hash_hex for ( file_seed_chunk_hash_hex, serialisable_file_seed_chunk ) in serialisable_file_seed_chunks ]
+            
+        
+        def get_fresh_chunk_hashes( fsc ):
+            
+            fresh_file_seed_cache = ClientImportFileSeeds.FileSeedCache()
+            
+            fresh_file_seed_cache.AddFileSeeds( fsc.GetFileSeeds() )
+            
+            return get_chunk_hashes( fresh_file_seed_cache )
+            
+        
+        original_chunk_hashes = get_chunk_hashes( file_seed_cache )
+        
+        self.assertEqual( len( original_chunk_hashes ), 3 )
+        
+        # a status change only touches its own chunk
+        
+        file_seeds[ chunk_size + 5 ].SetStatus( CC.STATUS_SUCCESSFUL_AND_NEW )
+        
+        file_seed_cache.NotifyFileSeedsUpdated( ( file_seeds[ chunk_size + 5 ], ) )
+        
+        chunk_hashes = get_chunk_hashes( file_seed_cache )
+        
+        self.assertEqual( chunk_hashes, get_fresh_chunk_hashes( file_seed_cache ) )
+        self.assertEqual( chunk_hashes[0], original_chunk_hashes[0] )
+        self.assertNotEqual( chunk_hashes[1], original_chunk_hashes[1] )
+        self.assertEqual( chunk_hashes[2], original_chunk_hashes[2] )
+        
+        # everything that shuffles or changes file seeds has to keep the chunks honest
+        
+        file_seed_cache.AddFileSeeds( [ ClientImportFileSeeds.FileSeed( ClientImportFileSeeds.FILE_SEED_TYPE_URL, f'https://example.com/post/new/{i}' ) for i in range( chunk_size ) ] )
+        self.assertEqual( get_chunk_hashes( file_seed_cache ), get_fresh_chunk_hashes( file_seed_cache ) )
+        
+        file_seed_cache.RemoveFileSeeds( file_seeds[ : 10 ] )
+        self.assertEqual( get_chunk_hashes( file_seed_cache ), get_fresh_chunk_hashes( file_seed_cache ) )
+        
+        file_seed_cache.InsertFileSeeds( chunk_size, [ ClientImportFileSeeds.FileSeed( ClientImportFileSeeds.FILE_SEED_TYPE_URL, 'https://example.com/post/inserted' ) ] )
+        self.assertEqual( get_chunk_hashes( file_seed_cache ), get_fresh_chunk_hashes( file_seed_cache ) )
+        
+        file_seed_cache.AdvanceFileSeed( file_seeds[ chunk_size * 2 ] )
+        self.assertEqual( get_chunk_hashes( file_seed_cache ), get_fresh_chunk_hashes( file_seed_cache ) )
+        
+        file_seed_cache.SetStatusToStatus( CC.STATUS_SUCCESSFUL_AND_NEW, CC.STATUS_ERROR )
+        file_seed_cache.RetryFailed()
+        self.assertEqual( get_chunk_hashes( file_seed_cache ), get_fresh_chunk_hashes( file_seed_cache ) )
+        
+        file_seed_cache.Reverse()
+        self.assertEqual( get_chunk_hashes( file_seed_cache ), get_fresh_chunk_hashes( file_seed_cache ) )
+        
+        # a duplicate saves the same chunks
+        
+        dupe_file_seed_cache = file_seed_cache.Duplicate()
+        
+        self.assertEqual( get_chunk_hashes( dupe_file_seed_cache ), get_chunk_hashes( file_seed_cache ) )
+        self.assertEqual( [ file_seed.file_seed_data for file_seed in dupe_file_seed_cache.GetFileSeeds() ], [ file_seed.file_seed_data for file_seed in file_seed_cache.GetFileSeeds() ] )
+        
+        # and the old single list format updates to chunks
+        
+        old_serialisable_tuple = ( HydrusSerialisable.SERIALISABLE_TYPE_FILE_SEED_CACHE, 8, HydrusSerialisable.SerialisableList( file_seed_cache.GetFileSeeds() ).GetSerialisableTuple() )
+        
+        updated_file_seed_cache = HydrusSerialisable.CreateFromSerialisableTuple( old_serialisable_tuple )
+        
+        self.assertEqual( get_chunk_hashes( updated_file_seed_cache ), get_chunk_hashes( file_seed_cache ) )
+        
+        # a session page strips the chunks out and can put them back
+        
+        ( stripped_serialisable, hashes_to_serialisable_file_seed_chunks ) = ClientImportFileSeeds.StripFileSeedChunks( [ 'some page', file_seed_cache.GetSerialisableTuple() ] )
+        
+        self.assertEqual( ClientImportFileSeeds.GetStrippedFileSeedChunkHashes( stripped_serialisable ), set( hashes_to_serialisable_file_seed_chunks.keys() ) )
+        
+        ( page_name, serialisable_file_seed_cache ) = ClientImportFileSeeds.FillFileSeedChunks( stripped_serialisable, hashes_to_serialisable_file_seed_chunks )
+        
+        filled_file_seed_cache = HydrusSerialisable.CreateFromSerialisableTuple( serialisable_file_seed_cache )
+        
+        self.assertEqual( len( filled_file_seed_cache ), len( file_seed_cache ) )
+        
+    
+    def test_file_seed_chunks_in_place_edits( self ):
+        
+        chunk_size = ClientImportFileSeeds.FILE_SEED_CACHE_CHUNK_SIZE
+        
+        file_seeds = [ ClientImportFileSeeds.FileSeed( ClientImportFileSeeds.FILE_SEED_TYPE_URL, f'https://example.com/post/{i}' ) for i in range( chunk_size * 2 ) ]
+        
+        file_seed_cache = ClientImportFileSeeds.FileSeedCache()
+        
+        file_seed_cache.AddFileSeeds( file_seeds )
+        
+        # save it once, as a session would, then load it back so it starts from the loaded form
+        
+        file_seed_cache = HydrusSerialisable.CreateFromString( file_seed_cache.DumpToString() )
+        
+        ( first_file_seed, other_file_seed ) = ( file_seed_cache.GetFileSeeds()[ 5 ], file_seed_cache.GetFileSeeds()[ chunk_size + 5 ] )
+        
+        # edit the file seeds directly, without telling the file log
+        
+        first_file_seed.SetStatus( CC.STATUS_ERROR, note = 'it broke' )
+        other_file_seed.AddPrimaryURLs( ( 'https://example.com/post/primary', ) )
+        
+        loaded_file_seed_cache = HydrusSerialisable.CreateFromString( file_seed_cache.DumpToString() )
+        
+        loaded_first_file_seed = loaded_file_seed_cache.GetFileSeeds()[ 5 ]
+        loaded_other_file_seed = loaded_file_seed_cache.GetFileSeeds()[ chunk_size + 5 ]
+        
+        self.assertEqual( loaded_first_file_seed.status, CC.STATUS_ERROR )
+        self.assertEqual( loaded_first_file_seed.note, 'it broke' )
+        self.assertIn( 'https://example.com/post/primary', loaded_other_file_seed.GetPrimaryURLs() )
+        
+        # and the session form carries the edits too
+        
+        ( stripped_serialisable, hashes_to_serialisable_file_seed_chunks ) = ClientImportFileSeeds.StripFileSeedChunks( file_seed_cache.GetSerialisableTuple() )
+        
+        filled_file_seed_cache = HydrusSerialisable.CreateFromSerialisableTuple( ClientImportFileSeeds.FillFileSeedChunks( stripped_serialisable, hashes_to_serialisable_file_seed_chunks ) )
+        
+        self.assertEqual( filled_file_seed_cache.GetFileSeeds()[ 5 ].note, 'it broke' )
+        
+    
     def test_renormalise( self ):
         
         file_seed_cache = ClientImportFileSeeds.FileSeedCache()
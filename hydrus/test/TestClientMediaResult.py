@@ -0,0 +1,198 @@
+import gc
+import os
+import pickle
+import unittest
+import weakref
+
+from hydrus.core import HydrusSerialisable
+
+from hydrus.client import ClientConstants as CC
+from hydrus.client.media import ClientMediaManagers
+from hydrus.client.media import ClientMediaResult
+from hydrus.client.media import ClientMediaResultCache
+from hydrus.client.metadata import ClientTags
+
+from hydrus.test import HelperFunctions as HF
+
+class TestMediaResultSlots( unittest.TestCase ):
+    
+    def _GetManagers( self, media_result: ClientMediaResult.MediaResult ):
+        
+        return [
+            media_result.GetFileInfoManager(),
+            media_result.GetTagsManager(),
+            media_result.GetTimesManager(),
+            media_result.GetLocationsManager(),
+            media_result.GetRatingsManager(),
+            media_result.GetNotesManager(),
+            media_result.GetFileViewingStatsManager()
+        ]
+        
+    
+    def _AssertSameMediaResult( self, media_result: ClientMediaResult.MediaResult, other_media_result: ClientMediaResult.MediaResult ):
+        
+        file_info_manager = media_result.GetFileInfoManager()
+        other_file_info_manager = other_media_result.GetFileInfoManager()
+        
+        for name in ClientMediaManagers.FileInfoManager.__slots__:
+            
+            self.assertEqual( getattr( file_info_manager, name ), getattr( other_file_info_manager, name ) )
+            
+        
+        for tag_display_type in ( ClientTags.TAG_DISPLAY_STORAGE, ClientTags.TAG_DISPLAY_DISPLAY_ACTUAL ):
+            
+            self.assertEqual( media_result.GetTagsManager().GetCurrent( CC.DEFAULT_LOCAL_TAG_SERVICE_KEY, tag_display_type ), other_media_result.GetTagsManager().GetCurrent( CC.DEFAULT_LOCAL_TAG_SERVICE_KEY, tag_display_type ) )
+            self.assertEqual( media_result.GetTagsManager().GetPending( CC.DEFAULT_LOCAL_TAG_SERVICE_KEY, tag_display_type ), other_media_result.GetTagsManager().GetPending( CC.DEFAULT_LOCAL_TAG_SERVICE_KEY, tag_display_type ) )
+            
+        
+        self.assertEqual( media_result.GetTimesManager().GetFileModifiedTimestampMS(), other_media_result.GetTimesManager().GetFileModifiedTimestampMS() )
+        
+        self.assertEqual( media_result.GetLocationsManager().GetCurrent(), other_media_result.GetLocationsManager().GetCurrent() )
+        self.assertEqual( media_result.GetLocationsManager().GetInbox(), other_media_result.GetLocationsManager().GetInbox() )
+        
+        self.assertEqual( media_result.GetRatingsManager().GetServiceKeysToRatings(), other_media_result.GetRatingsManager().GetServiceKeysToRatings() )
+        self.assertEqual( media_result.GetNotesManager().GetNamesToNotes(), other_media_result.GetNotesManager().GetNamesToNotes() )
+        
+        self.assertEqual( media_result.GetFileViewingStatsManager().views, other_media_result.GetFileViewingStatsManager().views )
+        self.assertEqual( media_result.GetFileViewingStatsManager().viewtimes_ms, other_media_result.GetFileViewingStatsManager().viewtimes_ms )
+        
+    
+    def test_no_dict( self ):
+        
+        media_result = HF.GetFakeMediaResult( os.urandom( 32 ) )
+        
+        file_duplicates_manager = ClientMediaManagers.FileDuplicatesManager( None, None, {} )
+        
+        for obj in [ media_result, file_duplicates_manager ] + self._GetManagers( media_result ):
+            
+            self.assertFalse( hasattr( obj, '__dict__' ) )
+            
+            with self.assertRaises( AttributeError ):
+                
+                obj.some_new_attribute = 5
+                
+            
+        
+    
+    def test_duplicate( self ):
+        
+        media_result = HF.GetFakeMediaResult( os.urandom( 32 ) )
+        
+        dupe_media_result = media_result.Duplicate()
+        
+        self._AssertSameMediaResult( media_result, dupe_media_result )
+        
+        # every manager is a new object, and the times manager is shared with the managers that use it, just like the original
+        
+        for ( manager, dupe_manager ) in zip( self._GetManagers( media_result ), self._GetManagers( dupe_media_result ) ):
+            
+            self.assertIsNot( manager, dupe_manager )
+            
+        
+        self.assertIs( dupe_media_result.GetLocationsManager().GetTimesManager(), dupe_media_result.GetTimesManager() )
+        
+        # and editing the dupe does not touch the original
+        
+        dupe_media_result.GetNotesManager().GetNamesToNotes()[ 'new note' ] = 'hi'
+        
+        self.assertNotIn( 'new note', media_result.GetNotesManager().GetNamesToNotes() )
+        
+        dupe_media_result.GetFileInfoManager().size = 5
+        
+        self.assertNotEqual( media_result.GetFileInfoManager().size, 5 )
+        
+        #
+        
+        file_duplicates_manager = ClientMediaManagers.FileDuplicatesManager( os.urandom( 32 ), 5, { 1 : 2 } )
+        
+        dupe_file_duplicates_manager = file_duplicates_manager.Duplicate()
+        
+        self.assertEqual( dupe_file_duplicates_manager.media_group_king_hash, file_duplicates_manager.media_group_king_hash )
+        self.assertEqual( dupe_file_duplicates_manager.alternates_group_id, 5 )
+        self.assertEqual( dupe_file_duplicates_manager.GetDupeCount( 1 ), 2 )
+        self.assertIsNot( dupe_file_duplicates_manager.dupe_statuses_to_count, file_duplicates_manager.dupe_statuses_to_count )
+        
+    
+    def test_pickle( self ):
+        
+        # the tags manager, and so the whole media result, holds a lock, so only Duplicate copies those. the rest pickle fine with slots
+        
+        media_result = HF.GetFakeMediaResult( os.urandom( 32 ) )
+        
+        file_info_manager = pickle.loads( pickle.dumps( media_result.GetFileInfoManager() ) )
+        
+        for name in ClientMediaManagers.FileInfoManager.__slots__:
+            
+            self.assertEqual( getattr( file_info_manager, name ), getattr( media_result.GetFileInfoManager(), name ) )
+            
+        
+        times_manager = pickle.loads( pickle.dumps( media_result.GetTimesManager() ) )
+        
+        self.assertEqual( times_manager.GetFileModifiedTimestampMS(), media_result.GetTimesManager().GetFileModifiedTimestampMS() )
+        self.assertEqual( times_manager.GetImportedTimestampMS( CC.LOCAL_FILE_SERVICE_KEY ), media_result.GetTimesManager().GetImportedTimestampMS( CC.LOCAL_FILE_SERVICE_KEY ) )
+        self.assertIsNone( times_manager.GetDeletedTimestampMS( CC.LOCAL_FILE_SERVICE_KEY ) )
+        
+        locations_manager = pickle.loads( pickle.dumps( media_result.GetLocationsManager() ) )
+        
+        self.assertEqual( locations_manager.GetCurrent(), media_result.GetLocationsManager().GetCurrent() )
+        self.assertEqual( locations_manager.GetTimesManager().GetImportedTimestampMS( CC.LOCAL_FILE_SERVICE_KEY ), media_result.GetTimesManager().GetImportedTimestampMS( CC.LOCAL_FILE_SERVICE_KEY ) )
+        
+        notes_manager = pickle.loads( pickle.dumps( media_result.GetNotesManager() ) )
+        
+        self.assertEqual( notes_manager.GetNamesToNotes(), { 'note' : 'hello', 'note2' : 'hello2' } )
+        
+        ratings_manager = pickle.loads( pickle.dumps( ClientMediaManagers.RatingsManager( { CC.DEFAULT_FAVOURITES_RATING_SERVICE_KEY : 1.0 } ) ) )
+        
+        self.assertEqual( ratings_manager.GetServiceKeysToRatings(), { CC.DEFAULT_FAVOURITES_RATING_SERVICE_KEY : 1.0 } )
+        
+        file_viewing_stats_manager = pickle.loads( pickle.dumps( media_result.GetFileViewingStatsManager() ) )
+        
+        self.assertEqual( file_viewing_stats_manager.views, media_result.GetFileViewingStatsManager().views )
+        
+        file_duplicates_manager = pickle.loads( pickle.dumps( ClientMediaManagers.FileDuplicatesManager( None, 5, { 1 : 2 } ) ) )
+        
+        self.assertEqual( file_duplicates_manager.GetDupeCount( 1 ), 2 )
+        
+    
+    def test_serialisation( self ):
+        
+        media_results = [ HF.GetFakeMediaResult( os.urandom( 32 ) ) for i in range( 3 ) ]
+        
+        snapshot = ClientMediaResultCache.MediaResultSnapshot( media_results )
+        
+        dupe_snapshot = HydrusSerialisable.CreateFromString( snapshot.DumpToString() )
+        
+        dupe_media_results = dupe_snapshot.GetMediaResults()
+        
+        self.assertEqual( len( dupe_media_results ), 3 )
+        
+        for ( media_result, dupe_media_result ) in zip( media_results, dupe_media_results ):
+            
+            self._AssertSameMediaResult( media_result, dupe_media_result )
+            
+            self.assertEqual( dupe_media_result.GetTimesManager().GetImportedTimestampMS( CC.LOCAL_FILE_SERVICE_KEY ), media_result.GetTimesManager().GetImportedTimestampMS( CC.LOCAL_FILE_SERVICE_KEY ) )
+            
+        
+    
+    def test_weakref( self ):
+        
+        media_result = HF.GetFakeMediaResult( os.urandom( 32 ) )
+        
+        media_result_ref = weakref.ref( media_result )
+        
+        self.assertIs( media_result_ref(), media_result )
+        
+        hashes_to_media_results = weakref.WeakValueDictionary()
+        
+        hashes_to_media_results[ media_result.GetHash() ] = media_result
+        
+        self.assertIn( media_result.GetHash(), hashes_to_media_results )
+        
+        del media_result
+        
+        gc.collect()
+        
+        self.assertIsNone( media_result_ref() )
+        self.assertEqual( len( hashes_to_media_results ), 0 )
+        
+    
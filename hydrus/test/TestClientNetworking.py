@@ -1,5 +1,8 @@
+import concurrent.futures
+import hashlib
 import time
 import unittest
+import urllib.parse
 
 from httmock import all_requests, urlmatch, HTTMock, response
 
@@ -9,11 +12,14 @@ from hydrus.core import HydrusConstants as HC
 from hydrus.core import HydrusData
 from hydrus.core import HydrusExceptions
 from hydrus.core import HydrusTime
+from hydrus.core.networking import HydrusNetwork
 from hydrus.core.networking import HydrusNetworking
 
 from hydrus.client import ClientConstants as CC
+from hydrus.client import ClientGlobals as CG
 from hydrus.client import ClientStrings
 from hydrus.client import ClientServices
+from hydrus.client.files import ClientFilesMaintenance
 from hydrus.client.networking import ClientNetworking
 from hydrus.client.networking import ClientNetworkingBandwidth
 from hydrus.client.networking import ClientNetworkingContexts
@@ -26,6 +32,7 @@ from hydrus.client.networking import ClientNetworkingSessions
 from hydrus.client.networking import ClientNetworkingURLClass
 
 from hydrus.test import TestController
+from hydrus.test import TestGlobals as TG
 
 # some gumpf
 GOOD_RESPONSE = bytes( range( 256 ) )
@@ -1232,6 +1239,53 @@ class TestNetworkingEngine( unittest.TestCase ):
         engine.Shutdown()
         
     
+class TestNetworkingSessions( unittest.TestCase ):
+    
+    def test_connection_pool_size( self ):
+        
+        session_manager = ClientNetworkingSessions.NetworkSessionManager()
+        
+        session = session_manager.GetSessionForDomain( MOCK_DOMAIN )
+        
+        # sized to how many jobs can run on one domain at once
+        self.assertEqual( session.get_adapter( MOCK_URL )._pool_maxsize, 3 )
+        
+        # pools for more hosts than the requests default, since one session covers all the subdomains
+        self.assertEqual( session.get_adapter( MOCK_URL )._pool_connections, ClientNetworkingSessions.SESSION_POOL_NUM_HOSTS )
+        
+        TG.test_controller.new_options.SetInteger( 'max_network_jobs_per_domain', 8 )
+        
+        try:
+            
+            session_manager.ReinitialiseSessions()
+            
+            session = session_manager.GetSessionForDomain( MOCK_DOMAIN )
+            
+            self.assertEqual( session.get_adapter( MOCK_URL )._pool_maxsize, 8 )
+            self.assertEqual( session.get_adapter( MOCK_URL.replace( 'https', 'http' ) )._pool_maxsize, 8 )
+            
+            # subdomains share the same session and pools
+            self.assertIs( session_manager.GetSessionForDomain( MOCK_SUBDOMAIN ), session )
+            
+            # and the total job limit caps it too
+            
+            TG.test_controller.new_options.SetInteger( 'max_network_jobs', 5 )
+            
+            session_manager.ReinitialiseSessions()
+            
+            session = session_manager.GetSessionForDomain( MOCK_DOMAIN )
+            
+            self.assertEqual( session.get_adapter( MOCK_URL )._pool_maxsize, 5 )
+            
+        finally:
+            
+            TG.test_controller.new_options.SetInteger( 'max_network_jobs', 15 )
+            
+            TG.test_controller.new_options.SetInteger( 'max_network_jobs_per_domain', 3 )
+            
+        
+    
+
 class TestNetworkingJob( unittest.TestCase ):
     
     def _GetJob( self, for_login = False ):
@@ -1596,3 +1650,526 @@ class TestNetworkingJobHydrus( unittest.TestCase ):
         pass
         
     
+class FakeNetworkJobHydrus( object ):
+    
+    def __init__( self, service_key, method, url, body = None, temp_path = None, file_body_path = None ):
+        
+        self.url = url
+        self.update_hash = bytes.fromhex( urllib.parse.parse_qs( urllib.parse.urlparse( url ).query )[ 'update_hash' ][0] )
+        
+        self.engine = None
+        self.cancelled = False
+        
+    
+    def AddAdditionalHeader( self, key, value ):
+        
+        pass
+        
+    
+    def Cancel( self ):
+        
+        self.cancelled = True
+        
+    
+    def GetContentBytes( self ):
+        
+        return self.engine.responses[ self.update_hash ]
+        
+    
+    def GetContentType( self ):
+        
+        return None
+        
+    
+    def OnlyTryConnectionOnce( self ):
+        
+        pass
+        
+    
+    def OverrideBandwidth( self ):
+        
+        pass
+        
+    
+    def SetForLogin( self, for_login ):
+        
+        pass
+        
+    
+    def WaitUntilDone( self ):
+        
+        self.engine.WaitingOn( self )
+        
+    
+
+class FakeNetworkEngine( object ):
+    
+    def __init__( self, responses ):
+        
+        self.responses = responses
+        
+        self.jobs = []
+        self.waited_jobs = []
+        self.num_in_flight_when_waited = []
+        
+        self.wait_callback = None
+        
+    
+    def AddJob( self, job ):
+        
+        job.engine = self
+        
+        self.jobs.append( job )
+        
+    
+    def WaitingOn( self, job ):
+        
+        self.waited_jobs.append( job )
+        
+        self.num_in_flight_when_waited.append( len( [ j for j in self.jobs if j not in self.waited_jobs[:-1] and not j.cancelled ] ) )
+        
+        if self.wait_callback is not None:
+            
+            self.wait_callback( job )
+            
+        
+        response = self.responses[ job.update_hash ]
+        
+        if isinstance( response, Exception ):
+            
+            raise response
+            
+        
+    
+
+class TestRepositoryUpdateSync( unittest.TestCase ):
+    
+    def setUp( self ):
+        
+        self._service = ClientServices.GenerateService( HydrusData.GenerateKey(), HC.TAG_REPOSITORY, 'test tag repo' )
+        
+        self._update_network_bytes = []
+        
+        for i in range( 5 ):
+            
+            update = HydrusNetwork.DefinitionsUpdate()
+            
+            update.AddRow( ( HC.DEFINITIONS_TYPE_TAGS, i, 'tag {}'.format( i ) ) )
+            
+            self._update_network_bytes.append( update.DumpToNetworkBytes() )
+            
+        
+        self._update_hashes = [ hashlib.sha256( update_network_bytes ).digest() for update_network_bytes in self._update_network_bytes ]
+        
+        self._engine = FakeNetworkEngine( dict( zip( self._update_hashes, self._update_network_bytes ) ) )
+        
+        self._imported_update_hashes = []
+        self._job_statuses = []
+        
+        def write_synchronous( action, *args ):
+            
+            if action == 'import_update':
+                
+                ( update_network_bytes, update_hash, mime ) = args
+                
+                self._imported_update_hashes.append( update_hash )
+                
+            
+        
+        def pub( topic, *args ):
+            
+            if topic == 'message':
+                
+                self._job_statuses.append( args[0] )
+                
+            
+        
+        self._controller = mock.Mock()
+        
+        self._controller.Read.return_value = list( self._update_hashes )
+        self._controller.WriteSynchronous.side_effect = write_synchronous
+        self._controller.pub.side_effect = pub
+        self._controller.ShouldStopThisWork.return_value = False
+        self._controller.new_options.GetInteger.return_value = 3
+        self._controller.network_engine = self._engine
+        
+        for patcher in (
+            mock.patch.object( CG, 'client_controller', self._controller ),
+            mock.patch.object( ClientServices.ClientNetworkingJobs, 'NetworkJobHydrus', FakeNetworkJobHydrus ),
+            mock.patch.object( self._service, '_CanSyncDownload', return_value = True )
+        ):
+            
+            patcher.start()
+            
+            self.addCleanup( patcher.stop )
+            
+        
+    
+    def _GetCancelledUpdateHashes( self ):
+        
+        return [ job.update_hash for job in self._engine.jobs if job.cancelled ]
+        
+    
+    def test_download_in_order( self ):
+        
+        self._service._SyncDownloadUpdates( None )
+        
+        # several downloads are in flight, but we import strictly in hash order
+        
+        self.assertEqual( [ job.update_hash for job in self._engine.jobs ], self._update_hashes )
+        self.assertEqual( [ job.update_hash for job in self._engine.waited_jobs ], self._update_hashes )
+        self.assertEqual( self._imported_update_hashes, self._update_hashes )
+        
+        self.assertEqual( self._engine.num_in_flight_when_waited, [ 3, 3, 3, 2, 1 ] )
+        
+        self.assertEqual( self._GetCancelledUpdateHashes(), [] )
+        
+    
+    def test_download_early_return( self ):
+        
+        # the service is paused after the first update
+        
+        self._service._CanSyncDownload.side_effect = [ True, True, False ]
+        
+        self._service._SyncDownloadUpdates( None )
+        
+        self.assertEqual( self._imported_update_hashes, self._update_hashes[:1] )
+        
+        self.assertEqual( [ job.update_hash for job in self._engine.jobs ], self._update_hashes[:3] )
+        self.assertEqual( self._GetCancelledUpdateHashes(), self._update_hashes[1:3] )
+        
+    
+    def test_download_should_quit( self ):
+        
+        # the user cancels the popup while the first update is downloading
+        
+        def wait_callback( job ):
+            
+            if job.update_hash == self._update_hashes[0]:
+                
+                self._job_statuses[0].Cancel()
+                
+            
+        
+        self._engine.wait_callback = wait_callback
+        
+        self._service._SyncDownloadUpdates( None )
+        
+        self.assertEqual( self._imported_update_hashes, self._update_hashes[:1] )
+        
+        self.assertEqual( [ job.update_hash for job in self._engine.jobs ], self._update_hashes[:3] )
+        self.assertEqual( self._GetCancelledUpdateHashes(), self._update_hashes[1:3] )
+        
+        self.assertEqual( self._service._no_requests_reason, 'download was recently cancelled' )
+        
+    
+    def test_download_network_error( self ):
+        
+        self._engine.responses[ self._update_hashes[1] ] = HydrusExceptions.NetworkException( 'connection reset' )
+        
+        self._service._SyncDownloadUpdates( None )
+        
+        self.assertEqual( self._imported_update_hashes, self._update_hashes[:1] )
+        
+        # the failed job was waited on, the others are cancelled, and nothing after is started
+        
+        self.assertEqual( [ job.update_hash for job in self._engine.jobs ], self._update_hashes[:4] )
+        self.assertEqual( self._GetCancelledUpdateHashes(), self._update_hashes[2:4] )
+        
+        self.assertEqual( self._service._no_requests_reason, 'connection reset' )
+        
+    
+    def test_download_hash_mismatch( self ):
+        
+        self._engine.responses[ self._update_hashes[0] ] = self._update_network_bytes[1]
+        
+        self._service._SyncDownloadUpdates( None )
+        
+        self.assertEqual( self._imported_update_hashes, [] )
+        
+        self.assertEqual( [ job.update_hash for job in self._engine.jobs ], self._update_hashes[:3] )
+        self.assertEqual( self._GetCancelledUpdateHashes(), self._update_hashes[1:3] )
+        
+        self.assertEqual( self._service._no_requests_reason, 'had an unusual update response' )
+        
+    
+class LazyFuture( concurrent.futures.Future ):
+    
+    def __init__( self, call ):
+        
+        super().__init__()
+        
+        self._call = call
+        
+    
+    def result( self, timeout = None ):
+        
+        # we only decode when the processing loop gets to us, so anything still pending in the look-ahead window is visible
+        
+        if not self.done() and self.set_running_or_notify_cancel():
+            
+            try:
+                
+                self.set_result( self._call() )
+                
+            except Exception as e:
+                
+                self.set_exception( e )
+                
+            
+        
+        return super().result( timeout = timeout )
+        
+    
+
+class FakeExecutor( object ):
+    
+    def __init__( self, *args, **kwargs ):
+        
+        self.submitted = []
+        self.was_shut_down = False
+        
+    
+    def shutdown( self, wait = True, cancel_futures = False ):
+        
+        self.was_shut_down = True
+        
+        if cancel_futures:
+            
+            for ( update_hash, future ) in self.submitted:
+                
+                future.cancel()
+                
+            
+        
+    
+    def submit( self, func, update_hash, mime ):
+        
+        future = LazyFuture( lambda: func( update_hash, mime ) )
+        
+        self.submitted.append( ( update_hash, future ) )
+        
+        return future
+        
+    
+
+class TestRepositoryUpdateProcessing( unittest.TestCase ):
+    
+    def setUp( self ):
+        
+        self._service = ClientServices.GenerateService( HydrusData.GenerateKey(), HC.TAG_REPOSITORY, 'test tag repo' )
+        
+        self._updates = []
+        
+        for i in range( 5 ):
+            
+            update = HydrusNetwork.DefinitionsUpdate()
+            
+            update.AddRow( ( HC.DEFINITIONS_TYPE_TAGS, i, 'tag {}'.format( i ) ) )
+            
+            self._updates.append( update )
+            
+        
+        self._update_hashes = [ hashlib.sha256( update.DumpToNetworkBytes() ).digest() for update in self._updates ]
+        
+        self._update_hashes_to_updates = dict( zip( self._update_hashes, self._updates ) )
+        
+        self._executors = []
+        self._processed_update_hashes = []
+        self._num_submitted_when_processed = []
+        self._maintenance_jobs_and_num_processed = []
+        self._should_stop = False
+        self._stop_after_processing = None
+        
+        def load_update( update_hash, mime ):
+            
+            update = self._update_hashes_to_updates[ update_hash ]
+            
+            if isinstance( update, Exception ):
+                
+                raise update
+                
+            
+            return update
+            
+        
+        def make_executor( *args, **kwargs ):
+            
+            executor = FakeExecutor()
+            
+            self._executors.append( executor )
+            
+            return executor
+            
+        
+        def write_synchronous( action, *args, **kwargs ):
+            
+            if action == 'process_repository_definitions':
+                
+                ( service_key, update_hash, iterator_dict, content_types, job_status, expected_work_period ) = args
+                
+                iterator_dict.clear()
+                
+                self._processed_update_hashes.append( update_hash )
+                self._num_submitted_when_processed.append( len( self._executors[0].submitted ) )
+                
+                if update_hash == self._stop_after_processing:
+                    
+                    self._should_stop = True
+                    
+                
+                return 1
+                
+            elif action == 'schedule_repository_update_file_maintenance':
+                
+                ( service_key, job_type ) = args
+                
+                self._maintenance_jobs_and_num_processed.append( ( job_type, len( self._processed_update_hashes ) ) )
+                
+            
+        
+        # we swap out the executor the service makes, but the threaded test wants a real one
+        self._real_thread_pool_executor_class = concurrent.futures.ThreadPoolExecutor
+        
+        self._controller = mock.Mock()
+        
+        self._controller.Read.return_value = ( False, [ ( update_hash, { HC.CONTENT_TYPE_DEFINITIONS } ) for update_hash in self._update_hashes ], False, [] )
+        self._controller.WriteSynchronous.side_effect = write_synchronous
+        self._controller.ShouldStopThisWork.side_effect = lambda *args, **kwargs: self._should_stop
+        self._controller.CurrentlyVeryIdle.return_value = True
+        self._controller.new_options.GetBoolean.return_value = False
+        self._controller.new_options.GetInteger.return_value = 0
+        
+        for patcher in (
+            mock.patch.object( CG, 'client_controller', self._controller ),
+            mock.patch.object( ClientServices.concurrent.futures, 'ThreadPoolExecutor', make_executor ),
+            mock.patch.object( ClientServices.HydrusData, 'ShowText' ),
+            mock.patch.object( ClientServices.HydrusData, 'ShowException' ),
+            mock.patch.object( self._service, '_LoadUpdate', side_effect = load_update ),
+            mock.patch.object( self._service, '_LogFinalRowSpeed' ),
+            mock.patch.object( self._service, '_ReportOngoingRowSpeed' )
+        ):
+            
+            patcher.start()
+            
+            self.addCleanup( patcher.stop )
+            
+        
+    
+    def test_decode_ahead_in_order( self ):
+        
+        # with real worker threads, the later updates finish decoding first, but we still get them in order
+        
+        def load_update( update_hash, mime ):
+            
+            time.sleep( 0.02 * ( len( self._update_hashes ) - self._update_hashes.index( update_hash ) ) )
+            
+            return self._update_hashes_to_updates[ update_hash ]
+            
+        
+        self._service._LoadUpdate.side_effect = load_update
+        
+        with self._real_thread_pool_executor_class( max_workers = ClientServices.NUM_UPDATES_TO_DECODE_AHEAD ) as executor:
+            
+            results = [ ( update_hash, future.result() ) for ( update_hash, content_types, future ) in self._service._IterateUpdatesWithDecodeAhead( executor, [ ( update_hash, set() ) for update_hash in self._update_hashes ], HC.APPLICATION_HYDRUS_UPDATE_DEFINITIONS ) ]
+            
+        
+        self.assertEqual( results, list( zip( self._update_hashes, self._updates ) ) )
+        
+    
+    def test_decode_ahead_window( self ):
+        
+        executor = FakeExecutor()
+        
+        iterator = self._service._IterateUpdatesWithDecodeAhead( executor, [ ( update_hash, set() ) for update_hash in self._update_hashes ], HC.APPLICATION_HYDRUS_UPDATE_DEFINITIONS )
+        
+        for ( i, ( update_hash, content_types, future ) ) in enumerate( iterator ):
+            
+            self.assertEqual( update_hash, self._update_hashes[ i ] )
+            
+            # the one we are on plus at most the look-ahead window
+            self.assertEqual( len( executor.submitted ), min( i + 1 + ClientServices.NUM_UPDATES_TO_DECODE_AHEAD, len( self._update_hashes ) ) )
+            
+            future.result()
+            
+        
+    
+    def test_decode_ahead_cancel( self ):
+        
+        executor = FakeExecutor()
+        
+        iterator = self._service._IterateUpdatesWithDecodeAhead( executor, [ ( update_hash, set() ) for update_hash in self._update_hashes ], HC.APPLICATION_HYDRUS_UPDATE_DEFINITIONS )
+        
+        ( update_hash, content_types, future ) = next( iterator )
+        
+        future.result()
+        
+        iterator.close()
+        
+        self.assertEqual( [ future.cancelled() for ( update_hash, future ) in executor.submitted ], [ False, True, True ] )
+        
+    
+    def test_process_in_order( self ):
+        
+        self._service._SyncProcessUpdates( maintenance_mode = HC.MAINTENANCE_FORCED )
+        
+        self.assertEqual( self._processed_update_hashes, self._update_hashes )
+        self.assertEqual( self._num_submitted_when_processed, [ 3, 4, 5, 5, 5 ] )
+        
+        self.assertEqual( self._maintenance_jobs_and_num_processed, [] )
+        self.assertTrue( self._executors[0].was_shut_down )
+        
+    
+    def test_process_stops_early( self ):
+        
+        self._stop_after_processing = self._update_hashes[0]
+        
+        self._service._SyncProcessUpdates( maintenance_mode = HC.MAINTENANCE_FORCED )
+        
+        self.assertEqual( self._processed_update_hashes, self._update_hashes[:1] )
+        
+        # the look-ahead work is cancelled, and nothing past the window was ever started
+        
+        executor = self._executors[0]
+        
+        self.assertEqual( [ update_hash for ( update_hash, future ) in executor.submitted ], self._update_hashes[:3] )
+        self.assertEqual( [ future.cancelled() for ( update_hash, future ) in executor.submitted ], [ False, True, True ] )
+        
+        self.assertEqual( self._service._LoadUpdate.call_count, 1 )
+        
+    
+    def test_process_missing_file( self ):
+        
+        self._update_hashes_to_updates[ self._update_hashes[1] ] = HydrusExceptions.FileMissingException( 'missing' )
+        self._update_hashes_to_updates[ self._update_hashes[2] ] = HydrusExceptions.SerialisationException( 'broken' )
+        
+        self._service._SyncProcessUpdates( maintenance_mode = HC.MAINTENANCE_FORCED )
+        
+        # the first update is processed, and only then do we hit the missing second one
+        
+        self.assertEqual( self._processed_update_hashes, self._update_hashes[:1] )
+        self.assertEqual( self._maintenance_jobs_and_num_processed, [ ( ClientFilesMaintenance.REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_PRESENCE_REMOVE_RECORD, 1 ) ] )
+        
+        ( e, ) = ClientServices.HydrusData.ShowException.call_args[0]
+        
+        self.assertIn( self._update_hashes[1].hex(), str( e ) )
+        
+        self.assertTrue( self._service._update_processing_paused )
+        
+    
+    def test_process_invalid_file( self ):
+        
+        self._update_hashes_to_updates[ self._update_hashes[2] ] = HydrusExceptions.SerialisationException( 'broken' )
+        
+        self._service._SyncProcessUpdates( maintenance_mode = HC.MAINTENANCE_FORCED )
+        
+        self.assertEqual( self._processed_update_hashes, self._update_hashes[:2] )
+        self.assertEqual( self._maintenance_jobs_and_num_processed, [ ( ClientFilesMaintenance.REGENERATE_FILE_DATA_JOB_FILE_INTEGRITY_DATA_REMOVE_RECORD, 2 ) ] )
+        
+        ( e, ) = ClientServices.HydrusData.ShowException.call_args[0]
+        
+        self.assertIn( self._update_hashes[2].hex(), str( e ) )
+        
+        self.assertTrue( self._service._update_processing_paused )
+        
+    
@@ -1,9 +1,12 @@
+import numpy
 import os
+import random
 import unittest
 
 from hydrus.core import HydrusConstants as HC
 
 from hydrus.client import ClientConstants as CC
+from hydrus.client.db import ClientDBFilesSearch
 from hydrus.client.metadata import ClientTagsHandling
 from hydrus.client.search import ClientNumberTest
 from hydrus.client.search import ClientSearchAutocomplete
@@ -1924,3 +1927,42 @@ class TestAutocompletePredGubbins( unittest.TestCase ):
         self.assertEqual( tag_autocomplete_options.GetExactMatchCharacterThreshold(), 2 )
         
     
+
+class TestDBSortOrder( unittest.TestCase ):
+    
+    def test_numpy_sort_order( self ):
+        
+        rows = [ ( hash_id, random.choice( [ None, 0, 5, 5, 12, 1000000, 1700000000000 ] ) ) for hash_id in random.sample( range( 1, 100000 ), 2000 ) ]
+        
+        python_key = lambda row: -1 if row[1] is None else row[1]
+        
+        hash_ids = [ row[0] for row in rows ]
+        
+        sort_columns = [ numpy.nan_to_num( ClientDBFilesSearch.GetNumPySortColumn( rows, 1 ), nan = -1 ) ]
+        
+        for reverse in ( False, True ):
+            
+            expected_result = [ row[0] for row in sorted( rows, key = python_key, reverse = reverse ) ]
+            
+            result = [ hash_ids[ i ] for i in ClientDBFilesSearch.GetNumPySortOrder( sort_columns, reverse ) ]
+            
+            # ties keep their original order, just like sorted
+            self.assertEqual( result, expected_result )
+            
+        
+        # multi-key
+        
+        python_key = lambda row: ( -1 if row[1] is None else row[1], row[0] )
+        
+        sort_columns.append( numpy.array( hash_ids, dtype = numpy.int64 ) )
+        
+        for reverse in ( False, True ):
+            
+            expected_result = [ row[0] for row in sorted( rows, key = python_key, reverse = reverse ) ]
+            
+            result = [ hash_ids[ i ] for i in ClientDBFilesSearch.GetNumPySortOrder( sort_columns, reverse ) ]
+            
+            self.assertEqual( result, expected_result )
+            
+        
+    
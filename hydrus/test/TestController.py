@@ -55,6 +55,7 @@ from hydrus.client.networking import ClientNetworkingURLClass
 from hydrus.server import ServerGlobals as SG
 
 from hydrus.test import TestClientAPI
+from hydrus.test import TestClientCaches
 from hydrus.test import TestClientConstants
 from hydrus.test import TestClientDaemons
 from hydrus.test import TestClientDB
@@ -68,6 +69,7 @@ from hydrus.test import TestClientImportObjects
 from hydrus.test import TestClientImportOptions
 from hydrus.test import TestClientImportSubscriptions
 from hydrus.test import TestClientListBoxes
+from hydrus.test import TestClientMediaResult
 from hydrus.test import TestClientMetadataConditional
 from hydrus.test import TestClientMetadataMigration
 from hydrus.test import TestClientMigration
@@ -419,6 +421,7 @@ class Controller( object ):
         self.image_tiles_cache = ClientCaches.ImageTileCache( self )
         self.thumbnails_cache = ClientCaches.ThumbnailCache( self )
         self.thumbnails_cache_graphics_view_test = ClientCaches.ThumbnailCacheGraphicsViewTest( self )
+        self.client_api_render_cache = ClientCaches.ClientAPIRenderCache( self )
         
         self.server_session_manager = HydrusSessions.HydrusSessionManagerServer()
         
@@ -940,10 +943,12 @@ class Controller( object ):
         
         module_lookup[ 'data' ] = [
             TestHydrusPaths,
+            TestClientCaches,
             TestClientConstants,
             TestClientFileStorage,
             TestClientImportObjects,
             TestClientImportOptions,
+            TestClientMediaResult,
             TestClientParsing,
             TestClientSearch,
             TestClientTags,
@@ -1154,6 +1159,11 @@ class Controller( object ):
         self._write_call_args[ name ].append( ( args, kwargs ) )
         
     
+    def WriteClientToServerUpdate( self, service_key, account, client_to_server_update, timestamp ):
+        
+        self.WriteSynchronous( 'update', service_key, account, client_to_server_update, timestamp )
+        
+    
     def WriteSynchronous( self, name, *args, **kwargs ):
         
         self._write_call_args[ name ].append( ( args, kwargs ) )
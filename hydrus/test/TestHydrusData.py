@@ -1,8 +1,13 @@
 import random
 import unittest
+import zlib
 
+from hydrus.core import HydrusBitmaps
+from hydrus.core import HydrusCompression
+from hydrus.core import HydrusExceptions
 from hydrus.core import HydrusLists
 from hydrus.core import HydrusNumbers
+from hydrus.core import HydrusSerialisable
 
 class TestHydrusNumbers( unittest.TestCase ):
     
@@ -22,6 +27,106 @@ class TestHydrusNumbers( unittest.TestCase ):
         
     
 
+class TestHydrusBitmaps( unittest.TestCase ):
+    
+    def test_compressed_bitmap( self ):
+        
+        # sparse and dense chunks, and a chunk boundary or two
+        a = set( random.sample( range( 300000 ), 20000 ) ) | set( range( 131000, 140000 ) )
+        b = set( random.sample( range( 300000 ), 2000 ) ) | set( range( 65530, 65540 ) )
+        
+        bitmap_a = HydrusBitmaps.CompressedBitmap.FromIntegers( a )
+        bitmap_b = HydrusBitmaps.CompressedBitmap.FromIntegers( b )
+        
+        self.assertEqual( bitmap_a.ToSet(), a )
+        self.assertEqual( len( bitmap_a ), len( a ) )
+        self.assertEqual( bitmap_b.ToSet(), b )
+        
+        self.assertEqual( bitmap_a.Intersection( bitmap_b ).ToSet(), a.intersection( b ) )
+        self.assertEqual( bitmap_a.Union( bitmap_b ).ToSet(), a.union( b ) )
+        self.assertEqual( bitmap_a.Difference( bitmap_b ).ToSet(), a.difference( b ) )
+        self.assertEqual( bitmap_b.Difference( bitmap_a ).ToSet(), b.difference( a ) )
+        
+        for i in random.sample( range( 300000 ), 1000 ):
+            
+            self.assertEqual( i in bitmap_a, i in a )
+            
+        
+        empty = HydrusBitmaps.CompressedBitmap.FromIntegers( [] )
+        
+        self.assertEqual( len( empty ), 0 )
+        self.assertEqual( bitmap_a.Intersection( empty ).ToSet(), set() )
+        self.assertEqual( bitmap_a.Union( empty ).ToSet(), a )
+        
+        # the dense run takes a packed chunk, so it is much smaller than a python set
+        self.assertLess( bitmap_a.GetSizeInBytes(), len( a ) * 4 )
+        
+    
+
+class TestHydrusCompression( unittest.TestCase ):
+    
+    def test_codecs( self ):
+        
+        obj_bytes = b'{"hello": "world", "numbers": [1, 2, 3]}' * 100
+        
+        # the legacy format is still plain zlib
+        
+        legacy_bytes = HydrusCompression.CompressBytesToBytes( obj_bytes )
+        
+        self.assertEqual( zlib.decompress( legacy_bytes ), obj_bytes )
+        self.assertFalse( HydrusCompression.IsFramed( legacy_bytes ) )
+        self.assertEqual( HydrusCompression.DecompressBytesToBytes( legacy_bytes ), obj_bytes )
+        
+        #
+        
+        framed_bytes = HydrusCompression.CompressBytesToBytes( obj_bytes, codec = HydrusCompression.CODEC_ZLIB )
+        
+        self.assertTrue( HydrusCompression.IsFramed( framed_bytes ) )
+        self.assertEqual( HydrusCompression.DecompressBytesToBytes( framed_bytes ), obj_bytes )
+        
+        self.assertEqual( HydrusCompression.DecompressBytesToString( HydrusCompression.CompressStringToBytes( 'sam\u30b5\u30e0\u30b9', codec = HydrusCompression.CODEC_ZLIB ) ), 'sam\u30b5\u30e0\u30b9' )
+        
+        # a codec from the future
+        
+        future_bytes = framed_bytes[ : len( HydrusCompression.FRAME_PREFIX ) + 1 ] + bytes( [ 250 ] ) + framed_bytes[ len( HydrusCompression.FRAME_PREFIX ) + 2 : ]
+        
+        with self.assertRaises( HydrusExceptions.UnsupportedCodecException ):
+            
+            HydrusCompression.DecompressBytesToBytes( future_bytes )
+            
+        
+        if not HydrusCompression.ZSTD_OK:
+            
+            with self.assertRaises( HydrusExceptions.UnsupportedCodecException ):
+                
+                HydrusCompression.CompressBytesToBytes( obj_bytes, codec = HydrusCompression.CODEC_ZSTD )
+                
+            
+        
+    
+    @unittest.skipUnless( HydrusCompression.ZSTD_OK, 'zstd is not available' )
+    def test_zstd( self ):
+        
+        obj_bytes = b'{"hello": "world", "numbers": [1, 2, 3]}' * 100
+        
+        zstd_bytes = HydrusCompression.CompressBytesToBytes( obj_bytes, codec = HydrusCompression.CODEC_ZSTD )
+        
+        self.assertTrue( HydrusCompression.IsFramed( zstd_bytes ) )
+        self.assertLess( len( zstd_bytes ), len( obj_bytes ) )
+        self.assertEqual( HydrusCompression.DecompressBytesToBytes( zstd_bytes ), obj_bytes )
+        
+        self.assertEqual( HydrusCompression.DecompressBytesToString( HydrusCompression.CompressStringToBytes( 'sam\u30b5\u30e0\u30b9', codec = HydrusCompression.CODEC_ZSTD ) ), 'sam\u30b5\u30e0\u30b9' )
+        
+        # and through the serialisable layer
+        
+        obj = HydrusSerialisable.SerialisableList( [ 'a', 'b', 1, 2 ] )
+        
+        network_bytes = obj.DumpToNetworkBytes( codec = HydrusCompression.CODEC_ZSTD )
+        
+        self.assertEqual( list( HydrusSerialisable.CreateFromNetworkBytes( network_bytes ) ), [ 'a', 'b', 1, 2 ] )
+        
+    
+
 class TestHydrusLists( unittest.TestCase ):
     
     def test_unique_fast_list( self ):
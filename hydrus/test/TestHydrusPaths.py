@@ -1,11 +1,15 @@
 from unittest import mock
 import unittest
 
+import hashlib
 import ntpath
+import os
 import posixpath
 
 from hydrus.core import HydrusConstants as HC
 from hydrus.core import HydrusPaths
+from hydrus.core import HydrusTemp
+from hydrus.core.files import HydrusFileHandling
 
 # I pad these in the actual code
 MAGIC_WINDOWS_TOTAL_PATH_LIMIT = 260 - 10
@@ -616,6 +620,57 @@ class TestHydrusPaths( unittest.TestCase ):
             
             HC.PLATFORM_LINUX = old_platform_linux
             HC.PLATFORM_WINDOWS = old_platform_windows
+        
+    
+    def test_8_multi_digest_hashing( self ):
+        
+        ( os_file_handle, temp_path ) = HydrusTemp.GetTempPath( 'test_hashing' )
+        
+        try:
+            
+            # a bit over two read blocks, so we cover a partial final block
+            data = os.urandom( ( HydrusFileHandling.MULTI_DIGEST_READ_BLOCK_SIZE * 2 ) + 12345 )
+            
+            with open( temp_path, 'wb' ) as f:
+                
+                f.write( data )
+                
+            
+            expected_result = ( hashlib.md5( data ).digest(), hashlib.sha1( data ).digest(), hashlib.sha512( data ).digest() )
+            
+            self.assertEqual( HydrusFileHandling.GetExtraHashesFromPath( temp_path ), expected_result )
+            
+            with mock.patch.object( HydrusFileHandling, 'MULTI_DIGEST_THREADED_MINIMUM_SIZE', 0 ):
+                
+                self.assertEqual( HydrusFileHandling.GetExtraHashesFromPath( temp_path ), expected_result )
+                
+            
+            
+            # a broken digest thread should raise, not leave the reader blocked on its full queue
+            
+            class BrokenHasher( object ):
+                
+                def update( self, block ):
+                    
+                    raise ValueError( 'broken hasher' )
+                    
+                
+            
+            # small blocks, so there are far more of them than the queues hold
+            with mock.patch.object( HydrusFileHandling, 'MULTI_DIGEST_THREADED_MINIMUM_SIZE', 0 ), mock.patch.object( HydrusFileHandling, 'MULTI_DIGEST_READ_BLOCK_SIZE', 65536 ):
+                
+                with mock.patch.object( hashlib, 'sha1', BrokenHasher ):
+                    
+                    with self.assertRaises( ValueError ):
+                        
+                        HydrusFileHandling.GetExtraHashesFromPath( temp_path )
+                        
+                    
+                
+            
+        finally:
+            
+            HydrusTemp.CleanUpTempPath( os_file_handle, temp_path )
             
         
     
@@ -2,9 +2,11 @@ import unittest
 
 from hydrus.core import HydrusConstants as HC
 from hydrus.core import HydrusData
+from hydrus.core import HydrusExceptions
 from hydrus.core import HydrusSerialisable
 from hydrus.core import HydrusTags
 from hydrus.core import HydrusTime
+from hydrus.core.networking import HydrusNetwork
 
 from hydrus.client import ClientApplicationCommand as CAC
 from hydrus.client import ClientConstants as CC
@@ -156,6 +158,98 @@ class TestSerialisables( unittest.TestCase ):
             
         
     
+    def test_SERIALISABLE_TYPE_CONTENT_UPDATE( self ):
+        
+        def test( obj, dupe_obj ):
+            
+            self.assertEqual( [ tuple( row ) for row in obj.GetNewFiles() ], [ tuple( row ) for row in dupe_obj.GetNewFiles() ] )
+            self.assertEqual( list( obj.GetDeletedFiles() ), list( dupe_obj.GetDeletedFiles() ) )
+            self.assertEqual( [ ( tag_id, list( hash_ids ) ) for ( tag_id, hash_ids ) in obj.GetNewMappings() ], [ ( tag_id, list( hash_ids ) ) for ( tag_id, hash_ids ) in dupe_obj.GetNewMappings() ] )
+            self.assertEqual( [ tuple( pair ) for pair in obj.GetNewTagParents() ], [ tuple( pair ) for pair in dupe_obj.GetNewTagParents() ] )
+            self.assertEqual( [ tuple( pair ) for pair in obj.GetDeletedTagSiblings() ], [ tuple( pair ) for pair in dupe_obj.GetDeletedTagSiblings() ] )
+            self.assertEqual( obj.GetNumRows(), dupe_obj.GetNumRows() )
+            
+        
+        content_update = HydrusNetwork.ContentUpdate()
+        
+        content_update.AddRow( ( HC.CONTENT_TYPE_FILES, HC.CONTENT_UPDATE_ADD, ( 1, 123456, HC.IMAGE_JPEG, 1600000000, 640, 480, None, None, None ) ) )
+        content_update.AddRow( ( HC.CONTENT_TYPE_FILES, HC.CONTENT_UPDATE_ADD, ( 2, 5000000, HC.VIDEO_WEBM, 1600000005, 1920, 1080, 30000, 900, None ) ) )
+        content_update.AddRow( ( HC.CONTENT_TYPE_FILES, HC.CONTENT_UPDATE_DELETE, 70000 ) )
+        content_update.AddRow( ( HC.CONTENT_TYPE_FILES, HC.CONTENT_UPDATE_DELETE, 3 ) )
+        content_update.AddRow( ( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD, ( 5, [ 1, 2, 3, 100000, 40 ] ) ) )
+        content_update.AddRow( ( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD, ( 2 ** 40, [ 7 ] ) ) )
+        content_update.AddRow( ( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD, ( 6, [] ) ) )
+        content_update.AddRow( ( HC.CONTENT_TYPE_MAPPINGS, HC.CONTENT_UPDATE_ADD, ( 4, [ 2 ** 33, 2 ** 33 + 1, 5 ] ) ) )
+        content_update.AddRow( ( HC.CONTENT_TYPE_TAG_PARENTS, HC.CONTENT_UPDATE_ADD, ( 8, 9 ) ) )
+        content_update.AddRow( ( HC.CONTENT_TYPE_TAG_SIBLINGS, HC.CONTENT_UPDATE_DELETE, ( 10, 11 ) ) )
+        
+        self._dump_and_load_and_test( content_update, test )
+        
+        compact_network_bytes = content_update.DumpToCompactNetworkBytes()
+        
+        self.assertTrue( compact_network_bytes.startswith( HydrusSerialisable.COMPACT_NETWORK_BYTES_PREFIX ) )
+        
+        dupe_content_update = HydrusSerialisable.CreateFromNetworkBytes( compact_network_bytes )
+        
+        self.assertIsInstance( dupe_content_update, HydrusNetwork.ContentUpdate )
+        
+        test( content_update, dupe_content_update )
+        
+        # sqlite will not take numpy ints, so the rows have to come out as python ints
+        
+        for ( tag_id, hash_ids ) in dupe_content_update.GetNewMappings():
+            
+            self.assertIs( type( tag_id ), int )
+            self.assertTrue( False not in ( type( hash_id ) is int for hash_id in hash_ids ) )
+            
+        
+        self.assertIs( type( dupe_content_update.GetNewFiles()[0][0] ), int )
+        
+        with self.assertRaises( HydrusExceptions.SerialisationException ):
+            
+            HydrusSerialisable.CreateFromNetworkBytes( compact_network_bytes[ : -10 ] )
+            
+        
+        #
+        
+        bad_content_update = HydrusNetwork.ContentUpdate()
+        
+        bad_content_update.AddRow( ( HC.CONTENT_TYPE_FILES, HC.CONTENT_UPDATE_ADD, ( 1, 'not an int' ) ) )
+        
+        with self.assertRaises( HydrusExceptions.SerialisationException ):
+            
+            bad_content_update.DumpToCompactNetworkBytes()
+            
+        
+    
+    def test_SERIALISABLE_TYPE_DEFINITIONS_UPDATE( self ):
+        
+        def test( obj, dupe_obj ):
+            
+            self.assertEqual( obj.GetHashIdsToHashes(), dupe_obj.GetHashIdsToHashes() )
+            self.assertEqual( obj.GetTagIdsToTags(), dupe_obj.GetTagIdsToTags() )
+            
+        
+        definitions_update = HydrusNetwork.DefinitionsUpdate()
+        
+        for i in range( 20 ):
+            
+            definitions_update.AddRow( ( HC.DEFINITIONS_TYPE_HASHES, i * 3, HydrusData.GenerateKey() ) )
+            
+        
+        definitions_update.AddRow( ( HC.DEFINITIONS_TYPE_TAGS, 1, 'character:samus aran' ) )
+        definitions_update.AddRow( ( HC.DEFINITIONS_TYPE_TAGS, 2, '\u30b5\u30e0\u30b9' ) )
+        definitions_update.AddRow( ( HC.DEFINITIONS_TYPE_TAGS, 3, '' ) )
+        
+        self._dump_and_load_and_test( definitions_update, test )
+        
+        dupe_definitions_update = HydrusSerialisable.CreateFromNetworkBytes( definitions_update.DumpToCompactNetworkBytes() )
+        
+        self.assertIsInstance( dupe_definitions_update, HydrusNetwork.DefinitionsUpdate )
+        
+        test( definitions_update, dupe_definitions_update )
+        
+    
     def test_SERIALISABLE_TYPE_DUPLICATE_CONTENT_MERGE_OPTIONS( self ):
         
         def test( obj, dupe_obj ):
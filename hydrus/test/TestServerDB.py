@@ -1,4 +1,5 @@
 import random
+import threading
 import time
 import typing
 import unittest
@@ -6,12 +7,16 @@ import unittest
 from hydrus.core import HydrusConstants as HC
 from hydrus.core import HydrusData
 from hydrus.core import HydrusExceptions
+from hydrus.core import HydrusGlobals as HG
+from hydrus.core import HydrusSerialisable
 from hydrus.core import HydrusStaticDir
 from hydrus.core import HydrusTime
 from hydrus.core.networking import HydrusNetwork
 from hydrus.core.networking import HydrusNetworking
 
+from hydrus.server import ServerController
 from hydrus.server import ServerDB
+from hydrus.server import ServerFiles
 
 from hydrus.test import TestController
 from hydrus.test import TestGlobals as TG
@@ -336,6 +341,210 @@ class TestServerDB( unittest.TestCase ):
         self.assertEqual( result, self._tag_service_regular_account.GetAccountKey() )
         
     
+    def _test_batched_updates( self ):
+        
+        tags = [ 'series:batch test {}'.format( i ) for i in range( 3 ) ]
+        hash = HydrusData.GenerateKey()
+        
+        updates = []
+        
+        for tag in tags:
+            
+            client_to_server_update = HydrusNetwork.ClientToServerUpdate()
+            client_to_server_update.AddContent( HC.CONTENT_UPDATE_PEND, HydrusNetwork.Content( HC.CONTENT_TYPE_MAPPINGS, ( tag, ( hash, ) ) ) )
+            
+            updates.append( ( self._tag_service_key, self._tag_service_regular_account, client_to_server_update, HydrusTime.GetNow() ) )
+            
+        
+        # the middle one is for a service that does not exist
+        
+        ( service_key, account, client_to_server_update, timestamp ) = updates[1]
+        
+        updates[1] = ( HydrusData.GenerateKey(), account, client_to_server_update, timestamp )
+        
+        results = self._write( 'updates', updates )
+        
+        self.assertEqual( len( results ), 3 )
+        self.assertIsNone( results[0] )
+        self.assertIsInstance( results[1], HydrusExceptions.DataMissing )
+        self.assertIsNone( results[2] )
+        
+        for i in ( 0, 2 ):
+            
+            result = self._read( 'account_key_from_content', self._tag_service_key, HydrusNetwork.Content( HC.CONTENT_TYPE_MAPPING, ( tags[ i ], hash ) ) )
+            
+            self.assertEqual( result, self._tag_service_regular_account.GetAccountKey() )
+            
+        
+    
+    def _test_update_file_generation( self ):
+        
+        begin = 0
+        end = HydrusTime.GetNow() + 60
+        
+        update_hashes = TestServerDB._db.ReadOnCommittedSnapshot( 'repository_update_files', self._tag_service_key, begin, end )
+        
+        self.assertGreater( len( update_hashes ), 0 )
+        
+        tags_in_updates = set()
+        
+        for update_hash in update_hashes:
+            
+            with open( ServerFiles.GetExpectedFilePath( update_hash ), 'rb' ) as f:
+                
+                update = HydrusSerialisable.CreateFromNetworkBytes( f.read() )
+                
+            
+            if isinstance( update, HydrusNetwork.DefinitionsUpdate ):
+                
+                tags_in_updates.update( update.GetTagIdsToTags().values() )
+                
+            
+        
+        self.assertIn( 'series:batch test 0', tags_in_updates )
+        
+        self._write( 'register_update', self._tag_service_key, update_hashes )
+        
+        # the snapshot read should make exactly the same files as doing it all in the main transaction
+        
+        self.assertEqual( self._write( 'create_update', self._tag_service_key, begin, end ), update_hashes )
+        
+    
+    def _test_update_generation_with_concurrent_upload( self ):
+        
+        def get_tags_in_updates( update_hashes ):
+            
+            tags = set()
+            
+            for update_hash in update_hashes:
+                
+                with open( ServerFiles.GetExpectedFilePath( update_hash ), 'rb' ) as f:
+                    
+                    update = HydrusSerialisable.CreateFromNetworkBytes( f.read() )
+                    
+                
+                if isinstance( update, HydrusNetwork.DefinitionsUpdate ):
+                    
+                    tags.update( update.GetTagIdsToTags().values() )
+                    
+                
+            
+            return tags
+            
+        
+        update_period = 3600
+        now = HydrusTime.GetNow()
+        
+        # one update is due, for the period ending just now
+        
+        dictionary = HydrusNetwork.GenerateDefaultServiceDictionary( HC.TAG_REPOSITORY )
+        
+        dictionary[ 'service_options' ][ 'update_period' ] = update_period
+        
+        metadata = HydrusNetwork.Metadata()
+        
+        metadata.AppendUpdate( [], 0, now - update_period - 2, 0 )
+        
+        dictionary[ 'metadata' ] = metadata
+        
+        service = HydrusNetwork.GenerateService( self._tag_service_key, HC.TAG_REPOSITORY, 'tag repo', 100, dictionary )
+        
+        tag = 'series:uploaded during update generation'
+        hash = HydrusData.GenerateKey()
+        
+        upload_timestamps = []
+        
+        def upload():
+            
+            client_to_server_update = HydrusNetwork.ClientToServerUpdate()
+            
+            client_to_server_update.AddContent( HC.CONTENT_UPDATE_PEND, HydrusNetwork.Content( HC.CONTENT_TYPE_MAPPINGS, ( tag, ( hash, ) ) ) )
+            
+            timestamp = service.AcquireUpdateTimestamp()
+            
+            try:
+                
+                self._write( 'update', self._tag_service_key, self._tag_service_regular_account, client_to_server_update, timestamp )
+                
+            finally:
+                
+                service.ReleaseUpdateTimestamp( timestamp )
+                
+            
+            upload_timestamps.append( timestamp )
+            
+        
+        class FakeController( object ):
+            
+            def pub( self, *args, **kwargs ):
+                
+                pass
+                
+            
+            def ReadOnCommittedSnapshot( self, action, *args, **kwargs ):
+                
+                result = TestServerDB._db.ReadOnCommittedSnapshot( action, *args, **kwargs )
+                
+                # a client uploads after the snapshot was taken but before the update is registered
+                upload()
+                
+                # and a backup has to wait until the update files and their rows are both in
+                with self_test.assertRaises( HydrusExceptions.ServerBusyException ):
+                    
+                    TestServerDB._db.Write( 'backup', True )
+                    
+                
+                return result
+                
+            
+            def WriteSynchronous( self, action, *args, **kwargs ):
+                
+                return TestServerDB._db.Write( action, True, *args, **kwargs )
+                
+            
+        
+        self_test = self
+        
+        original_controller = HG.controller
+        
+        HG.controller = FakeController()
+        
+        try:
+            
+            # a busy server does not start an update
+            
+            with HG.server_busy:
+                
+                service.Sync()
+                
+            
+            self.assertEqual( service.GetMetadata().GetNextUpdateIndex(), 1 )
+            
+            service.Sync()
+            
+        finally:
+            
+            HG.controller = original_controller
+            
+        
+        self.assertEqual( service.GetMetadata().GetNextUpdateIndex(), 2 )
+        
+        update_hashes = service.GetMetadata().GetUpdateHashes( 1 )
+        
+        ( begin, end ) = service.GetMetadata().GetUpdateIndexBeginAndEnd( 1 )
+        
+        [ upload_timestamp ] = upload_timestamps
+        
+        self.assertGreater( upload_timestamp, end )
+        self.assertNotIn( tag, get_tags_in_updates( update_hashes ) )
+        
+        # it goes in the next update instead
+        
+        next_update_hashes = TestServerDB._db.ReadOnCommittedSnapshot( 'repository_update_files', self._tag_service_key, end + 1, end + update_period )
+        
+        self.assertIn( tag, get_tags_in_updates( next_update_hashes ) )
+        
+    
     def _test_account_modification( self ):
         
         regular_account_key = self._tag_service_regular_account.GetAccountKey()
@@ -1111,6 +1320,104 @@ class TestServerDB( unittest.TestCase ):
         
         self._test_account_fetching_from_content()
         
+        self._test_batched_updates()
+        
+        self._test_update_file_generation()
+        
+        self._test_update_generation_with_concurrent_upload()
+        
         self._test_delete_all_content()
         
-
+    
+    def test_reportable_exceptions( self ):
+        
+        try:
+            
+            b'\xff'.decode( 'utf-8' )
+            
+        except Exception as e:
+            
+            # UnicodeDecodeError cannot be made from just a message
+            
+            new_e = TestServerDB._db._GenerateReportableException( e )
+            
+            self.assertIn( 'UnicodeDecodeError', str( new_e ) )
+            
+        
+        try:
+            
+            raise HydrusExceptions.BadRequestException( 'bad' )
+            
+        except Exception as e:
+            
+            self.assertIs( TestServerDB._db._GenerateReportableException( e ), e )
+            
+        
+    
+    def test_client_to_server_update_writer( self ):
+        
+        class FakeController( object ):
+            
+            def __init__( self ):
+                
+                self.batches = []
+                
+            
+            def WriteSynchronous( self, action, updates ):
+                
+                self.batches.append( len( updates ) )
+                
+                time.sleep( 0.05 )
+                
+                return [ HydrusExceptions.BadRequestException( 'bad update' ) if client_to_server_update == 'bad' else None for ( service_key, account, client_to_server_update, timestamp ) in updates ]
+                
+            
+        
+        controller = FakeController()
+        
+        writer = ServerController.ClientToServerUpdateWriter( controller )
+        
+        results = {}
+        
+        def do_it( i ):
+            
+            try:
+                
+                writer.WriteUpdate( b'service', None, 'bad' if i % 5 == 0 else 'good', 0 )
+                
+                results[ i ] = None
+                
+            except Exception as e:
+                
+                results[ i ] = e
+                
+            
+        
+        threads = [ threading.Thread( target = do_it, args = ( i, ) ) for i in range( 20 ) ]
+        
+        for thread in threads:
+            
+            thread.start()
+            
+        
+        for thread in threads:
+            
+            thread.join()
+            
+        
+        self.assertEqual( sum( controller.batches ), 20 )
+        self.assertLess( len( controller.batches ), 20 )
+        
+        for i in range( 20 ):
+            
+            if i % 5 == 0:
+                
+                self.assertIsInstance( results[ i ], HydrusExceptions.BadRequestException )
+                
+            else:
+                
+                self.assertIsNone( results[ i ] )
+                
+            
+        
+    